@@ -3,15 +3,28 @@ FastAPI 路由定义，提供健康检查、批改与下载接口。
 """
 from __future__ import annotations
 
+import asyncio
 import json
 from pathlib import Path
 from typing import List
 
 from fastapi import APIRouter, Body, Depends, File, Form, HTTPException, UploadFile
-from fastapi.responses import FileResponse, HTMLResponse, JSONResponse
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse, HTMLResponse, JSONResponse, StreamingResponse
 
 from app.model.schemas import GradeConfig, GradeResponse, ModelEndpoint
+from app.service.circuit_breaker import breaker_snapshots
+from app.service.concurrency import limiter_snapshots
+from app.service.cpu_pool import cpu_pool_snapshot
 from app.service.grading_service import GradingService
+from app.service.jobs import GradingJob, JobConflictError, JobManager, format_sse
+from app.service.length_control import LONG_ESSAY_STRATEGIES
+from app.service.loop_monitor import loop_lag_snapshot
+from app.service.provider_caps import negotiated_structured_outputs
+from app.service.rate_limit import rate_limit_snapshots
+from app.service.response_cache import get_response_cache
+from app.service.scheduler import scheduler_snapshot
+from app.service.token_usage import get_usage_ledger
 from app.service.prompt_config import (
     PROMPT_CONFIG_PATH,
     load_prompt_config,
@@ -20,10 +33,11 @@ from app.service.prompt_config import (
     save_prompts_md_sections,
 )
 from app.util.logger import logger
-from config.settings import STATIC_DIR
+from config.settings import FILE_CONCURRENCY, JOB_EVENTS_HEARTBEAT_SECONDS, MODEL_CONSENSUS_TOLERANCE, MODEL_PACK_MAX_SIZE, STATIC_DIR
 
 router = APIRouter(prefix="/api")
 service = GradingService()
+job_manager = JobManager(service)
 
 
 def get_service() -> GradingService:
@@ -37,27 +51,83 @@ async def ping() -> JSONResponse:
     return JSONResponse({"message": "pong"})
 
 
-@router.post("/grade", response_model=GradeResponse)
-async def grade(
-    files: List[UploadFile] = File(..., description="待批改的作业文件"),
+@router.get("/limits")
+async def get_limits() -> JSONResponse:
+    """返回各模型端点当前的自适应并发上限、近期延迟/错误率、限流额度、结构化输出降级情况、各批次排队统计，
+    以及事件循环延迟与解析进程池状态。"""
+    return JSONResponse(
+        {
+            "file_concurrency": FILE_CONCURRENCY,
+            "endpoints": limiter_snapshots(),
+            "rate_limits": rate_limit_snapshots(),
+            "breakers": breaker_snapshots(),
+            "structured_output": negotiated_structured_outputs(),
+            "batches": scheduler_snapshot(),
+            "event_loop": loop_lag_snapshot(),
+            "cpu_pool": cpu_pool_snapshot(),
+        }
+    )
+
+
+@router.get("/cache/stats")
+async def get_cache_stats() -> JSONResponse:
+    """返回模型响应缓存的命中/未命中计数与容量占用。"""
+    return JSONResponse(await asyncio.to_thread(get_response_cache().stats))
+
+
+@router.delete("/cache")
+async def clear_cache() -> JSONResponse:
+    """清空模型响应缓存。"""
+    await asyncio.to_thread(get_response_cache().clear)
+    return JSONResponse({"message": "响应缓存已清空"})
+
+
+@router.get("/usage")
+async def get_usage() -> JSONResponse:
+    """返回服务启动以来按端点/模型汇总的 Token 用量与费用。"""
+    return JSONResponse(get_usage_ledger().snapshot())
+
+
+async def grade_config_form(
     api_url: str | None = Form(default=None, description="模型接口地址"),
     api_key: str | None = Form(default=None, description="API 密钥"),
     model_name: str | None = Form(default=None, description="模型名称"),
-    models: str | None = Form(default=None, description="追加模型配置 JSON（数组，每项包含 api_url/api_key/model_name，最多 2 个）"),
+    models: str | None = Form(default=None, description="追加模型配置 JSON（数组，每项包含 api_url/api_key/model_name，可选 context_window，最多 2 个）"),
     template: str = Form(default="auto", description="作业模板类型（auto 为自动识别，否则传分类 key）"),
     mock: str = Form(default="false", description="是否使用模拟模式"),
     skip_format_check: str = Form(default="false", description="是否跳过格式检查"),
     score_target_max: float = Form(default=60.0, description="目标满分（用于将评分规则总分按比例换算）"),
-    srv: GradingService = Depends(get_service),
-) -> GradeResponse:
-    """接收文件并执行批改流程。"""
-    if not files:
-        raise HTTPException(status_code=400, detail="请至少上传一个作业文件（.docx/.md/.markdown/.txt）")
+    bypass_cache: str = Form(default="false", description="是否跳过模型响应缓存（强制重新调用模型）"),
+    stream: str = Form(default="false", description="是否以流式（SSE）方式调用模型"),
+    hedge: str = Form(default="false", description="是否启用对冲模式（追加模型作为备用端点）"),
+    consensus: str = Form(default="false", description="是否启用共识模式（两个模型一致即采用，分歧时才调用第三个模型）"),
+    consensus_tolerance: float = Form(default=MODEL_CONSENSUS_TOLERANCE, description="共识模式分差容差（占目标满分的比例，0～1）"),
+    batch_mode: str = Form(default="false", description="是否通过批量接口（/v1/batches）离线批改"),
+    pack_size: int = Form(default=0, description="合并批改：每次请求合并的短作业份数（0 表示不合并）"),
+    context_window: int | None = Form(default=None, description="默认模型的上下文窗口（Token），留空时按模型名推断"),
+    long_essay_strategy: str = Form(default="truncate", description="超长作业处理：truncate / summarize / off"),
+) -> GradeConfig:
+    """解析并校验批改表单字段（同步批改与后台任务共用）。"""
     # 前端 FormData 传递布尔值为字符串，需要转换
     is_mock = mock.lower() == "true"
     is_skip_format = skip_format_check.lower() == "true"
+    is_bypass_cache = bypass_cache.lower() == "true"
+    is_stream = stream.lower() == "true"
+    is_hedge = hedge.lower() == "true"
+    is_consensus = consensus.lower() == "true"
+    is_batch_mode = batch_mode.lower() == "true"
     if score_target_max <= 0:
         raise HTTPException(status_code=400, detail="目标满分必须大于 0")
+    if is_consensus and is_hedge:
+        raise HTTPException(status_code=400, detail="共识模式与对冲模式不能同时启用")
+    if not 0 <= consensus_tolerance <= 1:
+        raise HTTPException(status_code=400, detail="共识容差必须在 0～1 之间")
+    if not 0 <= pack_size <= MODEL_PACK_MAX_SIZE:
+        raise HTTPException(status_code=400, detail=f"合并批改份数必须在 0～{MODEL_PACK_MAX_SIZE} 之间")
+    if long_essay_strategy not in LONG_ESSAY_STRATEGIES:
+        raise HTTPException(status_code=400, detail=f"超长作业处理方式必须为 {' / '.join(LONG_ESSAY_STRATEGIES)} 之一")
+    if context_window is not None and context_window < 1024:
+        raise HTTPException(status_code=400, detail="上下文窗口不能小于 1024 Token")
     if not is_mock:
         if not models and not api_url:
             raise HTTPException(status_code=400, detail="未填写模型接口地址")
@@ -81,9 +151,10 @@ async def grade(
                     api_url=str(item.get("api_url") or "").strip(),
                     api_key=(str(item.get("api_key")).strip() if item.get("api_key") is not None else None),
                     model_name=str(item.get("model_name") or "").strip(),
+                    context_window=item.get("context_window") or None,
                 )
             except Exception:  # noqa: BLE001
-                raise HTTPException(status_code=400, detail=f"多模型配置第 {idx} 项字段不合法，请检查 api_url/model_name。")
+                raise HTTPException(status_code=400, detail=f"多模型配置第 {idx} 项字段不合法，请检查 api_url/model_name/context_window。")
             if not is_mock:
                 if not endpoint.api_url:
                     raise HTTPException(status_code=400, detail=f"多模型配置第 {idx} 项未填写 api_url。")
@@ -96,24 +167,177 @@ async def grade(
         api_url=api_url,
         api_key=api_key,
         model_name=model_name,
+        context_window=context_window,
         models=parsed_models,
         template=template,
         mock=is_mock,
         skip_format_check=is_skip_format,
         score_target_max=score_target_max,
+        bypass_cache=is_bypass_cache,
+        stream=is_stream,
+        hedge=is_hedge,
+        consensus=is_consensus,
+        consensus_tolerance=consensus_tolerance,
+        batch_mode=is_batch_mode,
+        pack_size=pack_size,
+        long_essay_strategy=long_essay_strategy,
     )
-    extra_count = len(parsed_models) if parsed_models else 0
+    return config
+
+
+def _accept_upload(kind: str, files: List[UploadFile], config: GradeConfig) -> None:
+    """校验上传文件非空并记录请求概要。"""
+    if not files:
+        raise HTTPException(status_code=400, detail="请至少上传一个作业文件（.docx/.md/.markdown/.txt）")
     logger.info(
-        "收到批改请求：文件数=%d，模板=%s，模拟模式=%s，跳过格式检查=%s，追加模型数=%d",
+        "收到%s：文件数=%d，模板=%s，模拟模式=%s，跳过格式检查=%s，追加模型数=%d",
+        kind,
         len(files),
-        template,
-        is_mock,
-        is_skip_format,
-        extra_count,
+        config.template,
+        config.mock,
+        config.skip_format_check,
+        len(config.models) if config.models else 0,
     )
+
+
+@router.post("/grade", response_model=GradeResponse)
+async def grade(
+    files: List[UploadFile] = File(..., description="待批改的作业文件"),
+    config: GradeConfig = Depends(grade_config_form),
+    srv: GradingService = Depends(get_service),
+) -> GradeResponse:
+    """接收文件并执行批改流程。"""
+    _accept_upload("批改请求", files, config)
     return await srv.process(files, config)
 
 
+@router.post("/jobs", status_code=202)
+async def submit_job(
+    files: List[UploadFile] = File(..., description="待批改的作业文件"),
+    config: GradeConfig = Depends(grade_config_form),
+) -> JSONResponse:
+    """提交后台批改任务：保存文件后立即返回 batch_id，批次在后台执行。"""
+    _accept_upload("后台批改任务", files, config)
+    job = job_manager.submit(files, config)
+    return JSONResponse(
+        {"batch_id": job.batch_id, "status": job.status, "status_url": f"/api/jobs/{job.batch_id}"},
+        status_code=202,
+    )
+
+
+@router.get("/jobs")
+async def list_jobs() -> JSONResponse:
+    """返回进行中与最近结束的后台任务概要（不含逐文件状态）。"""
+    return JSONResponse(
+        {
+            "running": job_manager.running,
+            "max_running": job_manager.max_running,
+            "jobs": [job.summary() for job in job_manager.list_jobs()],
+        }
+    )
+
+
+@router.get("/jobs/{batch_id}")
+async def get_job(batch_id: str, items: bool = False) -> JSONResponse:
+    """返回后台任务的逐文件状态、预计剩余时间与已完成结果（items=true 时附带完整评分明细）。"""
+    job = job_manager.get(batch_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="未找到对应后台任务")
+    return JSONResponse(jsonable_encoder(job.snapshot(include_items=items)))
+
+
+@router.get("/jobs/{batch_id}/events")
+async def job_events(batch_id: str) -> StreamingResponse:
+    """以 Server-Sent Events 推送后台任务进度：snapshot（已有结果）、file（开始处理）、item（单个文件完成）、
+    status、progress（心跳：计数、预计剩余时间、模型耗时与排队深度）、done（含下载地址）。"""
+    job = job_manager.get(batch_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="未找到对应后台任务")
+
+    async def stream():
+        async for event, data in job.events(JOB_EVENTS_HEARTBEAT_SECONDS):
+            yield format_sse(event, data)
+
+    return StreamingResponse(
+        stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.post("/jobs/{batch_id}/resume", status_code=202)
+async def resume_job(batch_id: str, config: GradeConfig = Depends(grade_config_form)) -> JSONResponse:
+    """按批次断点日志恢复中断的批次（如服务重启）：已完成文件沿用结果，只重新评分缺失的文件并重新导出 Excel。
+    表单字段与 /api/grade 相同（日志不保存模型密钥），无需重新上传文件。"""
+    try:
+        job = job_manager.resume(batch_id, config)
+    except FileNotFoundError as exc:
+        raise HTTPException(status_code=404, detail=str(exc)) from exc
+    except JobConflictError as exc:
+        raise HTTPException(status_code=409, detail=str(exc)) from exc
+    return _restarted_job_response(job)
+
+
+@router.post("/batches/{batch_id}/regrade", status_code=202)
+async def regrade_batch(
+    batch_id: str,
+    config: GradeConfig = Depends(grade_config_form),
+    failed_only: str = Form(default="false", description="只重新评分失败的文件"),
+    file_names: str | None = Form(default=None, description="指定重新评分的文件名（JSON 字符串数组）"),
+    categories: str | None = Form(default=None, description="指定重新评分的作业分类（JSON 字符串数组）"),
+) -> JSONResponse:
+    """在已有批次内只重新评分筛选出的文件（条件之间为“且”），复用已保存的上传文件，
+    其余文件沿用原结果，完成后合并并重新生成 grade_result.xlsx。进度与结果通过 /api/jobs/{batch_id} 查询。"""
+    try:
+        job = job_manager.regrade(
+            batch_id,
+            config,
+            failed_only=failed_only.lower() == "true",
+            file_names=_parse_name_list(file_names, "文件名"),
+            categories=_parse_name_list(categories, "作业分类"),
+        )
+    except FileNotFoundError as exc:
+        raise HTTPException(status_code=404, detail=str(exc)) from exc
+    except JobConflictError as exc:
+        raise HTTPException(status_code=409, detail=str(exc)) from exc
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    return _restarted_job_response(job)
+
+
+def _parse_name_list(raw: str | None, label: str) -> list[str] | None:
+    if raw is None or not raw.strip():
+        return None
+    try:
+        values = json.loads(raw)
+    except json.JSONDecodeError as exc:
+        raise HTTPException(status_code=400, detail=f"{label}列表 JSON 解析失败，请检查格式。") from exc
+    if not isinstance(values, list) or not all(isinstance(v, str) for v in values):
+        raise HTTPException(status_code=400, detail=f"{label}列表必须为字符串数组。")
+    return [v.strip() for v in values if v.strip()]
+
+
+def _restarted_job_response(job: GradingJob) -> JSONResponse:
+    return JSONResponse(
+        {
+            "batch_id": job.batch_id,
+            "status": job.status,
+            "status_url": f"/api/jobs/{job.batch_id}",
+            "resumed_files": len(job.completed),
+            "pending_files": len(job.file_states) - len(job.completed),
+            "regrade_files": [name for name in job.file_states if name not in job.completed],
+        },
+        status_code=202,
+    )
+
+
+@router.post("/jobs/{batch_id}/cancel")
+async def cancel_job(batch_id: str) -> JSONResponse:
+    """取消排队中或运行中的后台任务，已完成文件的结果保留。"""
+    job = job_manager.cancel(batch_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="未找到对应后台任务")
+    return JSONResponse({"batch_id": batch_id, "status": job.status if job.finished else "cancelling"})
+
+
 @router.get("/download/{file_type}/{batch_id}")
 async def download(file_type: str, batch_id: str, srv: GradingService = Depends(get_service)) -> FileResponse:
     """提供成绩表或异常清单的下载。"""
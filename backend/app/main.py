@@ -8,6 +8,9 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
 from app.api.routes import router, router_home
+from app.service.cpu_pool import shutdown_cpu_pool
+from app.service.http_pool import close_http_clients
+from app.service.loop_monitor import ensure_loop_monitor
 from config.settings import STATIC_DIR, ensure_directories
 from app.util.logger import logger
 
@@ -31,10 +34,19 @@ app.mount("/static", StaticFiles(directory=str(STATIC_DIR)), name="static")
 
 @app.on_event("startup")
 async def startup_event() -> None:
-    """启动钩子，记录启动日志。"""
+    """启动钩子，启动事件循环延迟监测并记录启动日志。"""
+    ensure_loop_monitor()
     logger.info("AI 作业批改工具启动成功。")
 
 
+@app.on_event("shutdown")
+async def shutdown_event() -> None:
+    """关闭钩子，释放模型接口的共享连接池与解析进程池。"""
+    await close_http_clients()
+    shutdown_cpu_pool()
+    logger.info("AI 作业批改工具已关闭，模型连接池与解析进程池已释放。")
+
+
 @app.get("/health")
 async def health() -> dict[str, str]:
     """备用健康检查接口。"""
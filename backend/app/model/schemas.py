@@ -3,10 +3,12 @@ Pydantic 数据模型定义，描述接口输入输出结构。
 """
 from __future__ import annotations
 
-from typing import List, Optional
+from typing import List, Literal, Optional
 
 from pydantic import BaseModel, Field
 
+from config.settings import MODEL_CONSENSUS_TOLERANCE, MODEL_PACK_MAX_SIZE
+
 
 class ModelEndpoint(BaseModel):
     """单个模型端点配置（支持多模型批改）。"""
@@ -14,6 +16,7 @@ class ModelEndpoint(BaseModel):
     api_url: str = Field(..., description="大模型接口地址")
     api_key: Optional[str] = Field(None, description="大模型访问密钥")
     model_name: str = Field(..., description="模型名称")
+    context_window: Optional[int] = Field(None, ge=1024, description="上下文窗口（Token），未填写时按模型名推断")
 
     model_config = {"protected_namespaces": ()}
 
@@ -24,11 +27,24 @@ class GradeConfig(BaseModel):
     api_url: Optional[str] = Field(None, description="大模型接口地址")
     api_key: Optional[str] = Field(None, description="大模型访问密钥")
     model_name: Optional[str] = Field(None, description="模型名称")
+    context_window: Optional[int] = Field(None, ge=1024, description="默认模型的上下文窗口（Token），未填写时按模型名推断")
     models: Optional[List[ModelEndpoint]] = Field(None, description="追加模型端点配置（最多 2 个，不含默认模型）")
     template: str = Field("职业规划书与专业分析报告的自动分类", description="评分模版或作业类型提示")
     mock: bool = Field(False, description="是否启用离线模拟评分")
     skip_format_check: bool = Field(False, description="是否跳过文档格式校验（仅对 docx 生效）")
     score_target_max: float = Field(60.0, description="目标满分（用于将评分规则总分按比例换算）")
+    bypass_cache: bool = Field(False, description="是否跳过模型响应缓存（强制重新调用模型，新结果仍写回缓存）")
+    stream: bool = Field(False, description="是否以流式（SSE）方式调用模型，输出偏离约定结构时提前中断重试")
+    batch_mode: bool = Field(False, description="批量接口模式：整批请求写成 JSONL 提交到 /v1/batches 离线执行，以延迟换吞吐与成本")
+    pack_size: int = Field(0, ge=0, le=MODEL_PACK_MAX_SIZE, description="合并批改：同分类短作业每次请求合并的份数（0/1 表示不合并）")
+    hedge: bool = Field(False, description="对冲模式：仅以默认模型评分，追加模型作为备用端点，主端点超过近期 p90 延迟未返回时发送重复请求")
+    consensus: bool = Field(False, description="共识模式：先调用前两个模型，分差在容差内即采用，分歧时才调用下一个模型仲裁")
+    consensus_tolerance: float = Field(
+        MODEL_CONSENSUS_TOLERANCE, ge=0, le=1, description="共识模式的分差容差（占目标满分的比例）"
+    )
+    long_essay_strategy: Literal["truncate", "summarize", "off"] = Field(
+        "truncate", description="超长作业处理：truncate 首尾截断 / summarize 分段摘要后评分 / off 不处理"
+    )
 
     model_config = {"protected_namespaces": ()}
 
@@ -57,6 +73,16 @@ class GradeItem(BaseModel):
     raw_text_length: int
     raw_response: Optional[str] = None
     aggregate_strategy: Optional[str] = None
+    # 长文预检结果：full 完整发送 / truncated 首尾截断 / summarized 分段摘要 / oversize 超长但未处理
+    length_strategy: Optional[str] = None
+    # 长文预检明细：上下文窗口、正文可用 Token、原文与实际发送的估算 Token 等
+    length_info: Optional[dict] = None
+    # 本文件全部模型调用（含重试、总体评语）的 Token 用量与费用
+    usage: Optional[dict] = None
+    # 重复提交：本文件复用了哪个文件的评分结果（未单独调用模型）
+    duplicate_of: Optional[str] = None
+    # 重复提交：同一批次中正文与本文件相同的其他文件
+    duplicate_files: Optional[list[str]] = None
     grader_results: Optional[list[dict]] = None
 
 
@@ -71,3 +97,5 @@ class GradeResponse(BaseModel):
     download_result_url: str
     download_error_url: str
     items: List[GradeItem]
+    # 批次用量汇总：{"currency", "total", "endpoints": [按端点/模型拆分]}
+    usage: Optional[dict] = None
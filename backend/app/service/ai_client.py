@@ -3,34 +3,109 @@
 """
 from __future__ import annotations
 
+import asyncio
+import hashlib
 import json
 import random
-from typing import Any, Dict, Optional
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
 
 import httpx
 
-from config.settings import DEFAULT_MODEL_TIMEOUT
-from app.service.prompt_builder import RubricExpected
+from config.settings import MODEL_OUTPUT_TOKENS_ESTIMATE, MODEL_REPAIR_ATTEMPTS, RESPONSE_CACHE_ENABLED
+from app.service.batch_api import BatchApiError, BatchTicket
+from app.service.circuit_breaker import CircuitBreaker, CircuitOpenError, get_circuit_breaker
+from app.service.concurrency import get_model_limiter
+from app.service.http_pool import get_http_client
+from app.service.output_parser import compile_rubric_validator, extract_json_object
+from app.service.provider_caps import (
+    apply_structured_output,
+    downgrade_structured_output,
+    is_structured_output_rejection,
+    prompt_cache_style,
+    structured_output_style,
+)
+from app.service.rate_limit import estimate_tokens, get_rate_limiter
+from app.service.response_cache import ResponseCache, get_response_cache
+from app.service.retry_policy import RetryBudget, get_retry_policy
+from app.service.prompt_builder import RubricExpected, build_repair_prompt, split_user_prompt
+from app.service.stream_guard import StreamGuard, StreamGuardError
+from app.service.token_usage import add_usage, new_usage, usage_from_response
 from app.util.logger import logger
 
+T = TypeVar("T")
+
+# 评分与总体评语请求统一使用的采样温度（同时参与响应缓存键）
+GRADE_TEMPERATURE = 0.2
+
 
 class ModelError(Exception):
     """大模型调用异常。"""
 
-    def __init__(self, message: str, *, raw_response: str | None = None, kind: str = "unknown") -> None:
+    def __init__(
+        self,
+        message: str,
+        *,
+        raw_response: str | None = None,
+        kind: str = "unknown",
+        retryable: bool = True,
+        status_code: int | None = None,
+    ) -> None:
         super().__init__(message)
         self.raw_response = raw_response
         self.kind = kind
+        self.retryable = retryable
+        # 接口以非 2xx 拒绝请求时的 HTTP 状态码
+        self.status_code = status_code
+
+
+class RubricMismatchError(ModelError):
+    """模型输出是合法 JSON，但与评分规则不一致（可通过修复重提示更正）。"""
+
+    def __init__(self, message: str, *, raw_response: str, parsed: Dict[str, Any], reason: str) -> None:
+        super().__init__(message, raw_response=raw_response, kind="parse")
+        self.parsed = parsed
+        self.reason = reason
+
+
+def _new_call_stats() -> Dict[str, Any]:
+    return {
+        "attempts": 0,
+        "retries": {"call": 0, "parse": 0},
+        "retry_wait_ms": 0,
+        "rate_limit_wait_ms": 0,
+        "budget_exhausted": False,
+        "deadline_exceeded": False,
+        "cache_hit": False,
+        # 修复重提示（只发送上次 JSON 与校验错误）的次数与成功次数，不计入 attempts/retries
+        "repairs": {"attempts": 0, "succeeded": 0},
+    }
 
 
 class AIClient:
     """封装模型调用逻辑，兼顾真实接口与离线模拟。"""
 
-    def __init__(self, api_url: Optional[str], api_key: Optional[str], model_name: Optional[str], mock: bool = False) -> None:
+    def __init__(
+        self,
+        api_url: Optional[str],
+        api_key: Optional[str],
+        model_name: Optional[str],
+        mock: bool = False,
+        stream: bool = False,
+        batch_ticket: Optional[BatchTicket] = None,
+    ) -> None:
         self.api_url = api_url
         self.api_key = api_key
         self.model_name = model_name or "demo-model"
         self.mock = mock or not api_url
+        # 流式模式：以 SSE 逐段读取输出，并在输出明显偏离约定结构时提前中断重试
+        self.stream = stream
+        # 批量接口模式：首次请求登记到批量任务，之后的重试改走在线调用
+        self.batch_ticket = batch_ticket
+        # 最近一次 grade/chat_json 调用的重试与等待统计
+        self.stats: Dict[str, Any] = _new_call_stats()
+        # 本客户端全部调用（含重试）累计的 Token 用量与费用，不随单次调用重置
+        self.usage: Dict[str, Any] = new_usage()
 
     async def grade(
         self,
@@ -39,80 +114,202 @@ class AIClient:
         template: str,
         expected: RubricExpected,
         score_target_max: float,
+        *,
+        deadline: Optional[float] = None,
+        retry_budget: Optional[RetryBudget] = None,
+        use_cache: bool = True,
     ) -> tuple[str, Dict[str, Any], Dict[str, Any]]:
-        """对正文内容进行评分，返回原始解析 + 标准化字典。"""
+        """对正文内容进行评分，返回原始解析 + 标准化字典。
+
+        deadline 为 time.monotonic() 时间点，超过后不再重试；retry_budget 为批次共享的重试预算；
+        use_cache=False 时跳过响应缓存读取（新结果仍会写回缓存）。
+        """
+        self.stats = _new_call_stats()
         if self.mock:
             logger.info("启用离线模拟评分，跳过真实调用。")
             return self._mock_grade(template, expected, score_target_max)
         if not self.api_url:
             raise ModelError("未配置模型接口地址")
         headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
-        messages = [
-            {
-                "role": "system",
-                "content": system_prompt,
-            },
-            {
-                "role": "user",
-                "content": self._build_user_content(template, content),
-            },
-        ]
-        payload = {
+        payload = self._build_grade_payload(system_prompt, template, content)
+
+        cache_key = self._grade_cache_key(system_prompt, self._build_user_content(template, content))
+        if cache_key is not None and use_cache:
+            cached = await self._cache_lookup(cache_key, expected, score_target_max)
+            if cached is not None:
+                return cached
+
+        async def attempt_once() -> tuple[str, Dict[str, Any], Dict[str, Any]]:
+            content_text = await self._request_grade(payload, headers, expected)
+            try:
+                parsed, normalized = self.parse_and_normalize(content_text, expected, score_target_max)
+            except RubricMismatchError as exc:
+                repaired = await self._repair_grade(exc, system_prompt, headers, expected, score_target_max, deadline)
+                if repaired is None:
+                    raise
+                return repaired
+            return content_text, parsed, normalized
+
+        result = await self._with_retries(attempt_once, deadline=deadline, retry_budget=retry_budget, label="评分")
+        await self._cache_store(cache_key, result[0])
+        return result
+
+    def _build_grade_payload(self, system_prompt: str, template: str, content: str) -> Dict[str, Any]:
+        """构造评分请求：稳定前缀（System Prompt + 评分配置）在前、学生正文在最后，并按服务商附加前缀缓存提示。"""
+        prefix, tail = self._split_user_content(template, content)
+        style = prompt_cache_style(self.api_url, self.model_name)
+        user_content: Any = prefix + tail
+        if style == "cache_control":
+            user_content = [
+                {"type": "text", "text": prefix, "cache_control": {"type": "ephemeral"}},
+                {"type": "text", "text": tail},
+            ]
+        payload: Dict[str, Any] = {
             "model": self.model_name,
-            "messages": messages,
-            "temperature": 0.2,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_content},
+            ],
+            "temperature": GRADE_TEMPERATURE,
         }
-        last_exc: Optional[Exception] = None
-        last_raw: Optional[str] = None
-        last_kind: str = "unknown"
-        for attempt in range(3):
+        if style == "openai":
+            payload["prompt_cache_key"] = hashlib.sha256(f"{system_prompt}\n{prefix}".encode("utf-8")).hexdigest()[:32]
+        return payload
+
+    async def _request_grade(self, payload: Dict[str, Any], headers: Dict[str, str], expected: RubricExpected) -> str:
+        """发送评分请求，并按端点能力附加由评分规则生成的 JSON Schema（结构化输出/受约束解码）。
+
+        端点以 400/422 拒绝且错误信息指向结构化输出参数时降级（json_schema/guided_json → json_object → none）并立即重发，
+        降级结果按端点与模型记住，不计入重试次数；其他原因的 400/422 原样抛出。
+        """
+        style = structured_output_style(self.api_url, self.model_name)
+        schema = compile_rubric_validator(expected).json_schema
+        while True:
             try:
-                async with httpx.AsyncClient(timeout=DEFAULT_MODEL_TIMEOUT) as client:
-                    resp = await client.post(self.api_url, json=payload, headers=headers)
-                    try:
-                        resp.raise_for_status()
-                    except httpx.HTTPStatusError as exc:
-                        status_code = exc.response.status_code
-                        last_kind = "call"
-                        if status_code in (401, 403):
-                            raise ModelError("模型鉴权失败（401/403），请检查 API Key/权限配置是否正确。", kind="call") from exc
-                        if 400 <= status_code < 500 and status_code not in (408, 429):
-                            raise ModelError(f"模型请求被拒绝（HTTP {status_code}），请检查接口地址、请求格式与权限配置。", kind="call") from exc
-                        raise
-                    data = resp.json()
+                return await self._request_content(apply_structured_output(payload, schema, style), headers, StreamGuard(expected))
+            except ModelError as exc:
+                if style == "none" or not is_structured_output_rejection(exc.status_code, exc.raw_response):
+                    raise
+                rejected = style
+                style = downgrade_structured_output(self.api_url, self.model_name, rejected)
+                logger.warning("端点 %s 不支持结构化输出方式 %s，降级为 %s 后重发", self.api_url, rejected, style)
+
+    def _grade_cache_key(self, system_prompt: str, user_content: str) -> Optional[str]:
+        if not RESPONSE_CACHE_ENABLED or self.mock:
+            return None
+        return ResponseCache.make_key(
+            model_name=self.model_name,
+            api_url=self.api_url or "",
+            system_prompt=system_prompt,
+            user_prompt=user_content,
+            temperature=GRADE_TEMPERATURE,
+        )
+
+    async def lookup_cached_grade(
+        self, content: str, system_prompt: str, template: str, expected: RubricExpected, score_target_max: float
+    ) -> Optional[tuple[str, Dict[str, Any], Dict[str, Any]]]:
+        """按单篇评分的缓存键查找缓存结果（供合并批改等不经过 grade() 的路径使用）。"""
+        cache_key = self._grade_cache_key(system_prompt, self._build_user_content(template, content))
+        if cache_key is None:
+            return None
+        return await self._cache_lookup(cache_key, expected, score_target_max)
 
-                try:
-                    content_text = data["choices"][0]["message"]["content"]
-                except Exception as exc:  # noqa: BLE001
-                    last_raw = json.dumps(data, ensure_ascii=False)
-                    last_kind = "parse"
-                    raise ValueError("模型返回结构异常，缺少 choices.message.content 字段") from exc
+    async def store_cached_grade(self, content: str, system_prompt: str, template: str, raw_text: str) -> None:
+        """以单篇评分的缓存键写入模型输出文本。"""
+        await self._cache_store(self._grade_cache_key(system_prompt, self._build_user_content(template, content)), raw_text)
 
-                try:
-                    parsed = self._parse_json_from_text(content_text)
-                except Exception as exc:  # noqa: BLE001
-                    last_raw = content_text
-                    last_kind = "parse"
-                    raise ValueError("模型未按要求返回合法 JSON") from exc
+    async def _cache_store(self, cache_key: Optional[str], raw_text: str) -> None:
+        if cache_key is None:
+            return
+        try:
+            await get_response_cache().aput(cache_key, raw_text, model_name=self.model_name)
+        except Exception as exc:  # noqa: BLE001
+            logger.warning("写入响应缓存失败：%s", exc)
 
-                try:
-                    normalized = self._normalize_response(parsed, expected, score_target_max)
-                except Exception as exc:  # noqa: BLE001
-                    last_raw = content_text
-                    last_kind = "parse"
-                    raise ValueError(f"模型返回内容不符合评分规则要求：{exc}") from exc
+    async def _cache_lookup(
+        self, cache_key: str, expected: RubricExpected, score_target_max: float
+    ) -> Optional[tuple[str, Dict[str, Any], Dict[str, Any]]]:
+        """命中缓存时直接重新解析与标准化；缓存内容已不符合当前评分规则时删除并回退到真实调用。"""
+        cache = get_response_cache()
+        try:
+            raw_text = await cache.aget(cache_key)
+        except Exception as exc:  # noqa: BLE001
+            logger.warning("读取响应缓存失败，改为真实调用：%s", exc)
+            return None
+        if raw_text is None:
+            return None
+        try:
+            parsed, normalized = self.parse_and_normalize(raw_text, expected, score_target_max)
+        except ModelError:
+            logger.info("缓存的模型输出不再符合评分规则，已丢弃并重新调用。")
+            try:
+                await cache.adelete(cache_key)
+            except Exception:  # noqa: BLE001
+                pass
+            return None
+        self.stats["cache_hit"] = True
+        return raw_text, parsed, normalized
 
-                return content_text, parsed, normalized
+    def parse_and_normalize(
+        self, content_text: str, expected: RubricExpected, score_target_max: float
+    ) -> tuple[Dict[str, Any], Dict[str, Any]]:
+        """解析模型输出文本并按评分规则标准化，失败时抛出 kind="parse" 的 ModelError。"""
+        try:
+            parsed = self._parse_json_from_text(content_text)
+        except Exception as exc:  # noqa: BLE001
+            raise ModelError("模型未按要求返回合法 JSON", raw_response=content_text, kind="parse") from exc
+        if not isinstance(parsed, dict):
+            raise ModelError("模型返回 JSON 非对象", raw_response=content_text, kind="parse")
+        try:
+            normalized = compile_rubric_validator(expected).normalize(parsed, score_target_max)
+        except Exception as exc:  # noqa: BLE001
+            raise RubricMismatchError(
+                f"模型返回内容不符合评分规则要求：{exc}", raw_response=content_text, parsed=parsed, reason=str(exc)
+            ) from exc
+        return parsed, normalized
+
+    async def _repair_grade(
+        self,
+        error: RubricMismatchError,
+        system_prompt: str,
+        headers: Dict[str, str],
+        expected: RubricExpected,
+        score_target_max: float,
+        deadline: Optional[float],
+    ) -> Optional[tuple[str, Dict[str, Any], Dict[str, Any]]]:
+        """修复重提示：沿用同一 System Prompt（可命中前缀缓存），只发送上次输出的 JSON 与校验错误，不重发作业正文。
+
+        修复成功返回（修复后的原始输出, 解析结果, 标准化结果）；修复失败或已超过单文件时限时返回 None，由调用方按解析失败重试整篇评分。
+        """
+        for _ in range(MODEL_REPAIR_ATTEMPTS):
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            self.stats["repairs"]["attempts"] += 1
+            payload = {
+                "model": self.model_name,
+                "messages": [
+                    {"role": "system", "content": system_prompt},
+                    {
+                        "role": "user",
+                        "content": build_repair_prompt(expected, json.dumps(error.parsed, ensure_ascii=False), error.reason),
+                    },
+                ],
+                "temperature": GRADE_TEMPERATURE,
+            }
+            try:
+                content_text = await self._request_grade(payload, headers, expected)
+                parsed, normalized = self.parse_and_normalize(content_text, expected, score_target_max)
+            except RubricMismatchError as exc:
+                logger.warning("修复重提示后仍不符合评分规则：%s", exc.reason)
+                error = exc
+                continue
             except Exception as exc:  # noqa: BLE001
-                last_exc = exc
-                if isinstance(exc, httpx.HTTPError):
-                    last_kind = "call"
-                logger.warning("模型调用或解析失败，第 %d 次尝试：%s", attempt + 1, exc)
-                if attempt == 2:
-                    if last_kind == "call":
-                        raise ModelError("模型调用失败或超时，已重试 3 次仍失败", raw_response=last_raw, kind=last_kind) from exc
-                    raise ModelError("模型返回内容不合格，已重试 3 次仍失败", raw_response=last_raw, kind=last_kind) from exc
-        raise ModelError("模型调用失败：未知错误", raw_response=last_raw, kind=last_kind) from last_exc
+                logger.warning("修复重提示失败，改为重新评分：%s", exc)
+                return None
+            self.stats["repairs"]["succeeded"] += 1
+            logger.info("修复重提示成功（原错误：%s）", error.reason)
+            return content_text, parsed, normalized
+        return None
 
     async def chat_json(
         self,
@@ -120,13 +317,16 @@ class AIClient:
         system_prompt: str,
         user_prompt: str,
         required_fields: tuple[str, ...] = ("comment",),
+        deadline: Optional[float] = None,
+        retry_budget: Optional[RetryBudget] = None,
     ) -> tuple[str, Dict[str, Any]]:
         """
         通用 JSON 生成接口：调用模型并要求只返回一个 JSON 对象。
 
-        - 会对“调用失败/超时”和“返回结构/JSON 解析失败”分别重试，最多 3 次。
+        - 会对“调用失败/超时”和“返回结构/JSON 解析失败”按各自的重试策略分别重试。
         - required_fields 用于做最基本的字段存在性校验。
         """
+        self.stats = _new_call_stats()
         if self.mock:
             raise ModelError("模拟模式不支持生成总体评语", kind="parse")
         if not self.api_url:
@@ -140,56 +340,288 @@ class AIClient:
         payload = {
             "model": self.model_name,
             "messages": messages,
-            "temperature": 0.2,
+            "temperature": GRADE_TEMPERATURE,
         }
 
-        last_exc: Optional[Exception] = None
+        async def attempt_once() -> tuple[str, Dict[str, Any]]:
+            content_text = await self._request_content(payload, headers, StreamGuard())
+            try:
+                parsed = self._parse_json_from_text(content_text)
+            except Exception as exc:  # noqa: BLE001
+                raise ModelError("模型未按要求返回合法 JSON", raw_response=content_text, kind="parse") from exc
+            if not isinstance(parsed, dict):
+                raise ModelError("模型返回 JSON 非对象", raw_response=content_text, kind="parse")
+            for field in required_fields:
+                if field not in parsed:
+                    raise ModelError(f"模型返回缺少必填字段：{field}", raw_response=content_text, kind="parse")
+            return content_text, parsed
+
+        return await self._with_retries(attempt_once, deadline=deadline, retry_budget=retry_budget, label="JSON模式")
+
+    async def _with_retries(
+        self,
+        attempt_once: Callable[[], Awaitable[T]],
+        *,
+        deadline: Optional[float],
+        retry_budget: Optional[RetryBudget],
+        label: str,
+    ) -> T:
+        """按错误类型的重试策略执行 attempt_once：指数退避 + 全抖动，受单文件时限与批次预算约束。"""
+        failures = {"call": 0, "parse": 0}
         last_raw: Optional[str] = None
-        last_kind: str = "unknown"
-        for attempt in range(3):
+        if retry_budget is not None:
+            retry_budget.record_request()
+        while True:
+            self.stats["attempts"] += 1
             try:
-                async with httpx.AsyncClient(timeout=DEFAULT_MODEL_TIMEOUT) as client:
-                    resp = await client.post(self.api_url, json=payload, headers=headers)
-                    resp.raise_for_status()
-                    data = resp.json()
+                return await attempt_once()
+            except Exception as exc:  # noqa: BLE001
+                if isinstance(exc, ModelError) and exc.kind in failures:
+                    kind = exc.kind
+                elif isinstance(exc, (httpx.HTTPError, ModelError)):
+                    kind = "call"
+                else:
+                    kind = "parse"
+                if isinstance(exc, ModelError) and exc.raw_response is not None:
+                    last_raw = exc.raw_response
+                logger.warning("模型调用或解析失败（%s），第 %d 次尝试：%s", label, self.stats["attempts"], exc)
+                if isinstance(exc, ModelError) and not exc.retryable:
+                    raise
+                failures[kind] += 1
+                policy = get_retry_policy(kind)
+                stop_reason = ""
+                if failures[kind] < policy.max_attempts:
+                    delay = policy.backoff(failures[kind] - 1)
+                    if deadline is not None and time.monotonic() + delay >= deadline:
+                        self.stats["deadline_exceeded"] = True
+                        stop_reason = "（已超过单文件时限）"
+                    elif retry_budget is not None and not retry_budget.try_spend():
+                        self.stats["budget_exhausted"] = True
+                        stop_reason = "（批次重试预算已用尽）"
+                    else:
+                        self.stats["retries"][kind] += 1
+                        self.stats["retry_wait_ms"] += int(delay * 1000)
+                        await asyncio.sleep(delay)
+                        continue
+                attempts = self.stats["attempts"]
+                if kind == "call":
+                    raise ModelError(f"模型调用失败或超时，已尝试 {attempts} 次仍失败{stop_reason}", raw_response=last_raw, kind=kind) from exc
+                raise ModelError(f"模型返回内容不合格，已尝试 {attempts} 次仍失败{stop_reason}", raw_response=last_raw, kind=kind) from exc
 
+    @staticmethod
+    def _extract_message_content(data: Dict[str, Any]) -> str:
+        try:
+            return data["choices"][0]["message"]["content"]
+        except Exception as exc:  # noqa: BLE001
+            raise ModelError(
+                "模型返回结构异常，缺少 choices.message.content 字段",
+                raw_response=json.dumps(data, ensure_ascii=False),
+                kind="parse",
+            ) from exc
+
+    async def _request_content(self, payload: Dict[str, Any], headers: Dict[str, str], guard: StreamGuard) -> str:
+        """发送一次请求并返回模型输出文本：批量模式首次请求走批量任务；流式模式下边读边校验；否则读取完整响应。"""
+        if self.batch_ticket is not None and not self.batch_ticket.used:
+            try:
+                data = await self.batch_ticket.submit(self.api_url or "", headers, payload)
+            except BatchApiError as exc:
+                raise ModelError(str(exc), kind="call") from exc
+        elif self.stream:
+            return await self._post_chat_stream(payload, headers, guard)
+        else:
+            data = await self._post_chat(payload, headers)
+        content_text = self._extract_message_content(data)
+        self._record_usage(data.get("usage"), payload, content_text)
+        return content_text
+
+    async def _post_chat(self, payload: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+        """通过共享连接池发送一次 chat-completions 请求，返回响应 JSON。"""
+        breaker = get_circuit_breaker(self.api_url)
+        is_probe = self._enter_breaker(breaker)
+        try:
+            client = await get_http_client(self.api_url)
+            rate_limiter = get_rate_limiter(self.api_url)
+            estimated_tokens = self._estimate_payload_tokens(payload)
+            waited = await rate_limiter.acquire(estimated_tokens)
+            self.stats["rate_limit_wait_ms"] += int(waited * 1000)
+            limiter = get_model_limiter(self.api_url)
+            async with limiter.slot():
+                started = time.perf_counter()
                 try:
-                    content_text = data["choices"][0]["message"]["content"]
-                except Exception as exc:  # noqa: BLE001
-                    last_raw = json.dumps(data, ensure_ascii=False)
-                    last_kind = "parse"
-                    raise ValueError("模型返回结构异常，缺少 choices.message.content 字段") from exc
+                    resp = await client.post(self.api_url, json=payload, headers=headers)
+                except httpx.HTTPError:
+                    # 超时与连接失败均视为过载信号
+                    limiter.record_failure(overload=True)
+                    breaker.record_failure()
+                    raise
+                if resp.status_code == 429 or resp.status_code >= 500:
+                    limiter.record_failure(overload=True)
+                elif resp.is_success:
+                    limiter.record_success((time.perf_counter() - started) * 1000)
+                else:
+                    limiter.record_failure(overload=False)
+                self._record_breaker(breaker, resp.status_code)
+        finally:
+            breaker.release(is_probe)
+        rate_limiter.update_from_headers(resp.headers, resp.status_code)
+        self._raise_for_status(resp)
+        data = resp.json()
+        usage = data.get("usage") if isinstance(data, dict) else None
+        if isinstance(usage, dict) and isinstance(usage.get("total_tokens"), (int, float)):
+            rate_limiter.settle(estimated_tokens, int(usage["total_tokens"]))
+        return data
+
+    async def _post_chat_stream(self, payload: Dict[str, Any], headers: Dict[str, str], guard: StreamGuard) -> str:
+        """以 SSE 流式发送请求，逐段累积 delta.content 并交给 guard 做增量校验。
+
+        guard 判定输出跑偏时立即关闭连接，抛出 kind="parse" 的 ModelError 交由重试逻辑处理；
+        delta.reasoning_content 等思考过程不做累积。
+        """
+        breaker = get_circuit_breaker(self.api_url)
+        is_probe = self._enter_breaker(breaker)
+        try:
+            return await self._stream_content(payload, headers, guard, breaker)
+        finally:
+            breaker.release(is_probe)
+
+    async def _stream_content(
+        self, payload: Dict[str, Any], headers: Dict[str, str], guard: StreamGuard, breaker: CircuitBreaker
+    ) -> str:
+        client = await get_http_client(self.api_url)
+        rate_limiter = get_rate_limiter(self.api_url)
+        estimated_tokens = self._estimate_payload_tokens(payload)
+        waited = await rate_limiter.acquire(estimated_tokens)
+        self.stats["rate_limit_wait_ms"] += int(waited * 1000)
+        limiter = get_model_limiter(self.api_url)
+        parts: list[str] = []
+        usage: Any = None
+        async with limiter.slot():
+            started = time.perf_counter()
+            try:
+                async with client.stream("POST", self.api_url, json=self._stream_payload(payload), headers=headers) as resp:
+                    self._record_breaker(breaker, resp.status_code)
+                    if not resp.is_success:
+                        await resp.aread()
+                        limiter.record_failure(overload=resp.status_code == 429 or resp.status_code >= 500)
+                        rate_limiter.update_from_headers(resp.headers, resp.status_code)
+                        self._raise_for_status(resp)
+                    rate_limiter.update_from_headers(resp.headers, resp.status_code)
+                    async for line in resp.aiter_lines():
+                        if not line.startswith("data:"):
+                            continue
+                        data_text = line[5:].strip()
+                        if data_text == "[DONE]":
+                            break
+                        try:
+                            chunk = json.loads(data_text)
+                        except json.JSONDecodeError as exc:
+                            raise ModelError("模型流式响应数据块不是合法 JSON", raw_response="".join(parts), kind="parse") from exc
+                        if isinstance(chunk.get("usage"), dict):
+                            usage = chunk["usage"]
+                        delta = self._extract_stream_delta(chunk)
+                        if not delta:
+                            continue
+                        parts.append(delta)
+                        try:
+                            guard.feed(delta)
+                        except StreamGuardError as exc:
+                            logger.warning("流式输出偏离约定结构，提前中断（已读取 %d 字符）：%s", guard.consumed, exc)
+                            self._record_usage(None, payload, "".join(parts))
+                            raise ModelError(f"模型输出偏离约定结构：{exc}", raw_response="".join(parts), kind="parse") from exc
+            except httpx.HTTPStatusError:
+                # 非 2xx 响应已在上方按状态码记录（与非流式一致），不再重复计数
+                raise
+            except httpx.HTTPError:
+                # 超时与连接失败均视为过载信号
+                limiter.record_failure(overload=True)
+                breaker.record_failure()
+                raise
+            limiter.record_success((time.perf_counter() - started) * 1000)
+        self._record_usage(usage, payload, "".join(parts))
+        if isinstance(usage, dict) and isinstance(usage.get("total_tokens"), (int, float)):
+            rate_limiter.settle(estimated_tokens, int(usage["total_tokens"]))
+        content_text = "".join(parts)
+        if not content_text:
+            raise ModelError("模型流式响应中没有任何输出内容", kind="parse")
+        return content_text
+
+    def _stream_payload(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        body = {**payload, "stream": True}
+        if prompt_cache_style(self.api_url, self.model_name) == "openai":
+            # OpenAI 流式响应默认不返回 usage，需显式开启才能统计缓存命中
+            body["stream_options"] = {"include_usage": True}
+        return body
+
+    def _record_usage(self, usage: Any, payload: Dict[str, Any], completion_text: str) -> None:
+        """累计本次调用（含重试）的 Token 用量与费用；服务商未返回 usage 时按本地估算。"""
+        record = usage_from_response(
+            usage,
+            model_name=self.model_name,
+            prompt_estimate=self._estimate_prompt_tokens(payload),
+            completion_text=completion_text,
+        )
+        add_usage(self.usage, record)
 
-                try:
-                    parsed = self._parse_json_from_text(content_text)
-                except Exception as exc:  # noqa: BLE001
-                    last_raw = content_text
-                    last_kind = "parse"
-                    raise ValueError("模型未按要求返回合法 JSON") from exc
-
-                if not isinstance(parsed, dict):
-                    last_raw = content_text
-                    last_kind = "parse"
-                    raise ValueError("模型返回 JSON 非对象")
-
-                for field in required_fields:
-                    if field not in parsed:
-                        last_raw = content_text
-                        last_kind = "parse"
-                        raise ValueError(f"模型返回缺少必填字段：{field}")
-
-                return content_text, parsed
-            except Exception as exc:  # noqa: BLE001
-                last_exc = exc
-                if isinstance(exc, httpx.HTTPError):
-                    last_kind = "call"
-                logger.warning("模型调用或解析失败（JSON模式），第 %d 次尝试：%s", attempt + 1, exc)
-                if attempt == 2:
-                    if last_kind == "call":
-                        raise ModelError("模型调用失败或超时，已重试 3 次仍失败", raw_response=last_raw, kind=last_kind) from exc
-                    raise ModelError("模型返回内容不合格，已重试 3 次仍失败", raw_response=last_raw, kind=last_kind) from exc
+    @staticmethod
+    def _enter_breaker(breaker: CircuitBreaker) -> bool:
+        """端点熔断中时快速失败（不再重试），返回本次是否为半开状态下的试探请求。"""
+        try:
+            return breaker.before_call()
+        except CircuitOpenError as exc:
+            raise ModelError(str(exc), kind="call", retryable=False) from exc
 
-        raise ModelError("模型调用失败：未知错误", raw_response=last_raw, kind=last_kind) from last_exc
+    @staticmethod
+    def _record_breaker(breaker: CircuitBreaker, status_code: int) -> None:
+        """5xx 计为端点失败；2xx、429 与其他 4xx 说明端点可达，计为成功。"""
+        if status_code >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+
+    @staticmethod
+    def _extract_stream_delta(chunk: Dict[str, Any]) -> str:
+        choices = chunk.get("choices")
+        if not isinstance(choices, list) or not choices or not isinstance(choices[0], dict):
+            return ""
+        delta = choices[0].get("delta") or {}
+        content = delta.get("content") if isinstance(delta, dict) else None
+        return content if isinstance(content, str) else ""
+
+    @staticmethod
+    def _raise_for_status(resp: httpx.Response) -> None:
+        """非 2xx 响应：鉴权失败与其他客户端错误不再重试，其余抛出 HTTPStatusError 交由重试逻辑处理。"""
+        try:
+            resp.raise_for_status()
+        except httpx.HTTPStatusError as exc:
+            status_code = exc.response.status_code
+            if status_code in (401, 403):
+                raise ModelError("模型鉴权失败（401/403），请检查 API Key/权限配置是否正确。", kind="call", retryable=False) from exc
+            if 400 <= status_code < 500 and status_code not in (408, 429):
+                raise ModelError(
+                    f"模型请求被拒绝（HTTP {status_code}），请检查接口地址、请求格式与权限配置。",
+                    kind="call",
+                    raw_response=exc.response.text[:2000],
+                    retryable=False,
+                    status_code=status_code,
+                ) from exc
+            raise
+
+    @staticmethod
+    def _estimate_prompt_tokens(payload: Dict[str, Any]) -> int:
+        """本地估算请求中全部消息的提示词 Token 数。"""
+        prompt_tokens = 0
+        for message in payload.get("messages") or []:
+            content = message.get("content")
+            if isinstance(content, str):
+                prompt_tokens += estimate_tokens(content)
+            elif isinstance(content, list):
+                prompt_tokens += sum(estimate_tokens(str(part.get("text") or "")) for part in content if isinstance(part, dict))
+        return prompt_tokens
+
+    @classmethod
+    def _estimate_payload_tokens(cls, payload: Dict[str, Any]) -> int:
+        """估算一次请求将消耗的 Token（提示词 + 预估输出），用于限流预扣。"""
+        return cls._estimate_prompt_tokens(payload) + MODEL_OUTPUT_TOKENS_ESTIMATE
 
     def _mock_grade(
         self, template: str, expected: RubricExpected, score_target_max: float
@@ -245,72 +677,19 @@ class AIClient:
 
         约定提示词文件中使用 {{HOMEWORK_TEXT}} 作为正文占位符；若未包含占位符，则自动附加正文区块。
         """
-        placeholder = "{{HOMEWORK_TEXT}}"
-        if placeholder in template_text:
-            return template_text.replace(placeholder, homework_text)
-        return f"{template_text}\n\n【学生作业正文】\n{homework_text}"
+        prefix, tail = AIClient._split_user_content(template_text, homework_text)
+        return prefix + tail
 
     @staticmethod
-    def _parse_json_from_text(text: str) -> Dict[str, Any]:
-        """从模型输出文本中提取 JSON 对象。
-
-        解析策略：
-        1) 若存在 Markdown 代码块（```...```），优先提取第一个看起来像 JSON 的代码块内容；
-        2) 否则回退为截取第一个“{”到最后一个“}”之间的内容。
-        """
-        if not text:
-            raise ValueError("模型输出为空")
-
-        # 优先解析 Markdown 代码块
-        fence = "```"
-        start_idx = 0
-        while True:
-            fence_start = text.find(fence, start_idx)
-            if fence_start == -1:
-                break
-            lang_end = text.find("\n", fence_start + len(fence))
-            if lang_end == -1:
-                break
-            fence_end = text.find(fence, lang_end + 1)
-            if fence_end == -1:
-                break
-            block = text[lang_end + 1 : fence_end].strip()
-            if block.startswith("{") and block.endswith("}"):
-                return json.loads(block)
-            start_idx = fence_end + len(fence)
-
-        start = text.find("{")
-        end = text.rfind("}")
-        if start == -1 or end == -1 or end <= start:
-            raise ValueError("未在模型输出中找到 JSON 对象")
-        snippet = text[start : end + 1]
-        try:
-            return json.loads(snippet)
-        except json.JSONDecodeError:
-            repaired = self._attempt_repair_json(snippet)
-            if repaired:
-                return repaired
-            raise
+    def _split_user_content(template_text: str, homework_text: str) -> tuple[str, str]:
+        """把 User Prompt 拆成（稳定前缀, 正文部分），规则见 prompt_builder.split_user_prompt。"""
+        return split_user_prompt(template_text, homework_text)
 
     @staticmethod
-    def _attempt_repair_json(snippet: str) -> dict[str, Any] | None:
-        """尝试修复常见的 JSON 结构错误（如 model 在 sections 内）。"""
-        import re
+    def _parse_json_from_text(text: str) -> Dict[str, Any]:
+        """从模型输出文本中提取 JSON 对象（快速路径 + 有界修复，见 output_parser）。"""
+        return extract_json_object(text)
 
-        model_match = re.search(r'\n\s*"model":\s*".*?"', snippet)
-        if not model_match:
-            return None
-        model_line = model_match.group(0).strip()
-        snippet_fixed = snippet[: model_match.start()] + snippet[model_match.end() :]
-        closing_match = re.search(r'\n\s*]\s*\n}', snippet_fixed)
-        if not closing_match:
-            return None
-        replacement = "\n  ],\n  " + model_line + "\n}"
-        snippet_fixed = snippet_fixed[: closing_match.start()] + replacement
-        try:
-            return json.loads(snippet_fixed)
-        except json.JSONDecodeError:
-            return None
     @staticmethod
     def _normalize_response(data: Dict[str, Any], expected: RubricExpected, score_target_max: float) -> Dict[str, Any]:
         """将接口返回的评分结果标准化（schema_version=2），并按目标满分进行比例换算。
@@ -318,109 +697,7 @@ class AIClient:
         注意：模型输出只要求包含细则得分与评语；所有总分字段由后端根据评分规则自动计算。
         """
         try:
-            def to_float(v: Any) -> float:
-                if v is None:
-                    raise ValueError("分数字段为空")
-                return float(v)
-
-            def clamp_min_max(num: float, min_v: float, max_v: float) -> float:
-                return max(min_v, min(max_v, num))
-
-            comment = data.get("comment")
-            if comment is None or not str(comment).strip():
-                raise ValueError("评语字段为空")
-
-            schema_version = int(to_float(data.get("schema_version")))
-            if schema_version != 2:
-                raise ValueError("schema_version 必须为 2")
-
-            if float(score_target_max) <= 0:
-                raise ValueError("score_target_max 非法")
-            score_rubric_max = float(expected.rubric_max)
-            if score_rubric_max <= 0:
-                raise ValueError("评分规则总分非法")
-
-            sections = data.get("sections")
-            if not isinstance(sections, list) or not sections:
-                raise ValueError("sections 必须为非空数组")
-
-            # 将模型输出按“名称”对齐到期望结构，并强制校验不可多不可少。
-            model_sections_by_name: dict[str, Any] = {}
-            for sec in sections:
-                if not isinstance(sec, dict):
-                    continue
-                name = str(sec.get("name") or "").strip()
-                if name:
-                    model_sections_by_name[name] = sec
-
-            if len(model_sections_by_name) != len(expected.sections):
-                raise ValueError("sections 数量与评分规则不一致")
-
-            normalized_sections: list[dict] = []
-            score_rubric = 0.0
-            for sec_expected in expected.sections:
-                sec_model = model_sections_by_name.get(sec_expected.name)
-                if not isinstance(sec_model, dict):
-                    raise ValueError(f"缺失评分维度：{sec_expected.name}")
-                items = sec_model.get("items")
-                if not isinstance(items, list):
-                    raise ValueError(f"维度“{sec_expected.name}”的 items 非法")
-                model_items_by_name: dict[str, Any] = {}
-                for item in items:
-                    if not isinstance(item, dict):
-                        continue
-                    item_name = str(item.get("name") or "").strip()
-                    if item_name:
-                        model_items_by_name[item_name] = item
-                if len(model_items_by_name) != len(sec_expected.items):
-                    raise ValueError(f"维度“{sec_expected.name}”的细则数量与评分规则不一致")
-
-                sec_score = 0.0
-                normalized_items: list[dict] = []
-                for item_expected in sec_expected.items:
-                    item_model = model_items_by_name.get(item_expected.name)
-                    if not isinstance(item_model, dict):
-                        raise ValueError(f"缺失评分细则：{sec_expected.name} / {item_expected.name}")
-                    item_score = clamp_min_max(to_float(item_model.get("score")), 0.0, float(item_expected.max_score))
-                    item_comment = str(item_model.get("comment") or "").strip()
-                    if not item_comment:
-                        item_comment = "未提供细则扣分原因。"
-                    sec_score += float(item_score)
-                    normalized_items.append(
-                        {
-                            "name": item_expected.name,
-                            "max_score": float(item_expected.max_score),
-                            "score": float(item_score),
-                            "comment": item_comment,
-                        }
-                    )
-
-                score_rubric += sec_score
-                sec_comment = str(sec_model.get("comment") or "").strip() or "未提供维度总体评价。"
-                normalized_sections.append(
-                    {
-                        "name": sec_expected.name,
-                        "max_score": float(sec_expected.max_score),
-                        "score": float(sec_score),
-                        "comment": sec_comment,
-                        "items": normalized_items,
-                    }
-                )
-
-            score_rubric = clamp_min_max(score_rubric, 0.0, score_rubric_max)
-            score = round(score_rubric * float(score_target_max) / score_rubric_max, 2)
-
-            return {
-                "schema_version": 2,
-                "category_name": expected.category_name,
-                "score_target_max": float(score_target_max),
-                "score_rubric_max": score_rubric_max,
-                "score_rubric": score_rubric,
-                "score": score,
-                "comment": str(comment).strip(),
-                "sections": normalized_sections,
-                "model": data.get("model"),
-            }
+            return compile_rubric_validator(expected).normalize(data, score_target_max)
         except Exception as exc:  # noqa: BLE001
             logger.error("评分结果解析失败：%s", exc)
             raise ModelError("模型返回数据格式异常") from exc
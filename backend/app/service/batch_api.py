@@ -0,0 +1,231 @@
+"""
+批量接口模式：把整批作业的评分请求写成 JSONL，提交到 OpenAI 兼容的 /v1/batches 接口离线执行。
+
+流程：
+1) 每个（文件, 模型）评分调用持有一张 BatchTicket，首次请求不直接调用模型，而是登记到 BatchCollector；
+2) 所有调用都已登记或确定不会登记（缓存命中、文件校验失败等）后，按端点分组上传 JSONL 并创建批量任务；
+3) 轮询任务状态直至结束，下载输出文件，按 custom_id 把响应体（含 usage）交还给各调用；
+4) 调用方照常走 JSON 解析、_normalize_response 与 GradeItem/Excel 流程；解析失败的重试改走在线调用。
+以延迟换取更高吞吐与更低成本，适合期末集中批改。
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from typing import Any, Dict, Optional
+from urllib.parse import urlparse
+
+import httpx
+
+from config.settings import (
+    MODEL_BATCH_COMPLETION_WINDOW,
+    MODEL_BATCH_MAX_WAIT_SECONDS,
+    MODEL_BATCH_POLL_INTERVAL_SECONDS,
+)
+from app.service.http_pool import get_http_client
+from app.util.logger import logger
+
+_CHAT_SUFFIX = "/chat/completions"
+_TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+class BatchApiError(Exception):
+    """批量接口调用失败。"""
+
+
+def split_chat_url(api_url: str) -> tuple[str, str]:
+    """把 chat-completions 地址拆成（接口前缀, 批量任务中的 endpoint 路径）。
+
+    例如 https://api.openai.com/v1/chat/completions -> ("https://api.openai.com/v1", "/v1/chat/completions")。
+    """
+    url = api_url.rstrip("/")
+    if not url.endswith(_CHAT_SUFFIX):
+        raise BatchApiError(f"批量模式要求接口地址以 {_CHAT_SUFFIX} 结尾：{api_url}")
+    return url[: -len(_CHAT_SUFFIX)], urlparse(url).path
+
+
+class OpenAIBatchClient:
+    """OpenAI 兼容批量接口的最小客户端：上传文件、创建任务、轮询、下载结果。"""
+
+    def __init__(
+        self,
+        api_url: str,
+        headers: Dict[str, str],
+        *,
+        poll_interval: float = MODEL_BATCH_POLL_INTERVAL_SECONDS,
+        completion_window: str = MODEL_BATCH_COMPLETION_WINDOW,
+        max_wait: float = MODEL_BATCH_MAX_WAIT_SECONDS,
+    ) -> None:
+        self.api_url = api_url
+        self.prefix, self.endpoint = split_chat_url(api_url)
+        self.headers = headers
+        self.poll_interval = poll_interval
+        self.completion_window = completion_window
+        self.max_wait = max_wait
+
+    async def run(self, requests: list[dict]) -> tuple[dict[str, Any], dict[str, dict]]:
+        """提交一批请求并等待完成，返回（任务信息, custom_id -> 结果行）。"""
+        client = await get_http_client(self.api_url)
+        body = "\n".join(json.dumps(r, ensure_ascii=False) for r in requests).encode("utf-8")
+        uploaded = await self._call(
+            client.post(
+                f"{self.prefix}/files",
+                data={"purpose": "batch"},
+                files={"file": ("grading_batch.jsonl", body, "application/jsonl")},
+                headers=self.headers,
+            )
+        )
+        batch = await self._call(
+            client.post(
+                f"{self.prefix}/batches",
+                json={
+                    "input_file_id": uploaded["id"],
+                    "endpoint": self.endpoint,
+                    "completion_window": self.completion_window,
+                },
+                headers=self.headers,
+            )
+        )
+        logger.info("批量任务已创建：%s（%d 条请求）", batch.get("id"), len(requests))
+        started = time.monotonic()
+        while batch.get("status") not in _TERMINAL_STATUSES:
+            if time.monotonic() - started > self.max_wait:
+                try:
+                    await self._call(client.post(f"{self.prefix}/batches/{batch['id']}/cancel", headers=self.headers))
+                except BatchApiError:
+                    pass
+                raise BatchApiError(f"批量任务 {batch.get('id')} 等待超时")
+            await asyncio.sleep(self.poll_interval)
+            batch = await self._call(client.get(f"{self.prefix}/batches/{batch['id']}", headers=self.headers))
+        logger.info("批量任务 %s 结束：status=%s，request_counts=%s", batch.get("id"), batch.get("status"), batch.get("request_counts"))
+
+        rows: dict[str, dict] = {}
+        for file_key in ("output_file_id", "error_file_id"):
+            file_id = batch.get(file_key)
+            if not file_id:
+                continue
+            resp = await client.get(f"{self.prefix}/files/{file_id}/content", headers=self.headers)
+            if not resp.is_success:
+                raise BatchApiError(f"下载批量结果文件失败（HTTP {resp.status_code}）")
+            for line in resp.text.splitlines():
+                if not line.strip():
+                    continue
+                row = json.loads(line)
+                rows.setdefault(str(row.get("custom_id")), row)
+        return batch, rows
+
+    @staticmethod
+    async def _call(request: Any) -> dict[str, Any]:
+        try:
+            resp = await request
+        except httpx.HTTPError as exc:
+            raise BatchApiError(f"批量接口请求失败：{exc}") from exc
+        if not resp.is_success:
+            raise BatchApiError(f"批量接口返回 HTTP {resp.status_code}：{resp.text[:200]}")
+        return resp.json()
+
+
+class BatchTicket:
+    """单个（文件, 模型）评分调用在批量模式下的登记凭证，只能提交一次。"""
+
+    def __init__(self, collector: "BatchCollector") -> None:
+        self.collector = collector
+        self.used = False
+        self.settled = False
+
+    async def submit(self, api_url: str, headers: Dict[str, str], payload: Dict[str, Any]) -> Dict[str, Any]:
+        """登记请求并等待批量任务返回该请求的 chat-completions 响应体。"""
+        self.used = True
+        future = self.collector._enqueue(api_url, headers, payload)
+        self.settle()
+        return await future
+
+    def settle(self) -> None:
+        """声明本调用不会再登记新请求（可重复调用）。"""
+        if not self.settled:
+            self.settled = True
+            self.collector.forfeit(1)
+
+
+class BatchCollector:
+    """收集整批评分请求，待全部调用就绪后按端点分组提交批量任务。"""
+
+    def __init__(self, expected_calls: int, *, client_factory: Any = OpenAIBatchClient) -> None:
+        self.outstanding = int(expected_calls)
+        self.client_factory = client_factory
+        self._queue: list[tuple[str, str, Dict[str, str], Dict[str, Any], asyncio.Future]] = []
+        self._flush_task: Optional[asyncio.Task] = None
+        self.batches: list[dict[str, Any]] = []
+        self.submitted = 0
+        self.failed = 0
+
+    def ticket(self) -> BatchTicket:
+        return BatchTicket(self)
+
+    def forfeit(self, count: int) -> None:
+        """减少待就绪的调用数；全部就绪后触发提交。"""
+        self.outstanding -= int(count)
+        if self.outstanding <= 0 and self._queue and self._flush_task is None:
+            self._flush_task = asyncio.ensure_future(self._flush())
+
+    def _enqueue(self, api_url: str, headers: Dict[str, str], payload: Dict[str, Any]) -> asyncio.Future:
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        custom_id = f"req-{len(self._queue) + 1}"
+        self._queue.append((custom_id, api_url, headers, payload, future))
+        return future
+
+    async def _flush(self) -> None:
+        queue, self._queue = self._queue, []
+        groups: dict[tuple[str, str], list[tuple[str, Dict[str, Any], asyncio.Future]]] = {}
+        group_headers: dict[tuple[str, str], Dict[str, str]] = {}
+        for custom_id, api_url, headers, payload, future in queue:
+            key = (api_url, headers.get("Authorization", ""))
+            groups.setdefault(key, []).append((custom_id, payload, future))
+            group_headers[key] = headers
+        await asyncio.gather(*(self._run_group(key[0], group_headers[key], entries) for key, entries in groups.items()))
+
+    async def _run_group(self, api_url: str, headers: Dict[str, str], entries: list[tuple[str, Dict[str, Any], asyncio.Future]]) -> None:
+        self.submitted += len(entries)
+        try:
+            client = self.client_factory(api_url, headers)
+            requests = [
+                {"custom_id": custom_id, "method": "POST", "url": client.endpoint, "body": payload}
+                for custom_id, payload, _future in entries
+            ]
+            batch, rows = await client.run(requests)
+        except Exception as exc:  # noqa: BLE001
+            logger.error("批量任务失败，相关请求将改走在线调用：%s", exc)
+            self.failed += len(entries)
+            self.batches.append({"api_url": api_url, "status": "error", "error": str(exc)})
+            for _custom_id, _payload, future in entries:
+                if not future.done():
+                    future.set_exception(BatchApiError(f"批量任务失败：{exc}"))
+            return
+
+        self.batches.append(
+            {
+                "api_url": api_url,
+                "id": batch.get("id"),
+                "status": batch.get("status"),
+                "request_counts": batch.get("request_counts"),
+            }
+        )
+        for custom_id, _payload, future in entries:
+            if future.done():
+                continue
+            row = rows.get(custom_id) or {}
+            response = row.get("response") or {}
+            body = response.get("body") if isinstance(response, dict) else None
+            try:
+                if int(response.get("status_code") or 0) != 200 or not isinstance(body, dict):
+                    raise ValueError((row.get("error") or {}).get("message") if isinstance(row.get("error"), dict) else "未返回结果")
+                if not isinstance(body["choices"][0]["message"]["content"], str):
+                    raise ValueError("响应中缺少输出内容")
+                future.set_result(body)
+            except Exception as exc:  # noqa: BLE001
+                self.failed += 1
+                future.set_exception(BatchApiError(f"批量任务中该请求失败：{exc}"))
+
+    def snapshot(self) -> dict[str, Any]:
+        return {"submitted": self.submitted, "failed": self.failed, "batches": list(self.batches)}
@@ -0,0 +1,120 @@
+"""
+模型端点熔断器：按端点维护 closed / open / half_open 三态。
+
+- closed：正常放行，连续调用类失败（连接失败、超时、5xx）达到阈值后跳闸进入 open；
+- open：在熔断窗口内直接快速失败，不再占用文件并发名额去等待超时；
+- half_open：窗口到期后只放行一个试探请求，成功则恢复 closed，失败则重新 open。
+429 限流与 4xx 客户端错误说明端点可达，不计入失败。
+"""
+from __future__ import annotations
+
+import time
+from typing import Any, Optional
+
+from config.settings import MODEL_BREAKER_FAILURE_THRESHOLD, MODEL_BREAKER_OPEN_SECONDS
+from app.service.http_pool import endpoint_key
+from app.util.logger import logger
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """端点处于熔断状态，请求被快速拒绝。"""
+
+    def __init__(self, key: str, retry_in: float, consecutive_failures: int) -> None:
+        super().__init__(f"模型端点 {key} 连续失败 {consecutive_failures} 次已熔断，约 {retry_in:.0f} 秒后试探恢复")
+        self.key = key
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """单个模型端点的熔断器。"""
+
+    def __init__(
+        self,
+        key: str,
+        *,
+        failure_threshold: int = MODEL_BREAKER_FAILURE_THRESHOLD,
+        open_seconds: float = MODEL_BREAKER_OPEN_SECONDS,
+    ) -> None:
+        self.key = key
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.open_seconds = float(open_seconds)
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.trip_count = 0
+        self.rejected_count = 0
+
+    def before_call(self) -> bool:
+        """发起请求前调用：熔断中或已有试探请求在途时抛出 CircuitOpenError；返回本次是否为试探请求。"""
+        if self.state == CLOSED:
+            return False
+        now = time.monotonic()
+        if self.state == OPEN:
+            remaining = self.opened_at + self.open_seconds - now
+            if remaining > 0:
+                self.rejected_count += 1
+                raise CircuitOpenError(self.key, remaining, self.consecutive_failures)
+            self.state = HALF_OPEN
+            logger.info("端点 %s 熔断窗口到期，放行一个试探请求", self.key)
+        if self.probe_in_flight:
+            self.rejected_count += 1
+            raise CircuitOpenError(self.key, self.open_seconds, self.consecutive_failures)
+        self.probe_in_flight = True
+        return True
+
+    def record_success(self) -> None:
+        if self.state != CLOSED:
+            logger.info("端点 %s 试探请求成功，熔断恢复", self.key)
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.probe_in_flight = False
+
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        self.probe_in_flight = False
+        if self.state == HALF_OPEN or (self.state == CLOSED and self.consecutive_failures >= self.failure_threshold):
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+            self.trip_count += 1
+            logger.warning("端点 %s 连续失败 %d 次，熔断 %.0f 秒", self.key, self.consecutive_failures, self.open_seconds)
+
+    def release(self, is_probe: bool) -> None:
+        """请求结束时调用：试探请求未产生结果（如被取消）时释放试探名额，让下一个请求继续试探。"""
+        if is_probe:
+            self.probe_in_flight = False
+
+    def snapshot(self) -> dict[str, Any]:
+        retry_in: Optional[float] = None
+        if self.state == OPEN:
+            retry_in = round(max(0.0, self.opened_at + self.open_seconds - time.monotonic()), 1)
+        return {
+            "endpoint": self.key,
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "trip_count": self.trip_count,
+            "rejected_count": self.rejected_count,
+            "retry_in_seconds": retry_in,
+        }
+
+
+_BREAKERS: dict[str, CircuitBreaker] = {}
+
+
+def get_circuit_breaker(api_url: str | None) -> CircuitBreaker:
+    """获取该接口所属端点的熔断器（进程内共享）。"""
+    key = endpoint_key(api_url)
+    breaker = _BREAKERS.get(key)
+    if breaker is None:
+        breaker = CircuitBreaker(key)
+        _BREAKERS[key] = breaker
+    return breaker
+
+
+def breaker_snapshots() -> list[dict[str, Any]]:
+    """返回所有端点熔断器的当前状态。"""
+    return [breaker.snapshot() for breaker in _BREAKERS.values()]
@@ -0,0 +1,191 @@
+"""
+模型端点自适应并发控制（AIMD）。
+
+每个端点（协议+主机）维护一个限制器：
+- 近期 p95 延迟与错误率健康、且并发已被用满时，按“加性增”缓慢提高上限；
+- 遇到 429 / 5xx / 超时 / 连接失败时，按“乘性减”立即降低上限（带冷却，避免同一波失败重复降级）；
+- 上限始终夹在 [floor, ceiling] 之间；
+- 名额不足时的等待者按批次加权公平、主评分优先的顺序放行（见 scheduler.FairQueue）。
+"""
+from __future__ import annotations
+
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque
+
+from config.settings import (
+    MODEL_CONCURRENCY_CEILING,
+    MODEL_CONCURRENCY_DECREASE_COOLDOWN,
+    MODEL_CONCURRENCY_DECREASE_FACTOR,
+    MODEL_CONCURRENCY_FLOOR,
+    MODEL_CONCURRENCY_INITIAL,
+    MODEL_CONCURRENCY_WINDOW,
+    MODEL_ERROR_RATE_THRESHOLD,
+    MODEL_LATENCY_P95_TARGET_MS,
+)
+from app.service.http_pool import endpoint_key
+from app.service.scheduler import FairQueue
+from app.util.logger import logger
+
+
+def _quantile(values: list[float], q: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))
+    return ordered[idx]
+
+
+class AdaptiveLimiter:
+    """单个模型端点的 AIMD 并发限制器。"""
+
+    def __init__(
+        self,
+        key: str,
+        *,
+        initial: int = MODEL_CONCURRENCY_INITIAL,
+        floor: int = MODEL_CONCURRENCY_FLOOR,
+        ceiling: int = MODEL_CONCURRENCY_CEILING,
+        window: int = MODEL_CONCURRENCY_WINDOW,
+        latency_p95_target_ms: float = MODEL_LATENCY_P95_TARGET_MS,
+        error_rate_threshold: float = MODEL_ERROR_RATE_THRESHOLD,
+        decrease_factor: float = MODEL_CONCURRENCY_DECREASE_FACTOR,
+        decrease_cooldown: float = MODEL_CONCURRENCY_DECREASE_COOLDOWN,
+    ) -> None:
+        if floor < 1 or ceiling < floor:
+            raise ValueError("并发上下限配置非法")
+        self.key = key
+        self.floor = floor
+        self.ceiling = ceiling
+        self.limit = float(min(ceiling, max(floor, initial)))
+        self.latency_p95_target_ms = latency_p95_target_ms
+        self.error_rate_threshold = error_rate_threshold
+        self.decrease_factor = decrease_factor
+        self.decrease_cooldown = decrease_cooldown
+        self.in_flight = 0
+        self._latencies: Deque[float] = deque(maxlen=window)
+        self._outcomes: Deque[bool] = deque(maxlen=window)
+        self._waiters = FairQueue("model")
+        self._last_decrease = 0.0
+        self.total_success = 0
+        self.total_failure = 0
+        self.total_overload = 0
+
+    @property
+    def current_limit(self) -> int:
+        return max(self.floor, int(self.limit))
+
+    async def acquire(self) -> None:
+        if self.in_flight < self.current_limit and not self._waiters:
+            self.in_flight += 1
+            self._waiters.record_immediate()
+            return
+        fut = self._waiters.enqueue()
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # 已被授予名额但调用方取消，归还名额
+                self.release()
+            else:
+                self._waiters.discard(fut)
+            raise
+
+    def release(self) -> None:
+        self.in_flight = max(0, self.in_flight - 1)
+        self._wake()
+
+    def _wake(self) -> None:
+        while self.in_flight < self.current_limit and self._waiters.grant():
+            self.in_flight += 1
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def latency_quantile(self, q: float, *, min_samples: int = 1) -> float | None:
+        """返回近期窗口内成功调用延迟的分位数（毫秒），样本数不足 min_samples 时返回 None。"""
+        if len(self._latencies) < max(1, min_samples):
+            return None
+        return _quantile(list(self._latencies), q)
+
+    def error_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return sum(1 for ok in self._outcomes if not ok) / len(self._outcomes)
+
+    def _healthy(self) -> bool:
+        p95 = self.latency_quantile(0.95)
+        if p95 is not None and p95 > self.latency_p95_target_ms:
+            return False
+        return self.error_rate() <= self.error_rate_threshold
+
+    def record_success(self, latency_ms: float) -> None:
+        """记录一次成功调用；健康且并发被用满时加性增。"""
+        self.total_success += 1
+        self._latencies.append(float(latency_ms))
+        self._outcomes.append(True)
+        # in_flight 此时仍包含本次调用
+        saturated = self.in_flight >= self.current_limit
+        if saturated and self._healthy() and self.limit < self.ceiling:
+            self.limit = min(float(self.ceiling), self.limit + 1.0 / max(1.0, self.limit))
+            self._wake()
+
+    def record_failure(self, *, overload: bool) -> None:
+        """记录一次失败调用；过载类失败（429/5xx/超时）触发乘性减。"""
+        self.total_failure += 1
+        self._outcomes.append(False)
+        if not overload:
+            return
+        self.total_overload += 1
+        now = time.monotonic()
+        if now - self._last_decrease < self.decrease_cooldown:
+            return
+        self._last_decrease = now
+        before = self.current_limit
+        self.limit = max(float(self.floor), self.limit * self.decrease_factor)
+        if self.current_limit != before:
+            logger.warning("端点 %s 出现过载信号，并发上限 %d -> %d", self.key, before, self.current_limit)
+
+    def snapshot(self) -> dict[str, Any]:
+        p50 = self.latency_quantile(0.5)
+        p95 = self.latency_quantile(0.95)
+        return {
+            "endpoint": self.key,
+            "limit": self.current_limit,
+            "floor": self.floor,
+            "ceiling": self.ceiling,
+            "in_flight": self.in_flight,
+            "waiting": len(self._waiters),
+            "latency_p50_ms": round(p50, 1) if p50 is not None else None,
+            "latency_p95_ms": round(p95, 1) if p95 is not None else None,
+            "error_rate": round(self.error_rate(), 4),
+            "total_success": self.total_success,
+            "total_failure": self.total_failure,
+            "total_overload": self.total_overload,
+        }
+
+
+_LIMITERS: dict[str, AdaptiveLimiter] = {}
+
+
+def get_model_limiter(api_url: str | None) -> AdaptiveLimiter:
+    """获取该接口所属端点的并发限制器（进程内共享）。"""
+    key = endpoint_key(api_url)
+    limiter = _LIMITERS.get(key)
+    if limiter is None:
+        limiter = AdaptiveLimiter(key)
+        _LIMITERS[key] = limiter
+    return limiter
+
+
+def limiter_snapshots() -> list[dict[str, Any]]:
+    """返回所有端点限制器的当前状态。"""
+    return [limiter.snapshot() for limiter in _LIMITERS.values()]
@@ -0,0 +1,132 @@
+"""
+共识模式：多模型评分时先只调用前两个模型，两者分差在容差内即采用其平均分，不再调用其余模型。
+
+- 两者分歧（或其中一个失败）时才按顺序启用下一个模型作为仲裁；
+- 任意两个成功结果分差不超过容差即达成共识，取分差最小的一对，其余结果不参与计分；
+- 模型用尽仍未达成共识时退回全部成功结果的平均分；
+- 达成共识后仍在进行的请求会被取消（仅在模型失败后补发仲裁时可能出现）。
+"""
+from __future__ import annotations
+
+import asyncio
+import itertools
+from typing import Any, Awaitable, Callable, Optional, Sequence
+
+from app.util.logger import logger
+
+# 达成共识所需的一致模型数
+CONSENSUS_QUORUM = 2
+
+
+class ConsensusStats:
+    """批次级共识统计。"""
+
+    def __init__(self) -> None:
+        self.files = 0
+        self.calls = 0
+        self.available_calls = 0
+        self.agreed_first = 0
+        self.tiebreaks = 0
+        self.agreed_after_tiebreak = 0
+        self.no_agreement = 0
+        self.cancelled = 0
+
+    @property
+    def skipped_calls(self) -> int:
+        """因提前达成共识而未发起的调用数。"""
+        return max(0, self.available_calls - self.calls)
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "files": self.files,
+            "calls": self.calls,
+            "agreed_first": self.agreed_first,
+            "tiebreaks": self.tiebreaks,
+            "agreed_after_tiebreak": self.agreed_after_tiebreak,
+            "no_agreement": self.no_agreement,
+            "cancelled": self.cancelled,
+            "skipped_calls": self.skipped_calls,
+            "skipped_ratio": round(self.skipped_calls / self.available_calls, 4) if self.available_calls else 0.0,
+        }
+
+
+def find_agreement(scores: dict[int, float], tolerance: float) -> Optional[tuple[int, int]]:
+    """返回分差不超过 tolerance 且分差最小的一对下标；没有则返回 None。"""
+    best: Optional[tuple[float, int, int]] = None
+    for a, b in itertools.combinations(sorted(scores), 2):
+        diff = abs(scores[a] - scores[b])
+        if diff <= tolerance and (best is None or diff < best[0]):
+            best = (diff, a, b)
+    return (best[1], best[2]) if best is not None else None
+
+
+async def run_consensus(
+    launchers: Sequence[Callable[[], Awaitable[dict]]],
+    *,
+    tolerance: float,
+    score_of: Callable[[dict], Optional[float]],
+    stats: Optional[ConsensusStats] = None,
+) -> tuple[list[dict], Optional[tuple[int, int]]]:
+    """先启动前 CONSENSUS_QUORUM 个 launchers，未达成共识时逐个启用后续模型。
+
+    返回（已发起调用的结果，按下标排序；达成共识的一对下标或 None）。score_of 对失败结果返回 None。
+    """
+    if not launchers:
+        raise ValueError("共识模式至少需要一个模型")
+    tasks: dict[asyncio.Task, int] = {}
+    results: dict[int, dict] = {}
+    scores: dict[int, float] = {}
+    next_idx = 0
+
+    def launch() -> None:
+        nonlocal next_idx
+        tasks[asyncio.ensure_future(launchers[next_idx]())] = next_idx
+        next_idx += 1
+        if stats is not None:
+            stats.calls += 1
+
+    while next_idx < min(CONSENSUS_QUORUM, len(launchers)):
+        launch()
+    if stats is not None:
+        stats.files += 1
+        stats.available_calls += len(launchers)
+    agreed: Optional[tuple[int, int]] = None
+    try:
+        while True:
+            agreed = find_agreement(scores, tolerance)
+            if agreed is not None:
+                break
+            pending = [t for t in tasks if not t.done()]
+            # 仍在进行的请求已不可能凑齐共识（分歧或失败）时，启用下一个模型仲裁
+            if next_idx < len(launchers) and (not pending or len(scores) + len(pending) < CONSENSUS_QUORUM):
+                logger.info("已返回的模型未达成共识（得分：%s），启用模型 #%d 仲裁", scores or "无", next_idx + 1)
+                if stats is not None:
+                    stats.tiebreaks += 1
+                launch()
+                continue
+            if not pending:
+                break
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                idx = tasks[task]
+                results[idx] = task.result()
+                score = score_of(results[idx])
+                if score is not None:
+                    scores[idx] = float(score)
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+                if stats is not None:
+                    stats.cancelled += 1
+        leftovers = [t for t in tasks if not t.done()]
+        if leftovers:
+            await asyncio.gather(*leftovers, return_exceptions=True)
+    if stats is not None:
+        if agreed is None:
+            stats.no_agreement += 1
+        elif len(tasks) > CONSENSUS_QUORUM:
+            stats.agreed_after_tiebreak += 1
+        else:
+            stats.agreed_first += 1
+    return [results[idx] for idx in sorted(results)], agreed
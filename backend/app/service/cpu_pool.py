@@ -0,0 +1,126 @@
+"""
+CPU 密集步骤的进程池：文档解析、docx 格式校验与正文哈希在独立进程中执行，大文件不再阻塞事件循环、拖慢所有在途模型调用。
+
+- 进程数由 CPU_POOL_WORKERS 配置（configure_cpu_pool 可在运行时调整），0 表示在事件循环线程内直接执行；
+- 以 spawn 方式启动，工作进程初始化时预先导入 python-docx 与解析模块，之后的任务不再付出导入开销；
+- 工作进程只输出到控制台，不写滚动日志文件，避免多进程同时滚动同一文件；
+- 工作进程异常退出（进程池损坏）时重建进程池，本次任务改在线程中执行；
+- 任务只传文件路径与校验参数、返回正文文本，不在进程间传递大对象。
+"""
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from typing import Any, Callable, Optional, TypeVar
+
+from config.settings import CPU_POOL_WORKERS
+from app.service.dedup import essay_fingerprint
+from app.util.file_utils import parse_file_text, validate_docx_format
+from app.util.logger import logger
+
+T = TypeVar("T")
+
+_workers = CPU_POOL_WORKERS
+_POOL: Optional[ProcessPoolExecutor] = None
+_STATS = {"tasks": 0, "inline": 0, "fallbacks": 0, "busy_ms": 0.0}
+
+
+@dataclass(frozen=True)
+class PreparedDocument:
+    """工作进程返回的解析结果。"""
+
+    content: str
+    # 重复提交指纹（未启用合并时为 None）
+    fingerprint: Optional[str]
+
+
+def prepare_document(
+    path: str,
+    min_length: int,
+    docx_rules: Optional[dict[str, Any]],
+    fingerprint_category: Optional[str],
+) -> PreparedDocument:
+    """解析正文，按需校验 docx 格式并计算重复提交指纹；不合格时抛出 ValueError。"""
+    file_path = Path(path)
+    content = parse_file_text(file_path, min_length=min_length)
+    if docx_rules is not None:
+        validate_docx_format(file_path, **docx_rules)
+    fingerprint = essay_fingerprint(content, fingerprint_category) if fingerprint_category is not None else None
+    return PreparedDocument(content, fingerprint)
+
+
+def _init_worker() -> None:
+    import docx  # noqa: F401  预热：python-docx 只在进程启动时导入一次
+
+    for handler in list(logger.handlers):
+        if isinstance(handler, RotatingFileHandler):
+            logger.removeHandler(handler)
+            handler.close()
+
+
+def _get_pool() -> Optional[ProcessPoolExecutor]:
+    global _POOL
+    if _workers <= 0:
+        return None
+    if _POOL is None:
+        _POOL = ProcessPoolExecutor(
+            max_workers=_workers, mp_context=multiprocessing.get_context("spawn"), initializer=_init_worker
+        )
+        logger.info("解析进程池已启动：%d 个工作进程", _workers)
+    return _POOL
+
+
+def configure_cpu_pool(workers: int) -> None:
+    """调整进程数（0 表示不使用进程池）；已有进程池会先关闭，下次任务时按新配置创建。"""
+    global _workers
+    shutdown_cpu_pool()
+    _workers = max(0, int(workers))
+
+
+def shutdown_cpu_pool() -> None:
+    global _POOL
+    pool, _POOL = _POOL, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+async def run_cpu_bound(fn: Callable[..., T], *args: Any) -> T:
+    """在进程池中执行 fn(*args)；未启用进程池时直接在当前线程执行。fn 与参数须可被 pickle。"""
+    global _POOL
+    started = time.perf_counter()
+    _STATS["tasks"] += 1
+    try:
+        pool = _get_pool()
+        if pool is None:
+            _STATS["inline"] += 1
+            return fn(*args)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(pool, fn, *args)
+        except BrokenProcessPool:
+            logger.warning("解析进程池异常退出，已重建；本次任务改在线程中执行")
+            _STATS["fallbacks"] += 1
+            if _POOL is pool:
+                _POOL = None
+                pool.shutdown(wait=False, cancel_futures=True)
+            return await asyncio.to_thread(fn, *args)
+    finally:
+        _STATS["busy_ms"] += (time.perf_counter() - started) * 1000
+
+
+def cpu_pool_snapshot() -> dict[str, Any]:
+    """进程数、已执行任务数（其中在事件循环线程内执行的数量）、进程池损坏后的线程回退次数与平均耗时。"""
+    tasks = _STATS["tasks"]
+    return {
+        "workers": _workers,
+        "started": _POOL is not None,
+        "tasks": tasks,
+        "inline": _STATS["inline"],
+        "fallbacks": _STATS["fallbacks"],
+        "avg_ms": round(_STATS["busy_ms"] / tasks, 1) if tasks else 0.0,
+    }
@@ -0,0 +1,67 @@
+"""
+批次内重复提交合并：同一份作业被重复上传、或多名学生提交了内容完全相同的文件时，只调用一次模型。
+
+- 以“规范化正文（NFKC、去除全部空白）的哈希 + 作业分类”作为键；
+- 首个到达的文件负责评分，其余文件等待其结果并直接复用（不再发起模型调用）；
+- 首份评分失败时，等待者各自正常评分；
+- 记录各重复分组，供 Excel“重复提交”表与批次总览标注（亦可提示疑似抄袭）。
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import re
+import unicodedata
+from typing import Any, Generic, Optional, TypeVar
+
+T = TypeVar("T")
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def essay_fingerprint(text: str, category: str) -> str:
+    """返回用于判定重复提交的键：分类 + 规范化正文的 SHA-256。"""
+    normalized = _WHITESPACE.sub("", unicodedata.normalize("NFKC", text or ""))
+    return f"{category}:{hashlib.sha256(normalized.encode('utf-8')).hexdigest()}"
+
+
+class DuplicateCoalescer(Generic[T]):
+    """批次级重复提交合并器：同一键只保留一个在途评分，其余文件等待并复用其结果。"""
+
+    def __init__(self) -> None:
+        self._inflight: dict[str, asyncio.Future[Optional[T]]] = {}
+        # 键 -> 按到达顺序排列的文件名（第一个为负责评分的文件）
+        self.groups: dict[str, list[str]] = {}
+        self.reused = 0
+        self.fallbacks = 0
+
+    def claim(self, key: str, file_name: str) -> Optional[asyncio.Future[Optional[T]]]:
+        """登记文件；已有同键文件在评分时返回其结果 Future（调用方应等待复用），否则返回 None（由调用方负责评分）。"""
+        self.groups.setdefault(key, []).append(file_name)
+        future = self._inflight.get(key)
+        if future is not None:
+            return future
+        self._inflight[key] = asyncio.get_running_loop().create_future()
+        return None
+
+    def resolve(self, key: str, result: Optional[T]) -> None:
+        """负责评分的文件结束时调用：result 为可复用的结果，失败时传 None。"""
+        future = self._inflight.get(key)
+        if future is not None and not future.done():
+            future.set_result(result)
+
+    def primary_of(self, key: str) -> str:
+        return self.groups[key][0]
+
+    def duplicate_groups(self) -> list[list[str]]:
+        """包含两个及以上文件的分组（首个为负责评分的文件）。"""
+        return [names for names in self.groups.values() if len(names) > 1]
+
+    def snapshot(self) -> dict[str, Any]:
+        groups = self.duplicate_groups()
+        return {
+            "groups": len(groups),
+            "duplicates": sum(len(names) - 1 for names in groups),
+            "reused": self.reused,
+            "fallbacks": self.fallbacks,
+        }
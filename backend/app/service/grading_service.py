@@ -4,18 +4,34 @@
 from __future__ import annotations
 
 import asyncio
+import contextlib
+import functools
 import statistics
 import json
 import time
 from pathlib import Path
-from typing import Iterable, List, Optional
-from urllib.parse import urlsplit
+from typing import Callable, Iterable, List, Optional
 
 from fastapi import UploadFile
 
 from app.model.schemas import GradeConfig, GradeItem, GradeResponse, ModelEndpoint
 from app.service.ai_client import AIClient, ModelError
-from app.service.prompt_builder import build_system_prompt, build_user_prompt
+from app.service.packing import PackCollector, PackError
+from app.service.prompt_builder import RubricExpected, build_packed_user_prompt, build_system_prompt, build_user_prompt
+from app.service.batch_api import BatchCollector, BatchTicket
+from app.service.circuit_breaker import get_circuit_breaker
+from app.service.consensus import ConsensusStats, run_consensus
+from app.service.dedup import DuplicateCoalescer
+from app.service.cpu_pool import cpu_pool_snapshot, prepare_document, run_cpu_bound
+from app.service.http_pool import endpoint_key
+from app.service.journal import BatchJournal
+from app.service.hedging import HedgeStats, hedge_delay_seconds, run_hedged
+from app.service.length_control import fit_essay
+from app.service.loop_monitor import ensure_loop_monitor, loop_lag_snapshot
+from app.service.provider_caps import structured_output_style
+from app.service.retry_policy import RetryBudget
+from app.service.scheduler import PRIORITY_OVERALL, FairSemaphore, batch_queue_snapshot, batch_scope, call_priority
+from app.service.token_usage import UsageLedger, add_usage, get_usage_ledger, new_usage
 from app.service.prompt_config import (
     OVERALL_COMMENT_SYSTEM_KEY,
     OVERALL_COMMENT_USER_KEY,
@@ -31,36 +47,25 @@ from app.util.file_utils import (
     FileMeta,
     parse_filename_meta,
     generate_batch_id,
-    parse_file_text,
     save_upload_files,
-    validate_docx_format,
     validate_supported_file,
 )
 from app.util.logger import logger
-from config.settings import UPLOAD_DIR
-
+from config.settings import (
+    DEDUP_IDENTICAL_SUBMISSIONS,
+    FILE_CONCURRENCY,
+    FILE_DEADLINE_SECONDS,
+    MODEL_CONCURRENCY_CEILING,
+    MODEL_CONCURRENCY_FLOOR,
+    UPLOAD_DIR,
+)
 
-_FILE_SEMAPHORE = asyncio.Semaphore(5)
-_MODEL_SEMAPHORES: dict[str, asyncio.Semaphore] = {}
-_MODEL_SEMAPHORES_LOCK = asyncio.Lock()
 
+# 文件名额进程内共享，并发批次之间按权重公平放行（见 scheduler）
+_FILE_SLOTS = FairSemaphore("file", FILE_CONCURRENCY)
 
-async def _get_model_semaphore(api_url: str) -> asyncio.Semaphore:
-    raw = (api_url or "").strip()
-    if not raw:
-        key = "mock"
-    else:
-        parts = urlsplit(raw)
-        if parts.scheme and parts.netloc:
-            key = f"{parts.scheme.lower()}://{parts.netloc.lower()}"
-        else:
-            key = raw.lower()
-    async with _MODEL_SEMAPHORES_LOCK:
-        sem = _MODEL_SEMAPHORES.get(key)
-        if sem is None:
-            sem = asyncio.Semaphore(2)
-            _MODEL_SEMAPHORES[key] = sem
-        return sem
+# 批次进度回调：(事件, 文件名, 该文件的评分结果)
+ProgressCallback = Callable[[str, Optional[str], Optional[GradeItem]], None]
 
 
 class GradingService:
@@ -77,6 +82,7 @@ class GradingService:
                 api_url=config.api_url or "",
                 api_key=config.api_key,
                 model_name=config.model_name or "demo-model",
+                context_window=config.context_window,
             )
         extras = list(config.models or [])[:2]
         if base is None:
@@ -105,50 +111,186 @@ class GradingService:
         user_prompt: str,
         expected: object,
         score_target_max: float,
+        deadline: Optional[float] = None,
+        retry_budget: Optional[RetryBudget] = None,
+        use_cache: bool = True,
+        stream: bool = False,
+        batch_ticket: Optional[BatchTicket] = None,
+        pack_collector: Optional[PackCollector] = None,
     ) -> dict:
-        ai_client = AIClient(endpoint.api_url, endpoint.api_key, endpoint.model_name, mock=mock or (not endpoint.api_url))
-        sem = await _get_model_semaphore(endpoint.api_url)
+        ai_client = AIClient(
+            endpoint.api_url,
+            endpoint.api_key,
+            endpoint.model_name,
+            mock=mock or (not endpoint.api_url),
+            stream=stream,
+            batch_ticket=batch_ticket,
+        )
         started = time.perf_counter()
-        async with sem:
-            try:
+        try:
+            packed = None
+            if pack_collector is not None and not ai_client.mock and pack_collector.eligible(content):
+                packed = await self._grade_packed(
+                    ai_client,
+                    pack_collector,
+                    content=content,
+                    system_prompt=system_prompt,
+                    user_prompt=user_prompt,
+                    expected=expected,  # type: ignore[arg-type]
+                    score_target_max=score_target_max,
+                    deadline=deadline,
+                    retry_budget=retry_budget,
+                    use_cache=use_cache,
+                )
+            if packed is not None:
+                raw_text, _parsed_result, normalized_result = packed
+            else:
                 raw_text, _parsed_result, normalized_result = await ai_client.grade(
                     content=content,
                     system_prompt=system_prompt,
                     template=user_prompt,
                     expected=expected,  # type: ignore[arg-type]
                     score_target_max=score_target_max,
+                    deadline=deadline,
+                    retry_budget=retry_budget,
+                    use_cache=use_cache,
                 )
-                latency_ms = int((time.perf_counter() - started) * 1000)
-                return {
-                    "model_index": model_index,
-                    "api_url": endpoint.api_url,
-                    "model_name": endpoint.model_name,
-                    "status": "success",
-                    "score": normalized_result.get("score"),
-                    "score_rubric": normalized_result.get("score_rubric"),
-                    "score_rubric_max": normalized_result.get("score_rubric_max"),
-                    "comment": normalized_result.get("comment"),
-                    "normalized_result": normalized_result,
-                    "raw_response": raw_text,
-                    "error_message": None,
-                    "latency_ms": latency_ms,
-                }
-            except ModelError as exc:
-                latency_ms = int((time.perf_counter() - started) * 1000)
-                return {
-                    "model_index": model_index,
-                    "api_url": endpoint.api_url,
-                    "model_name": endpoint.model_name,
-                    "status": "failure",
-                    "score": None,
-                    "score_rubric": None,
-                    "score_rubric_max": None,
-                    "comment": None,
-                    "normalized_result": None,
-                    "raw_response": getattr(exc, "raw_response", None),
-                    "error_message": str(exc),
-                    "latency_ms": latency_ms,
-                }
+            latency_ms = int((time.perf_counter() - started) * 1000)
+            return {
+                "model_index": model_index,
+                "api_url": endpoint.api_url,
+                "model_name": endpoint.model_name,
+                "status": "success",
+                "score": normalized_result.get("score"),
+                "score_rubric": normalized_result.get("score_rubric"),
+                "score_rubric_max": normalized_result.get("score_rubric_max"),
+                "comment": normalized_result.get("comment"),
+                "normalized_result": normalized_result,
+                "raw_response": raw_text,
+                "error_message": None,
+                "latency_ms": latency_ms,
+                **self._call_stats_fields(ai_client),
+            }
+        except ModelError as exc:
+            latency_ms = int((time.perf_counter() - started) * 1000)
+            return {
+                "model_index": model_index,
+                "api_url": endpoint.api_url,
+                "model_name": endpoint.model_name,
+                "status": "failure",
+                "score": None,
+                "score_rubric": None,
+                "score_rubric_max": None,
+                "comment": None,
+                "normalized_result": None,
+                "raw_response": getattr(exc, "raw_response", None),
+                "error_message": str(exc),
+                "latency_ms": latency_ms,
+                **self._call_stats_fields(ai_client),
+            }
+        finally:
+            # 缓存命中或未走到请求阶段时，也要告知批量收集器本调用不会再登记
+            if batch_ticket is not None:
+                batch_ticket.settle()
+
+    @staticmethod
+    async def _grade_packed(
+        ai_client: AIClient,
+        pack_collector: PackCollector,
+        *,
+        content: str,
+        system_prompt: str,
+        user_prompt: str,
+        expected: RubricExpected,
+        score_target_max: float,
+        deadline: Optional[float],
+        retry_budget: Optional[RetryBudget],
+        use_cache: bool,
+    ) -> Optional[tuple[str, dict, dict]]:
+        """合并批改：与同分组的其他短作业合并为一次请求；未得到合格结果时返回 None，由调用方退回单篇调用。
+
+        合并请求按发起该请求的作业的单文件时限停止重试；每份作业等待合并结果不超过自身时限，
+        超过时限后不再退回单篇调用，直接按调用失败处理。
+        """
+        if use_cache:
+            cached = await ai_client.lookup_cached_grade(content, system_prompt, user_prompt, expected, score_target_max)
+            if cached is not None:
+                return cached
+
+        async def runner(essays: list[tuple[str, str]]) -> tuple[dict, dict]:
+            client = AIClient(ai_client.api_url, ai_client.api_key, ai_client.model_name)
+            try:
+                _raw, parsed = await client.chat_json(
+                    system_prompt=system_prompt,
+                    user_prompt=build_packed_user_prompt(user_prompt, essays),
+                    required_fields=("results",),
+                    deadline=deadline,
+                    retry_budget=retry_budget,
+                )
+            except Exception:
+                # 合并请求最终失败时，已消耗的 Token 计入发起该请求的作业
+                add_usage(ai_client.usage, client.usage)
+                raise
+            return parsed, client.usage
+
+        key = (ai_client.api_url, ai_client.model_name, system_prompt, user_prompt)
+        timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+        try:
+            raw_text, usage_share = await asyncio.wait_for(pack_collector.submit(key, content, runner), timeout)
+            add_usage(ai_client.usage, usage_share)
+            parsed, normalized = ai_client.parse_and_normalize(raw_text, expected, score_target_max)
+        except (PackError, ModelError, asyncio.TimeoutError) as exc:
+            pack_collector.record_fallback()
+            if isinstance(exc, asyncio.TimeoutError) or (deadline is not None and time.monotonic() >= deadline):
+                ai_client.stats["deadline_exceeded"] = True
+                raise ModelError("合并批改未在单文件时限内完成（已超过单文件时限）", kind="call", retryable=False) from exc
+            logger.info("合并批改结果不可用，退回单篇调用：%s", exc)
+            return None
+        await ai_client.store_cached_grade(content, system_prompt, user_prompt, raw_text)
+        return raw_text, parsed, normalized
+
+    @staticmethod
+    def _reuse_duplicate(
+        primary: GradeItem, file_name: str, student_id: Optional[str], student_name: Optional[str], raw_length: int
+    ) -> GradeItem:
+        """重复提交：复用首份文件的评分结果，换成本文件的学生信息；本文件未调用模型，用量记为 0。"""
+        return primary.model_copy(
+            update={
+                "file_name": file_name,
+                "student_id": student_id,
+                "student_name": student_name,
+                "raw_text_length": raw_length,
+                "aggregate_strategy": "duplicate",
+                "duplicate_of": primary.file_name,
+                "usage": new_usage(),
+                "grader_results": [{**r, "usage": None} for r in (primary.grader_results or [])],
+            }
+        )
+
+    @staticmethod
+    def _call_stats_fields(ai_client: AIClient) -> dict:
+        stats = ai_client.stats
+        return {
+            "attempts": stats.get("attempts"),
+            "retries": dict(stats.get("retries") or {}),
+            "retry_wait_ms": stats.get("retry_wait_ms"),
+            "rate_limit_wait_ms": stats.get("rate_limit_wait_ms"),
+            "cache_hit": bool(stats.get("cache_hit")),
+            "repairs": dict(stats.get("repairs") or {}),
+            "usage": dict(ai_client.usage),
+        }
+
+    @staticmethod
+    def _tally_usage(
+        ledger: UsageLedger, calls: Iterable[tuple[Optional[str], Optional[str], Optional[dict]]]
+    ) -> dict:
+        """把各次模型调用（api_url, model_name, usage）计入批次与进程级汇总，返回该文件的合计用量。"""
+        file_usage = new_usage()
+        for api_url, model_name, usage in calls:
+            add_usage(file_usage, usage)
+            ledger.add(api_url, model_name, usage)
+            get_usage_ledger().add(api_url, model_name, usage)
+        return file_usage
 
     @staticmethod
     def _build_overall_comment_prompts(
@@ -185,15 +327,42 @@ class GradingService:
         )
         return system_prompt, user_prompt
 
-    async def process(self, files: Iterable[UploadFile], config: GradeConfig) -> GradeResponse:
+    async def process(
+        self, files: Iterable[UploadFile], config: GradeConfig, *, progress: Optional[ProgressCallback] = None
+    ) -> GradeResponse:
         """执行批次处理，并返回标准化响应。"""
         batch_id = generate_batch_id()
         batch_dir, stored_paths = save_upload_files(batch_id, files)
+        return await self.process_saved(batch_id, batch_dir, stored_paths, config, progress=progress)
+
+    async def process_saved(
+        self,
+        batch_id: str,
+        batch_dir: Path,
+        stored_paths: List[Path],
+        config: GradeConfig,
+        *,
+        progress: Optional[ProgressCallback] = None,
+        completed: Optional[dict[str, tuple[GradeItem, Optional[dict]]]] = None,
+    ) -> GradeResponse:
+        """处理已保存到批次目录的文件；progress 依次收到 file_started / file_finished / exporting 事件。
+
+        completed 为从批次日志恢复的结果（文件名 -> (评分结果, 错误行)），这些文件不再评分，直接参与导出。
+        """
+        stored_names = {path.name for path in stored_paths}
+        completed = {name: result for name, result in (completed or {}).items() if name in stored_names}
         exporter = ExcelExporter(batch_dir)
         prompt_config = load_prompt_config()
         auditor = AuditLogger(batch_id)
         model_endpoints = self._resolve_model_endpoints(config)
-        logger.info("本批次启用模型数=%d（默认+追加），并发：文件=5，模型=2/接口，单次超时=300秒，重试=3次", len(model_endpoints))
+        logger.info(
+            "本批次启用模型数=%d（默认+追加），并发：文件=%d，模型=%d～%d/接口（自适应），单次超时=300秒，单文件时限=%d秒，重试=按错误类型指数退避",
+            len(model_endpoints),
+            FILE_CONCURRENCY,
+            MODEL_CONCURRENCY_FLOOR,
+            MODEL_CONCURRENCY_CEILING,
+            int(FILE_DEADLINE_SECONDS),
+        )
         auditor.save_meta(
             {
                 "template": config.template,
@@ -204,38 +373,103 @@ class GradingService:
             }
         )
         auditor.log_operation("批次初始化完成，准备开始处理文件")
+        journal = BatchJournal(batch_dir)
+        ensure_loop_monitor()
+        lag_since = time.monotonic()
+        journal.start([path.name for path in stored_paths], config)
+        if completed:
+            auditor.log_operation(f"从批次日志恢复 {len(completed)} 个已完成文件，其余 {len(stored_paths) - len(completed)} 个重新评分")
 
         grade_items: List[GradeItem] = []
         error_rows: List[dict] = []
+        retry_budget = RetryBudget()
+        batch_collector: Optional[BatchCollector] = None
+        if config.batch_mode and not config.mock and model_endpoints:
+            batch_collector = BatchCollector(len(stored_paths) * len(model_endpoints))
+        batch_files_issued: set[Path] = set()
+        use_hedge = config.hedge and len(model_endpoints) > 1 and batch_collector is None
+        use_consensus = config.consensus and len(model_endpoints) > 1 and batch_collector is None and not use_hedge
+        pack_collector: Optional[PackCollector] = None
+        if config.pack_size >= 2 and not config.mock and batch_collector is None and not use_hedge:
+            pack_collector = PackCollector(config.pack_size)
+        hedge_stats = HedgeStats()
+        consensus_stats = ConsensusStats()
+        usage_ledger = UsageLedger()
+        coalescer: Optional[DuplicateCoalescer[GradeItem]] = DuplicateCoalescer() if DEDUP_IDENTICAL_SUBMISSIONS else None
 
         async def process_one(file_path: Path) -> tuple[GradeItem, Optional[dict]]:
-            async with _FILE_SEMAPHORE:
+            # 批量接口模式下各文件只是登记请求，需全部登记后才会提交，因此不受文件并发与单文件时限约束
+            async with _FILE_SLOTS.slot() if batch_collector is None else contextlib.nullcontext() as file_slot:
+                deadline = time.monotonic() + FILE_DEADLINE_SECONDS if batch_collector is None else None
+                if progress is not None:
+                    progress("file_started", file_path.name, None)
                 system_prompt: str = ""
                 user_prompt: str = ""
                 resolved_user_prompt: str | None = None
+                # 共识模式下参与计分的模型序号（未启用或未达成共识时为空）
+                agreed_models: set[int] = set()
+                # 对冲模式下胜出（唯一计分）的模型序号
+                hedge_winner: Optional[int] = None
+                file_batch_collector = batch_collector
+                # 重复提交合并：本文件负责评分时记录其键，结束时把可复用的结果交给等待者
+                dedup_key: Optional[str] = None
+                shared_item: Optional[GradeItem] = None
                 try:
                     validate_supported_file(file_path)
                     meta: FileMeta = parse_filename_meta(file_path.name)
                     category: AssignmentCategory = detect_assignment_category(file_path.name, config.template)
                     rule = get_rule(category)
-                    content = parse_file_text(file_path, min_length=rule.min_length)
+                    if prompt_config is None or category not in prompt_config.categories:
+                        raise ValueError("未找到对应分类的评分规则配置，请先在“评分规则”页面配置并保存。")
+                    category_cfg = prompt_config.categories[category]
+                    docx_rules: Optional[dict] = None
+                    if file_path.suffix.lower() == ".docx" and not config.skip_format_check and category_cfg.docx_validation.enabled:
+                        docx_rules = {
+                            "allowed_font_keywords": category_cfg.docx_validation.allowed_font_keywords,
+                            "allowed_font_size_pts": category_cfg.docx_validation.allowed_font_size_pts,
+                            "font_size_tolerance": category_cfg.docx_validation.font_size_tolerance,
+                            "target_line_spacing": category_cfg.docx_validation.target_line_spacing,
+                            "line_spacing_tolerance": category_cfg.docx_validation.line_spacing_tolerance,
+                        }
+                    # 正文解析、docx 格式校验与重复提交指纹在进程池中执行，大文件不阻塞事件循环
+                    prepared = await run_cpu_bound(
+                        prepare_document,
+                        str(file_path),
+                        rule.min_length,
+                        docx_rules,
+                        str(category) if coalescer is not None else None,
+                    )
+                    content = prepared.content
                     student_id = meta.student_id
                     student_name = meta.student_name
                     raw_length = len(content)
                     auditor.log_operation(f"开始处理文件 {file_path.name}，识别为 {category}")
 
-                    if prompt_config is None or category not in prompt_config.categories:
-                        raise ValueError("未找到对应分类的评分规则配置，请先在“评分规则”页面配置并保存。")
-                    category_cfg = prompt_config.categories[category]
-                    if file_path.suffix.lower() == ".docx" and not config.skip_format_check and category_cfg.docx_validation.enabled:
-                        validate_docx_format(
-                            file_path,
-                            allowed_font_keywords=category_cfg.docx_validation.allowed_font_keywords,
-                            allowed_font_size_pts=category_cfg.docx_validation.allowed_font_size_pts,
-                            font_size_tolerance=category_cfg.docx_validation.font_size_tolerance,
-                            target_line_spacing=category_cfg.docx_validation.target_line_spacing,
-                            line_spacing_tolerance=category_cfg.docx_validation.line_spacing_tolerance,
-                        )
+                    if coalescer is not None and prepared.fingerprint is not None:
+                        key = prepared.fingerprint
+                        pending = coalescer.claim(key, file_path.name)
+                        if pending is None:
+                            dedup_key = key
+                        else:
+                            primary_name = coalescer.primary_of(key)
+                            if batch_collector is not None and file_path not in batch_files_issued:
+                                # 批量接口模式：先作废本文件的调用名额，避免批量任务等待本文件登记而无法提交
+                                batch_collector.forfeit(len(model_endpoints))
+                                batch_files_issued.add(file_path)
+                                file_batch_collector = None
+                            if file_slot is not None:
+                                # 等待首份评分期间交还文件并发名额，让其他文件先行；回退单独评分时再重新排队
+                                file_slot.suspend()
+                            primary_item = await pending
+                            if primary_item is not None:
+                                coalescer.reused += 1
+                                auditor.log_operation(f"文件 {file_path.name} 与 {primary_name} 正文相同，复用其评分结果")
+                                return self._reuse_duplicate(primary_item, file_path.name, student_id, student_name, raw_length), None
+                            coalescer.fallbacks += 1
+                            auditor.log_operation(f"文件 {file_path.name} 与 {primary_name} 正文相同，但首份评分失败，改为单独评分")
+                            if file_slot is not None:
+                                await file_slot.resume()
+                                deadline = time.monotonic() + FILE_DEADLINE_SECONDS
 
                     # 动态获取分值：若规则配置了 target_score，则覆盖全局配置
                     current_score_target = float(config.score_target_max)
@@ -245,31 +479,93 @@ class GradingService:
                     user_prompt, expected = build_user_prompt(category_cfg, score_target_max=current_score_target)
                     system_prompt = build_system_prompt(prompt_config.system_prompt)
                     auditor.save_prompts(system_prompt, user_prompt)
-                    resolved_user_prompt = AIClient._build_user_content(user_prompt, content)
 
                     if not model_endpoints:
                         raise ValueError("未配置任何可用模型，请在设置中填写模型端点与名称。")
 
-                    tasks = [
-                        self._grade_one_model(
-                            model_index=idx,
-                            endpoint=endpoint,
-                            mock=config.mock,
-                            content=content,
-                            system_prompt=system_prompt,
-                            user_prompt=user_prompt,
-
-                            expected=expected,
-                            score_target_max=current_score_target,
+                    # 长文预检：按最小上下文窗口估算正文可用 Token，超长时按配置截断或分段摘要
+                    content, length_info, prep_usage = await fit_essay(
+                        content,
+                        endpoints=model_endpoints,
+                        system_prompt=system_prompt,
+                        user_prompt=user_prompt,
+                        strategy=config.long_essay_strategy,
+                        mock=config.mock,
+                        deadline=deadline,
+                        retry_budget=retry_budget,
+                    )
+                    prep_calls = [(model_endpoints[0].api_url, model_endpoints[0].model_name, prep_usage)] if prep_usage else []
+                    if length_info["strategy"] != "full":
+                        auditor.log_operation(
+                            f"文件 {file_path.name} 正文约 {length_info['original_tokens']} Token，超出可用额度 "
+                            f"{length_info['budget_tokens']}，处理方式：{length_info['strategy']}，实际发送约 {length_info['sent_tokens']} Token"
+                        )
+                    resolved_user_prompt = AIClient._build_user_content(user_prompt, content)
+
+                    grade_kwargs = dict(
+                        mock=config.mock,
+                        content=content,
+                        system_prompt=system_prompt,
+                        user_prompt=user_prompt,
+                        expected=expected,
+                        score_target_max=current_score_target,
+                        deadline=deadline,
+                        retry_budget=retry_budget,
+                        use_cache=not config.bypass_cache,
+                        stream=config.stream,
+                        pack_collector=pack_collector,
+                    )
+                    if use_hedge:
+                        # 对冲模式：只按胜出者计分，追加模型仅作为备用端点；
+                        # 已完成但未被采用的调用同样计入用量、审计记录与 grader_results
+                        _winner, winner_idx, model_results = await run_hedged(
+                            [
+                                functools.partial(self._grade_one_model, model_index=idx, endpoint=endpoint, **grade_kwargs)
+                                for idx, endpoint in enumerate(model_endpoints, start=1)
+                            ],
+                            delay=hedge_delay_seconds(model_endpoints[0].api_url),
+                            accept=lambda r: r.get("status") == "success" and r.get("score") is not None,
+                            stats=hedge_stats,
+                        )
+                        hedge_winner = winner_idx + 1
+                    elif use_consensus:
+                        # 共识模式：前两个模型分差在容差内即采用，分歧或失败时才启用下一个模型仲裁
+                        model_results, agreed = await run_consensus(
+                            [
+                                functools.partial(self._grade_one_model, model_index=idx, endpoint=endpoint, **grade_kwargs)
+                                for idx, endpoint in enumerate(model_endpoints, start=1)
+                            ],
+                            tolerance=config.consensus_tolerance * current_score_target,
+                            score_of=lambda r: r.get("score") if r.get("status") == "success" else None,
+                            stats=consensus_stats,
                         )
-                        for idx, endpoint in enumerate(model_endpoints, start=1)
-                    ]
-                    model_results = await asyncio.gather(*tasks)
+                        if agreed is not None:
+                            agreed_models = {idx + 1 for idx in agreed}
+                    else:
+                        tasks = [
+                            self._grade_one_model(
+                                model_index=idx,
+                                endpoint=endpoint,
+                                batch_ticket=file_batch_collector.ticket() if file_batch_collector is not None else None,
+                                **grade_kwargs,
+                            )
+                            for idx, endpoint in enumerate(model_endpoints, start=1)
+                        ]
+                        batch_files_issued.add(file_path)
+                        model_results = await asyncio.gather(*tasks)
 
                     success = [r for r in model_results if r.get("status") == "success" and r.get("score") is not None]
+                    if agreed_models:
+                        # 达成共识时只按一致的两个模型计分，仲裁中偏离的结果不参与平均
+                        success = [r for r in success if r.get("model_index") in agreed_models]
+                    if hedge_winner is not None:
+                        success = [r for r in success if r.get("model_index") == hedge_winner]
                     if not success:
                         errors = [str(r.get("error_message") or "未知错误") for r in model_results]
                         message = "；".join(errors[:3])
+                        file_usage = self._tally_usage(
+                            usage_ledger, prep_calls + [(r.get("api_url"), r.get("model_name"), r.get("usage")) for r in model_results]
+                        )
                         auditor.append_error(file_path.name, message)
                         auditor.log_operation(f"文件 {file_path.name} 所有模型均失败：{message}")
                         for r in model_results:
@@ -297,6 +593,9 @@ class GradingService:
                             raw_text_length=raw_length,
                             raw_response=None,
                             aggregate_strategy="mean",
+                            length_strategy=length_info["strategy"],
+                            length_info=length_info,
+                            usage=file_usage,
                             grader_results=[
                                 {
                                     "model_index": r.get("model_index"),
@@ -307,6 +606,14 @@ class GradingService:
                                     "comment": r.get("comment"),
                                     "error_message": r.get("error_message"),
                                     "latency_ms": r.get("latency_ms"),
+                                    "attempts": r.get("attempts"),
+                                    "retries": r.get("retries"),
+                                    "retry_wait_ms": r.get("retry_wait_ms"),
+                                    "rate_limit_wait_ms": r.get("rate_limit_wait_ms"),
+                                    "cache_hit": r.get("cache_hit"),
+                                    "repairs": r.get("repairs"),
+                                    "usage": r.get("usage"),
+                                    "adopted": False,
                                 }
                                 for r in model_results
                             ],
@@ -319,10 +626,10 @@ class GradingService:
                     normalized_result = (picked or {}).get("normalized_result") or {}
 
                     overall_comment = normalized_result.get("comment")
-                    if config.models and not config.mock:
+                    client2: Optional[AIClient] = None
+                    if config.models and not config.mock and not use_hedge:
                         try:
                             main_endpoint = model_endpoints[0]
-                            sem = await _get_model_semaphore(main_endpoint.api_url)
                             system2, user2 = self._build_overall_comment_prompts(
                                 category=str(category),
                                 score_target_max=current_score_target,
@@ -339,9 +646,22 @@ class GradingService:
                                     for r in model_results
                                 ],
                             )
-                            async with sem:
-                                client2 = AIClient(main_endpoint.api_url, main_endpoint.api_key, main_endpoint.model_name, mock=False)
-                                raw2, parsed2 = await client2.chat_json(system_prompt=system2, user_prompt=user2, required_fields=("comment",))
+                            client2 = AIClient(
+                                main_endpoint.api_url,
+                                main_endpoint.api_key,
+                                main_endpoint.model_name,
+                                mock=False,
+                                stream=config.stream,
+                            )
+                            # 总体评语排在各批次的主评分调用之后
+                            with call_priority(PRIORITY_OVERALL):
+                                raw2, parsed2 = await client2.chat_json(
+                                    system_prompt=system2,
+                                    user_prompt=user2,
+                                    required_fields=("comment",),
+                                    deadline=deadline,
+                                    retry_budget=retry_budget,
+                                )
                             auditor.save_model_interaction(
                                 file_path.name,
                                 system2,
@@ -359,6 +679,10 @@ class GradingService:
                             auditor.append_error(file_path.name, f"总体评语生成失败：{exc}")
 
                     detail_json = json.dumps(normalized_result, ensure_ascii=False)
+                    usage_calls = prep_calls + [(r.get("api_url"), r.get("model_name"), r.get("usage")) for r in model_results]
+                    if client2 is not None:
+                        usage_calls.append((client2.api_url, client2.model_name, client2.usage))
+                    file_usage = self._tally_usage(usage_ledger, usage_calls)
 
                     for r in model_results:
                         auditor.save_model_interaction(
@@ -385,7 +709,10 @@ class GradingService:
                         error_message=None,
                         raw_text_length=raw_length,
                         raw_response=None,
-                        aggregate_strategy="mean",
+                        aggregate_strategy="hedged" if use_hedge else "consensus" if agreed_models else "mean",
+                        length_strategy=length_info["strategy"],
+                        length_info=length_info,
+                        usage=file_usage,
                         grader_results=[
                             {
                                 "model_index": r.get("model_index"),
@@ -396,11 +723,20 @@ class GradingService:
                                 "comment": r.get("comment"),
                                 "error_message": r.get("error_message"),
                                 "latency_ms": r.get("latency_ms"),
+                                "attempts": r.get("attempts"),
+                                "retries": r.get("retries"),
+                                "retry_wait_ms": r.get("retry_wait_ms"),
+                                "rate_limit_wait_ms": r.get("rate_limit_wait_ms"),
+                                "cache_hit": r.get("cache_hit"),
+                                "repairs": r.get("repairs"),
+                                "usage": r.get("usage"),
                                 "sections": (r.get("normalized_result") or {}).get("sections") if r.get("status") == "success" else None,
+                                "adopted": any(r is chosen for chosen in success),
                             }
                             for r in model_results
                         ],
                     )
+                    shared_item = item
                     return item, None
                 except ValueError as exc:
                     logger.warning("文件处理异常：%s -> %s", file_path.name, exc)
@@ -425,13 +761,53 @@ class GradingService:
                         ),
                         {"file_name": file_path.name, "error_type": "解析校验错误", "error_message": str(exc)},
                     )
+                finally:
+                    if coalescer is not None and dedup_key is not None:
+                        coalescer.resolve(dedup_key, shared_item)
 
-        results = await asyncio.gather(*[process_one(p) for p in stored_paths])
+        async def run_file(file_path: Path) -> tuple[GradeItem, Optional[dict]]:
+            try:
+                if file_path.name in completed:
+                    result = completed[file_path.name]
+                else:
+                    result = await process_one(file_path)
+                    journal.record(*result)
+                if progress is not None:
+                    progress("file_finished", file_path.name, result[0])
+                return result
+            finally:
+                # 未发起模型调用即结束的文件：告知批量收集器其调用名额已作废
+                if batch_collector is not None and file_path not in batch_files_issued:
+                    batch_collector.forfeit(len(model_endpoints))
+
+        # 本批次的文件任务与模型调用在全局调度中作为同一条流排队
+        with batch_scope(batch_id):
+            results = await asyncio.gather(*[run_file(p) for p in stored_paths])
+        queue_stats = batch_queue_snapshot(batch_id)
+        loop_lag = loop_lag_snapshot(lag_since)
+        pool_stats = cpu_pool_snapshot()
         for item, error_row in results:
             grade_items.append(item)
             if error_row:
                 error_rows.append(error_row)
-
+        if coalescer is not None:
+            items_by_name = {item.file_name: item for item in grade_items}
+            for names in coalescer.duplicate_groups():
+                for name in names:
+                    if name in items_by_name:
+                        items_by_name[name].duplicate_files = [other for other in names if other != name]
+
+        usage_snapshot = usage_ledger.snapshot()
+        usage_total = usage_snapshot["total"]
+        prompt_tokens_total = usage_total["prompt_tokens"]
+        cached_tokens_total = usage_total["cached_tokens"]
+        cache_flags = [
+            bool(r.get("cache_hit"))
+            for item in grade_items
+            for r in (item.grader_results or [])
+            if r.get("status") == "成功"
+        ]
+        repair_stats = [r.get("repairs") or {} for item in grade_items for r in (item.grader_results or [])]
         scores = [item.score for item in grade_items if item.score is not None]
         average_score = round(statistics.mean(scores), 2) if scores else None
         score_rubric_values = [item.score_rubric for item in grade_items if item.score_rubric is not None]
@@ -439,6 +815,8 @@ class GradingService:
         rubric_max_values = sorted({float(item.score_rubric_max) for item in grade_items if item.score_rubric_max is not None})
 
         auditor.log_operation("批次处理完毕，准备导出 Excel 与 响应")
+        if progress is not None:
+            progress("exporting", None, None)
 
         exporter.export_results(
             [item.model_dump() for item in grade_items],
@@ -449,7 +827,105 @@ class GradingService:
                 "模型列表": "；".join([f"{m.model_name}@{m.api_url}" for m in model_endpoints]) if model_endpoints else "",
                 "聚合算法": "平均分（成功模型）",
                 "多模型总体评语": "启用多模型时，会用主模型二次生成总体评语（JSON）",
-                "并发限制": "文件=5；模型=2/接口；单次超时=300秒；重试=3次",
+                "并发限制": f"文件={FILE_CONCURRENCY}（全局，跨批次公平排队）；模型={MODEL_CONCURRENCY_FLOOR}～{MODEL_CONCURRENCY_CEILING}/接口（自适应）；单次超时=300秒；单文件时限={int(FILE_DEADLINE_SECONDS)}秒",
+                "提示词缓存": (
+                    f"命中前缀缓存 {cached_tokens_total}/{prompt_tokens_total} Token（{cached_tokens_total / prompt_tokens_total:.1%}）"
+                    if prompt_tokens_total
+                    else "无用量数据"
+                ),
+                "调用模式": "流式（SSE，输出跑偏提前中断）" if config.stream else "非流式",
+                "结构化输出": (
+                    "；".join(
+                        f"{m.model_name}@{m.api_url}={structured_output_style(m.api_url, m.model_name)}" for m in model_endpoints if m.api_url
+                    )
+                    if not config.mock
+                    else ""
+                )
+                or "未启用",
+                "熔断状态": "；".join(
+                    "{endpoint}={state}（跳闸 {trip_count} 次，快速失败 {rejected_count} 次）".format(**get_circuit_breaker(url).snapshot())
+                    for url in {endpoint_key(m.api_url): m.api_url for m in model_endpoints if m.api_url}.values()
+                )
+                or "无",
+                "批量接口": (
+                    "提交={submitted}；失败={failed}；任务={tasks}".format(
+                        **batch_collector.snapshot(),
+                        tasks="，".join(f"{b.get('id') or '-'}:{b.get('status')}" for b in batch_collector.batches) or "无",
+                    )
+                    if batch_collector is not None
+                    else "未启用"
+                ),
+                "合并批改": (
+                    "每批≤{pack_size}份；合并请求={requests}；覆盖作业={essays}；节省请求={saved_requests}；退回单篇={fallbacks}".format(
+                        **pack_collector.snapshot()
+                    )
+                    if pack_collector is not None
+                    else "未启用"
+                ),
+                "共识模式": (
+                    "文件={files}；首轮一致={agreed_first}；仲裁调用={tiebreaks}；仲裁后一致={agreed_after_tiebreak}；未达成共识={no_agreement}；"
+                    "容差=目标满分的 {tolerance:.0%}；节省调用={skipped_calls}（{skipped_ratio:.1%}）".format(
+                        **consensus_stats.snapshot(), tolerance=config.consensus_tolerance
+                    )
+                    if use_consensus
+                    else "未启用"
+                ),
+                "对冲请求": (
+                    "对冲文件={hedged_files}；备用胜出={backup_wins}；取消={cancelled}；浪费调用={wasted_calls}/{calls}（{wasted_ratio:.1%}）".format(
+                        **hedge_stats.snapshot()
+                    )
+                    if use_hedge
+                    else "未启用"
+                ),
+                "调度排队": "；".join(
+                    "{label}：放行={granted}，排队={queued}，平均等待={wait_ms_avg:.0f}ms，最长等待={wait_ms_max:.0f}ms".format(
+                        label={"file": "文件名额", "model": "模型名额"}.get(resource, resource), **stats
+                    )
+                    for resource, stats in queue_stats.items()
+                )
+                or "无",
+                "断点续批": (
+                    f"沿用日志结果={len(completed)}；本次评分={len(stored_paths) - len(completed)}（Token 用量与费用只统计本次调用）"
+                    if completed
+                    else "未使用"
+                ),
+                "事件循环延迟": (
+                    "p50={p50_ms}ms；p95={p95_ms}ms；最大={max_ms}ms（采样 {samples} 次）".format(**loop_lag)
+                    if loop_lag["samples"]
+                    else "无采样"
+                )
+                + "；解析进程池={workers}".format(workers=f"{pool_stats['workers']} 进程" if pool_stats["workers"] else "未启用（事件循环内解析）"),
+                "重试统计": "首次请求={requests}；重试={retries}/{allowance}；预算拒绝={denied}".format(**retry_budget.snapshot()),
+                "重复提交": (
+                    "分组={groups}；重复文件={duplicates}；复用结果={reused}；首份失败后单独评分={fallbacks}".format(**coalescer.snapshot())
+                    if coalescer is not None
+                    else "未启用"
+                ),
+                "修复重提示": "尝试={attempts}；成功={succeeded}".format(
+                    attempts=sum(int(r.get("attempts") or 0) for r in repair_stats),
+                    succeeded=sum(int(r.get("succeeded") or 0) for r in repair_stats),
+                ),
+                "Token 用量": (
+                    "调用={calls}；提示词={prompt_tokens}；输出={completion_tokens}；合计={total_tokens}；本地估算={estimated_calls} 次".format(
+                        **usage_total
+                    )
+                ),
+                "模型费用": f"{usage_total['cost']:.4f} {usage_snapshot['currency']}"
+                + (f"（{usage_total['unpriced_calls']} 次调用的模型未配置单价）" if usage_total["unpriced_calls"] else ""),
+                **{
+                    f"用量·{entry['model_name']}@{entry['endpoint']}": "调用={calls}；提示词={prompt_tokens}（缓存 {cached_tokens}）；输出={completion_tokens}；费用={cost:.4f}".format(
+                        **entry
+                    )
+                    for entry in usage_snapshot["endpoints"]
+                },
+                "长文处理": (
+                    "方式={strategy}；".format(strategy={"truncate": "首尾截断", "summarize": "分段摘要", "off": "不处理"}[config.long_essay_strategy])
+                    + "；".join(
+                        f"{label}={sum(1 for item in grade_items if item.length_strategy == key)}"
+                        for key, label in (("truncated", "截断"), ("summarized", "摘要"), ("oversize", "超长未处理"))
+                    )
+                ),
+                "响应缓存": f"命中={sum(cache_flags)}；未命中={len(cache_flags) - sum(cache_flags)}" + ("（本批次跳过缓存读取）" if config.bypass_cache else ""),
                 "文件总数": len(grade_items),
                 "成功数": len(scores),
                 "失败数": len(grade_items) - len(scores),
@@ -460,6 +936,10 @@ class GradingService:
         )
         exporter.export_errors(error_rows)
         exporter.export_errors(error_rows)
+        journal.mark_exported()
+        auditor.save_usage(
+            {**usage_snapshot, "files": [{"file_name": item.file_name, "usage": item.usage} for item in grade_items]}
+        )
 
         # 归档逻辑
         try:
@@ -490,6 +970,7 @@ class GradingService:
             download_result_url=f"/api/download/result/{batch_id}",
             download_error_url=f"/api/download/error/{batch_id}",
             items=grade_items,
+            usage=usage_snapshot,
         )
         logger.info(
             "批次完成：%s，总计%d，成功%d，异常%d，平均分%s",
@@ -0,0 +1,124 @@
+"""
+对冲请求：主端点迟迟未返回时，向备用端点发送重复请求，先返回有效结果者胜出。
+
+- 对冲等待时间取主端点近期成功调用延迟的 p90（见 AdaptiveLimiter），样本不足时使用默认值；
+- 主端点提前失败时立即启用下一个备用端点；
+- 胜出后取消其余仍在进行的请求，并统计浪费的调用比例；
+- 已完成但未被采用的结果（如主端点失败）同样返回，调用方据此计入用量与审计记录。
+"""
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Awaitable, Callable, Optional, Sequence
+
+from config.settings import (
+    MODEL_HEDGE_DEFAULT_DELAY_SECONDS,
+    MODEL_HEDGE_MIN_DELAY_SECONDS,
+    MODEL_HEDGE_MIN_SAMPLES,
+    MODEL_HEDGE_QUANTILE,
+)
+from app.service.concurrency import get_model_limiter
+from app.util.logger import logger
+
+
+def hedge_delay_seconds(api_url: str | None) -> float:
+    """返回主端点的对冲等待时间（秒）。"""
+    p90 = get_model_limiter(api_url).latency_quantile(MODEL_HEDGE_QUANTILE, min_samples=MODEL_HEDGE_MIN_SAMPLES)
+    if p90 is None:
+        return float(MODEL_HEDGE_DEFAULT_DELAY_SECONDS)
+    return max(float(MODEL_HEDGE_MIN_DELAY_SECONDS), p90 / 1000.0)
+
+
+class HedgeStats:
+    """批次级对冲统计。"""
+
+    def __init__(self) -> None:
+        self.files = 0
+        self.calls = 0
+        self.hedged_files = 0
+        self.backup_wins = 0
+        self.cancelled = 0
+
+    @property
+    def wasted_calls(self) -> int:
+        """未被采用的调用数（被取消的 + 失败后被其他端点替代的）。"""
+        return max(0, self.calls - self.files)
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "files": self.files,
+            "calls": self.calls,
+            "hedged_files": self.hedged_files,
+            "backup_wins": self.backup_wins,
+            "cancelled": self.cancelled,
+            "wasted_calls": self.wasted_calls,
+            "wasted_ratio": round(self.wasted_calls / self.calls, 4) if self.calls else 0.0,
+        }
+
+
+async def run_hedged(
+    launchers: Sequence[Callable[[], Awaitable[dict]]],
+    *,
+    delay: float,
+    accept: Callable[[dict], bool],
+    stats: Optional[HedgeStats] = None,
+) -> tuple[dict, int, list[dict]]:
+    """按顺序启动 launchers：上一个在 delay 秒内未返回或已失败时启动下一个。
+
+    返回（胜出结果, 胜出者下标, 已完成的全部结果）；全部失败时胜出结果为主端点（下标 0）的结果。
+    已完成的结果按下标排序，包含胜出者与被替代的失败结果（均已产生调用用量），不含被取消的调用。
+    """
+    if not launchers:
+        raise ValueError("对冲请求至少需要一个端点")
+    tasks: dict[asyncio.Task, int] = {}
+    results: dict[int, dict] = {}
+    next_idx = 0
+
+    def launch() -> None:
+        nonlocal next_idx
+        tasks[asyncio.ensure_future(launchers[next_idx]())] = next_idx
+        next_idx += 1
+        if stats is not None:
+            stats.calls += 1
+
+    launch()
+    if stats is not None:
+        stats.files += 1
+    try:
+        while True:
+            pending = [t for t in tasks if not t.done()]
+            if not pending and next_idx >= len(launchers):
+                break
+            if not pending:
+                launch()
+                continue
+            timeout = delay if next_idx < len(launchers) else None
+            done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                logger.info("主端点超过 %.1f 秒未返回，向备用端点 #%d 发送对冲请求", delay, next_idx)
+                launch()
+                continue
+            # 同一轮可能有多个请求完成：先全部收下，再按下标选出胜出者
+            for task in done:
+                results[tasks[task]] = task.result()
+            accepted = sorted(tasks[task] for task in done if accept(results[tasks[task]]))
+            if accepted:
+                idx = accepted[0]
+                if stats is not None:
+                    if len(tasks) > 1:
+                        stats.hedged_files += 1
+                    if idx > 0:
+                        stats.backup_wins += 1
+                return results[idx], idx, [results[i] for i in sorted(results)]
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+                if stats is not None:
+                    stats.cancelled += 1
+        leftovers = [t for t in tasks if not t.done()]
+        if leftovers:
+            await asyncio.gather(*leftovers, return_exceptions=True)
+    if stats is not None and len(tasks) > 1:
+        stats.hedged_files += 1
+    return results[0], 0, [results[i] for i in sorted(results)]
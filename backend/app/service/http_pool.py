@@ -0,0 +1,84 @@
+"""
+模型接口连接池：按“协议+主机”复用 httpx.AsyncClient，避免每次调用重复建立 TCP/TLS 连接。
+"""
+from __future__ import annotations
+
+import asyncio
+from urllib.parse import urlsplit
+
+import httpx
+
+from config.settings import (
+    DEFAULT_MODEL_TIMEOUT,
+    MODEL_HTTP2_ENABLED,
+    MODEL_KEEPALIVE_EXPIRY,
+    MODEL_MAX_CONNECTIONS,
+    MODEL_MAX_KEEPALIVE_CONNECTIONS,
+)
+from app.util.logger import logger
+
+try:  # HTTP/2 依赖 h2，未安装时自动退回 HTTP/1.1
+    import h2  # noqa: F401
+
+    _HTTP2_AVAILABLE = True
+except ImportError:  # pragma: no cover - 取决于运行环境
+    _HTTP2_AVAILABLE = False
+
+
+# 注册表的读写之间没有 await，单线程事件循环下天然原子，无需额外加锁。
+_CLIENTS: dict[str, tuple[httpx.AsyncClient, asyncio.AbstractEventLoop]] = {}
+
+
+def endpoint_key(api_url: str | None) -> str:
+    """将模型接口地址归一化为“协议://主机”，作为连接池、并发控制等的共享键。"""
+    raw = (api_url or "").strip()
+    if not raw:
+        return "mock"
+    parts = urlsplit(raw)
+    if parts.scheme and parts.netloc:
+        return f"{parts.scheme.lower()}://{parts.netloc.lower()}"
+    return raw.lower()
+
+
+def _new_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        timeout=DEFAULT_MODEL_TIMEOUT,
+        http2=MODEL_HTTP2_ENABLED and _HTTP2_AVAILABLE,
+        limits=httpx.Limits(
+            max_connections=MODEL_MAX_CONNECTIONS,
+            max_keepalive_connections=MODEL_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=MODEL_KEEPALIVE_EXPIRY,
+        ),
+    )
+
+
+async def get_http_client(api_url: str | None) -> httpx.AsyncClient:
+    """获取（必要时创建）该接口所属主机的共享客户端。
+
+    客户端与事件循环绑定：若当前循环与创建时不同（如测试中多次 asyncio.run），会重新创建。
+    """
+    key = endpoint_key(api_url)
+    loop = asyncio.get_running_loop()
+    entry = _CLIENTS.get(key)
+    if entry is not None:
+        client, owner_loop = entry
+        if not client.is_closed and owner_loop is loop:
+            return client
+    client = _new_client()
+    _CLIENTS[key] = (client, loop)
+    logger.info("已创建模型连接池：%s（HTTP/2=%s）", key, MODEL_HTTP2_ENABLED and _HTTP2_AVAILABLE)
+    return client
+
+
+async def close_http_clients() -> None:
+    """关闭全部共享客户端（应用关闭时调用）。"""
+    entries = list(_CLIENTS.items())
+    _CLIENTS.clear()
+    loop = asyncio.get_running_loop()
+    for key, (client, owner_loop) in entries:
+        if owner_loop is not loop:
+            continue
+        try:
+            await client.aclose()
+        except Exception as exc:  # noqa: BLE001
+            logger.warning("关闭模型连接池失败：%s -> %s", key, exc)
@@ -0,0 +1,383 @@
+"""
+后台批改任务：提交后立即返回 batch_id，由进程内的任务池执行批次，前端轮询 /api/jobs/{batch_id} 获取进度。
+
+- 上传文件在提交请求内落盘，之后的解析、评分与导出都在后台进行，不再受 HTTP 请求或反向代理超时影响；
+- 同时运行的批次数受 JOB_MAX_RUNNING 限制，其余按提交顺序排队；
+- 每个文件的状态与已完成的评分结果随处理进度更新，预计剩余时间按已运行时间内的完成速度估算；
+- 取消时中止仍在排队或处理中的文件，已完成的结果保留在任务状态中；
+- events() 以事件流推送进度（供 SSE 接口使用）：先补发已有结果，之后每个文件完成即推送，空闲时按心跳推送计数、
+  模型耗时与排队深度；
+- resume() 按批次断点日志恢复服务重启前中断的批次：已记录的文件沿用结果，只重新评分缺失的文件并重新导出；
+- regrade() 在已有批次内只重新评分筛选出的文件（失败文件 / 指定文件 / 指定分类），合并结果后重新导出；
+- 已结束的任务只在内存中保留最近 JOB_HISTORY_KEEP 个。
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import statistics
+import time
+from collections import OrderedDict, deque
+from pathlib import Path
+from typing import Any, AsyncIterator, Deque, Iterable, Optional
+
+from fastapi import UploadFile
+
+from config.settings import JOB_HISTORY_KEEP, JOB_MAX_RUNNING
+from app.model.schemas import GradeConfig, GradeItem, GradeResponse
+from app.service.grading_service import GradingService
+from app.service.journal import BatchJournal, JournalState
+from app.service.rules import detect_assignment_category
+from app.service.scheduler import batch_queue_snapshot
+from app.util.file_utils import generate_batch_id, save_upload_files
+from app.util.logger import logger
+
+JOB_FINISHED_STATES = ("completed", "failed", "cancelled")
+
+
+class JobConflictError(RuntimeError):
+    """批次仍在运行中，不能恢复或重新评分。"""
+
+
+class GradingJob:
+    """单个后台批次的状态：queued → running → exporting → completed / failed / cancelled。"""
+
+    def __init__(
+        self,
+        batch_id: str,
+        batch_dir: Path,
+        stored_paths: list[Path],
+        config: GradeConfig,
+        *,
+        completed: Optional[dict[str, tuple[GradeItem, Optional[dict]]]] = None,
+    ) -> None:
+        self.batch_id = batch_id
+        self.batch_dir = batch_dir
+        self.stored_paths = stored_paths
+        self.config = config
+        self.status = "queued"
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        # 文件名 -> pending / running / success / failed / cancelled
+        self.file_states: dict[str, str] = {path.name: "pending" for path in stored_paths}
+        self.items: dict[str, GradeItem] = {}
+        self.result: Optional[GradeResponse] = None
+        self.task: Optional[asyncio.Task] = None
+        # 已完成文件中成功模型调用的耗时（毫秒）
+        self.latencies_ms: list[float] = []
+        self._subscribers: list[asyncio.Queue] = []
+        # 从批次日志恢复的结果：不再评分，预计剩余时间只按本次评分的速度估算
+        self.completed = {name: result for name, result in (completed or {}).items() if name in self.file_states}
+        for name, (item, _error_row) in self.completed.items():
+            self.file_states[name] = "success" if item.status == "成功" else "failed"
+            self.items[name] = item
+
+    @property
+    def finished(self) -> bool:
+        return self.status in JOB_FINISHED_STATES
+
+    def on_progress(self, event: str, file_name: Optional[str], item: Optional[GradeItem]) -> None:
+        """GradingService 的进度回调。"""
+        if event == "file_started" and file_name in self.file_states:
+            self.file_states[file_name] = "running"
+            self.publish("file", {"file_name": file_name, "state": "running", "progress": self.progress()})
+        elif event == "file_finished" and file_name in self.file_states and item is not None:
+            self.file_states[file_name] = "success" if item.status == "成功" else "failed"
+            self.items[file_name] = item
+            self.latencies_ms.extend(
+                float(r["latency_ms"]) for r in item.grader_results or [] if r.get("status") == "成功" and r.get("latency_ms")
+            )
+            self.publish("item", {"item": item.model_dump(), "progress": self.progress()})
+        elif event == "exporting":
+            self.status = "exporting"
+            self.publish("status", {"status": self.status, "progress": self.progress()})
+
+    def publish(self, event: str, data: dict[str, Any]) -> None:
+        for queue in self._subscribers:
+            queue.put_nowait((event, data))
+
+    async def events(self, heartbeat: float) -> AsyncIterator[tuple[str, dict[str, Any]]]:
+        """进度事件流：snapshot → file / item / status / progress（心跳）… → done。"""
+        if self.finished:
+            yield "snapshot", self.snapshot(include_items=True)
+            yield "done", self.summary()
+            return
+        # 先订阅再补发快照，避免两者之间完成的文件被漏掉（重复的 item 以文件名去重即可）
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers.append(queue)
+        try:
+            yield "snapshot", self.snapshot(include_items=True)
+            while True:
+                try:
+                    event, data = await asyncio.wait_for(queue.get(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    yield "progress", self.progress()
+                    continue
+                yield event, data
+                if event == "done":
+                    return
+        finally:
+            self._subscribers.remove(queue)
+
+    def progress(self) -> dict[str, Any]:
+        """计数、预计剩余时间、模型耗时分位数与本批次排队深度。"""
+        latencies = sorted(self.latencies_ms)
+        return {
+            "status": self.status,
+            "total_files": len(self.file_states),
+            "done_files": len(self.items),
+            "counts": self.counts(),
+            "eta_seconds": self.eta_seconds(),
+            "latency_ms": {
+                "p50": round(statistics.median(latencies), 1) if latencies else None,
+                "p95": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 1) if latencies else None,
+            },
+            "queue": batch_queue_snapshot(self.batch_id),
+        }
+
+    def summary(self) -> dict[str, Any]:
+        data = self.snapshot()
+        data.pop("files")
+        return data
+
+    def counts(self) -> dict[str, int]:
+        counts = {"pending": 0, "running": 0, "success": 0, "failed": 0, "cancelled": 0}
+        for state in self.file_states.values():
+            counts[state] += 1
+        return counts
+
+    def eta_seconds(self) -> Optional[float]:
+        """按已运行时间内的完成速度估算剩余秒数；尚无文件完成时返回 None。"""
+        if self.status != "running" or self.started_at is None:
+            return None
+        done = len(self.items) - len(self.completed)
+        remaining = len(self.file_states) - len(self.items)
+        if done <= 0:
+            return None
+        elapsed = time.time() - self.started_at
+        return round(elapsed / done * remaining, 1)
+
+    def snapshot(self, *, include_items: bool = False) -> dict[str, Any]:
+        end = self.finished_at or time.time()
+        data: dict[str, Any] = {
+            "batch_id": self.batch_id,
+            "status": self.status,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "elapsed_seconds": round(end - self.started_at, 1) if self.started_at else 0.0,
+            "eta_seconds": self.eta_seconds(),
+            "total_files": len(self.file_states),
+            "done_files": len(self.items),
+            "counts": self.counts(),
+            "files": [
+                {
+                    "file_name": name,
+                    "state": state,
+                    "score": self.items[name].score if name in self.items else None,
+                    "error_message": self.items[name].error_message if name in self.items else None,
+                    "duplicate_of": self.items[name].duplicate_of if name in self.items else None,
+                }
+                for name, state in self.file_states.items()
+            ],
+            "download_result_url": self.result.download_result_url if self.result else None,
+            "download_error_url": self.result.download_error_url if self.result else None,
+        }
+        if self.result is not None:
+            data["success_count"] = self.result.success_count
+            data["error_count"] = self.result.error_count
+            data["average_score"] = self.result.average_score
+        if include_items:
+            data["items"] = [item.model_dump() for item in self.items.values()]
+        return data
+
+
+class JobManager:
+    """进程内后台任务池：按提交顺序启动批次，同时运行的批次数不超过 max_running。"""
+
+    def __init__(self, service: GradingService, *, max_running: int = JOB_MAX_RUNNING, keep: int = JOB_HISTORY_KEEP) -> None:
+        if max_running < 1:
+            raise ValueError("同时运行的批次数必须大于 0")
+        self.service = service
+        self.max_running = max_running
+        self.keep = keep
+        self.running = 0
+        self._jobs: "OrderedDict[str, GradingJob]" = OrderedDict()
+        self._queue: Deque[GradingJob] = deque()
+
+    def submit(self, files: Iterable[UploadFile], config: GradeConfig) -> GradingJob:
+        """保存上传文件并登记任务，返回后台任务（须在事件循环内调用）。"""
+        batch_id = generate_batch_id()
+        batch_dir, stored_paths = save_upload_files(batch_id, files)
+        job = GradingJob(batch_id, batch_dir, stored_paths, config)
+        self._jobs[batch_id] = job
+        self._queue.append(job)
+        logger.info("后台批改任务已提交：%s（%d 个文件，排队中 %d 个批次）", batch_id, len(stored_paths), len(self._queue))
+        self._pump()
+        return job
+
+    def resume(self, batch_id: str, config: GradeConfig) -> GradingJob:
+        """按批次断点日志恢复批次：日志中已完成的文件沿用结果，只重新评分缺失的文件并重新导出。
+
+        日志不含模型密钥，需由调用方重新提供评分配置。批次日志或上传文件不存在时抛出 FileNotFoundError，
+        批次仍在运行时抛出 JobConflictError。
+        """
+        batch_dir, state, stored_paths = self._load_batch(batch_id, config)
+        job = self._restart(GradingJob(batch_id, batch_dir, stored_paths, config, completed=state.results))
+        logger.info(
+            "后台批改任务已恢复：%s（沿用 %d 个文件的结果，重新评分 %d 个）",
+            batch_id,
+            len(job.completed),
+            len(stored_paths) - len(job.completed),
+        )
+        return job
+
+    def regrade(
+        self,
+        batch_id: str,
+        config: GradeConfig,
+        *,
+        failed_only: bool = False,
+        file_names: Optional[Iterable[str]] = None,
+        categories: Optional[Iterable[str]] = None,
+    ) -> GradingJob:
+        """在已有批次内只重新评分筛选出的文件，其余文件沿用日志中的结果，完成后合并结果并重新导出。
+
+        筛选条件之间为“且”：failed_only 只选评分失败的文件，file_names 指定文件名，categories 指定作业分类（key 或显示名称）；
+        日志中缺失的文件（批次中断）总会一并评分。筛选条件为空、文件名不存在或没有匹配的文件时抛出 ValueError。
+        """
+        names = set(file_names or [])
+        # 分类可传 key 或显示名称，统一换算为 key；未知分类抛出 ValueError
+        wanted_categories = {detect_assignment_category("", category) for category in categories or []}
+        if not failed_only and not names and not wanted_categories:
+            raise ValueError("请至少指定一个筛选条件（失败文件、文件名或作业分类）")
+        batch_dir, state, stored_paths = self._load_batch(batch_id, config)
+        stored_names = [path.name for path in stored_paths]
+        unknown = sorted(names - set(stored_names))
+        if unknown:
+            raise ValueError(f"批次中不存在以下文件：{'、'.join(unknown)}")
+
+        def selected(name: str) -> bool:
+            if names and name not in names:
+                return False
+            if failed_only and name in state.results and state.results[name][0].status == "成功":
+                return False
+            if wanted_categories:
+                try:
+                    category = detect_assignment_category(name, config.template)
+                except ValueError:
+                    return False
+                if category not in wanted_categories:
+                    return False
+            return True
+
+        chosen = [name for name in stored_names if name in state.results and selected(name)]
+        if not chosen:
+            raise ValueError("没有符合筛选条件的文件")
+        completed = {name: result for name, result in state.results.items() if name not in chosen}
+        job = self._restart(GradingJob(batch_id, batch_dir, stored_paths, config, completed=completed))
+        logger.info(
+            "批次增量重评：%s（重新评分 %d 个文件，沿用 %d 个文件的结果）",
+            batch_id,
+            len(stored_paths) - len(job.completed),
+            len(job.completed),
+        )
+        return job
+
+    def _load_batch(self, batch_id: str, config: GradeConfig) -> tuple[Path, JournalState, list[Path]]:
+        current = self._jobs.get(batch_id)
+        if current is not None and not current.finished:
+            raise JobConflictError("该批次仍在运行中，请等待结束或先取消")
+        batch_dir = self.service.upload_root / batch_id
+        state = BatchJournal(batch_dir).load() if batch_dir.is_dir() else None
+        if state is None:
+            raise FileNotFoundError("未找到该批次的断点日志")
+        stored_paths = [batch_dir / name for name in state.files if (batch_dir / name).is_file()]
+        if not stored_paths:
+            raise FileNotFoundError("该批次的上传文件已被清理")
+        for key in ("template", "score_target_max"):
+            if key in state.config and state.config[key] != getattr(config, key):
+                logger.warning("批次 %s 的配置项 %s 与原批次不同：%s -> %s", batch_id, key, state.config[key], getattr(config, key))
+        return batch_dir, state, stored_paths
+
+    def _restart(self, job: GradingJob) -> GradingJob:
+        # 同一批次只保留最新的任务记录
+        self._jobs.pop(job.batch_id, None)
+        self._jobs[job.batch_id] = job
+        self._queue.append(job)
+        self._pump()
+        return job
+
+    def get(self, batch_id: str) -> Optional[GradingJob]:
+        return self._jobs.get(batch_id)
+
+    def list_jobs(self) -> list[GradingJob]:
+        return list(reversed(self._jobs.values()))
+
+    def cancel(self, batch_id: str) -> Optional[GradingJob]:
+        """取消排队中或运行中的任务；任务不存在时返回 None，已结束的任务原样返回。"""
+        job = self._jobs.get(batch_id)
+        if job is None or job.finished:
+            return job
+        if job.task is None:
+            job.status = "cancelled"
+            job.finished_at = time.time()
+            job.file_states = {name: "cancelled" for name in job.file_states}
+            job.publish("done", job.summary())
+            logger.info("后台批改任务已在排队中取消：%s", batch_id)
+            self._prune()
+        else:
+            job.task.cancel()
+        return job
+
+    def _pump(self) -> None:
+        while self.running < self.max_running and self._queue:
+            job = self._queue.popleft()
+            if job.status != "queued":
+                continue
+            self.running += 1
+            job.status = "running"
+            job.started_at = time.time()
+            job.task = asyncio.create_task(self._run(job))
+            # 收尾放在完成回调中：任务在首次调度前被取消时协程体不会执行
+            job.task.add_done_callback(lambda task, job=job: self._on_done(job, task))
+
+    async def _run(self, job: GradingJob) -> None:
+        job.result = await self.service.process_saved(
+            job.batch_id, job.batch_dir, job.stored_paths, job.config, progress=job.on_progress, completed=job.completed
+        )
+
+    def _on_done(self, job: GradingJob, task: asyncio.Task) -> None:
+        job.finished_at = time.time()
+        if task.cancelled():
+            job.status = "cancelled"
+            logger.info("后台批改任务已取消：%s（已完成 %d/%d 个文件）", job.batch_id, len(job.items), len(job.file_states))
+        elif task.exception() is not None:
+            exc = task.exception()
+            job.status = "failed"
+            job.error = str(exc)
+            logger.error("后台批改任务失败：%s -> %s", job.batch_id, exc, exc_info=exc)
+        else:
+            job.status = "completed"
+        if job.status != "completed":
+            # 中途取消或失败时，尚未完成的文件不会再有结果
+            for name, state in job.file_states.items():
+                if state in ("pending", "running"):
+                    job.file_states[name] = "cancelled" if job.status == "cancelled" else "failed"
+        job.publish("done", job.summary())
+        self.running -= 1
+        self._prune()
+        self._pump()
+
+    def _prune(self) -> None:
+        finished = [key for key, job in self._jobs.items() if job.finished]
+        for key in finished[: max(0, len(finished) - self.keep)]:
+            self._jobs.pop(key, None)
+
+
+def format_sse(event: str, data: dict[str, Any]) -> str:
+    """按 Server-Sent Events 格式编码一条事件（JSON 不含裸换行，可放在单行 data 中）。"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
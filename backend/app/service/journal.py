@@ -0,0 +1,131 @@
+"""
+批次断点日志：每个文件完成即向批次目录追加一行 JSON，服务重启后据此只重新评分缺失的文件。
+
+- 日志为追加写入的 JSON Lines（UPLOAD_DIR/<batch_id>/journal.jsonl），首行记录文件清单与评分配置（不含密钥），
+  之后每个文件一行，包含完整的 GradeItem（含各模型结果）与错误行；
+- 每行写入后 flush，JOURNAL_FSYNC 开启时再 fsync，进程崩溃最多丢失正在写入的一行；
+- 读取时跳过无法解析的行（崩溃时写了一半的末行，续写前会先补换行），同一文件出现多次时以最后一次为准；
+- 导出完成后追加 exported 记录，未出现该记录的批次视为可恢复。
+"""
+from __future__ import annotations
+
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Optional
+
+from config.settings import JOURNAL_FSYNC
+from app.model.schemas import GradeConfig, GradeItem
+from app.util.logger import logger
+
+JOURNAL_FILE_NAME = "journal.jsonl"
+# 写入日志时从配置中去除的字段
+_SECRET_FIELDS = ("api_key",)
+
+
+@dataclass
+class JournalState:
+    """从日志恢复的批次状态。"""
+
+    files: list[str] = field(default_factory=list)
+    config: dict[str, Any] = field(default_factory=dict)
+    # 文件名 -> (评分结果, 错误行)
+    results: dict[str, tuple[GradeItem, Optional[dict]]] = field(default_factory=dict)
+    exported: bool = False
+    resumed: int = 0
+    skipped_lines: int = 0
+
+    @property
+    def missing(self) -> list[str]:
+        return [name for name in self.files if name not in self.results]
+
+
+def _redact(config: GradeConfig) -> dict[str, Any]:
+    data = config.model_dump()
+    for key in _SECRET_FIELDS:
+        data.pop(key, None)
+    for endpoint in data.get("models") or []:
+        for key in _SECRET_FIELDS:
+            endpoint.pop(key, None)
+    return data
+
+
+class BatchJournal:
+    """单个批次的追加写入日志。"""
+
+    def __init__(self, batch_dir: Path) -> None:
+        self.path = batch_dir / JOURNAL_FILE_NAME
+        self._tail_checked = False
+
+    @property
+    def exists(self) -> bool:
+        return self.path.exists()
+
+    def _torn_tail(self) -> bool:
+        """上次进程崩溃时末行是否只写了一半（不以换行结尾）。"""
+        if not self.exists or self.path.stat().st_size == 0:
+            return False
+        with self.path.open("rb") as fp:
+            fp.seek(-1, os.SEEK_END)
+            return fp.read(1) != b"\n"
+
+    def _append(self, record: dict[str, Any]) -> None:
+        line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+        if not self._tail_checked:
+            # 先结束残缺的末行，避免新记录与其拼成一行而一并被丢弃
+            if self._torn_tail():
+                line = "\n" + line
+            self._tail_checked = True
+        with self.path.open("a", encoding="utf-8") as fp:
+            fp.write(line)
+            fp.flush()
+            if JOURNAL_FSYNC:
+                os.fsync(fp.fileno())
+
+    def start(self, files: list[str], config: GradeConfig) -> None:
+        """新批次写入文件清单与配置；已有日志（恢复执行）时只追加一条 resumed 记录。"""
+        if self.exists:
+            self._append({"type": "resumed", "at": time.time()})
+            return
+        self._append({"type": "batch", "at": time.time(), "files": files, "config": _redact(config)})
+
+    def record(self, item: GradeItem, error_row: Optional[dict]) -> None:
+        """记录一个已完成的文件（成功或失败）。"""
+        try:
+            self._append({"type": "file", "at": time.time(), "item": item.model_dump(), "error_row": error_row})
+        except OSError as exc:
+            # 日志写入失败不影响本次评分，只是该文件在重启后需要重新评分
+            logger.warning("批次日志写入失败：%s -> %s", item.file_name, exc)
+
+    def mark_exported(self) -> None:
+        self._append({"type": "exported", "at": time.time()})
+
+    def load(self) -> Optional[JournalState]:
+        """读取日志；日志不存在时返回 None。"""
+        if not self.exists:
+            return None
+        state = JournalState()
+        with self.path.open("r", encoding="utf-8") as fp:
+            for line in fp:
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                    kind = record.get("type")
+                    if kind == "batch":
+                        state.files = list(record.get("files") or [])
+                        state.config = dict(record.get("config") or {})
+                    elif kind == "file":
+                        item = GradeItem(**record["item"])
+                        state.results[item.file_name] = (item, record.get("error_row"))
+                    elif kind == "resumed":
+                        state.resumed += 1
+                        state.exported = False
+                    elif kind == "exported":
+                        state.exported = True
+                except (ValueError, TypeError, KeyError) as exc:
+                    state.skipped_lines += 1
+                    logger.warning("批次日志存在无法解析的行（已跳过）：%s -> %s", self.path, exc)
+        return state
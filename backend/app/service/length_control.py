@@ -0,0 +1,193 @@
+"""
+长文预检：在调用模型前估算完整提示词的 Token 数，与各模型端点的上下文窗口比对，超长作业按配置的策略处理。
+
+- 正文可用 Token = min(最小上下文窗口 - 提示词开销 - 预估输出 - 安全余量, LONG_ESSAY_MAX_TOKENS)；
+- truncate：保留开头与结尾（按 LONG_ESSAY_HEAD_RATIO 分配），中间以省略标记替代，尽量在段落边界切分；
+- summarize：按段切分后并发调用主模型压缩（map），再按原文顺序拼接各段摘要送去评分（reduce），
+  摘要仍超长时再做首尾截断；摘要失败或模拟模式下退回 truncate；
+- off：不做处理，仅记录超长情况。
+"""
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Optional, Sequence
+
+from config.settings import (
+    LONG_ESSAY_CHUNK_TOKENS,
+    LONG_ESSAY_HEAD_RATIO,
+    LONG_ESSAY_MAX_CHUNKS,
+    LONG_ESSAY_MAX_TOKENS,
+    MODEL_CONTEXT_SAFETY_TOKENS,
+    MODEL_CONTEXT_WINDOW_DEFAULT,
+    MODEL_CONTEXT_WINDOWS,
+    MODEL_OUTPUT_TOKENS_ESTIMATE,
+)
+from app.model.schemas import ModelEndpoint
+from app.service.ai_client import AIClient
+from app.service.prompt_builder import (
+    LONG_ESSAY_SUMMARY_SYSTEM_PROMPT,
+    build_chunk_summary_prompt,
+    build_summarized_essay,
+)
+from app.service.rate_limit import chars_within_tokens, estimate_tokens
+from app.service.retry_policy import RetryBudget
+from app.service.token_usage import add_usage, new_usage
+from app.util.logger import logger
+
+LONG_ESSAY_STRATEGIES = ("truncate", "summarize", "off")
+
+_PLACEHOLDER = "{{HOMEWORK_TEXT}}"
+# 省略标记与段落标签的 Token 预留
+_MARKER_TOKENS = 40
+# 正文可用 Token 低于该值时，说明提示词本身已接近上下文窗口，直接报错
+_MIN_ESSAY_TOKENS = 256
+
+
+def resolve_context_window(endpoint: ModelEndpoint) -> int:
+    """端点显式配置的上下文窗口优先，其次按模型名最长前缀匹配 MODEL_CONTEXT_WINDOWS。"""
+    if endpoint.context_window:
+        return int(endpoint.context_window)
+    name = (endpoint.model_name or "").lower()
+    prefixes = [key for key in MODEL_CONTEXT_WINDOWS if name.startswith(key.lower())]
+    if prefixes:
+        return int(MODEL_CONTEXT_WINDOWS[max(prefixes, key=len)])
+    return MODEL_CONTEXT_WINDOW_DEFAULT
+
+
+def essay_token_budget(endpoints: Sequence[ModelEndpoint], system_prompt: str, user_prompt: str) -> tuple[int, int]:
+    """返回（正文可用 Token, 参与评分端点中最小的上下文窗口）。"""
+    window = min((resolve_context_window(e) for e in endpoints), default=MODEL_CONTEXT_WINDOW_DEFAULT)
+    overhead = estimate_tokens(system_prompt) + estimate_tokens(user_prompt.replace(_PLACEHOLDER, ""))
+    available = window - overhead - MODEL_OUTPUT_TOKENS_ESTIMATE - MODEL_CONTEXT_SAFETY_TOKENS
+    return min(available, LONG_ESSAY_MAX_TOKENS), window
+
+
+def _snap_to_newline(text: str, cut: int, *, from_end: bool = False) -> int:
+    """把切分位置对齐到附近的换行（最多回退 20%），返回保留的字符数。"""
+    if cut <= 0 or cut >= len(text):
+        return cut
+    if from_end:
+        pos = text.find("\n", len(text) - cut)
+        return len(text) - pos - 1 if 0 <= pos and len(text) - pos - 1 >= cut * 0.8 else cut
+    pos = text.rfind("\n", 0, cut)
+    return pos if pos >= cut * 0.8 else cut
+
+
+def truncate_head_tail(text: str, budget: int, *, head_ratio: float = LONG_ESSAY_HEAD_RATIO) -> str:
+    """首尾截断：保留开头与结尾，使估算 Token 不超过 budget。"""
+    if estimate_tokens(text) <= budget:
+        return text
+    usable = max(0, budget - _MARKER_TOKENS)
+    head = _snap_to_newline(text, chars_within_tokens(text, usable * head_ratio))
+    tail = _snap_to_newline(text, chars_within_tokens(text, usable * (1 - head_ratio), from_end=True), from_end=True)
+    tail = min(tail, len(text) - head)
+    omitted = len(text) - head - tail
+    tail_text = text[len(text) - tail :] if tail else ""
+    return f"{text[:head].rstrip()}\n\n……（中间约 {omitted} 字已省略）……\n\n{tail_text.lstrip()}".strip()
+
+
+def split_chunks(text: str, chunk_tokens: int) -> list[str]:
+    """按估算 Token 把正文切成若干段，尽量在段落边界切分。"""
+    chunks: list[str] = []
+    rest = text
+    while rest.strip():
+        cut = _snap_to_newline(rest, chars_within_tokens(rest, chunk_tokens))
+        cut = max(cut, 1)
+        chunks.append(rest[:cut])
+        rest = rest[cut:]
+    return chunks
+
+
+async def summarize_long_text(
+    text: str,
+    *,
+    endpoint: ModelEndpoint,
+    budget: int,
+    usage: dict[str, Any],
+    deadline: Optional[float],
+    retry_budget: Optional[RetryBudget],
+) -> str:
+    """map-reduce 分段摘要，返回拼接后的摘要正文；各段摘要调用的用量（含失败）累加到 usage。"""
+    window = resolve_context_window(endpoint)
+    overhead = estimate_tokens(LONG_ESSAY_SUMMARY_SYSTEM_PROMPT) + _MARKER_TOKENS * 2
+    room = window - overhead - MODEL_OUTPUT_TOKENS_ESTIMATE - MODEL_CONTEXT_SAFETY_TOKENS
+    chunk_tokens = max(_MIN_ESSAY_TOKENS, min(LONG_ESSAY_CHUNK_TOKENS, room))
+    if estimate_tokens(text) > chunk_tokens * LONG_ESSAY_MAX_CHUNKS:
+        # 段数过多时先首尾截断到可摘要的上限，避免一次作业发出过多请求
+        text = truncate_head_tail(text, chunk_tokens * LONG_ESSAY_MAX_CHUNKS)
+    chunks = split_chunks(text, chunk_tokens)
+    target_chars = max(200, budget // len(chunks) - _MARKER_TOKENS)
+    clients = [AIClient(endpoint.api_url, endpoint.api_key, endpoint.model_name) for _ in chunks]
+    try:
+        results = await asyncio.gather(
+            *(
+                client.chat_json(
+                    system_prompt=LONG_ESSAY_SUMMARY_SYSTEM_PROMPT,
+                    user_prompt=build_chunk_summary_prompt(idx, len(chunks), chunk, target_chars),
+                    required_fields=("summary",),
+                    deadline=deadline,
+                    retry_budget=retry_budget,
+                )
+                for idx, (client, chunk) in enumerate(zip(clients, chunks), start=1)
+            ),
+            return_exceptions=True,
+        )
+    finally:
+        for client in clients:
+            add_usage(usage, client.usage)
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    summaries = [str(parsed.get("summary") or "").strip() for _raw, parsed in results]
+    if not all(summaries):
+        raise ValueError("分段摘要结果为空")
+    return build_summarized_essay(summaries)
+
+
+async def fit_essay(
+    content: str,
+    *,
+    endpoints: Sequence[ModelEndpoint],
+    system_prompt: str,
+    user_prompt: str,
+    strategy: str,
+    mock: bool,
+    deadline: Optional[float] = None,
+    retry_budget: Optional[RetryBudget] = None,
+) -> tuple[str, dict[str, Any], Optional[dict[str, Any]]]:
+    """预检正文长度并按策略处理，返回（送去评分的正文, 处理记录, 摘要调用用量或 None）。"""
+    budget, window = essay_token_budget(endpoints, system_prompt, user_prompt)
+    original_tokens = estimate_tokens(content)
+    info: dict[str, Any] = {
+        "strategy": "full",
+        "context_window": window,
+        "budget_tokens": budget,
+        "original_tokens": original_tokens,
+        "sent_tokens": original_tokens,
+    }
+    if original_tokens <= budget:
+        return content, info, None
+    if budget < _MIN_ESSAY_TOKENS:
+        raise ValueError(f"评分提示词已接近模型上下文窗口（{window} Token），无法容纳作业正文，请精简评分规则或更换长上下文模型。")
+    if strategy == "off":
+        info["strategy"] = "oversize"
+        logger.warning("作业正文约 %d Token，超出可用额度 %d（未启用长文处理）", original_tokens, budget)
+        return content, info, None
+
+    usage = new_usage()
+    fitted: Optional[str] = None
+    if strategy == "summarize" and not mock and endpoints:
+        try:
+            summarized = await summarize_long_text(
+                content, endpoint=endpoints[0], budget=budget, usage=usage, deadline=deadline, retry_budget=retry_budget
+            )
+            fitted = truncate_head_tail(summarized, budget)
+            info["strategy"] = "summarized"
+        except Exception as exc:  # noqa: BLE001
+            logger.warning("长文分段摘要失败，退回首尾截断：%s", exc)
+            info["note"] = f"分段摘要失败，已退回首尾截断：{exc}"
+    if fitted is None:
+        fitted = truncate_head_tail(content, budget)
+        info["strategy"] = "truncated"
+    info["sent_tokens"] = estimate_tokens(fitted)
+    return fitted, info, usage if usage["calls"] else None
@@ -0,0 +1,50 @@
+"""
+事件循环延迟监测：后台任务按固定间隔睡眠，实际唤醒比预期晚的时长即为此刻的事件循环延迟。
+
+- 协程内的同步阻塞（如直接解析大文件）会表现为延迟尖峰，期间所有在途模型调用与 SSE 推送都被拖住；
+- 保留最近 LOOP_LAG_WINDOW 个采样，提供 p50/p95/最大值，可按起始时刻截取（批次汇总只统计批次运行期间）；
+- 每个事件循环只启动一个监测任务，循环结束时随之取消。
+"""
+from __future__ import annotations
+
+import asyncio
+import statistics
+import time
+import weakref
+from collections import deque
+from typing import Any, Deque, Optional
+
+from config.settings import LOOP_LAG_INTERVAL_SECONDS, LOOP_LAG_WINDOW
+
+# (采样时刻 time.monotonic(), 延迟毫秒)
+_SAMPLES: Deque[tuple[float, float]] = deque(maxlen=LOOP_LAG_WINDOW)
+_MONITORS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Task]" = weakref.WeakKeyDictionary()
+
+
+async def _monitor(interval: float) -> None:
+    while True:
+        started = time.monotonic()
+        await asyncio.sleep(interval)
+        now = time.monotonic()
+        _SAMPLES.append((now, max(0.0, (now - started - interval) * 1000)))
+
+
+def ensure_loop_monitor(interval: float = LOOP_LAG_INTERVAL_SECONDS) -> None:
+    """在当前事件循环上启动监测任务（已启动时忽略）。"""
+    loop = asyncio.get_running_loop()
+    task = _MONITORS.get(loop)
+    if task is None or task.done():
+        _MONITORS[loop] = loop.create_task(_monitor(interval))
+
+
+def loop_lag_snapshot(since: Optional[float] = None) -> dict[str, Any]:
+    """返回采样数与延迟 p50/p95/最大值（毫秒）；since 为 time.monotonic() 时刻，只统计其后的采样。"""
+    lags = sorted(lag for at, lag in _SAMPLES if since is None or at >= since)
+    if not lags:
+        return {"samples": 0, "p50_ms": None, "p95_ms": None, "max_ms": None}
+    return {
+        "samples": len(lags),
+        "p50_ms": round(statistics.median(lags), 1),
+        "p95_ms": round(lags[min(len(lags) - 1, int(len(lags) * 0.95))], 1),
+        "max_ms": round(lags[-1], 1),
+    }
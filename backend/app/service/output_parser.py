@@ -0,0 +1,340 @@
+"""
+模型输出解析快速路径：JSON 提取、有界修复与按评分规则预编译的校验器。
+
+- 解码优先使用 orjson（未安装时退回标准库 json），输出以 `{` 开头时直接整体解码，不再做多轮字符串扫描；
+- 有界修复：只处理末尾多余逗号与输出被截断（未闭合的字符串/对象/数组、残缺的键值）两类问题，
+  单次线性扫描，超过长度或嵌套上限时放弃，避免为修复付出比重新请求更高的代价；
+- RubricValidator 按 RubricExpected 预先整理维度/细则名称与满分并生成结构化输出用的 JSON Schema，同一评分规则对象只编译一次。
+"""
+from __future__ import annotations
+
+import json
+import re
+from typing import Any, Optional
+
+from config.settings import MODEL_JSON_REPAIR_MAX_CHARS
+from app.service.prompt_builder import RubricExpected, build_rubric_json_schema
+from app.util.logger import logger
+
+try:  # orjson 为可选依赖，未安装时退回标准库 json
+    import orjson
+
+    _ORJSON_AVAILABLE = True
+except ImportError:  # pragma: no cover - 取决于运行环境
+    orjson = None  # type: ignore[assignment]
+    _ORJSON_AVAILABLE = False
+
+_FENCE = "```"
+# 修复时允许补齐的最大嵌套层数
+_REPAIR_MAX_DEPTH = 64
+_TRAILING_SCALAR = re.compile(r"(?:[A-Za-z]+|[-+0-9.eE]+)$")
+
+
+def loads(text: str) -> Any:
+    """解码 JSON：优先 orjson，失败时用标准库再试一次（兼容 NaN、超长整数等 orjson 不接受的写法）。"""
+    if _ORJSON_AVAILABLE:
+        try:
+            return orjson.loads(text)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(text)
+
+
+def extract_json_object(text: str) -> dict[str, Any]:
+    """从模型输出文本中提取 JSON 对象。
+
+    1) 去除首尾空白后以 `{` 开头：直接整体解码（最常见的情况）；
+    2) Markdown 代码块中看起来像 JSON 的内容；
+    3) 第一个 `{` 到最后一个 `}` 之间的内容；
+    4) 以上都失败时，从第一个 `{` 起做有界修复。
+    """
+    if not text:
+        raise ValueError("模型输出为空")
+    stripped = text.strip()
+    if stripped.startswith("{"):
+        try:
+            data = loads(stripped)
+            if isinstance(data, dict):
+                return data
+        except ValueError:
+            pass
+
+    start_idx = 0
+    while True:
+        fence_start = text.find(_FENCE, start_idx)
+        if fence_start == -1:
+            break
+        lang_end = text.find("\n", fence_start + len(_FENCE))
+        if lang_end == -1:
+            break
+        fence_end = text.find(_FENCE, lang_end + 1)
+        if fence_end == -1:
+            break
+        block = text[lang_end + 1 : fence_end].strip()
+        if block.startswith("{") and block.endswith("}"):
+            try:
+                data = loads(block)
+                if isinstance(data, dict):
+                    return data
+            except ValueError:
+                pass
+        start_idx = fence_end + len(_FENCE)
+
+    start = text.find("{")
+    if start == -1:
+        raise ValueError("未在模型输出中找到 JSON 对象")
+    end = text.rfind("}")
+    error: Optional[ValueError] = None
+    if end > start:
+        try:
+            data = loads(text[start : end + 1])
+            if isinstance(data, dict):
+                return data
+        except ValueError as exc:
+            error = exc
+    repaired = repair_json(text[start:])
+    if repaired is not None:
+        logger.info("模型输出 JSON 不完整或含多余逗号，已修复后解析")
+        return repaired
+    raise error or ValueError("模型输出中的 JSON 对象不完整")
+
+
+def repair_json(snippet: str) -> Optional[dict[str, Any]]:
+    """有界修复：去掉多余逗号、补齐被截断的结构，或把误放进 sections 的 model 字段移回根对象；无法修复时返回 None。"""
+    if len(snippet) > MODEL_JSON_REPAIR_MAX_CHARS:
+        return None
+    moved = _move_misplaced_model(snippet)
+    for candidate in (_close_truncated(snippet), _close_truncated(moved) if moved else None):
+        if candidate is None:
+            continue
+        try:
+            data = loads(candidate)
+        except ValueError:
+            continue
+        if isinstance(data, dict):
+            return data
+    return None
+
+
+def _strip_trailing_comma(out: list[str]) -> None:
+    while out and out[-1].isspace():
+        out.pop()
+    if out and out[-1] == ",":
+        out.pop()
+
+
+def _close_truncated(text: str) -> Optional[str]:
+    """单次扫描：删除 `}`/`]` 前的多余逗号；根对象未闭合时补齐字符串、残缺键值与括号。"""
+    out: list[str] = []
+    # 栈帧：[类型 obj/arr, 期望 key/colon/value/comma]
+    stack: list[list[str]] = []
+    in_string = escape = string_is_key = False
+    for ch in text:
+        if in_string:
+            out.append(ch)
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+                stack[-1][1] = "colon" if string_is_key else "comma"
+            continue
+        if ch == '"':
+            if not stack:
+                return None
+            in_string = True
+            string_is_key = stack[-1][0] == "obj" and stack[-1][1] == "key"
+        elif ch in "{[":
+            if stack:
+                stack[-1][1] = "comma"
+            if len(stack) >= _REPAIR_MAX_DEPTH:
+                return None
+            stack.append(["obj", "key"] if ch == "{" else ["arr", "value"])
+        elif ch in "}]":
+            _strip_trailing_comma(out)
+            if not stack:
+                return None
+            stack.pop()
+            out.append(ch)
+            if not stack:
+                return "".join(out)
+            continue
+        elif ch == "," and stack:
+            stack[-1][1] = "key" if stack[-1][0] == "obj" else "value"
+        elif ch == ":" and stack:
+            stack[-1][1] = "value"
+        elif not ch.isspace() and stack and stack[-1][1] == "value":
+            stack[-1][1] = "comma"
+        out.append(ch)
+
+    if not stack:
+        return None
+    if in_string:
+        if escape:
+            out.pop()
+        out.append('"')
+        stack[-1][1] = "colon" if string_is_key else "comma"
+    raw = "".join(out)
+    body = raw.rstrip()
+    state = stack[-1][1]
+    if state == "comma" and body and body[-1] not in '"}]':
+        # 截断点紧贴数字或 true/false/null：即使能解析（如 15 只剩 1）也可能不完整，整体丢弃交给结构校验
+        match = _TRAILING_SCALAR.search(body)
+        if match is not None:
+            terminated = len(raw) > len(body)
+            try:
+                json.loads(match.group(0))
+            except ValueError:
+                terminated = False
+            if not terminated:
+                body = body[: match.start()].rstrip()
+                state = "value"
+    if state == "colon":
+        body += ": null"
+    elif state == "value" and body.endswith(":"):
+        body += " null"
+    elif body.endswith(","):
+        body = body[:-1]
+    return body + "".join("}" if kind == "obj" else "]" for kind, _state in reversed(stack))
+
+
+def _move_misplaced_model(snippet: str) -> Optional[str]:
+    """修复模型把根级 "model" 字段写进 sections 数组末尾的情况。"""
+    model_match = re.search(r'\n\s*"model":\s*".*?"', snippet)
+    if not model_match:
+        return None
+    model_line = model_match.group(0).strip()
+    snippet_fixed = snippet[: model_match.start()] + snippet[model_match.end() :]
+    closing_match = re.search(r"\n\s*]\s*\n}", snippet_fixed)
+    if not closing_match:
+        return None
+    return snippet_fixed[: closing_match.start()] + "\n  ],\n  " + model_line + "\n}"
+
+
+_RubricKey = tuple[str, float, tuple[tuple[str, float, tuple[tuple[str, float], ...]], ...]]
+
+
+def _rubric_key(expected: RubricExpected) -> _RubricKey:
+    """评分规则内容键：(分类名, 规则满分, ((维度名, 维度满分, ((细则名, 细则满分), ...)), ...))。"""
+    sections = tuple(
+        (sec.name, float(sec.max_score), tuple((item.name, float(item.max_score)) for item in sec.items))
+        for sec in expected.sections
+    )
+    return expected.category_name, float(expected.rubric_max), sections
+
+
+class RubricValidator:
+    """按评分规则预编译的输出校验与标准化器（schema_version=2）。"""
+
+    def __init__(self, expected: RubricExpected) -> None:
+        self.category_name, self.rubric_max, self.sections = _rubric_key(expected)
+        # 结构化输出使用的严格 JSON Schema，与校验器一同按评分规则内容缓存
+        self.json_schema: dict[str, Any] = build_rubric_json_schema(expected)
+
+    @staticmethod
+    def _to_float(v: Any) -> float:
+        if v is None:
+            raise ValueError("分数字段为空")
+        return float(v)
+
+    @staticmethod
+    def _index_by_name(entries: list[Any]) -> dict[str, dict[str, Any]]:
+        indexed: dict[str, dict[str, Any]] = {}
+        for entry in entries:
+            if isinstance(entry, dict):
+                name = str(entry.get("name") or "").strip()
+                if name:
+                    indexed[name] = entry
+        return indexed
+
+    def normalize(self, data: dict[str, Any], score_target_max: float) -> dict[str, Any]:
+        """校验模型输出与评分规则一一对应，计算各级得分并按目标满分换算；不合格时抛出 ValueError。"""
+        comment = data.get("comment")
+        if comment is None or not str(comment).strip():
+            raise ValueError("评语字段为空")
+        if int(self._to_float(data.get("schema_version"))) != 2:
+            raise ValueError("schema_version 必须为 2")
+        if float(score_target_max) <= 0:
+            raise ValueError("score_target_max 非法")
+        if self.rubric_max <= 0:
+            raise ValueError("评分规则总分非法")
+        sections = data.get("sections")
+        if not isinstance(sections, list) or not sections:
+            raise ValueError("sections 必须为非空数组")
+
+        # 将模型输出按“名称”对齐到期望结构，并强制校验不可多不可少。
+        model_sections = self._index_by_name(sections)
+        if len(model_sections) != len(self.sections):
+            raise ValueError("sections 数量与评分规则不一致")
+
+        normalized_sections: list[dict[str, Any]] = []
+        score_rubric = 0.0
+        for sec_name, sec_max, items_expected in self.sections:
+            sec_model = model_sections.get(sec_name)
+            if sec_model is None:
+                raise ValueError(f"缺失评分维度：{sec_name}")
+            items = sec_model.get("items")
+            if not isinstance(items, list):
+                raise ValueError(f"维度“{sec_name}”的 items 非法")
+            model_items = self._index_by_name(items)
+            if len(model_items) != len(items_expected):
+                raise ValueError(f"维度“{sec_name}”的细则数量与评分规则不一致")
+
+            sec_score = 0.0
+            normalized_items: list[dict[str, Any]] = []
+            for item_name, item_max in items_expected:
+                item_model = model_items.get(item_name)
+                if item_model is None:
+                    raise ValueError(f"缺失评分细则：{sec_name} / {item_name}")
+                item_score = max(0.0, min(item_max, self._to_float(item_model.get("score"))))
+                sec_score += item_score
+                normalized_items.append(
+                    {
+                        "name": item_name,
+                        "max_score": item_max,
+                        "score": item_score,
+                        "comment": str(item_model.get("comment") or "").strip() or "未提供细则扣分原因。",
+                    }
+                )
+            score_rubric += sec_score
+            normalized_sections.append(
+                {
+                    "name": sec_name,
+                    "max_score": sec_max,
+                    "score": sec_score,
+                    "comment": str(sec_model.get("comment") or "").strip() or "未提供维度总体评价。",
+                    "items": normalized_items,
+                }
+            )
+
+        score_rubric = max(0.0, min(self.rubric_max, score_rubric))
+        return {
+            "schema_version": 2,
+            "category_name": self.category_name,
+            "score_target_max": float(score_target_max),
+            "score_rubric_max": self.rubric_max,
+            "score_rubric": score_rubric,
+            "score": round(score_rubric * float(score_target_max) / self.rubric_max, 2),
+            "comment": str(comment).strip(),
+            "sections": normalized_sections,
+            "model": data.get("model"),
+        }
+
+
+# 按评分规则内容缓存：每个文件都会重新构建 RubricExpected，但同一分类的规则内容相同，只需编译一次
+_VALIDATORS: dict[_RubricKey, RubricValidator] = {}
+# 规则被反复修改时缓存条目上限，超出后淘汰最早编译的校验器
+_VALIDATORS_MAX = 128
+
+
+def compile_rubric_validator(expected: RubricExpected) -> RubricValidator:
+    """获取该评分规则对应的校验器；规则内容相同（同一分类的所有文件、模型与重试）只编译一次。"""
+    key = _rubric_key(expected)
+    validator = _VALIDATORS.get(key)
+    if validator is None:
+        validator = RubricValidator(expected)
+        if len(_VALIDATORS) >= _VALIDATORS_MAX:
+            _VALIDATORS.pop(next(iter(_VALIDATORS)))
+        _VALIDATORS[key] = validator
+    return validator
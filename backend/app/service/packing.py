@@ -0,0 +1,116 @@
+"""
+多份作业合并批改：把同一分类、同一模型的多份短作业合并到一次请求中评分。
+
+- 相同（模型端点, 提示词）的作业进入同一分组，凑满 pack_size 份或等待超时后合并发送；
+- 模型输出 {"results": [...]}，按 essay_id 拆回各文件，由调用方逐份做 _normalize_response 校验；
+- 缺失或不合格的条目由调用方退回单篇调用；
+- 合并请求的 Token 用量与费用均分到组内各份作业。
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+from config.settings import MODEL_PACK_FLUSH_DELAY_SECONDS, MODEL_PACK_MAX_CHARS
+from app.service.token_usage import split_usage
+from app.util.logger import logger
+
+# runner 返回（模型输出的 JSON 对象, 本次合并请求的用量记录或 None）
+PackRunner = Callable[[list[tuple[str, str]]], Awaitable[tuple[dict, Optional[dict]]]]
+
+
+class PackError(Exception):
+    """合并批改未能得到该作业的结果。"""
+
+
+class PackCollector:
+    """按分组收集待合并的作业，满额或超时后调用 runner 发送一次合并请求。"""
+
+    def __init__(
+        self,
+        pack_size: int,
+        *,
+        flush_delay: float = MODEL_PACK_FLUSH_DELAY_SECONDS,
+        max_chars: int = MODEL_PACK_MAX_CHARS,
+    ) -> None:
+        self.pack_size = int(pack_size)
+        self.flush_delay = float(flush_delay)
+        self.max_chars = int(max_chars)
+        self._groups: dict[Hashable, list[tuple[str, asyncio.Future]]] = {}
+        self._runners: dict[Hashable, PackRunner] = {}
+        self._timers: dict[Hashable, asyncio.TimerHandle] = {}
+        self._tasks: set[asyncio.Task] = set()
+        self.requests = 0
+        self.essays = 0
+        self.fallbacks = 0
+
+    def eligible(self, content: str) -> bool:
+        return self.pack_size >= 2 and len(content) <= self.max_chars
+
+    async def submit(self, key: Hashable, content: str, runner: PackRunner) -> tuple[str, Optional[dict]]:
+        """登记一份作业并等待合并请求返回，返回（该作业对应的输出 JSON 文本, 均摊到该作业的用量）。"""
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        group = self._groups.setdefault(key, [])
+        group.append((content, future))
+        self._runners.setdefault(key, runner)
+        if len(group) >= self.pack_size:
+            self._flush(key)
+        elif len(group) == 1:
+            self._timers[key] = asyncio.get_running_loop().call_later(self.flush_delay, self._flush, key)
+        return await future
+
+    def record_fallback(self) -> None:
+        self.fallbacks += 1
+
+    def _flush(self, key: Hashable) -> None:
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        group = self._groups.pop(key, None)
+        runner = self._runners.pop(key, None)
+        if not group or runner is None:
+            return
+        task = asyncio.ensure_future(self._run(group, runner))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, group: list[tuple[str, asyncio.Future]], runner: PackRunner) -> None:
+        essays = [(f"E{idx}", content) for idx, (content, _future) in enumerate(group, start=1)]
+        self.requests += 1
+        self.essays += len(group)
+        try:
+            parsed, usage = await runner(essays)
+        except Exception as exc:  # noqa: BLE001
+            logger.warning("合并批改请求失败（%d 份），将退回单篇调用：%s", len(group), exc)
+            for _content, future in group:
+                if not future.done():
+                    future.set_exception(PackError(f"合并批改请求失败：{exc}"))
+            return
+
+        results = parsed.get("results") if isinstance(parsed, dict) else None
+        shares = split_usage(usage, len(group)) if usage else [None] * len(group)
+        by_id: dict[str, Any] = {}
+        if isinstance(results, list):
+            for entry in results:
+                if isinstance(entry, dict):
+                    by_id[str(entry.get("essay_id") or "").strip()] = entry
+        for (essay_id, _content), (_c, future), share in zip(essays, group, shares):
+            if future.done():
+                continue
+            entry = by_id.get(essay_id)
+            if entry is None:
+                future.set_exception(PackError(f"合并批改结果中缺少作业 {essay_id}"))
+                continue
+            single = {k: v for k, v in entry.items() if k != "essay_id"}
+            future.set_result((json.dumps(single, ensure_ascii=False), share))
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "pack_size": self.pack_size,
+            "requests": self.requests,
+            "essays": self.essays,
+            "saved_requests": max(0, self.essays - self.requests),
+            "fallbacks": self.fallbacks,
+        }
+
@@ -149,3 +149,138 @@ def build_user_prompt_from_template(*, rubric_text: str, output_skeleton_json: s
         .replace("{{HOMEWORK_TEXT}}", str(homework_text_placeholder))
         .strip()
     )
+
+
+def split_user_prompt(template_text: str, homework_text: str) -> tuple[str, str]:
+    """把 User Prompt 拆成（稳定前缀, 正文部分），保证同分类所有文件的前缀逐字节一致、正文位于最后。
+
+    约定提示词中使用 {{HOMEWORK_TEXT}} 作为正文占位符；若未包含占位符，则自动附加正文区块。
+    占位符之后若只有代码块结束标记则随正文保留；若还有其他说明文字，则移到前缀开头，避免正文夹在中间。
+    """
+    placeholder = "{{HOMEWORK_TEXT}}"
+    if placeholder not in template_text:
+        return f"{template_text}\n\n【学生作业正文】\n", homework_text
+    before, after = template_text.split(placeholder, 1)
+    closing = ""
+    rest = after
+    stripped = after.lstrip()
+    if stripped.startswith("```"):
+        fence_end = after.index("```") + 3
+        closing, rest = after[:fence_end], after[fence_end:]
+    rest = rest.replace(placeholder, "").strip()
+    if rest:
+        before = f"{rest}\n\n{before}"
+    return before, homework_text + closing
+
+
+PACKED_GRADING_RULES = (
+    "【多份作业合并批改】本次请求包含多份相互独立的作业，每份以“【作业 编号 开始】”和“【作业 编号 结束】”标记，"
+    "请逐份独立评分，互不参考。\n"
+    '只输出一个 JSON 对象：{"results": [...]}。results 数组按编号顺序包含每份作业的评分结果，'
+    "每个元素都必须完全符合上面的输出骨架，并额外包含字段 essay_id（取值为对应编号）。"
+)
+
+
+def build_packed_user_prompt(user_prompt: str, essays: List[tuple[str, str]]) -> str:
+    """构造“多份作业合并批改”的 User Prompt：稳定的评分配置前缀在前，随后是合并批改规则，各份正文按编号拼接在最后。
+
+    essays 为（编号, 正文）列表；合并规则不含份数与编号，与评分配置一起构成同分类请求逐字节一致的前缀。
+    """
+    blocks = "\n\n".join(f"【作业 {essay_id} 开始】\n{text}\n【作业 {essay_id} 结束】" for essay_id, text in essays)
+    prefix, tail = split_user_prompt(user_prompt, blocks)
+    head, _sep, last_line = prefix.rstrip("\n").rpartition("\n")
+    if last_line.strip().startswith("```"):
+        # 前缀以代码块开头标记结尾（正文位于代码块内）：规则放在代码块之前
+        return f"{head.rstrip()}\n\n{PACKED_GRADING_RULES}\n\n{prefix[len(head) + 1:]}{tail}"
+    return f"{prefix.rstrip()}\n\n{PACKED_GRADING_RULES}\n\n{tail}"
+
+
+LONG_ESSAY_SUMMARY_SYSTEM_PROMPT = (
+    "你是一名高校助教，负责把超长的学生作业分段压缩，供后续评分使用。"
+    "只做忠实压缩，不评价、不补充、不润色；保留原文的章节标题与结构、核心论点、关键数据与事实、"
+    "引用来源以及明显的错误或缺失，尽量使用原文措辞。"
+    '只输出一个 JSON 对象：{"summary": "..."}。'
+)
+
+
+def build_chunk_summary_prompt(index: int, total: int, chunk: str, target_chars: int) -> str:
+    """构造长文分段摘要（map 阶段）的 User Prompt。"""
+    return (
+        f"以下是一份学生作业的第 {index}/{total} 段原文。"
+        f"请压缩为不超过约 {target_chars} 字的摘要，按原文顺序保留本段的标题层级、要点、数据与引用。\n\n"
+        f"【第 {index} 段原文开始】\n{chunk}\n【第 {index} 段原文结束】"
+    )
+
+
+def build_summarized_essay(summaries: List[str]) -> str:
+    """把各段摘要拼接为送去评分的正文（reduce 阶段），并提示评分模型正文已压缩。"""
+    head = f"【说明】原作业篇幅超出模型上下文，以下为按原文顺序分 {len(summaries)} 段压缩后的摘要，请据此评分，不因篇幅压缩扣分。"
+    blocks = "\n\n".join(f"【第 {idx} 段摘要】\n{text.strip()}" for idx, text in enumerate(summaries, start=1))
+    return f"{head}\n\n{blocks}"
+
+
+def build_repair_prompt(expected: RubricExpected, previous_output: str, error: str) -> str:
+    """构造“修复重提示”的 User Prompt：只给出评分结构、上次输出的 JSON 与校验错误，不重复作业正文。"""
+    structure = "\n".join(
+        f"- {sec.name}（{sec.max_score}分）：" + "、".join(f"{item.name}（{item.max_score}分）" for item in sec.items)
+        for sec in expected.sections
+    )
+    return (
+        "你上一次输出的评分 JSON 未通过校验，请在保留已有评分与评语的前提下修正，并重新输出完整的 JSON 对象。\n\n"
+        f"【校验错误】{error}\n\n"
+        "【评分结构】sections 必须与以下维度一一对应，每个维度的 items 必须与所列细则一一对应（名称完全一致、不可多不可少）：\n"
+        f"{structure}\n\n"
+        f"【上次输出】\n{previous_output.strip()}\n\n"
+        "只输出修正后的 JSON 对象（schema_version=2），不要输出任何解释。"
+    )
+
+
+def build_rubric_json_schema(expected: RubricExpected) -> Dict[str, Any]:
+    """由评分结构生成严格 JSON Schema（供结构化输出/受约束解码使用）。
+
+    维度与细则名称以 enum 限定、得分以 0～max_score 限定、数量以 minItems/maxItems 限定；
+    满足 OpenAI strict 模式的要求（全部字段必填、禁止额外字段、根为对象）。
+    """
+
+    def _strict_object(properties: Dict[str, Any]) -> Dict[str, Any]:
+        return {"type": "object", "properties": properties, "required": list(properties), "additionalProperties": False}
+
+    section_schemas: List[Dict[str, Any]] = []
+    for sec in expected.sections:
+        item_schemas = [
+            _strict_object(
+                {
+                    "name": {"type": "string", "enum": [item.name]},
+                    "score": {"type": "number", "minimum": 0, "maximum": float(item.max_score)},
+                    "comment": {"type": "string"},
+                }
+            )
+            for item in sec.items
+        ]
+        section_schemas.append(
+            _strict_object(
+                {
+                    "name": {"type": "string", "enum": [sec.name]},
+                    "comment": {"type": "string"},
+                    "items": {
+                        "type": "array",
+                        "items": item_schemas[0] if len(item_schemas) == 1 else {"anyOf": item_schemas},
+                        "minItems": len(item_schemas),
+                        "maxItems": len(item_schemas),
+                    },
+                }
+            )
+        )
+    return _strict_object(
+        {
+            "schema_version": {"type": "integer", "enum": [2]},
+            "category_name": {"type": "string", "enum": [expected.category_name]},
+            "comment": {"type": "string"},
+            "sections": {
+                "type": "array",
+                "items": section_schemas[0] if len(section_schemas) == 1 else {"anyOf": section_schemas},
+                "minItems": len(section_schemas),
+                "maxItems": len(section_schemas),
+            },
+        }
+    )
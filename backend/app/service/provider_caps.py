@@ -0,0 +1,141 @@
+"""
+模型服务商能力推断：不同 OpenAI 兼容服务对扩展参数的支持程度不同，这里集中判断。
+
+提示词前缀缓存的提示方式：
+- openai：自动前缀缓存，额外传 prompt_cache_key 提高同前缀请求命中同一缓存的概率；
+- cache_control：在内容分片上标注 {"cache_control": {"type": "ephemeral"}}（OpenRouter 上的 Claude/Gemini、通义千问显式缓存等）；
+- none：不加任何提示（DeepSeek、vLLM 等自动前缀缓存的服务，或未知服务）。
+
+结构化输出（按评分规则生成的 JSON Schema）的下发方式：
+- json_schema：response_format={"type": "json_schema", ...}（OpenAI、OpenRouter、新版 vLLM/SGLang 等，未知服务默认先尝试）；
+- guided_json：vLLM 扩展参数 guided_json（旧版 vLLM，需在配置中显式指定）；
+- json_object：response_format={"type": "json_object"}，只保证输出合法 JSON（DeepSeek、通义千问）；
+- none：仅靠提示词约束。
+端点以 400/422 拒绝且错误信息提到结构化输出参数名时，按 json_schema/guided_json → json_object → none 降级，
+降级结果在进程内按端点与模型记住 MODEL_STRUCTURED_DOWNGRADE_TTL_SECONDS 秒，到期后重新试探；
+其他原因的 400/422（如上下文超长、模型名错误、其他字段不符合请求格式）不触发降级。
+"""
+from __future__ import annotations
+
+import time
+from typing import Any
+from urllib.parse import urlparse
+
+from config.settings import (
+    MODEL_STRUCTURED_DOWNGRADE_TTL_SECONDS,
+    MODEL_PROMPT_CACHE_HINTS,
+    MODEL_PROMPT_CACHE_STYLES,
+    MODEL_STRUCTURED_OUTPUT,
+    MODEL_STRUCTURED_OUTPUT_STYLES,
+)
+from app.service.http_pool import endpoint_key
+
+PROMPT_CACHE_STYLES = ("openai", "cache_control", "none")
+STRUCTURED_OUTPUT_STYLES = ("json_schema", "guided_json", "json_object", "none")
+
+_STRUCTURED_DOWNGRADES = {"json_schema": "json_object", "guided_json": "json_object", "json_object": "none"}
+# 错误响应中出现任一参数名（不区分大小写）才视为结构化输出参数被拒绝；
+# 不匹配单独的 "schema"，它常见于与结构化输出无关的请求格式校验错误
+_STRUCTURED_REJECTION_HINTS = ("response_format", "json_schema", "json_object", "guided_json")
+# (端点, 模型名) -> (协商后的结构化输出方式, 到期时刻 time.monotonic())（仅记录被拒绝后的降级结果）
+_NEGOTIATED_STRUCTURED: dict[tuple[str, str], tuple[str, float]] = {}
+
+
+def _negotiated(key: tuple[str, str]) -> str | None:
+    entry = _NEGOTIATED_STRUCTURED.get(key)
+    if entry is None:
+        return None
+    style, expires_at = entry
+    if time.monotonic() >= expires_at:
+        _NEGOTIATED_STRUCTURED.pop(key, None)
+        return None
+    return style
+
+
+def prompt_cache_style(api_url: str | None, model_name: str | None) -> str:
+    """返回该端点/模型应使用的提示词缓存提示方式。"""
+    if not MODEL_PROMPT_CACHE_HINTS or not api_url:
+        return "none"
+    configured = MODEL_PROMPT_CACHE_STYLES.get(endpoint_key(api_url))
+    if configured in PROMPT_CACHE_STYLES:
+        return configured
+    host = (urlparse(api_url).hostname or "").lower()
+    model = (model_name or "").lower()
+    if host == "api.openai.com" or host.endswith(".openai.azure.com"):
+        return "openai"
+    if host == "openrouter.ai" and any(tag in model for tag in ("claude", "anthropic", "gemini")):
+        return "cache_control"
+    if host.startswith("dashscope") and "qwen" in model:
+        return "cache_control"
+    return "none"
+
+
+def extract_cached_tokens(usage: object) -> int | None:
+    """从 usage 中读取命中缓存的提示词 Token 数，兼容各家字段命名；未提供时返回 None。"""
+    if not isinstance(usage, dict):
+        return None
+    details = usage.get("prompt_tokens_details")
+    if isinstance(details, dict) and isinstance(details.get("cached_tokens"), (int, float)):
+        return int(details["cached_tokens"])
+    for key in ("prompt_cache_hit_tokens", "cache_read_input_tokens", "cached_tokens"):
+        if isinstance(usage.get(key), (int, float)):
+            return int(usage[key])
+    return None
+
+
+def structured_output_style(api_url: str | None, model_name: str | None) -> str:
+    """返回该端点/模型当前应使用的结构化输出方式：协商降级结果 > 显式配置 > 按服务商推断。"""
+    if not MODEL_STRUCTURED_OUTPUT or not api_url:
+        return "none"
+    key = endpoint_key(api_url)
+    configured = MODEL_STRUCTURED_OUTPUT_STYLES.get(key)
+    negotiated = _negotiated((key, (model_name or "").lower()))
+    if negotiated is not None:
+        return negotiated
+    if configured in STRUCTURED_OUTPUT_STYLES:
+        return configured
+    host = (urlparse(api_url).hostname or "").lower()
+    if "deepseek" in host or host.startswith("dashscope"):
+        return "json_object"
+    return "json_schema"
+
+
+def is_structured_output_rejection(status_code: int | None, body: str | None) -> bool:
+    """判断一次 4xx 拒绝是否由结构化输出参数引起（状态码为 400/422 且错误信息提到相关参数名）。"""
+    if status_code not in (400, 422) or not body:
+        return False
+    lowered = body.lower()
+    return any(hint in lowered for hint in _STRUCTURED_REJECTION_HINTS)
+
+
+def downgrade_structured_output(api_url: str | None, model_name: str | None, rejected: str) -> str:
+    """端点拒绝了 rejected 方式的请求参数：在有效期内记住并返回降级后的方式。"""
+    fallback = _STRUCTURED_DOWNGRADES.get(rejected, "none")
+    if api_url:
+        expires_at = time.monotonic() + MODEL_STRUCTURED_DOWNGRADE_TTL_SECONDS
+        _NEGOTIATED_STRUCTURED[(endpoint_key(api_url), (model_name or "").lower())] = (fallback, expires_at)
+    return fallback
+
+
+def negotiated_structured_outputs() -> dict[str, str]:
+    """协商降级结果快照（端点·模型 -> 方式），用于状态接口与批次总览。"""
+    snapshot: dict[str, str] = {}
+    for endpoint, model in list(_NEGOTIATED_STRUCTURED):
+        style = _negotiated((endpoint, model))
+        if style is not None:
+            snapshot[f"{model}@{endpoint}"] = style
+    return snapshot
+
+
+def apply_structured_output(payload: dict[str, Any], schema: dict[str, Any], style: str) -> dict[str, Any]:
+    """返回附加了结构化输出参数的请求体副本（style 为 none 时原样返回）。"""
+    if style == "json_schema":
+        return {
+            **payload,
+            "response_format": {"type": "json_schema", "json_schema": {"name": "rubric_grade", "strict": True, "schema": schema}},
+        }
+    if style == "guided_json":
+        return {**payload, "guided_json": schema}
+    if style == "json_object":
+        return {**payload, "response_format": {"type": "json_object"}}
+    return payload
@@ -0,0 +1,222 @@
+"""
+模型端点限流：按端点维护“请求数/分钟”与“Token 数/分钟”两个令牌桶。
+
+- 桶容量可在 settings 中按端点配置；未配置时，从响应头 x-ratelimit-limit-* 自动学习；
+- 每次响应后用 x-ratelimit-remaining-* / x-ratelimit-reset-* 校准剩余额度；
+- 429 携带的 Retry-After 会让该端点在窗口内暂停发起新请求；
+- 额度不足时延迟新调用，而不是让其失败。
+"""
+from __future__ import annotations
+
+import asyncio
+import re
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Mapping, Optional
+
+from config.settings import (
+    MODEL_RATE_LIMITS,
+    MODEL_RATE_LIMIT_RPM,
+    MODEL_RATE_LIMIT_TPM,
+    MODEL_RETRY_AFTER_MAX_SECONDS,
+)
+from app.service.http_pool import endpoint_key
+from app.util.logger import logger
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_CJK_CHAR = re.compile(r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]")
+
+
+def parse_duration_seconds(value: Optional[str]) -> Optional[float]:
+    """解析限流头中的时长：支持纯秒数（"20"、"0.5"）与 "1m30s"、"250ms" 这类写法。"""
+    if value is None:
+        return None
+    text = str(value).strip().lower()
+    if not text:
+        return None
+    try:
+        return max(0.0, float(text))
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(text)
+    if not parts:
+        return None
+    unit_seconds = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+    return sum(float(num) * unit_seconds[unit] for num, unit in parts)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析 Retry-After：秒数或 HTTP 日期。"""
+    seconds = parse_duration_seconds(value)
+    if seconds is not None:
+        return seconds
+    if not value:
+        return None
+    try:
+        target = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, target.timestamp() - time.time())
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算 Token 数：中日韩字符约 1 字 1 Token，其余字符约 4 字符 1 Token。"""
+    if not text:
+        return 0
+    cjk = len(_CJK_CHAR.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def chars_within_tokens(text: str, budget: float, *, from_end: bool = False) -> int:
+    """按 estimate_tokens 的口径，返回从开头（或结尾）起估算不超过 budget 个 Token 的字符数。"""
+    used = 0.0
+    for count, ch in enumerate(reversed(text) if from_end else text):
+        used += 1.0 if _CJK_CHAR.match(ch) else 0.25
+        if used > budget:
+            return count
+    return len(text)
+
+
+class TokenBucket:
+    """按分钟额度匀速回填的令牌桶。"""
+
+    def __init__(self, per_minute: float) -> None:
+        self.capacity = float(per_minute)
+        self.rate = float(per_minute) / 60.0
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        self._refill(now)
+        # 单次需求超过桶容量时按满桶计算，避免永远等不到
+        need = min(float(amount), self.capacity)
+        if self.tokens >= need:
+            return 0.0
+        return (need - self.tokens) / self.rate if self.rate > 0 else 0.0
+
+    def consume(self, amount: float) -> None:
+        self.tokens -= float(amount)
+
+    def sync(self, remaining: float, now: float) -> None:
+        """用服务端返回的剩余额度校准本地桶（只向下校准，避免放大额度）。"""
+        self._refill(now)
+        self.tokens = min(self.tokens, float(remaining))
+
+
+class EndpointRateLimiter:
+    """单个模型端点的请求/Token 双桶限流器。"""
+
+    def __init__(self, key: str, *, rpm: int = 0, tpm: int = 0) -> None:
+        self.key = key
+        self.requests: Optional[TokenBucket] = TokenBucket(rpm) if rpm > 0 else None
+        self.tokens: Optional[TokenBucket] = TokenBucket(tpm) if tpm > 0 else None
+        self.blocked_until = 0.0
+        self.total_wait_seconds = 0.0
+        self.throttled_count = 0
+
+    async def acquire(self, estimated_tokens: int) -> float:
+        """等待直到额度允许再发起一次请求，返回本次等待的秒数。"""
+        waited = 0.0
+        while True:
+            now = time.monotonic()
+            wait = max(0.0, self.blocked_until - now)
+            if self.requests is not None:
+                wait = max(wait, self.requests.wait_time(1, now))
+            if self.tokens is not None and estimated_tokens > 0:
+                wait = max(wait, self.tokens.wait_time(estimated_tokens, now))
+            if wait <= 0:
+                if self.requests is not None:
+                    self.requests.consume(1)
+                if self.tokens is not None and estimated_tokens > 0:
+                    self.tokens.consume(estimated_tokens)
+                break
+            await asyncio.sleep(wait)
+            waited += wait
+        if waited > 0:
+            self.total_wait_seconds += waited
+        return waited
+
+    def settle(self, estimated_tokens: int, actual_tokens: Optional[int]) -> None:
+        """按响应 usage 的实际 Token 数修正预扣的额度。"""
+        if self.tokens is None or actual_tokens is None:
+            return
+        self.tokens.consume(float(actual_tokens) - float(estimated_tokens))
+
+    def update_from_headers(self, headers: Mapping[str, str], status_code: int) -> None:
+        """读取 Retry-After 与 x-ratelimit-* 响应头，校准额度或暂停发起新请求。"""
+        now = time.monotonic()
+        for kind in ("requests", "tokens"):
+            limit = _to_float(headers.get(f"x-ratelimit-limit-{kind}"))
+            remaining = _to_float(headers.get(f"x-ratelimit-remaining-{kind}"))
+            reset = parse_duration_seconds(headers.get(f"x-ratelimit-reset-{kind}"))
+            bucket = getattr(self, kind)
+            if bucket is None and limit and limit > 0:
+                bucket = TokenBucket(limit)
+                setattr(self, kind, bucket)
+                logger.info("端点 %s 从响应头学习到限流额度：%s=%s/分钟", self.key, kind, int(limit))
+            if bucket is not None and remaining is not None:
+                bucket.sync(remaining, now)
+            if remaining is not None and remaining <= 0 and reset:
+                self._block(reset, now)
+
+        if status_code == 429:
+            self.throttled_count += 1
+            retry_after = parse_retry_after(headers.get("retry-after"))
+            if retry_after is None:
+                retry_after = parse_duration_seconds(headers.get("retry-after-ms"))
+                retry_after = retry_after / 1000.0 if retry_after is not None else None
+            if retry_after is not None:
+                self._block(retry_after, now)
+
+    def _block(self, seconds: float, now: float) -> None:
+        seconds = min(float(seconds), float(MODEL_RETRY_AFTER_MAX_SECONDS))
+        until = now + seconds
+        if until > self.blocked_until:
+            self.blocked_until = until
+            logger.warning("端点 %s 触发限流，暂停发起新请求 %.1f 秒", self.key, seconds)
+
+    def snapshot(self) -> dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "endpoint": self.key,
+            "rpm": int(self.requests.capacity) if self.requests else None,
+            "tpm": int(self.tokens.capacity) if self.tokens else None,
+            "requests_available": round(self.requests.tokens, 1) if self.requests else None,
+            "tokens_available": round(self.tokens.tokens, 1) if self.tokens else None,
+            "blocked_seconds": round(max(0.0, self.blocked_until - now), 1),
+            "throttled_count": self.throttled_count,
+            "total_wait_seconds": round(self.total_wait_seconds, 1),
+        }
+
+
+def _to_float(value: Optional[str]) -> Optional[float]:
+    if value is None:
+        return None
+    try:
+        return float(str(value).strip())
+    except ValueError:
+        return None
+
+
+_RATE_LIMITERS: dict[str, EndpointRateLimiter] = {}
+
+
+def get_rate_limiter(api_url: str | None) -> EndpointRateLimiter:
+    """获取该接口所属端点的限流器（进程内共享）。"""
+    key = endpoint_key(api_url)
+    limiter = _RATE_LIMITERS.get(key)
+    if limiter is None:
+        rpm, tpm = MODEL_RATE_LIMITS.get(key, (MODEL_RATE_LIMIT_RPM, MODEL_RATE_LIMIT_TPM))
+        limiter = EndpointRateLimiter(key, rpm=rpm, tpm=tpm)
+        _RATE_LIMITERS[key] = limiter
+    return limiter
+
+
+def rate_limit_snapshots() -> list[dict[str, Any]]:
+    """返回所有端点限流器的当前状态。"""
+    return [limiter.snapshot() for limiter in _RATE_LIMITERS.values()]
@@ -0,0 +1,163 @@
+"""
+模型评分响应缓存：以 SQLite 持久化保存模型原始输出文本。
+
+- 缓存键为 hash(模型名, 接口地址, System Prompt, 完整 User Prompt, temperature)，正文或提示词任一变化都会失效；
+- 只保存原始输出文本，命中后重新走 JSON 解析与 _normalize_response，因此修改目标满分等后处理参数无需重新调用模型；
+- 按最近访问时间做 LRU 淘汰，同时限制条目数与总字节数。
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import sqlite3
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+from config.settings import DATA_DIR, RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_MAX_ENTRIES
+from app.util.logger import logger
+
+CACHE_DB_PATH = DATA_DIR / "cache" / "responses.sqlite3"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    model_name TEXT,
+    raw_text TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses(last_access);
+"""
+
+
+class ResponseCache:
+    """基于 SQLite 的模型响应缓存（LRU + 容量上限）。"""
+
+    def __init__(
+        self,
+        path: Path = CACHE_DB_PATH,
+        *,
+        max_entries: int = RESPONSE_CACHE_MAX_ENTRIES,
+        max_bytes: int = RESPONSE_CACHE_MAX_BYTES,
+    ) -> None:
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self._initialized = False
+
+    @staticmethod
+    def make_key(*, model_name: str, api_url: str, system_prompt: str, user_prompt: str, temperature: float) -> str:
+        material = json.dumps([model_name, api_url, system_prompt, user_prompt, float(temperature)], ensure_ascii=False)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """每次操作使用独立连接（可在线程池中安全调用），结束时提交并关闭。"""
+        if not self._initialized:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.path), timeout=10)
+        try:
+            if not self._initialized:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript(_SCHEMA)
+                self._initialized = True
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def get(self, key: str) -> Optional[str]:
+        """读取缓存，命中时刷新最近访问时间。"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT raw_text FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+        self.hits += 1
+        return row[0]
+
+    def put(self, key: str, raw_text: str, *, model_name: str | None = None) -> None:
+        """写入缓存并按容量上限淘汰最久未访问的条目。"""
+        now = time.time()
+        size = len(raw_text.encode("utf-8"))
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses(key, model_name, raw_text, size, created_at, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model_name, raw_text, size, now, now),
+            )
+            self._evict(conn)
+        self.writes += 1
+
+    def delete(self, key: str) -> None:
+        with self._connect() as conn:
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+
+    def clear(self) -> None:
+        with self._connect() as conn:
+            conn.execute("DELETE FROM responses")
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        removed = 0
+        for key, size in conn.execute("SELECT key, size FROM responses ORDER BY last_access ASC").fetchall():
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            count -= 1
+            total -= size
+            removed += 1
+        if removed:
+            self.evictions += removed
+            logger.info("响应缓存超出容量，已淘汰 %d 条最久未访问记录", removed)
+
+    async def aget(self, key: str) -> Optional[str]:
+        return await asyncio.to_thread(self.get, key)
+
+    async def aput(self, key: str, raw_text: str, *, model_name: str | None = None) -> None:
+        await asyncio.to_thread(self.put, key, raw_text, model_name=model_name)
+
+    async def adelete(self, key: str) -> None:
+        await asyncio.to_thread(self.delete, key)
+
+    def stats(self) -> dict[str, Any]:
+        entries = 0
+        total = 0
+        try:
+            with self._connect() as conn:
+                entries, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        except sqlite3.Error as exc:
+            logger.warning("读取响应缓存统计失败：%s", exc)
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "writes": self.writes,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": total,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+        }
+
+
+_CACHE: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> ResponseCache:
+    """获取进程内共享的响应缓存实例。"""
+    global _CACHE
+    if _CACHE is None:
+        _CACHE = ResponseCache()
+    return _CACHE
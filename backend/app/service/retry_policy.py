@@ -0,0 +1,72 @@
+"""
+模型调用重试策略：按错误类型（call / parse）区分重试次数与退避参数，并提供批次级重试预算。
+
+- 退避采用“指数退避 + 全抖动”：第 n 次重试等待 uniform(0, min(max_delay, base_delay × 2^n)) 秒；
+- 批次重试预算限制整批的重试总量，避免故障的模型服务被放大为 3 倍负载。
+"""
+from __future__ import annotations
+
+import random
+from dataclasses import dataclass
+from typing import Any
+
+from config.settings import MODEL_RETRY_BUDGET_MIN, MODEL_RETRY_BUDGET_RATIO, MODEL_RETRY_POLICIES
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """单类错误的重试策略。"""
+
+    max_attempts: int
+    base_delay: float
+    max_delay: float
+
+    def backoff(self, retry_index: int) -> float:
+        """返回第 retry_index 次重试（从 0 开始）前应等待的秒数。"""
+        cap = min(self.max_delay, self.base_delay * (2**retry_index))
+        return random.uniform(0.0, cap) if cap > 0 else 0.0
+
+
+def get_retry_policy(kind: str) -> RetryPolicy:
+    """按错误类型获取重试策略，未知类型按 call 处理。"""
+    raw = MODEL_RETRY_POLICIES.get(kind) or MODEL_RETRY_POLICIES["call"]
+    return RetryPolicy(
+        max_attempts=max(1, int(raw["max_attempts"])),
+        base_delay=float(raw["base_delay"]),
+        max_delay=float(raw["max_delay"]),
+    )
+
+
+class RetryBudget:
+    """批次级重试预算：允许的重试总数 = 最少保底次数 + 比例 × 首次请求数。"""
+
+    def __init__(self, ratio: float = MODEL_RETRY_BUDGET_RATIO, min_retries: int = MODEL_RETRY_BUDGET_MIN) -> None:
+        self.ratio = float(ratio)
+        self.min_retries = int(min_retries)
+        self.requests = 0
+        self.retries = 0
+        self.denied = 0
+
+    @property
+    def allowance(self) -> int:
+        return self.min_retries + int(self.ratio * self.requests)
+
+    def record_request(self) -> None:
+        """记录一次首次请求（重试不计入）。"""
+        self.requests += 1
+
+    def try_spend(self) -> bool:
+        """尝试消耗一次重试额度，额度不足时返回 False。"""
+        if self.retries >= self.allowance:
+            self.denied += 1
+            return False
+        self.retries += 1
+        return True
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "allowance": self.allowance,
+            "denied": self.denied,
+        }
@@ -0,0 +1,271 @@
+"""
+全局调度：文件名额与模型并发名额在并发批次之间按权重公平分配，主评分调用优先于总体评语调用。
+
+- 每个批次是一条“流”，排队的请求按（优先级, 虚拟完成时间）出队：同一优先级内为单位代价的加权公平排队（WFQ），
+  大批次不会因先到而长时间占满名额，新来的小批次最多排在大批次一个名额之后；
+- 优先级为严格优先：有主评分（含长文摘要、修复重提示）调用在排队时，总体评语调用不会被放行；
+- 批次与优先级通过 contextvars 传递（batch_scope / call_priority），调用链无需逐层透传参数；
+- 每个批次按资源（file/model）记录排队深度与等待时长，供 /api/limits 与批次汇总展示。
+"""
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Iterator
+
+from config.settings import SCHEDULER_BATCH_WEIGHT, SCHEDULER_STATS_KEEP
+
+PRIORITY_PRIMARY = 0
+PRIORITY_OVERALL = 1
+PRIORITY_NAMES = {PRIORITY_PRIMARY: "评分", PRIORITY_OVERALL: "总体评语"}
+
+# 不属于任何批次的调用（如规则调试、接口探测）归入该流
+_NO_BATCH = "-"
+
+_BATCH: ContextVar[tuple[str, float]] = ContextVar("grading_batch", default=(_NO_BATCH, SCHEDULER_BATCH_WEIGHT))
+_PRIORITY: ContextVar[int] = ContextVar("call_priority", default=PRIORITY_PRIMARY)
+
+
+@contextmanager
+def batch_scope(batch_id: str, weight: float = SCHEDULER_BATCH_WEIGHT) -> Iterator[None]:
+    """在该范围内创建的任务与发起的调用都计入此批次。"""
+    if weight <= 0:
+        raise ValueError("批次权重必须大于 0")
+    stats = _batch_stats(batch_id)
+    stats["active"] = True
+    token = _BATCH.set((batch_id, float(weight)))
+    try:
+        yield
+    finally:
+        _BATCH.reset(token)
+        stats["active"] = False
+        _prune_stats()
+
+
+@contextmanager
+def call_priority(priority: int) -> Iterator[None]:
+    """在该范围内发起的模型调用使用指定优先级（数值越小越优先）。"""
+    token = _PRIORITY.set(priority)
+    try:
+        yield
+    finally:
+        _PRIORITY.reset(token)
+
+
+def current_batch_id() -> str:
+    return _BATCH.get()[0]
+
+
+# 批次 -> 排队统计；结束的批次只保留最近 SCHEDULER_STATS_KEEP 条
+_STATS: "OrderedDict[str, dict[str, Any]]" = OrderedDict()
+
+
+def _new_resource_stats() -> dict[str, Any]:
+    return {"waiting": 0, "granted": 0, "queued": 0, "wait_ms_total": 0.0, "wait_ms_max": 0.0}
+
+
+def _batch_stats(batch_id: str) -> dict[str, Any]:
+    stats = _STATS.get(batch_id)
+    if stats is None:
+        stats = {"active": False, "resources": {}}
+        _STATS[batch_id] = stats
+    return stats
+
+
+def _resource_stats(batch_id: str, resource: str) -> dict[str, Any]:
+    resources = _batch_stats(batch_id)["resources"]
+    stats = resources.get(resource)
+    if stats is None:
+        stats = _new_resource_stats()
+        resources[resource] = stats
+    return stats
+
+
+def _prune_stats() -> None:
+    finished = [
+        key
+        for key, stats in _STATS.items()
+        if not stats["active"] and not any(item["waiting"] for item in stats["resources"].values())
+    ]
+    for key in finished[: max(0, len(finished) - SCHEDULER_STATS_KEEP)]:
+        _STATS.pop(key, None)
+
+
+def _format_resource(stats: dict[str, Any]) -> dict[str, Any]:
+    granted = stats["granted"]
+    return {
+        "waiting": stats["waiting"],
+        "granted": granted,
+        "queued": stats["queued"],
+        "wait_ms_avg": round(stats["wait_ms_total"] / granted, 1) if granted else 0.0,
+        "wait_ms_max": round(stats["wait_ms_max"], 1),
+    }
+
+
+def batch_queue_snapshot(batch_id: str) -> dict[str, dict[str, Any]]:
+    """返回某批次在各资源上的排队统计：当前排队数、已放行数、曾排队数、平均/最长等待（毫秒）。"""
+    stats = _STATS.get(batch_id)
+    if stats is None:
+        return {}
+    return {resource: _format_resource(item) for resource, item in stats["resources"].items()}
+
+
+def scheduler_snapshot() -> list[dict[str, Any]]:
+    """返回所有进行中与最近结束批次的排队统计。"""
+    return [
+        {"batch_id": batch_id, "active": stats["active"], "resources": batch_queue_snapshot(batch_id)}
+        for batch_id, stats in _STATS.items()
+    ]
+
+
+class _Waiter:
+    __slots__ = ("future", "flow", "priority", "enqueued_at")
+
+    def __init__(self, future: asyncio.Future[None], flow: str, priority: int) -> None:
+        self.future = future
+        self.flow = flow
+        self.priority = priority
+        self.enqueued_at = time.perf_counter()
+
+
+class FairQueue:
+    """按批次分流、带严格优先级的加权公平等待队列；出队即放行（名额由调用方计数）。"""
+
+    def __init__(self, resource: str) -> None:
+        self.resource = resource
+        self._heap: list[tuple[int, float, int, _Waiter]] = []
+        self._waiters: dict[asyncio.Future[None], _Waiter] = {}
+        self._seq = itertools.count()
+        # 每个优先级的虚拟时钟，与 (优先级, 批次) 上一个请求的虚拟完成时间
+        self._virtual_time: dict[int, float] = {}
+        self._last_finish: dict[tuple[int, str], float] = {}
+        self._pending: dict[tuple[int, str], int] = {}
+
+    def __len__(self) -> int:
+        return len(self._waiters)
+
+    def record_immediate(self) -> None:
+        """记录一次无需排队即获得名额的请求。"""
+        _resource_stats(current_batch_id(), self.resource)["granted"] += 1
+
+    def enqueue(self) -> asyncio.Future[None]:
+        """按当前上下文的批次与优先级登记一个等待者，返回其 Future（放行时置结果）。"""
+        flow, weight = _BATCH.get()
+        priority = _PRIORITY.get()
+        future: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        waiter = _Waiter(future, flow, priority)
+        key = (priority, flow)
+        start = max(self._virtual_time.get(priority, 0.0), self._last_finish.get(key, 0.0))
+        finish = start + 1.0 / weight
+        self._last_finish[key] = finish
+        self._pending[key] = self._pending.get(key, 0) + 1
+        self._waiters[future] = waiter
+        heapq.heappush(self._heap, (priority, finish, next(self._seq), waiter))
+        stats = _resource_stats(flow, self.resource)
+        stats["waiting"] += 1
+        stats["queued"] += 1
+        return future
+
+    def discard(self, future: asyncio.Future[None]) -> None:
+        """撤销尚未放行的等待者（调用方被取消时）；堆中条目在出队时惰性跳过。"""
+        waiter = self._waiters.pop(future, None)
+        if waiter is not None:
+            self._forget(waiter)
+
+    def grant(self) -> bool:
+        """放行下一个等待者；队列为空时返回 False。"""
+        while self._heap:
+            priority, finish, _seq, waiter = heapq.heappop(self._heap)
+            if self._waiters.pop(waiter.future, None) is None:
+                continue
+            self._virtual_time[priority] = finish
+            self._forget(waiter)
+            if waiter.future.done():
+                continue
+            waited_ms = (time.perf_counter() - waiter.enqueued_at) * 1000
+            stats = _resource_stats(waiter.flow, self.resource)
+            stats["granted"] += 1
+            stats["wait_ms_total"] += waited_ms
+            stats["wait_ms_max"] = max(stats["wait_ms_max"], waited_ms)
+            waiter.future.set_result(None)
+            return True
+        return False
+
+    def _forget(self, waiter: _Waiter) -> None:
+        _resource_stats(waiter.flow, self.resource)["waiting"] -= 1
+        key = (waiter.priority, waiter.flow)
+        remaining = self._pending.get(key, 1) - 1
+        if remaining > 0:
+            self._pending[key] = remaining
+            return
+        # 该流已无排队请求：再次到来时从当前虚拟时钟起算，同时避免长期运行后字典无限增长
+        self._pending.pop(key, None)
+        self._last_finish.pop(key, None)
+
+
+class SlotLease:
+    """FairSemaphore.slot() 持有的名额：等待其他任务期间可先交还（suspend），需要时再重新排队取回（resume）。"""
+
+    def __init__(self, semaphore: "FairSemaphore") -> None:
+        self._semaphore = semaphore
+        self.held = False
+
+    def suspend(self) -> None:
+        if self.held:
+            self.held = False
+            self._semaphore.release()
+
+    async def resume(self) -> None:
+        if not self.held:
+            await self._semaphore.acquire()
+            self.held = True
+
+
+class FairSemaphore:
+    """固定容量的公平信号量：名额不足时按 FairQueue 的顺序放行，而不是先到先得。"""
+
+    def __init__(self, resource: str, capacity: int) -> None:
+        if capacity < 1:
+            raise ValueError("并发名额必须大于 0")
+        self.capacity = capacity
+        self.in_use = 0
+        self._queue = FairQueue(resource)
+
+    @property
+    def waiting(self) -> int:
+        return len(self._queue)
+
+    async def acquire(self) -> None:
+        if self.in_use < self.capacity and not self._queue:
+            self.in_use += 1
+            self._queue.record_immediate()
+            return
+        future = self._queue.enqueue()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # 已被放行但调用方取消，归还名额
+                self.release()
+            else:
+                self._queue.discard(future)
+            raise
+
+    def release(self) -> None:
+        self.in_use = max(0, self.in_use - 1)
+        while self.in_use < self.capacity and self._queue.grant():
+            self.in_use += 1
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[SlotLease]:
+        lease = SlotLease(self)
+        await lease.resume()
+        try:
+            yield lease
+        finally:
+            lease.suspend()
@@ -0,0 +1,205 @@
+"""
+流式输出守卫：在模型以 SSE 逐段返回内容时做增量 JSON 校验，尽早发现“跑偏”的输出。
+
+- 轻量级增量扫描器，只跟踪嵌套层级、当前键名与字符串/标量边界，不构建完整对象；
+- 在 `{` 之前出现正文文字（允许空白与 ```json 代码块起始标记）时立即判定失败；
+- JSON 语法错误（如非法字符、括号不匹配）时立即判定失败；
+- 若提供 RubricExpected，则 sections[].name 与 sections[].items[].name 一旦读完即与评分规则比对。
+根对象闭合后不再检查后续内容（与 _parse_json_from_text 的容错保持一致）。
+"""
+from __future__ import annotations
+
+import json
+from typing import Any, Optional
+
+from app.service.prompt_builder import RubricExpected
+
+_FENCE = "```"
+_WHITESPACE = " \t\r\n"
+_SCALAR_CHARS = set("0123456789+-.eEtruefalsn")
+
+
+class StreamGuardError(ValueError):
+    """流式输出已明显偏离约定的 JSON 结构。"""
+
+
+class StreamGuard:
+    """对模型流式输出做增量 JSON 结构校验。"""
+
+    def __init__(self, expected: Optional[RubricExpected] = None) -> None:
+        self.expected = expected
+        self._section_items: dict[str, set[str]] = {}
+        self._all_items: set[str] = set()
+        if expected is not None:
+            for sec in expected.sections:
+                names = {item.name.strip() for item in sec.items}
+                self._section_items[sec.name.strip()] = names
+                self._all_items |= names
+        self.started = False
+        self.done = False
+        self.consumed = 0
+        self._prefix = ""
+        # 栈帧：{"type": "obj"|"arr", "expect": ..., "key": 当前键, "name": 对象内已读到的 name}
+        self._stack: list[dict[str, Any]] = []
+        self._in_string = False
+        self._escape = False
+        self._string_role: Optional[str] = None  # "key" / "name" / None（不需要保留内容）
+        self._string_buf: list[str] = []
+        self._scalar: list[str] = []
+
+    def feed(self, delta: str) -> None:
+        """喂入一段增量文本，发现偏离时抛出 StreamGuardError。"""
+        if not delta or self.done:
+            return
+        for ch in delta:
+            self.consumed += 1
+            if not self.started:
+                self._feed_prefix(ch)
+            else:
+                self._feed_char(ch)
+            if self.done:
+                return
+
+    def _feed_prefix(self, ch: str) -> None:
+        if ch == "{" and not self._prefix:
+            self.started = True
+            self._stack.append({"type": "obj", "expect": "key", "key": None, "name": None})
+            return
+        if not self._prefix and ch in _WHITESPACE:
+            return
+        self._prefix += ch
+        if self._prefix.startswith(_FENCE):
+            # 代码块起始行（```json）读完后继续等待 `{`
+            if ch == "\n":
+                self._prefix = ""
+            return
+        if not _FENCE.startswith(self._prefix):
+            raise StreamGuardError("模型输出在 JSON 对象之前出现了多余文字")
+
+    def _feed_char(self, ch: str) -> None:
+        if self._in_string:
+            self._feed_string_char(ch)
+            return
+        if self._scalar:
+            if ch in _SCALAR_CHARS:
+                self._scalar.append(ch)
+                return
+            self._end_scalar()
+        if ch in _WHITESPACE:
+            return
+
+        frame = self._stack[-1]
+        expect = frame["expect"]
+        if expect == "key":
+            if ch == '"':
+                self._start_string("key")
+            elif ch == "}" and frame["key"] is None:
+                self._close("obj")
+            else:
+                raise StreamGuardError(f"JSON 对象中出现非法字符：{ch!r}")
+        elif expect == "colon":
+            if ch != ":":
+                raise StreamGuardError(f"JSON 键名后缺少冒号，读到：{ch!r}")
+            frame["expect"] = "value"
+        elif expect == "value":
+            self._start_value(ch, frame)
+        elif expect == "comma":
+            if ch == ",":
+                frame["expect"] = "key" if frame["type"] == "obj" else "value"
+            elif ch == "}" and frame["type"] == "obj":
+                self._close("obj")
+            elif ch == "]" and frame["type"] == "arr":
+                self._close("arr")
+            else:
+                raise StreamGuardError(f"JSON 中缺少逗号或括号不匹配，读到：{ch!r}")
+
+    def _start_value(self, ch: str, frame: dict[str, Any]) -> None:
+        if ch == "]" and frame["type"] == "arr" and frame.get("empty", True):
+            self._close("arr")
+            return
+        frame["empty"] = False
+        if ch == "{":
+            self._stack.append({"type": "obj", "expect": "key", "key": None, "name": None})
+        elif ch == "[":
+            self._stack.append({"type": "arr", "expect": "value", "empty": True})
+        elif ch == '"':
+            role = "name" if frame["type"] == "obj" and frame["key"] == "name" else None
+            self._start_string(role)
+        elif ch in _SCALAR_CHARS:
+            self._scalar.append(ch)
+        else:
+            raise StreamGuardError(f"JSON 值位置出现非法字符：{ch!r}")
+
+    def _start_string(self, role: Optional[str]) -> None:
+        self._in_string = True
+        self._escape = False
+        self._string_role = role
+        self._string_buf = []
+
+    def _feed_string_char(self, ch: str) -> None:
+        if self._escape:
+            self._escape = False
+        elif ch == "\\":
+            self._escape = True
+        elif ch == '"':
+            self._in_string = False
+            self._end_string()
+            return
+        if self._string_role is not None:
+            self._string_buf.append(ch)
+
+    def _end_string(self) -> None:
+        role = self._string_role
+        text = ""
+        if role is not None:
+            try:
+                text = json.loads('"' + "".join(self._string_buf) + '"')
+            except json.JSONDecodeError as exc:
+                raise StreamGuardError("JSON 字符串转义非法") from exc
+        frame = self._stack[-1]
+        if role == "key":
+            frame["key"] = text
+            frame["expect"] = "colon"
+            return
+        if role == "name":
+            frame["name"] = text.strip()
+            self._check_name(frame)
+        frame["expect"] = "comma"
+
+    def _end_scalar(self) -> None:
+        token = "".join(self._scalar)
+        self._scalar = []
+        try:
+            json.loads(token)
+        except json.JSONDecodeError as exc:
+            raise StreamGuardError(f"JSON 标量非法：{token[:20]}") from exc
+        self._stack[-1]["expect"] = "comma"
+
+    def _close(self, _kind: str) -> None:
+        self._stack.pop()
+        if not self._stack:
+            self.done = True
+            return
+        self._stack[-1]["expect"] = "comma"
+
+    def _path(self) -> list[Any]:
+        """返回当前栈对应的键路径（数组层以 "[]" 表示）。"""
+        path: list[Any] = []
+        for frame in self._stack:
+            path.append(frame["key"] if frame["type"] == "obj" else "[]")
+        return path
+
+    def _check_name(self, frame: dict[str, Any]) -> None:
+        if self.expected is None:
+            return
+        path = self._path()
+        name = frame["name"]
+        if path == ["sections", "[]", "name"]:
+            if name not in self._section_items:
+                raise StreamGuardError(f"出现评分规则之外的评分维度：{name}")
+        elif path == ["sections", "[]", "items", "[]", "name"]:
+            section_frame = self._stack[2]
+            section_name = section_frame.get("name")
+            allowed = self._section_items.get(section_name, self._all_items) if section_name else self._all_items
+            if name not in allowed:
+                raise StreamGuardError(f"出现评分规则之外的评分细则：{name}")
@@ -0,0 +1,193 @@
+"""
+Token 用量与成本统计：记录每次模型调用的提示词/输出/缓存命中 Token，并按单价表折算费用。
+
+- 服务商返回 usage 时以其为准；缺失（部分兼容服务、流式中断、批量结果缺字段）时用本地估算补齐并标记；
+- 单价表位于 config/model_prices.json（每百万 Token），按模型名精确匹配，其次按最长前缀匹配；
+- 命中前缀缓存的 Token 按 cached_input 单价计费（未配置时按 input 单价）；
+- UsageLedger 按（端点, 模型）汇总，批次内与进程级各维护一份。
+"""
+from __future__ import annotations
+
+import json
+import threading
+from pathlib import Path
+from typing import Any, Optional
+
+from config.settings import MODEL_PRICES_PATH
+from app.service.http_pool import endpoint_key
+from app.service.provider_caps import extract_cached_tokens
+from app.service.rate_limit import estimate_tokens
+from app.util.logger import logger
+
+_TOKEN_FIELDS = ("prompt_tokens", "cached_tokens", "completion_tokens", "total_tokens")
+
+
+def new_usage() -> dict[str, Any]:
+    """空的用量累计字典。"""
+    return {
+        "calls": 0,
+        "prompt_tokens": 0,
+        "cached_tokens": 0,
+        "completion_tokens": 0,
+        "total_tokens": 0,
+        "estimated_calls": 0,
+        "unpriced_calls": 0,
+        "cost": 0.0,
+    }
+
+
+def add_usage(target: dict[str, Any], delta: Optional[dict[str, Any]]) -> dict[str, Any]:
+    """把 delta 累加到 target 上并返回 target。"""
+    if not delta:
+        return target
+    for key, value in delta.items():
+        if key == "cost":
+            target["cost"] = round(float(target.get("cost") or 0.0) + float(value or 0.0), 6)
+        elif isinstance(value, (int, float)):
+            target[key] = int(target.get(key) or 0) + int(value)
+    return target
+
+
+def split_usage(usage: dict[str, Any], parts: int) -> list[dict[str, Any]]:
+    """把一次合并请求的用量均分给 parts 份作业（整数余数分给前几份，费用按比例）。"""
+    parts = max(1, int(parts))
+    shares = [new_usage() for _ in range(parts)]
+    for key, value in usage.items():
+        if key == "cost":
+            for share in shares:
+                share["cost"] = round(float(value or 0.0) / parts, 6)
+            continue
+        base, extra = divmod(int(value or 0), parts)
+        for idx, share in enumerate(shares):
+            share[key] = base + (1 if idx < extra else 0)
+    return shares
+
+
+class PriceTable:
+    """模型单价表：文件修改后自动重新加载。"""
+
+    def __init__(self, path: Path = MODEL_PRICES_PATH) -> None:
+        self.path = path
+        self.currency = "CNY"
+        self._models: dict[str, dict[str, float]] = {}
+        self._mtime: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _reload_if_changed(self) -> None:
+        try:
+            mtime = self.path.stat().st_mtime
+        except OSError:
+            self._models, self._mtime = {}, None
+            return
+        if mtime == self._mtime:
+            return
+        with self._lock:
+            try:
+                data = json.loads(self.path.read_text(encoding="utf-8"))
+            except (OSError, ValueError) as exc:
+                logger.warning("读取模型单价表失败，费用将记为 0：%s", exc)
+                data = {}
+            models = data.get("models") if isinstance(data, dict) else None
+            self._models = {str(k).lower(): v for k, v in (models or {}).items() if isinstance(v, dict)}
+            self.currency = str((data or {}).get("currency") or "CNY")
+            self._mtime = mtime
+
+    def lookup(self, model_name: Optional[str]) -> Optional[dict[str, float]]:
+        """按模型名查单价：精确匹配优先，其次最长前缀匹配。"""
+        self._reload_if_changed()
+        name = (model_name or "").lower()
+        if not name:
+            return None
+        if name in self._models:
+            return self._models[name]
+        prefixes = [key for key in self._models if name.startswith(key)]
+        return self._models[max(prefixes, key=len)] if prefixes else None
+
+    def cost(self, model_name: Optional[str], prompt_tokens: int, cached_tokens: int, completion_tokens: int) -> Optional[float]:
+        """按单价折算费用；未配置该模型时返回 None。"""
+        price = self.lookup(model_name)
+        if price is None:
+            return None
+        input_price = float(price.get("input") or 0.0)
+        cached_price = float(price.get("cached_input", input_price) or 0.0)
+        output_price = float(price.get("output") or 0.0)
+        cached = min(max(cached_tokens, 0), max(prompt_tokens, 0))
+        total = (prompt_tokens - cached) * input_price + cached * cached_price + completion_tokens * output_price
+        return round(total / 1_000_000, 6)
+
+
+_PRICE_TABLE: Optional[PriceTable] = None
+
+
+def get_price_table() -> PriceTable:
+    """获取进程内共享的单价表。"""
+    global _PRICE_TABLE
+    if _PRICE_TABLE is None:
+        _PRICE_TABLE = PriceTable()
+    return _PRICE_TABLE
+
+
+def usage_from_response(
+    usage: Any,
+    *,
+    model_name: Optional[str],
+    prompt_estimate: int,
+    completion_text: str,
+) -> dict[str, Any]:
+    """把单次调用的 usage 转成用量记录；缺失字段按本地估算补齐并计入 estimated_calls。"""
+    record = new_usage()
+    record["calls"] = 1
+    usage = usage if isinstance(usage, dict) else {}
+    estimated = False
+    prompt_tokens = usage.get("prompt_tokens")
+    if not isinstance(prompt_tokens, (int, float)):
+        prompt_tokens = prompt_estimate
+        estimated = True
+    completion_tokens = usage.get("completion_tokens")
+    if not isinstance(completion_tokens, (int, float)):
+        completion_tokens = estimate_tokens(completion_text)
+        estimated = True
+    record["prompt_tokens"] = int(prompt_tokens)
+    record["completion_tokens"] = int(completion_tokens)
+    record["cached_tokens"] = int(extract_cached_tokens(usage) or 0)
+    record["total_tokens"] = record["prompt_tokens"] + record["completion_tokens"]
+    record["estimated_calls"] = 1 if estimated else 0
+    cost = get_price_table().cost(model_name, record["prompt_tokens"], record["cached_tokens"], record["completion_tokens"])
+    if cost is None:
+        record["unpriced_calls"] = 1
+    else:
+        record["cost"] = cost
+    return record
+
+
+class UsageLedger:
+    """按（端点, 模型）汇总用量。"""
+
+    def __init__(self) -> None:
+        self._entries: dict[tuple[str, str], dict[str, Any]] = {}
+
+    def add(self, api_url: Optional[str], model_name: Optional[str], usage: Optional[dict[str, Any]]) -> None:
+        if not usage or not usage.get("calls"):
+            return
+        key = (endpoint_key(api_url) if api_url else "mock", model_name or "")
+        add_usage(self._entries.setdefault(key, new_usage()), usage)
+
+    def total(self) -> dict[str, Any]:
+        total = new_usage()
+        for usage in self._entries.values():
+            add_usage(total, usage)
+        return total
+
+    def by_endpoint(self) -> list[dict[str, Any]]:
+        return [{"endpoint": endpoint, "model_name": model, **usage} for (endpoint, model), usage in sorted(self._entries.items())]
+
+    def snapshot(self) -> dict[str, Any]:
+        return {"currency": get_price_table().currency, "total": self.total(), "endpoints": self.by_endpoint()}
+
+
+_GLOBAL_LEDGER = UsageLedger()
+
+
+def get_usage_ledger() -> UsageLedger:
+    """进程级用量汇总（自服务启动以来）。"""
+    return _GLOBAL_LEDGER
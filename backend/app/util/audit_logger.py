@@ -34,6 +34,10 @@ class AuditLogger:
         payload["timestamp"] = datetime.utcnow().isoformat()
         meta_path.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
 
+    def save_usage(self, payload: dict[str, Any]) -> None:
+        """保存批次 Token 用量与费用汇总（按端点与按文件）。"""
+        (self.base / "usage.json").write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
+
     def save_prompts(self, system_prompt: str, user_prompt: str) -> None:
         (self.prompts_dir / "system_prompt.txt").write_text(system_prompt, encoding="utf-8")
         (self.prompts_dir / "user_prompt.txt").write_text(user_prompt, encoding="utf-8")
@@ -951,8 +951,30 @@ class ExcelExporter:
             freeze="A2",
         )
 
+        # 用量与成本（每个文件一行：全部模型调用含重试、总体评语的合计）
+        usage_headers = ["学号", "姓名", "文件名", "调用次数", "提示词Token", "缓存命中Token", "输出Token", "合计Token", "本地估算次数", "费用"]
+        ws_usage, tbl_usage = self._create_table_sheet(
+            wb,
+            title="用量与成本",
+            headers=usage_headers,
+            table_name="TokenUsage",
+            landscape=True,
+            freeze="D2",
+        )
+
+        # 重复提交（正文相同的文件分组：首份评分 + 复用结果）
+        dup_headers = ["分组", "学号", "姓名", "文件名", "处理方式", "复用自", "最终分"]
+        ws_dup, tbl_dup = self._create_table_sheet(
+            wb,
+            title="重复提交",
+            headers=dup_headers,
+            table_name="DuplicateSubmissions",
+            landscape=True,
+            freeze="B2",
+        )
+
         # 3) 删除各表的占位空行（第 2 行）以便重新写真实数据
-        for w in (ws_overview, ws_idsum, ws_mwide, ws_dim, ws_rubric, ws_sum, ws_err):
+        for w in (ws_overview, ws_idsum, ws_mwide, ws_dim, ws_rubric, ws_sum, ws_err, ws_usage, ws_dup):
             w.delete_rows(2)
 
         # 4) 批次总览写入
@@ -1182,6 +1204,44 @@ class ExcelExporter:
                 cell.value = f'=HYPERLINK("#\'细则明细\'!A{rrow}","查看")'
                 cell.font = Font(color=self._theme()["link"], underline="single")
 
+        # 用量与成本写入
+        for r in sorted(rows_list, key=sort_key_by_student_id):
+            usage = r.get("usage") if isinstance(r.get("usage"), dict) else {}
+            ws_usage.append(
+                [
+                    r.get("student_id"),
+                    r.get("student_name"),
+                    r.get("file_name"),
+                    int(usage.get("calls") or 0),
+                    int(usage.get("prompt_tokens") or 0),
+                    int(usage.get("cached_tokens") or 0),
+                    int(usage.get("completion_tokens") or 0),
+                    int(usage.get("total_tokens") or 0),
+                    int(usage.get("estimated_calls") or 0),
+                    float(usage.get("cost") or 0.0),
+                ]
+            )
+
+        # 重复提交写入：按分组聚合，组内首份评分在前
+        dup_groups: dict[tuple[str, ...], list[dict]] = {}
+        for r in rows_list:
+            others = r.get("duplicate_files") or []
+            if others:
+                dup_groups.setdefault(tuple(sorted([str(r.get("file_name") or ""), *map(str, others)])), []).append(r)
+        for group_idx, group_key in enumerate(sorted(dup_groups), start=1):
+            for r in sorted(dup_groups[group_key], key=lambda row: (bool(row.get("duplicate_of")), str(row.get("file_name") or ""))):
+                ws_dup.append(
+                    [
+                        group_idx,
+                        r.get("student_id"),
+                        r.get("student_name"),
+                        r.get("file_name"),
+                        "复用结果" if r.get("duplicate_of") else "首份评分",
+                        r.get("duplicate_of"),
+                        r.get("score"),
+                    ]
+                )
+
         # 7) 错误统计占比公式（在写完行数后补）
         # ErrStats: B 列数量，C 列占比
         if ws_err.max_row >= 2:
@@ -1205,6 +1265,8 @@ class ExcelExporter:
             (ws_rubric, tbl_rubric),
             (ws_sum, tbl_sum),
             (ws_err, tbl_err),
+            (ws_usage, tbl_usage),
+            (ws_dup, tbl_dup),
         ):
             resize_table(ws, tbl)
 
@@ -1226,6 +1288,8 @@ class ExcelExporter:
         polish_table_sheet(ws_rubric, landscape=True)
         polish_table_sheet(ws_sum, landscape=False)
         polish_table_sheet(ws_err, landscape=False)
+        polish_table_sheet(ws_usage, landscape=True)
+        polish_table_sheet(ws_dup, landscape=True)
 
         # 关键列：最小宽度/最大宽度 + 换行
         # 文件名列一般很长：限制宽度 + 开启换行
@@ -1294,6 +1358,19 @@ class ExcelExporter:
         # 错误统计：错误类型宽一点
         self._min_col(ws_err, "A", 22)
 
+        # 用量与成本：文件名限宽换行，Token 列千分位，费用保留 4 位小数
+        self._cap_col(ws_usage, "C", 30)
+        self._wrap_column(ws_usage, "C", start_row=2)
+        for c in range(4, 10):
+            self._set_number_format_col(ws_usage, c, "#,##0", start_row=2)
+        self._set_number_format_col(ws_usage, 10, "0.0000", start_row=2)
+
+        # 重复提交：文件名列限宽换行
+        for col in ("D", "F"):
+            self._cap_col(ws_dup, col, 30)
+            self._wrap_column(ws_dup, col, start_row=2)
+        self._set_number_format_col(ws_dup, 7, "0.00", start_row=2)
+
         # 数字格式：分数、耗时、扣分
         # 成绩总览：最终分=B
         self._set_number_format_col(ws_overview, 2, "0.00", start_row=2)
@@ -0,0 +1,353 @@
+"""
+离线模型模拟服务：本地 OpenAI 兼容的 /v1/chat/completions 桩服务，用于在没有真实服务商的情况下
+端到端压测 GradingService.process（连接池、限流、自适应并发、熔断、重试与修复重提示全部走真实路径）。
+
+- 延迟：fixed 固定 / uniform 在 latency_ms×(1±spread) 内均匀分布 / lognormal 以 latency_ms 为中位数、spread 为 σ；
+- 故障注入：按比例返回 429（带 Retry-After）、500、格式错误的输出（截断或非 JSON）、与评分规则不一致的输出（缺少细则）；
+- 输出：请求附带 JSON Schema（response_format / guided_json）时按 Schema 生成；否则从提示词中的输出骨架、
+  合并批改的作业编号或修复重提示的评分结构还原；都没有时返回通用的 {"comment", "summary"}；
+- 确定性：每个请求的随机数由 seed、请求体摘要与该请求体的第几次到达共同决定，与并发到达顺序无关，
+  同一请求的重试会得到新的结果（可能由失败转为成功）。
+
+既可在测试中以 run_simulator_in_thread 启动，也可通过 scripts/model_simulator.py 独立运行。
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Iterator, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from app.service.rate_limit import estimate_tokens
+
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "lognormal")
+
+_PACKED_ESSAY = re.compile(r"【作业 (\S+?) 开始】")
+_RUBRIC_ITEM = re.compile(r"\d+\. (.+?)（([\d.]+)分）")
+_REPAIR_SECTION = re.compile(r"^- (.+?)（([\d.]+)分）：(.+)$", re.M)
+_REPAIR_ITEM = re.compile(r"(.+?)（([\d.]+)分）")
+_FILLER = "论述基本完整，结构清晰，但部分论据缺少数据支撑，建议补充具体案例。"
+
+
+@dataclass
+class SimulatorConfig:
+    """模拟服务的行为配置（各比例取值 0～1）。"""
+
+    seed: int = 0
+    latency: str = "lognormal"
+    latency_ms: float = 200.0
+    latency_spread: float = 0.5
+    rate_limit_rate: float = 0.0
+    error_rate: float = 0.0
+    malformed_rate: float = 0.0
+    mismatch_rate: float = 0.0
+    retry_after_seconds: float = 1.0
+    # 以 400 拒绝 response_format=json_schema（模拟不支持结构化输出的服务，用于验证协商降级）
+    reject_json_schema: bool = False
+
+
+class ModelSimulator:
+    """按配置生成模拟响应，并统计各类结果次数。"""
+
+    def __init__(self, config: SimulatorConfig) -> None:
+        if config.latency not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"不支持的延迟分布：{config.latency}")
+        self.config = config
+        self._arrivals: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.counters: Dict[str, int] = {}
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + 1
+
+    def _rng_for(self, body: bytes) -> random.Random:
+        digest = hashlib.sha256(body).hexdigest()
+        with self._lock:
+            arrival = self._arrivals.get(digest, 0)
+            self._arrivals[digest] = arrival + 1
+        return random.Random(f"{self.config.seed}:{digest}:{arrival}")
+
+    def _latency_seconds(self, rng: random.Random) -> float:
+        cfg = self.config
+        if cfg.latency == "fixed":
+            value = cfg.latency_ms
+        elif cfg.latency == "uniform":
+            value = rng.uniform(cfg.latency_ms * (1 - cfg.latency_spread), cfg.latency_ms * (1 + cfg.latency_spread))
+        else:
+            value = cfg.latency_ms * math.exp(rng.gauss(0.0, cfg.latency_spread))
+        return max(0.0, value) / 1000
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "config": asdict(self.config),
+                "counters": dict(self.counters),
+                "in_flight": self.in_flight,
+                "peak_in_flight": self.peak_in_flight,
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._arrivals.clear()
+            self.counters.clear()
+            self.peak_in_flight = self.in_flight
+
+    async def handle(self, body: bytes) -> tuple[int, Dict[str, Any], Dict[str, str]]:
+        """处理一次请求，返回（状态码, 响应 JSON, 额外响应头）。"""
+        cfg = self.config
+        rng = self._rng_for(body)
+        payload = json.loads(body)
+        self._count("requests")
+        with self._lock:
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self._latency_seconds(rng))
+            response_format = payload.get("response_format") or {}
+            if cfg.reject_json_schema and response_format.get("type") == "json_schema":
+                self._count("rejected_schema")
+                return 400, {"error": {"message": "response_format json_schema is not supported"}}, {}
+            draw = rng.random()
+            if draw < cfg.rate_limit_rate:
+                self._count("rate_limited")
+                return 429, {"error": {"message": "rate limit exceeded"}}, {"Retry-After": f"{cfg.retry_after_seconds:g}"}
+            if draw < cfg.rate_limit_rate + cfg.error_rate:
+                self._count("server_error")
+                return 500, {"error": {"message": "simulated upstream error"}}, {}
+
+            data = self._generate(payload, rng)
+            content = json.dumps(data, ensure_ascii=False, indent=2)
+            if rng.random() < cfg.malformed_rate:
+                self._count("malformed")
+                content = content[: len(content) // 2] if rng.random() < 0.5 else "抱歉，我无法按要求输出评分结果。"
+            elif rng.random() < cfg.mismatch_rate and self._drop_item(data):
+                self._count("mismatched")
+                content = json.dumps(data, ensure_ascii=False, indent=2)
+            else:
+                self._count("ok")
+            prompt_text = "".join(
+                m.get("content") if isinstance(m.get("content"), str) else json.dumps(m.get("content"), ensure_ascii=False)
+                for m in payload.get("messages") or []
+            )
+            prompt_tokens = estimate_tokens(prompt_text)
+            completion_tokens = estimate_tokens(content)
+            return (
+                200,
+                {
+                    "id": f"sim-{rng.getrandbits(48):012x}",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": payload.get("model") or "simulator",
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                    "usage": {
+                        "prompt_tokens": prompt_tokens,
+                        "completion_tokens": completion_tokens,
+                        "total_tokens": prompt_tokens + completion_tokens,
+                    },
+                },
+                {},
+            )
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    # ---- 输出生成 ----
+
+    def _generate(self, payload: Dict[str, Any], rng: random.Random) -> Dict[str, Any]:
+        response_format = payload.get("response_format") or {}
+        schema = payload.get("guided_json") or (response_format.get("json_schema") or {}).get("schema")
+        if isinstance(schema, dict):
+            return _from_schema(schema, rng)
+        messages = payload.get("messages") or []
+        user = messages[-1].get("content") if messages else ""
+        if isinstance(user, list):
+            user = "".join(part.get("text", "") for part in user if isinstance(part, dict))
+        user = str(user or "")
+        maxima = {name: float(score) for name, score in _RUBRIC_ITEM.findall(user)}
+        # 修复重提示中的【上次输出】本身就是不合规的结果，应以【评分结构】为准
+        skeleton = _skeleton_from_structure(user, maxima) if "【评分结构】" in user else _find_skeleton(user)
+        if skeleton is None:
+            return {"comment": _FILLER, "summary": _FILLER}
+        essay_ids = _PACKED_ESSAY.findall(user)
+        if essay_ids:
+            return {"results": [{**_fill_skeleton(skeleton, maxima, rng), "essay_id": essay_id} for essay_id in essay_ids]}
+        return _fill_skeleton(skeleton, maxima, rng)
+
+    @staticmethod
+    def _drop_item(data: Dict[str, Any]) -> bool:
+        """制造“缺少细则”的不一致输出；结构不符合评分输出时返回 False。"""
+        target = (data.get("results") or [data])[0] if isinstance(data.get("results"), list) else data
+        sections = target.get("sections") if isinstance(target, dict) else None
+        if not isinstance(sections, list) or not sections or not sections[0].get("items"):
+            return False
+        sections[0]["items"].pop()
+        return True
+
+
+def _from_schema(schema: Dict[str, Any], rng: random.Random) -> Any:
+    """按（评分规则生成的）JSON Schema 生成一个合规实例。"""
+    if "anyOf" in schema:
+        return _from_schema(schema["anyOf"][0], rng)
+    if "enum" in schema:
+        return schema["enum"][0]
+    kind = schema.get("type")
+    if kind == "object":
+        return {key: _from_schema(sub, rng) for key, sub in (schema.get("properties") or {}).items()}
+    if kind == "array":
+        items = schema.get("items") or {}
+        variants = items.get("anyOf") or [items]
+        count = int(schema.get("minItems") or len(variants))
+        return [_from_schema(variants[idx % len(variants)], rng) for idx in range(count)]
+    if kind in ("number", "integer"):
+        low = float(schema.get("minimum", 0))
+        high = float(schema.get("maximum", 10))
+        value = round(rng.uniform(low + (high - low) * 0.5, high) * 2) / 2
+        return int(value) if kind == "integer" else value
+    if kind == "boolean":
+        return True
+    return _FILLER
+
+
+def _find_skeleton(text: str) -> Optional[Dict[str, Any]]:
+    """从提示词中找出输出骨架 JSON（含 schema_version 与 sections 的对象）。"""
+    decoder = json.JSONDecoder()
+    idx = text.find('"schema_version"')
+    while idx != -1:
+        start = text.rfind("{", 0, idx)
+        if start != -1:
+            try:
+                obj, _end = decoder.raw_decode(text, start)
+            except ValueError:
+                obj = None
+            if isinstance(obj, dict) and isinstance(obj.get("sections"), list):
+                return obj
+        idx = text.find('"schema_version"', idx + 1)
+    return None
+
+
+def _skeleton_from_structure(text: str, maxima: Dict[str, float]) -> Optional[Dict[str, Any]]:
+    """从修复重提示的【评分结构】还原输出骨架。"""
+    sections: List[Dict[str, Any]] = []
+    for sec_name, _sec_max, items_text in _REPAIR_SECTION.findall(text):
+        items = []
+        for item_name, item_max in _REPAIR_ITEM.findall(items_text):
+            name = item_name.strip("、 ")
+            maxima[name] = float(item_max)
+            items.append({"name": name, "score": None, "comment": ""})
+        sections.append({"name": sec_name, "comment": "", "items": items})
+    return {"schema_version": 2, "comment": "", "sections": sections} if sections else None
+
+
+def _fill_skeleton(skeleton: Dict[str, Any], maxima: Dict[str, float], rng: random.Random) -> Dict[str, Any]:
+    """按骨架填充得分与评语：得分落在细则满分的 50%～100%，按 0.5 取整。"""
+    sections = []
+    for sec in skeleton.get("sections") or []:
+        items = []
+        for item in sec.get("items") or []:
+            top = maxima.get(str(item.get("name")), 5.0)
+            items.append({"name": item.get("name"), "score": round(rng.uniform(top * 0.5, top) * 2) / 2, "comment": _FILLER})
+        sections.append({"name": sec.get("name"), "comment": _FILLER, "items": items})
+    return {"schema_version": 2, "category_name": skeleton.get("category_name"), "comment": _FILLER, "sections": sections}
+
+
+def _sse_chunks(data: Dict[str, Any], pieces: int = 8) -> Iterator[str]:
+    """把完整响应拆成 SSE 数据块（含末尾的 usage 块与 [DONE]）。"""
+    content = data["choices"][0]["message"]["content"]
+    step = max(1, math.ceil(len(content) / pieces))
+    for offset in range(0, len(content), step):
+        chunk = {"id": data["id"], "object": "chat.completion.chunk", "choices": [{"index": 0, "delta": {"content": content[offset : offset + step]}}]}
+        yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+    yield f"data: {json.dumps({'id': data['id'], 'object': 'chat.completion.chunk', 'choices': [], 'usage': data['usage']})}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+def add_simulator_arguments(parser: argparse.ArgumentParser) -> None:
+    """模拟服务的行为参数（与 SimulatorConfig 字段一一对应），供压测脚本复用。"""
+    parser.add_argument("--seed", type=int, default=0, help="随机种子（默认：0）")
+    parser.add_argument("--latency", choices=LATENCY_DISTRIBUTIONS, default="lognormal", help="延迟分布（默认：lognormal）")
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="延迟中位数/固定值，毫秒（默认：200）")
+    parser.add_argument("--latency-spread", type=float, default=0.5, help="lognormal 的 σ 或 uniform 的 ±比例（默认：0.5）")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="返回 429 的比例（默认：0）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回 500 的比例（默认：0）")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="输出截断/非 JSON 的比例（默认：0）")
+    parser.add_argument("--mismatch-rate", type=float, default=0.0, help="输出缺少细则的比例（默认：0）")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="429 响应的 Retry-After 秒数（默认：1）")
+    parser.add_argument("--reject-json-schema", action="store_true", help="以 400 拒绝 response_format=json_schema")
+
+
+def simulator_config_from_args(args: argparse.Namespace) -> SimulatorConfig:
+    """由 add_simulator_arguments 解析出的参数构造 SimulatorConfig。"""
+    return SimulatorConfig(
+        seed=args.seed,
+        latency=args.latency,
+        latency_ms=args.latency_ms,
+        latency_spread=args.latency_spread,
+        rate_limit_rate=args.rate_limit_rate,
+        error_rate=args.error_rate,
+        malformed_rate=args.malformed_rate,
+        mismatch_rate=args.mismatch_rate,
+        retry_after_seconds=args.retry_after,
+        reject_json_schema=args.reject_json_schema,
+    )
+
+
+def create_simulator_app(config: SimulatorConfig) -> FastAPI:
+    """构造模拟服务：POST /v1/chat/completions（支持 stream），GET /stats 查看计数，POST /stats/reset 清零。"""
+    simulator = ModelSimulator(config)
+    app = FastAPI(title="模型模拟服务")
+    app.state.simulator = simulator
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.body()
+        status_code, data, headers = await simulator.handle(body)
+        if status_code == 200 and json.loads(body).get("stream"):
+            return StreamingResponse(_sse_chunks(data), media_type="text/event-stream")
+        return JSONResponse(data, status_code=status_code, headers=headers)
+
+    @app.get("/stats")
+    async def stats() -> JSONResponse:
+        return JSONResponse(simulator.snapshot())
+
+    @app.post("/stats/reset")
+    async def reset() -> JSONResponse:
+        simulator.reset()
+        return JSONResponse({"message": "计数已清零"})
+
+    return app
+
+
+@contextmanager
+def run_simulator_in_thread(config: SimulatorConfig, host: str = "127.0.0.1", port: int = 0) -> Iterator[tuple[str, ModelSimulator]]:
+    """在后台线程中启动模拟服务（port=0 时自动分配端口），返回（chat-completions 地址, 模拟器）；退出时关闭服务。"""
+    import uvicorn
+
+    app = create_simulator_app(config)
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning", access_log=False))
+    thread = threading.Thread(target=server.run, name="model-simulator", daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while not server.started:
+        if not thread.is_alive() or time.monotonic() > deadline:
+            raise RuntimeError("模型模拟服务启动失败")
+        time.sleep(0.01)
+    bound_port = server.servers[0].sockets[0].getsockname()[1]
+    try:
+        yield f"http://{host}:{bound_port}/v1/chat/completions", app.state.simulator
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
@@ -15,6 +15,140 @@ TEMPLATE_DIR: Final[Path] = BASE_DIR / "app" / "templates"
 # 默认模型请求超时（秒），按“5 分钟 / 人”预留足够评分时间
 DEFAULT_MODEL_TIMEOUT: Final[int] = 300
 
+# 模型接口连接池：按“协议+主机”共享长连接，服务端支持时启用 HTTP/2
+MODEL_HTTP2_ENABLED: Final[bool] = True
+MODEL_MAX_CONNECTIONS: Final[int] = 64
+MODEL_MAX_KEEPALIVE_CONNECTIONS: Final[int] = 32
+MODEL_KEEPALIVE_EXPIRY: Final[float] = 60.0
+
+# 文件级并发（同时处理的作业文件数）
+FILE_CONCURRENCY: Final[int] = 16
+
+# 全局调度：文件名额与模型并发名额在并发批次之间按权重加权公平排队，主评分调用严格优先于总体评语调用
+SCHEDULER_BATCH_WEIGHT: Final[float] = 1.0
+# 保留最近结束批次的排队统计条数（GET /api/limits 展示）
+SCHEDULER_STATS_KEEP: Final[int] = 20
+
+# 模型端点自适应并发（AIMD）：健康时加性增，遇 429/5xx/超时乘性减
+MODEL_CONCURRENCY_INITIAL: Final[int] = 2
+MODEL_CONCURRENCY_FLOOR: Final[int] = 1
+MODEL_CONCURRENCY_CEILING: Final[int] = 32
+MODEL_CONCURRENCY_WINDOW: Final[int] = 50
+MODEL_LATENCY_P95_TARGET_MS: Final[float] = 120_000.0
+MODEL_ERROR_RATE_THRESHOLD: Final[float] = 0.1
+MODEL_CONCURRENCY_DECREASE_FACTOR: Final[float] = 0.5
+MODEL_CONCURRENCY_DECREASE_COOLDOWN: Final[float] = 5.0
+
+# 模型端点限流（令牌桶）：0 表示不预设额度，改从响应头 x-ratelimit-* 自动学习
+MODEL_RATE_LIMIT_RPM: Final[int] = 0
+MODEL_RATE_LIMIT_TPM: Final[int] = 0
+# 按端点（协议://主机）单独配置 (每分钟请求数, 每分钟 Token 数)
+MODEL_RATE_LIMITS: Final[dict[str, tuple[int, int]]] = {}
+# 单次 Retry-After 最长暂停秒数，避免异常响应头让批次长时间挂起
+MODEL_RETRY_AFTER_MAX_SECONDS: Final[float] = 120.0
+# 预扣 Token 额度时对模型输出长度的估计
+MODEL_OUTPUT_TOKENS_ESTIMATE: Final[int] = 2048
+
+# 重试策略（按错误类型）：最大尝试次数与指数退避参数（全抖动，单位：秒）
+MODEL_RETRY_POLICIES: Final[dict[str, dict[str, float]]] = {
+    "call": {"max_attempts": 3, "base_delay": 1.0, "max_delay": 30.0},
+    "parse": {"max_attempts": 3, "base_delay": 0.5, "max_delay": 5.0},
+}
+# 批次重试预算：允许的重试总数 = 保底次数 + 比例 × 首次请求数
+MODEL_RETRY_BUDGET_RATIO: Final[float] = 0.2
+MODEL_RETRY_BUDGET_MIN: Final[int] = 10
+# 单个文件（含全部模型与重试）的总时限（秒）
+FILE_DEADLINE_SECONDS: Final[float] = 900.0
+
+# 模型响应缓存（SQLite，位于 data/cache）：条目数与总字节数上限，超出后按最近访问时间淘汰
+RESPONSE_CACHE_ENABLED: Final[bool] = True
+RESPONSE_CACHE_MAX_ENTRIES: Final[int] = 20000
+RESPONSE_CACHE_MAX_BYTES: Final[int] = 512 * 1024 * 1024
+
+# 提示词前缀缓存提示：auto 按接口地址/模型名推断；也可按端点（scheme://host）指定 openai / cache_control / none
+MODEL_PROMPT_CACHE_HINTS: Final[bool] = True
+MODEL_PROMPT_CACHE_STYLES: Final[dict[str, str]] = {}
+
+# 熔断：同一端点连续 N 次调用类失败（连接失败/超时/5xx）后熔断，期间快速失败；到期后放行单个试探请求
+MODEL_BREAKER_FAILURE_THRESHOLD: Final[int] = 5
+MODEL_BREAKER_OPEN_SECONDS: Final[float] = 30.0
+
+# 批量接口模式（OpenAI 兼容 /v1/batches）：轮询间隔、完成时限与最长等待时间
+MODEL_BATCH_POLL_INTERVAL_SECONDS: Final[float] = 30.0
+MODEL_BATCH_COMPLETION_WINDOW: Final[str] = "24h"
+MODEL_BATCH_MAX_WAIT_SECONDS: Final[float] = 26 * 3600.0
+
+# 多份作业合并批改：单次请求最多合并的份数、可参与合并的正文长度上限（字符）与凑批等待时间
+MODEL_PACK_MAX_SIZE: Final[int] = 8
+MODEL_PACK_MAX_CHARS: Final[int] = 4000
+MODEL_PACK_FLUSH_DELAY_SECONDS: Final[float] = 1.0
+
+# 对冲请求：主模型超过其近期 p90 延迟仍未返回时，向备用端点发送重复请求；样本不足时使用默认等待
+MODEL_HEDGE_QUANTILE: Final[float] = 0.9
+MODEL_HEDGE_MIN_DELAY_SECONDS: Final[float] = 2.0
+MODEL_HEDGE_DEFAULT_DELAY_SECONDS: Final[float] = 60.0
+MODEL_HEDGE_MIN_SAMPLES: Final[int] = 5
+
+# 共识模式：先调用前两个模型，分差不超过“目标满分 × 该比例”即采用，否则才启用下一个模型仲裁
+MODEL_CONSENSUS_TOLERANCE: Final[float] = 0.05
+
+# 长文预检：模型上下文窗口（Token，端点未配置 context_window 时按模型名最长前缀匹配，未匹配用默认值）
+MODEL_CONTEXT_WINDOW_DEFAULT: Final[int] = 32768
+MODEL_CONTEXT_WINDOWS: Final[dict[str, int]] = {
+    "deepseek": 65536,
+    "qwen": 131072,
+    "glm-4": 131072,
+    "moonshot-v1-8k": 8192,
+    "moonshot-v1-32k": 32768,
+    "moonshot-v1-128k": 131072,
+    "gpt-4o": 128000,
+    "gpt-4.1": 1047576,
+}
+# 预留给计算误差的 Token；无论上下文窗口多大，单篇正文最多发送的 Token（避免超长作业长时间占用并发槽位）
+MODEL_CONTEXT_SAFETY_TOKENS: Final[int] = 1024
+LONG_ESSAY_MAX_TOKENS: Final[int] = 24000
+# 超长作业处理：首尾截断时保留开头的比例；分段摘要时每段 Token 数与最多段数
+LONG_ESSAY_HEAD_RATIO: Final[float] = 0.7
+LONG_ESSAY_CHUNK_TOKENS: Final[int] = 8000
+LONG_ESSAY_MAX_CHUNKS: Final[int] = 12
+
+# 模型输出 JSON 有界修复：超过该长度（字符）的输出不做修复，直接按解析失败处理
+MODEL_JSON_REPAIR_MAX_CHARS: Final[int] = 200_000
+
+# 模型单价表（每百万 Token，按模型名精确匹配或最长前缀匹配）；服务商未返回 usage 时按本地估算计费
+MODEL_PRICES_PATH: Final[Path] = BASE_DIR / "config" / "model_prices.json"
+
+
+# 修复重提示：模型输出与评分规则不一致时，先只发送上次的 JSON 与校验错误请求更正（不重发作业正文），
+# 每次评分尝试最多修复的次数；仍失败时才按解析失败重试整篇评分
+MODEL_REPAIR_ATTEMPTS: Final[int] = 1
+
+# 结构化输出：按评分规则生成严格 JSON Schema，随评分请求下发（response_format json_schema / vLLM guided_json / json_object）；
+# 可按端点（scheme://host[:port]）强制指定方式：json_schema、guided_json、json_object、none；
+# 端点以 400/422 拒绝且错误信息指向结构化输出参数时自动降级（json_schema/guided_json → json_object → none）并记住结果
+MODEL_STRUCTURED_OUTPUT: Final[bool] = True
+MODEL_STRUCTURED_OUTPUT_STYLES: Final[dict[str, str]] = {}
+# 降级结果的有效期（秒）：到期后重新按原方式试探，避免一次误判长期关闭结构化输出
+MODEL_STRUCTURED_DOWNGRADE_TTL_SECONDS: Final[float] = 1800.0
+
+# 批次内重复提交合并：正文（规范化后）与分类完全相同的文件只调用一次模型，其余复用结果并在 Excel 中标注
+DEDUP_IDENTICAL_SUBMISSIONS: Final[bool] = True
+
+# 后台批改任务：同时运行的批次数（其余按提交顺序排队）与内存中保留的已结束任务数
+JOB_MAX_RUNNING: Final[int] = 2
+JOB_HISTORY_KEEP: Final[int] = 50
+# 进度事件流（SSE）在没有新事件时推送计数/排队深度的间隔（秒）
+JOB_EVENTS_HEARTBEAT_SECONDS: Final[float] = 5.0
+
+# 批次断点日志：每个文件完成即追加写入批次目录的 journal.jsonl，写入后是否 fsync（关闭时仅 flush，断电可能丢失最近几行）
+JOURNAL_FSYNC: Final[bool] = True
+
+# CPU 密集步骤（文档解析、docx 格式校验、正文哈希）的进程池大小；0 表示在事件循环线程内直接执行
+CPU_POOL_WORKERS: Final[int] = 2
+# 事件循环延迟监测：采样间隔（秒）与保留的最近采样数
+LOOP_LAG_INTERVAL_SECONDS: Final[float] = 0.1
+LOOP_LAG_WINDOW: Final[int] = 3000
+
 
 def ensure_directories() -> None:
     """确保运行所需的目录存在，缺失时自动创建。"""
@@ -0,0 +1,90 @@
+"""模型输出解析微基准：比较标准库 json / orjson 解码、提取与修复、预编译校验器在 5–20 KB 输出上的耗时。"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Callable
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+from app.service import output_parser
+from app.service.output_parser import RubricValidator, compile_rubric_validator, extract_json_object, repair_json
+from app.service.prompt_builder import RubricExpected, RubricItem, RubricSection
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="模型输出 JSON 解析与校验微基准")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5, 10, 20], help="输出大小（KB，默认：5 10 20）")
+    parser.add_argument("--rounds", type=int, default=300, help="每项重复次数（默认：300）")
+    return parser.parse_args()
+
+
+def _build_sample(size_kb: int) -> tuple[RubricExpected, str]:
+    """按目标大小构造评分规则与对应的模型输出（评语长度决定体积）。"""
+    sections = [
+        RubricSection(
+            name=f"维度{s}",
+            max_score=20.0,
+            items=[RubricItem(name=f"细则{s}-{i}", max_score=5.0) for i in range(1, 5)],
+        )
+        for s in range(1, 6)
+    ]
+    expected = RubricExpected(category_name="职业规划书", rubric_max=100.0, sections=sections)
+    # 20 条细则评语 + 5 条维度评语 + 总评，按 UTF-8 中文 3 字节估算，扣除键名与缩进的开销
+    per_comment = max(10, (size_kb * 1024 - 2800) // 3 // 26)
+    comment = ("论述较完整但缺少数据支撑" * (per_comment // 12 + 1))[:per_comment]
+    data = {
+        "schema_version": 2,
+        "comment": comment,
+        "sections": [
+            {
+                "name": sec.name,
+                "comment": comment,
+                "items": [{"name": item.name, "score": 4, "comment": comment} for item in sec.items],
+            }
+            for sec in sections
+        ],
+    }
+    return expected, json.dumps(data, ensure_ascii=False, indent=2)
+
+
+def _time_us(func: Callable[[], object], rounds: int) -> float:
+    func()
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func()
+    return (time.perf_counter() - start) / rounds * 1e6
+
+
+def main() -> int:
+    args = _parse_args()
+    print(f"orjson 可用：{output_parser._ORJSON_AVAILABLE}")
+    for size_kb in args.sizes:
+        expected, text = _build_sample(size_kb)
+        data = json.loads(text)
+        fenced = f"以下是评分结果：\n```json\n{text}\n```"
+        trailing = text.replace('\n        }', ',\n        }')
+        truncated = text[: int(len(text) * 0.9)]
+        cases: list[tuple[str, Callable[[], object]]] = [
+            ("json.loads", lambda: json.loads(text)),
+            ("output_parser.loads", lambda: output_parser.loads(text)),
+            ("提取（直接 JSON）", lambda: extract_json_object(text)),
+            ("提取（代码块）", lambda: extract_json_object(fenced)),
+            ("修复（多余逗号）", lambda: repair_json(trailing)),
+            ("修复（截断）", lambda: repair_json(truncated)),
+            ("校验（每次构建）", lambda: RubricValidator(expected).normalize(data, 100.0)),
+            ("校验（预编译）", lambda: compile_rubric_validator(expected).normalize(data, 100.0)),
+        ]
+        print(f"\n输出大小：{len(text.encode('utf-8')) / 1024:.1f} KB")
+        for label, func in cases:
+            print(f"  {label:<20}{_time_us(func, args.rounds):>10.1f} µs/次")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
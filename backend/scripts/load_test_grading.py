@@ -0,0 +1,104 @@
+"""端到端压测：启动离线模型模拟服务，生成一批合成作业，经 GradingService.process 走完整调用链路并输出吞吐与故障统计。"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import io
+import statistics
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+from docx import Document
+from fastapi import UploadFile
+
+from app.model.schemas import GradeConfig
+from app.service.cpu_pool import configure_cpu_pool, cpu_pool_snapshot
+from app.service.grading_service import GradingService
+from app.service.loop_monitor import loop_lag_snapshot
+from app.util.model_simulator import add_simulator_arguments, run_simulator_in_thread, simulator_config_from_args
+
+_DIGITS = "零一二三四五六七八九"
+_PARAGRAPH = "我的职业目标是成为一名软件工程师。为此我制定了分阶段的学习计划，包括课程学习、项目实践与实习经历，并定期复盘调整。"
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="GradingService 端到端压测（离线模型模拟服务）")
+    parser.add_argument("--files", type=int, default=50, help="合成作业份数（默认：50）")
+    parser.add_argument("--paragraphs", type=int, default=20, help="每份作业的段落数（默认：20）")
+    parser.add_argument("--stream", action="store_true", help="以流式方式调用模型")
+    parser.add_argument("--pack-size", type=int, default=0, help="合并批改份数（默认：0，不合并）")
+    parser.add_argument("--docx", action="store_true", help="生成 .docx 作业（解析开销更接近真实场景）")
+    parser.add_argument("--cpu-workers", type=int, default=None, help="解析进程池大小（默认取 CPU_POOL_WORKERS，0 表示在事件循环内解析）")
+    add_simulator_arguments(parser)
+    return parser.parse_args()
+
+
+def synthetic_uploads(count: int, paragraphs: int, *, docx: bool = False) -> list[UploadFile]:
+    """生成 count 份文件名符合“班级+姓名+学号+作业类型”约定的 .txt（或 .docx）作业。"""
+    uploads = []
+    for idx in range(1, count + 1):
+        name = "学生" + "".join(_DIGITS[int(d)] for d in f"{idx:03d}")
+        # 每份正文带上学生姓名，避免被批次内重复提交合并
+        lines = [name] + [f"第{p}段：{_PARAGRAPH}" for p in range(1, paragraphs + 1)]
+        if docx:
+            document = Document()
+            for line in lines:
+                document.add_paragraph(line)
+            buffer = io.BytesIO()
+            document.save(buffer)
+            data, suffix = buffer.getvalue(), "docx"
+        else:
+            data, suffix = "\n".join(lines).encode("utf-8"), "txt"
+        file_name = f"25压测1班+{name}+2025{idx:08d}+职业规划书.{suffix}"
+        uploads.append(UploadFile(file=io.BytesIO(data), filename=file_name))
+    return uploads
+
+
+def main() -> int:
+    args = _parse_args()
+    if args.cpu_workers is not None:
+        configure_cpu_pool(args.cpu_workers)
+    with run_simulator_in_thread(simulator_config_from_args(args)) as (api_url, simulator):
+        config = GradeConfig(
+            api_url=api_url,
+            api_key="simulator",
+            model_name="simulator-model",
+            template="职业规划书",
+            skip_format_check=True,
+            bypass_cache=True,
+            stream=args.stream,
+            pack_size=args.pack_size,
+        )
+        started = time.perf_counter()
+        result = asyncio.run(GradingService().process(synthetic_uploads(args.files, args.paragraphs, docx=args.docx), config))
+        elapsed = time.perf_counter() - started
+        stats = simulator.snapshot()
+
+    latencies = [r.get("latency_ms") or 0 for item in result.items for r in (item.grader_results or [])]
+    attempts = [r.get("attempts") or 0 for item in result.items for r in (item.grader_results or [])]
+    print(f"批次：{result.batch_id}（{result.total_files} 份，成功 {result.success_count}，失败 {result.error_count}）")
+    print(f"耗时：{elapsed:.2f} 秒；吞吐：{result.total_files / elapsed:.2f} 份/秒")
+    if latencies:
+        ordered = sorted(latencies)
+        print(
+            "单文件模型耗时：p50={:.0f}ms p90={:.0f}ms max={:.0f}ms；平均尝试次数={:.2f}".format(
+                statistics.median(ordered), ordered[int(len(ordered) * 0.9) - 1 if len(ordered) > 1 else 0], ordered[-1], statistics.mean(attempts)
+            )
+        )
+    lag = loop_lag_snapshot()
+    print(
+        "事件循环延迟：p50={p50_ms}ms p95={p95_ms}ms max={max_ms}ms（采样 {samples} 次）；解析进程池={workers} 进程".format(
+            **lag, workers=cpu_pool_snapshot()["workers"]
+        )
+    )
+    print(f"模拟服务：峰值在途={stats['peak_in_flight']}；计数={stats['counters']}")
+    return 0 if result.error_count == 0 else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,34 @@
+"""启动离线模型模拟服务（OpenAI 兼容 /v1/chat/completions），用于本地联调与压测。"""
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+from app.util.model_simulator import add_simulator_arguments, create_simulator_app, simulator_config_from_args
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="离线模型模拟服务（OpenAI 兼容）")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址（默认：127.0.0.1）")
+    parser.add_argument("--port", type=int, default=18089, help="监听端口（默认：18089）")
+    add_simulator_arguments(parser)
+    return parser.parse_args()
+
+
+def main() -> int:
+    import uvicorn
+
+    args = _parse_args()
+    app = create_simulator_app(simulator_config_from_args(args))
+    print(f"模拟服务地址：http://{args.host}:{args.port}/v1/chat/completions（计数：GET /stats）")
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,24 @@
+"""测试共用夹具。"""
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+import pytest
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+from app.service import ai_client as ai_client_module
+from app.util import audit_logger
+from app.util.files import storage
+
+
+@pytest.fixture()
+def isolated(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """上传目录与审计日志写入临时目录，并关闭响应缓存，避免测试之间互相复用结果。"""
+    monkeypatch.setattr(storage, "UPLOAD_DIR", tmp_path / "uploads")
+    monkeypatch.setattr(audit_logger, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(ai_client_module, "RESPONSE_CACHE_ENABLED", False)
+    return tmp_path
@@ -0,0 +1,148 @@
+"""批量接口模式（/v1/batches）单元测试：使用本地桩服务模拟 OpenAI 兼容接口。"""
+from __future__ import annotations
+
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+from app.service import ai_client as ai_client_module
+from app.service import batch_api as batch_api_module
+from app.service.ai_client import AIClient
+from app.service.batch_api import BatchCollector, OpenAIBatchClient, split_chat_url
+from app.service.prompt_builder import RubricExpected, RubricItem, RubricSection
+from app.service.retry_policy import RetryPolicy
+
+EXPECTED = RubricExpected(
+    category_name="职业规划书",
+    rubric_max=10.0,
+    sections=[RubricSection(name="维度A", max_score=10.0, items=[RubricItem(name="细则A", max_score=10.0)])],
+)
+API_URL = "http://batch-stub/v1/chat/completions"
+
+
+def _output(score: float) -> str:
+    return json.dumps(
+        {
+            "schema_version": 2,
+            "comment": "总体较好",
+            "sections": [{"name": "维度A", "comment": "较好", "items": [{"name": "细则A", "score": score, "comment": "原因"}]}],
+        },
+        ensure_ascii=False,
+    )
+
+
+class BatchStub:
+    """最小化的 OpenAI 兼容批量接口桩：第一次查询返回 in_progress，第二次返回 completed。"""
+
+    def __init__(self) -> None:
+        self.files: dict[str, str] = {}
+        self.batches: dict[str, dict] = {}
+        self.chat_calls = 0
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        if path == "/v1/files" and request.method == "POST":
+            body = request.content.decode("utf-8")
+            jsonl = body[body.index("{") : body.rindex("}") + 1]
+            file_id = f"file-{len(self.files) + 1}"
+            self.files[file_id] = jsonl
+            return httpx.Response(200, json={"id": file_id})
+        if path == "/v1/batches" and request.method == "POST":
+            spec = json.loads(request.content)
+            batch_id = f"batch-{len(self.batches) + 1}"
+            self.batches[batch_id] = {"id": batch_id, "status": "validating", "spec": spec, "polls": 0}
+            return httpx.Response(200, json={"id": batch_id, "status": "validating"})
+        if path.startswith("/v1/batches/"):
+            batch = self.batches[path.rsplit("/", 1)[-1]]
+            batch["polls"] += 1
+            if batch["polls"] < 2:
+                return httpx.Response(200, json={"id": batch["id"], "status": "in_progress"})
+            out_lines = []
+            for line in self.files[batch["spec"]["input_file_id"]].splitlines():
+                req = json.loads(line)
+                score = 9 if "甲" in req["body"]["messages"][1]["content"] else 6
+                out_lines.append(
+                    json.dumps(
+                        {
+                            "custom_id": req["custom_id"],
+                            "response": {"status_code": 200, "body": {"choices": [{"message": {"content": _output(score)}}]}},
+                        },
+                        ensure_ascii=False,
+                    )
+                )
+            self.files["file-out"] = "\n".join(out_lines)
+            return httpx.Response(
+                200, json={"id": batch["id"], "status": "completed", "output_file_id": "file-out", "request_counts": {"total": len(out_lines)}}
+            )
+        if path.startswith("/v1/files/") and path.endswith("/content"):
+            return httpx.Response(200, text=self.files[path.split("/")[3]])
+        if path == "/v1/chat/completions":
+            self.chat_calls += 1
+            return httpx.Response(200, json={"choices": [{"message": {"content": _output(5)}}]})
+        return httpx.Response(404)
+
+
+@pytest.fixture()
+def stub(monkeypatch: pytest.MonkeyPatch) -> BatchStub:
+    server = BatchStub()
+
+    async def fake_client(_api_url: str | None) -> httpx.AsyncClient:
+        return httpx.AsyncClient(transport=httpx.MockTransport(server.handler))
+
+    monkeypatch.setattr(ai_client_module, "get_http_client", fake_client)
+    monkeypatch.setattr(batch_api_module, "get_http_client", fake_client)
+    monkeypatch.setattr(ai_client_module, "RESPONSE_CACHE_ENABLED", False)
+    return server
+
+
+def test_split_chat_url() -> None:
+    assert split_chat_url("https://api.openai.com/v1/chat/completions") == ("https://api.openai.com/v1", "/v1/chat/completions")
+
+
+def test_batch_results_flow_through_normalize(stub: BatchStub) -> None:
+    def fast_client(api_url: str, headers: dict) -> OpenAIBatchClient:
+        return OpenAIBatchClient(api_url, headers, poll_interval=0.0)
+
+    async def scenario() -> list:
+        # 3 个调用名额：2 个登记请求，1 个模拟缓存命中直接作废
+        collector = BatchCollector(3, client_factory=fast_client)
+        clients = [AIClient(API_URL, "k", "m", batch_ticket=collector.ticket()) for _ in range(2)]
+        collector.ticket().settle()
+        results = await asyncio.gather(
+            clients[0].grade("学生甲的正文", "系统", "模板 {{HOMEWORK_TEXT}}", EXPECTED, 60.0),
+            clients[1].grade("学生乙的正文", "系统", "模板 {{HOMEWORK_TEXT}}", EXPECTED, 60.0),
+        )
+        assert collector.snapshot()["submitted"] == 2
+        assert collector.batches[0]["status"] == "completed"
+        return [normalized["score"] for _raw, _parsed, normalized in results]
+
+    assert asyncio.run(scenario()) == [54.0, 36.0]
+    assert len(stub.batches) == 1
+    assert stub.chat_calls == 0
+    assert stub.batches["batch-1"]["spec"]["endpoint"] == "/v1/chat/completions"
+
+
+def test_batch_failure_falls_back_to_online_call(stub: BatchStub, monkeypatch: pytest.MonkeyPatch) -> None:
+    class BrokenClient(OpenAIBatchClient):
+        async def run(self, requests: list[dict]):
+            raise batch_api_module.BatchApiError("桩服务不可用")
+
+    monkeypatch.setattr(ai_client_module, "get_retry_policy", lambda kind: RetryPolicy(max_attempts=3, base_delay=0.0, max_delay=0.0))
+
+    async def scenario() -> float:
+        collector = BatchCollector(1, client_factory=BrokenClient)
+        client = AIClient(API_URL, "k", "m", batch_ticket=collector.ticket())
+        _raw, _parsed, normalized = await client.grade("正文", "系统", "模板 {{HOMEWORK_TEXT}}", EXPECTED, 60.0)
+        assert collector.snapshot()["failed"] == 1
+        return normalized["score"]
+
+    assert asyncio.run(scenario()) == 30.0
+    assert stub.chat_calls == 1
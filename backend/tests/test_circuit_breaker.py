@@ -0,0 +1,115 @@
+"""模型端点熔断器单元测试。"""
+from __future__ import annotations
+
+import asyncio
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+from app.service import ai_client as ai_client_module
+from app.service.ai_client import AIClient, ModelError
+from app.service.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError, get_circuit_breaker
+from app.service.retry_policy import RetryPolicy
+
+
+def test_trips_after_consecutive_failures() -> None:
+    breaker = CircuitBreaker("http://a", failure_threshold=3, open_seconds=60)
+    for _ in range(2):
+        breaker.before_call()
+        breaker.record_failure()
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.consecutive_failures == 0
+    for _ in range(3):
+        breaker.before_call()
+        breaker.record_failure()
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    assert breaker.snapshot()["rejected_count"] == 1
+
+
+def test_half_open_allows_single_probe() -> None:
+    breaker = CircuitBreaker("http://a", failure_threshold=1, open_seconds=0.0)
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert breaker.before_call() is True
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == OPEN and breaker.trip_count == 2
+    assert breaker.before_call() is True
+    breaker.record_success()
+    assert breaker.state == CLOSED
+
+
+def test_cancelled_probe_releases_slot() -> None:
+    breaker = CircuitBreaker("http://a", failure_threshold=1, open_seconds=0.0)
+    breaker.record_failure()
+    is_probe = breaker.before_call()
+    breaker.release(is_probe)
+    assert breaker.before_call() is True
+
+
+def test_open_breaker_fails_fast_without_network(monkeypatch: pytest.MonkeyPatch) -> None:
+    calls: list[int] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(1)
+        return httpx.Response(503)
+
+    async def fake_client(_api_url: str | None) -> httpx.AsyncClient:
+        return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    monkeypatch.setattr(ai_client_module, "get_http_client", fake_client)
+    monkeypatch.setattr(ai_client_module, "get_retry_policy", lambda kind: RetryPolicy(max_attempts=3, base_delay=0.0, max_delay=0.0))
+    url = "http://breaker-test/v1/chat/completions"
+    breaker = get_circuit_breaker(url)
+    breaker.failure_threshold = 2
+    breaker.open_seconds = 60.0
+
+    client = AIClient(url, "k", "m")
+    with pytest.raises(ModelError):
+        asyncio.run(client.chat_json(system_prompt="s", user_prompt="u"))
+    assert breaker.state == OPEN
+    assert len(calls) == 2
+    assert client.stats["attempts"] == 3
+
+    with pytest.raises(ModelError) as exc_info:
+        asyncio.run(client.chat_json(system_prompt="s", user_prompt="u"))
+    assert "熔断" in str(exc_info.value)
+    assert exc_info.value.retryable is False
+    assert len(calls) == 2
+
+
+@pytest.mark.parametrize("stream", [False, True])
+@pytest.mark.parametrize("status_code, breaker_failures", [(500, 1), (429, 0)])
+def test_error_status_recorded_once_in_both_modes(
+    monkeypatch: pytest.MonkeyPatch, stream: bool, status_code: int, breaker_failures: int
+) -> None:
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(status_code, json={"error": {"message": "x"}})
+
+    async def fake_client(_api_url: str | None) -> httpx.AsyncClient:
+        return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    monkeypatch.setattr(ai_client_module, "get_http_client", fake_client)
+    monkeypatch.setattr(ai_client_module, "get_retry_policy", lambda kind: RetryPolicy(max_attempts=1, base_delay=0.0, max_delay=0.0))
+    url = f"http://breaker-status-{status_code}-{int(stream)}/v1/chat/completions"
+    breaker = get_circuit_breaker(url)
+
+    client = AIClient(url, "k", "m", stream=stream)
+    with pytest.raises(ModelError):
+        asyncio.run(client.chat_json(system_prompt="s", user_prompt="u"))
+    # 429 说明端点可达，不计入熔断；5xx 只计一次
+    assert breaker.consecutive_failures == breaker_failures
+    assert breaker.state == CLOSED
+
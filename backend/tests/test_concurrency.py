@@ -0,0 +1,104 @@
+"""自适应并发限制器（AIMD）单元测试。"""
+from __future__ import annotations
+
+import asyncio
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+from app.service import ai_client as ai_client_module
+from app.service.ai_client import AIClient, ModelError
+from app.service.concurrency import AdaptiveLimiter, get_model_limiter
+from app.service.retry_policy import RetryPolicy
+
+
+def _limiter(**kwargs) -> AdaptiveLimiter:
+    params = dict(initial=2, floor=1, ceiling=8, window=20, latency_p95_target_ms=1000.0, error_rate_threshold=0.2, decrease_cooldown=0.0)
+    params.update(kwargs)
+    return AdaptiveLimiter("http://test", **params)
+
+
+def test_limit_grows_when_saturated_and_healthy() -> None:
+    limiter = _limiter()
+    for _ in range(40):
+        limiter.in_flight = limiter.current_limit
+        limiter.record_success(100.0)
+    assert limiter.current_limit > 2
+    assert limiter.current_limit <= 8
+
+
+def test_limit_does_not_grow_when_unsaturated() -> None:
+    limiter = _limiter()
+    for _ in range(40):
+        limiter.in_flight = 0
+        limiter.record_success(100.0)
+    assert limiter.current_limit == 2
+
+
+def test_limit_does_not_grow_when_latency_unhealthy() -> None:
+    limiter = _limiter()
+    for _ in range(40):
+        limiter.in_flight = limiter.current_limit
+        limiter.record_success(5000.0)
+    assert limiter.current_limit == 2
+
+
+def test_overload_halves_limit_and_respects_floor() -> None:
+    limiter = _limiter(initial=8)
+    limiter.record_failure(overload=True)
+    assert limiter.current_limit == 4
+    for _ in range(10):
+        limiter.record_failure(overload=True)
+    assert limiter.current_limit == 1
+
+
+def test_non_overload_failure_keeps_limit() -> None:
+    limiter = _limiter(initial=4)
+    limiter.record_failure(overload=False)
+    assert limiter.current_limit == 4
+    assert limiter.snapshot()["total_failure"] == 1
+
+
+def test_acquire_blocks_beyond_limit() -> None:
+    async def scenario() -> None:
+        limiter = _limiter(initial=1)
+        await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        assert not waiter.done()
+        assert limiter.snapshot()["waiting"] == 1
+        limiter.release()
+        await asyncio.wait_for(waiter, timeout=1)
+        assert limiter.in_flight == 1
+        limiter.release()
+        assert limiter.in_flight == 0
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("stream", [False, True])
+@pytest.mark.parametrize("status_code", [500, 429])
+def test_error_status_counted_once_as_overload(monkeypatch: pytest.MonkeyPatch, stream: bool, status_code: int) -> None:
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(status_code, json={"error": {"message": "x"}})
+
+    async def fake_client(_api_url: str | None) -> httpx.AsyncClient:
+        return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    monkeypatch.setattr(ai_client_module, "get_http_client", fake_client)
+    monkeypatch.setattr(ai_client_module, "get_retry_policy", lambda kind: RetryPolicy(max_attempts=1, base_delay=0.0, max_delay=0.0))
+    url = f"http://limiter-status-{status_code}-{int(stream)}/v1/chat/completions"
+    limiter = get_model_limiter(url)
+
+    client = AIClient(url, "k", "m", stream=stream)
+    with pytest.raises(ModelError):
+        asyncio.run(client.chat_json(system_prompt="s", user_prompt="u"))
+    snapshot = limiter.snapshot()
+    assert snapshot["total_failure"] == 1
+    assert snapshot["total_overload"] == 1
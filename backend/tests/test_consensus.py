@@ -0,0 +1,75 @@
+"""多模型共识模式单元测试。"""
+from __future__ import annotations
+
+import asyncio
+import sys
+from pathlib import Path
+from typing import Optional
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+from app.service.consensus import ConsensusStats, find_agreement, run_consensus
+
+
+def _launcher(delay: float, score: Optional[float], log: list[str], name: str):
+    async def run() -> dict:
+        log.append(f"start:{name}")
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            log.append(f"cancel:{name}")
+            raise
+        log.append(f"end:{name}")
+        return {"name": name, "score": score}
+
+    return run
+
+
+def _run(launchers, stats: ConsensusStats, tolerance: float = 3.0):
+    return asyncio.run(run_consensus(launchers, tolerance=tolerance, score_of=lambda r: r["score"], stats=stats))
+
+
+def test_find_agreement_picks_closest_pair() -> None:
+    assert find_agreement({0: 40.0, 1: 50.0, 2: 48.5}, 3.0) == (1, 2)
+    assert find_agreement({0: 40.0, 1: 50.0}, 3.0) is None
+    assert find_agreement({0: 40.0}, 3.0) is None
+
+
+def test_agreement_skips_third_model() -> None:
+    log: list[str] = []
+    stats = ConsensusStats()
+    results, agreed = _run([_launcher(0.01, 45, log, "a"), _launcher(0.02, 47, log, "b"), _launcher(0.01, 10, log, "c")], stats)
+    assert agreed == (0, 1)
+    assert [r["name"] for r in results] == ["a", "b"]
+    assert "start:c" not in log
+    snapshot = stats.snapshot()
+    assert snapshot["agreed_first"] == 1 and snapshot["skipped_calls"] == 1
+
+
+def test_disagreement_runs_tiebreaker() -> None:
+    log: list[str] = []
+    stats = ConsensusStats()
+    results, agreed = _run([_launcher(0.01, 30, log, "a"), _launcher(0.01, 50, log, "b"), _launcher(0.01, 49, log, "c")], stats)
+    assert agreed == (1, 2)
+    assert len(results) == 3
+    snapshot = stats.snapshot()
+    assert snapshot["tiebreaks"] == 1 and snapshot["agreed_after_tiebreak"] == 1 and snapshot["skipped_calls"] == 0
+
+
+def test_failure_launches_next_model_immediately() -> None:
+    log: list[str] = []
+    stats = ConsensusStats()
+    results, agreed = _run([_launcher(0.5, 40, log, "a"), _launcher(0.01, None, log, "b"), _launcher(0.01, 41, log, "c")], stats)
+    # b 失败后立即启用 c，而不是等 a 返回
+    assert log.index("start:c") < log.index("end:a") and agreed == (0, 2)
+    assert [r["name"] for r in results] == ["a", "b", "c"]
+
+
+def test_no_agreement_returns_all_results() -> None:
+    log: list[str] = []
+    stats = ConsensusStats()
+    results, agreed = _run([_launcher(0.01, 10, log, "a"), _launcher(0.01, 30, log, "b"), _launcher(0.01, 50, log, "c")], stats)
+    assert agreed is None and len(results) == 3
+    assert stats.snapshot()["no_agreement"] == 1
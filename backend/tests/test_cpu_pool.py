@@ -0,0 +1,76 @@
+"""解析进程池与事件循环延迟监测单元测试。"""
+from __future__ import annotations
+
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import pytest
+from docx import Document
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+from app.service import cpu_pool
+from app.service.cpu_pool import configure_cpu_pool, cpu_pool_snapshot, prepare_document, run_cpu_bound
+from app.service.dedup import essay_fingerprint
+from app.service.loop_monitor import ensure_loop_monitor, loop_lag_snapshot
+from config.settings import CPU_POOL_WORKERS
+
+
+@pytest.fixture()
+def pool_workers():
+    yield configure_cpu_pool
+    configure_cpu_pool(CPU_POOL_WORKERS)
+
+
+def _docx(path: Path, paragraphs: int) -> Path:
+    document = Document()
+    for idx in range(paragraphs):
+        document.add_paragraph(f"第{idx}段：我的职业目标是成为一名嵌入式工程师，并为此制定了学习计划。")
+    document.save(str(path))
+    return path
+
+
+@pytest.mark.parametrize("workers", [1, 0])
+def test_prepare_document_in_pool_and_inline(tmp_path: Path, pool_workers, workers: int) -> None:
+    pool_workers(workers)
+    good = _docx(tmp_path / "good.docx", 30)
+    short = _docx(tmp_path / "short.docx", 0)
+
+    async def scenario() -> cpu_pool.PreparedDocument:
+        prepared = await run_cpu_bound(prepare_document, str(good), 50, None, "career_plan")
+        with pytest.raises(ValueError):
+            await run_cpu_bound(prepare_document, str(short), 50, None, None)
+        return prepared
+
+    before = cpu_pool_snapshot()
+    prepared = asyncio.run(scenario())
+    after = cpu_pool_snapshot()
+
+    assert "第29段" in prepared.content
+    assert prepared.fingerprint == essay_fingerprint(prepared.content, "career_plan")
+    assert after["workers"] == workers
+    assert after["tasks"] - before["tasks"] == 2
+    assert after["inline"] - before["inline"] == (2 if workers == 0 else 0)
+    assert after["started"] == (workers > 0)
+
+
+def test_loop_monitor_reports_blocking_call() -> None:
+    async def scenario() -> tuple[dict, dict]:
+        ensure_loop_monitor(interval=0.02)
+        await asyncio.sleep(0.1)
+        quiet_since = time.monotonic()
+        await asyncio.sleep(0.1)
+        quiet = loop_lag_snapshot(quiet_since)
+        blocked_since = time.monotonic()
+        time.sleep(0.3)  # 模拟在协程内同步解析大文件
+        await asyncio.sleep(0.1)
+        return quiet, loop_lag_snapshot(blocked_since)
+
+    quiet, blocked = asyncio.run(scenario())
+
+    assert quiet["samples"] > 0 and quiet["max_ms"] < 200
+    assert blocked["max_ms"] >= 200
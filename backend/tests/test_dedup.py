@@ -0,0 +1,94 @@
+"""批次内重复提交合并单元测试。"""
+from __future__ import annotations
+
+import asyncio
+import io
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi import UploadFile
+from openpyxl import load_workbook
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+from app.model.schemas import GradeConfig
+from app.service.dedup import DuplicateCoalescer, essay_fingerprint
+from app.service import grading_service
+from app.service.grading_service import GradingService
+from app.service.scheduler import FairSemaphore
+from app.util.model_simulator import SimulatorConfig, run_simulator_in_thread
+
+ESSAY = "\n".join(f"第{p}段：我的职业目标是成为一名数据分析师，并为此制定了分阶段的学习与实践计划。" for p in range(1, 6))
+
+
+def test_fingerprint_ignores_whitespace_but_not_category() -> None:
+    assert essay_fingerprint("第一段\n第二段", "职业规划书") == essay_fingerprint(" 第一段  第二段\r\n", "职业规划书")
+    assert essay_fingerprint("第一段", "职业规划书") != essay_fingerprint("第一段", "专业分析报告")
+    assert essay_fingerprint("第一段", "职业规划书") != essay_fingerprint("第二段", "职业规划书")
+
+
+def test_waiters_reuse_result_or_fall_back() -> None:
+    async def scenario() -> tuple[list[object], dict]:
+        coalescer: DuplicateCoalescer[str] = DuplicateCoalescer()
+        assert coalescer.claim("k1", "a.txt") is None
+        pending = [coalescer.claim("k1", "b.txt"), coalescer.claim("k1", "c.txt")]
+        assert coalescer.claim("k2", "d.txt") is None
+        waiter2 = coalescer.claim("k2", "e.txt")
+        coalescer.resolve("k1", "结果")
+        coalescer.resolve("k2", None)
+        results = await asyncio.gather(*pending, waiter2)
+        assert coalescer.duplicate_groups() == [["a.txt", "b.txt", "c.txt"], ["d.txt", "e.txt"]]
+        return list(results), coalescer.snapshot()
+
+    results, snapshot = asyncio.run(scenario())
+    assert results == ["结果", "结果", None]
+    assert snapshot["groups"] == 2 and snapshot["duplicates"] == 3
+
+
+def test_duplicate_files_share_one_grading(isolated: Path) -> None:
+    texts = {
+        "25测试1班+学生甲甲+202500000001+职业规划书.txt": ESSAY,
+        "25测试1班+学生乙乙+202500000002+职业规划书.txt": ESSAY.replace("\n", "\n\n"),
+        "25测试1班+学生丙丙+202500000003+职业规划书.txt": "原创\n" + ESSAY,
+    }
+    uploads = [UploadFile(file=io.BytesIO(text.encode("utf-8")), filename=name) for name, text in texts.items()]
+    with run_simulator_in_thread(SimulatorConfig(latency="fixed", latency_ms=20)) as (api_url, simulator):
+        config = GradeConfig(api_url=api_url, api_key="k", model_name="sim", template="职业规划书", bypass_cache=True)
+        result = asyncio.run(GradingService().process(uploads, config))
+        assert simulator.snapshot()["counters"]["requests"] == 2
+
+    items = {item.student_name: item for item in result.items}
+    assert result.success_count == 3
+    primary, duplicate = sorted((items["学生甲甲"], items["学生乙乙"]), key=lambda item: item.duplicate_of is not None)
+    assert duplicate.duplicate_of == primary.file_name
+    assert duplicate.score == primary.score and duplicate.usage["calls"] == 0
+    assert primary.duplicate_files == [duplicate.file_name] and duplicate.duplicate_files == [primary.file_name]
+    assert items["学生丙丙"].duplicate_files is None
+
+    sheet = load_workbook(next((isolated / "uploads").glob("*/grade_result.xlsx")))["重复提交"]
+    rows = [row for row in sheet.iter_rows(min_row=2, values_only=True) if row[0] is not None]
+    assert [(row[0], row[4]) for row in rows] == [(1, "首份评分"), (1, "复用结果")]
+
+
+def test_waiting_duplicate_does_not_hold_file_slot(isolated: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    slots = FairSemaphore("file", 2)
+    monkeypatch.setattr(grading_service, "_FILE_SLOTS", slots)
+    texts = {
+        "25测试1班+学生甲甲+202500000001+职业规划书.txt": ESSAY,
+        "25测试1班+学生乙乙+202500000002+职业规划书.txt": ESSAY,
+        "25测试1班+学生丙丙+202500000003+职业规划书.txt": "原创\n" + ESSAY,
+    }
+    uploads = [UploadFile(file=io.BytesIO(text.encode("utf-8")), filename=name) for name, text in texts.items()]
+    with run_simulator_in_thread(SimulatorConfig(latency="fixed", latency_ms=200)) as (api_url, simulator):
+        config = GradeConfig(api_url=api_url, api_key="k", model_name="sim", template="职业规划书", bypass_cache=True)
+        result = asyncio.run(GradingService().process(uploads, config))
+        counters = simulator.snapshot()
+
+    # 两个名额：重复文件等待期间交还名额，原创文件与首份评分同时进行
+    assert result.success_count == 3
+    assert counters["counters"]["requests"] == 2
+    assert counters["peak_in_flight"] == 2
+    assert slots.in_use == 0
@@ -0,0 +1,125 @@
+"""对冲请求单元测试。"""
+from __future__ import annotations
+
+import asyncio
+import io
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi import UploadFile
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+from app.model.schemas import GradeConfig, ModelEndpoint
+from app.service import ai_client as ai_client_module
+from app.service.concurrency import get_model_limiter
+from app.service.grading_service import GradingService
+from app.service.hedging import HedgeStats, hedge_delay_seconds, run_hedged
+from app.service.retry_policy import RetryPolicy
+from app.util.model_simulator import SimulatorConfig, run_simulator_in_thread
+
+ESSAY = "\n".join(f"第{p}段：我的职业目标是成为一名测试开发工程师，并为此制定了分阶段的学习与实践计划。" for p in range(1, 6))
+
+
+def _launcher(delay: float, status: str, log: list[str], name: str):
+    async def run() -> dict:
+        log.append(f"start:{name}")
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            log.append(f"cancel:{name}")
+            raise
+        return {"status": status, "name": name}
+
+    return run
+
+
+def _accept(result: dict) -> bool:
+    return result["status"] == "success"
+
+
+def test_fast_primary_does_not_hedge() -> None:
+    log: list[str] = []
+    stats = HedgeStats()
+    result, idx, completed = asyncio.run(
+        run_hedged([_launcher(0.01, "success", log, "a"), _launcher(0.01, "success", log, "b")], delay=0.5, accept=_accept, stats=stats)
+    )
+    assert (result["name"], idx) == ("a", 0)
+    assert [r["name"] for r in completed] == ["a"]
+    assert log == ["start:a"]
+    assert stats.snapshot()["wasted_calls"] == 0
+
+
+def test_slow_primary_is_hedged_and_cancelled() -> None:
+    log: list[str] = []
+    stats = HedgeStats()
+    result, idx, completed = asyncio.run(
+        run_hedged([_launcher(5.0, "success", log, "a"), _launcher(0.01, "success", log, "b")], delay=0.05, accept=_accept, stats=stats)
+    )
+    assert (result["name"], idx) == ("b", 1)
+    assert [r["name"] for r in completed] == ["b"]
+    assert "cancel:a" in log
+    snap = stats.snapshot()
+    assert (snap["backup_wins"], snap["cancelled"], snap["wasted_calls"]) == (1, 1, 1)
+    assert snap["wasted_ratio"] == 0.5
+
+
+def test_failed_primary_falls_over_immediately() -> None:
+    log: list[str] = []
+    result, idx, completed = asyncio.run(
+        run_hedged([_launcher(0.0, "failure", log, "a"), _launcher(0.0, "success", log, "b")], delay=60.0, accept=_accept)
+    )
+    assert (result["name"], idx) == ("b", 1)
+    # 失败的主端点已产生调用，一并返回供计入用量与审计
+    assert [(r["name"], r["status"]) for r in completed] == [("a", "failure"), ("b", "success")]
+
+
+def test_all_failed_returns_primary_result() -> None:
+    log: list[str] = []
+    result, idx, completed = asyncio.run(
+        run_hedged([_launcher(0.0, "failure", log, "a"), _launcher(0.0, "failure", log, "b")], delay=0.01, accept=_accept)
+    )
+    assert (result["name"], idx) == ("a", 0)
+    assert [r["name"] for r in completed] == ["a", "b"]
+
+
+def test_hedge_delay_uses_endpoint_p90() -> None:
+    url = "http://hedge-delay-test/v1/chat/completions"
+    assert hedge_delay_seconds(url) >= 2.0  # 样本不足时使用默认值
+    limiter = get_model_limiter(url)
+    for ms in [1000, 2000, 3000, 4000, 5000, 6000, 7000, 8000, 9000, 10000]:
+        limiter.record_success(ms)
+    assert hedge_delay_seconds(url) == 9.0
+
+
+def test_rejected_primary_is_still_billed_and_audited(isolated: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(ai_client_module, "get_retry_policy", lambda kind: RetryPolicy(max_attempts=1, base_delay=0.0, max_delay=0.0))
+    upload = UploadFile(file=io.BytesIO(ESSAY.encode("utf-8")), filename="25测试1班+学生甲甲+202500000001+职业规划书.txt")
+    with run_simulator_in_thread(SimulatorConfig(latency="fixed", latency_ms=10, mismatch_rate=1.0)) as (primary_url, primary):
+        with run_simulator_in_thread(SimulatorConfig(latency="fixed", latency_ms=10)) as (backup_url, _backup):
+            config = GradeConfig(
+                api_url=primary_url,
+                api_key="k",
+                model_name="sim",
+                models=[ModelEndpoint(api_url=backup_url, api_key="k", model_name="sim-backup")],
+                hedge=True,
+                template="职业规划书",
+                bypass_cache=True,
+            )
+            result = asyncio.run(GradingService().process([upload], config))
+            primary_requests = primary.snapshot()["counters"]["requests"]
+
+    item = result.items[0]
+    assert item.status == "成功" and item.aggregate_strategy == "hedged"
+    # 主端点的评分与修复重提示都已计费：即使未被采用也计入用量并保留在 grader_results 中
+    graders = {r["model_index"]: r for r in item.grader_results}
+    assert (graders[1]["status"], graders[1]["adopted"]) == ("失败", False)
+    assert (graders[2]["status"], graders[2]["adopted"]) == ("成功", True)
+    assert item.score == graders[2]["score"]
+    assert primary_requests == 2
+    assert item.usage["calls"] == primary_requests + 1
+    responses_dir = isolated / "logs" / result.batch_id / "model-responses"
+    assert [p.name.split("_")[-2] for p in sorted(responses_dir.glob("*.json"))] == ["m1", "m2"]
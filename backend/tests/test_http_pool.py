@@ -0,0 +1,47 @@
+"""模型连接池单元测试。"""
+from __future__ import annotations
+
+import asyncio
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+from app.service.http_pool import close_http_clients, endpoint_key, get_http_client
+
+
+def test_endpoint_key_normalizes_scheme_and_host() -> None:
+    assert endpoint_key("HTTPS://API.Example.com/v1/chat/completions") == "https://api.example.com"
+    assert endpoint_key("https://api.example.com/v2/other") == "https://api.example.com"
+    assert endpoint_key("") == "mock"
+    assert endpoint_key(None) == "mock"
+
+
+def test_get_http_client_reuses_client_per_host() -> None:
+    async def scenario() -> None:
+        a = await get_http_client("https://api.example.com/v1/chat/completions")
+        b = await get_http_client("https://api.example.com/v1/other")
+        c = await get_http_client("http://127.0.0.1:8000/v1/chat/completions")
+        assert a is b
+        assert a is not c
+        await close_http_clients()
+        assert a.is_closed and c.is_closed
+
+    asyncio.run(scenario())
+
+
+def test_get_http_client_recreates_for_new_event_loop() -> None:
+    holder: dict[str, object] = {}
+
+    async def first() -> None:
+        holder["client"] = await get_http_client("https://api.example.com/v1/chat/completions")
+
+    async def second() -> None:
+        client = await get_http_client("https://api.example.com/v1/chat/completions")
+        assert client is not holder["client"]
+        await close_http_clients()
+
+    asyncio.run(first())
+    asyncio.run(second())
@@ -0,0 +1,128 @@
+"""后台批改任务（提交、进度、取消与排队）单元测试。"""
+from __future__ import annotations
+
+import asyncio
+import io
+import sys
+from pathlib import Path
+
+import httpx
+from fastapi import UploadFile
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+from app.model.schemas import GradeConfig
+from app.service.grading_service import GradingService
+from app.service.jobs import JobManager, format_sse
+from app.util.model_simulator import SimulatorConfig, run_simulator_in_thread
+
+ESSAY = "\n".join(f"第{p}段：我的职业目标是成为一名产品经理，并为此制定了分阶段的学习与实践计划。" for p in range(1, 6))
+
+
+def _uploads(count: int) -> list[UploadFile]:
+    return [
+        UploadFile(file=io.BytesIO(f"学生{i:02d}\n{ESSAY}".encode("utf-8")), filename=f"25测试1班+学生{i:02d}+2025000000{i:02d}+职业规划书.txt")
+        for i in range(count)
+    ]
+
+
+async def _wait_finished(manager: JobManager, batch_id: str, timeout: float = 20.0) -> dict:
+    loop = asyncio.get_running_loop()
+    end = loop.time() + timeout
+    while loop.time() < end:
+        job = manager.get(batch_id)
+        if job is not None and job.finished:
+            return job.snapshot(include_items=True)
+        await asyncio.sleep(0.02)
+    raise AssertionError("后台任务未在时限内结束")
+
+
+def test_job_runs_in_background_and_reports_progress(isolated: Path) -> None:
+    with run_simulator_in_thread(SimulatorConfig(latency="fixed", latency_ms=100)) as (api_url, _simulator):
+        config = GradeConfig(api_url=api_url, api_key="k", model_name="sim", template="职业规划书", bypass_cache=True)
+
+        async def scenario() -> tuple[dict, dict]:
+            manager = JobManager(GradingService())
+            job = manager.submit(_uploads(3), config)
+            await asyncio.sleep(0)
+            early = job.snapshot()
+            return early, await _wait_finished(manager, job.batch_id)
+
+        early, final = asyncio.run(scenario())
+
+    assert early["status"] == "running" and early["done_files"] == 0
+    assert final["status"] == "completed"
+    assert final["counts"]["success"] == 3 and final["success_count"] == 3
+    assert all(entry["state"] == "success" and entry["score"] is not None for entry in final["files"])
+    assert len(final["items"]) == 3
+    assert final["download_result_url"] == f"/api/download/result/{final['batch_id']}"
+    assert (isolated / "uploads" / final["batch_id"] / "grade_result.xlsx").exists()
+
+
+def test_cancel_running_and_queued_jobs(isolated: Path) -> None:
+    with run_simulator_in_thread(SimulatorConfig(latency="fixed", latency_ms=3000)) as (api_url, _simulator):
+        config = GradeConfig(api_url=api_url, api_key="k", model_name="sim", template="职业规划书", bypass_cache=True)
+
+        async def scenario() -> tuple[dict, dict, int]:
+            manager = JobManager(GradingService(), max_running=1)
+            running = manager.submit(_uploads(2), config)
+            queued = manager.submit(_uploads(1), config)
+            assert queued.status == "queued"
+            await asyncio.sleep(0.3)
+            assert manager.cancel(queued.batch_id).status == "cancelled"
+            manager.cancel(running.batch_id)
+            final = await _wait_finished(manager, running.batch_id)
+            return final, queued.snapshot(), manager.running
+
+        final, queued, running_count = asyncio.run(scenario())
+
+    assert final["status"] == "cancelled"
+    assert final["counts"]["cancelled"] == 2 and final["download_result_url"] is None
+    assert queued["status"] == "cancelled" and queued["started_at"] is None
+    assert running_count == 0
+
+
+def test_event_stream_emits_items_then_done(isolated: Path) -> None:
+    with run_simulator_in_thread(SimulatorConfig(latency="fixed", latency_ms=50)) as (api_url, _simulator):
+        config = GradeConfig(api_url=api_url, api_key="k", model_name="sim", template="职业规划书", bypass_cache=True)
+
+        async def scenario() -> list[tuple[str, dict]]:
+            manager = JobManager(GradingService())
+            job = manager.submit(_uploads(3), config)
+            return [event async for event in job.events(heartbeat=0.02)]
+
+        events = asyncio.run(scenario())
+
+    names = [name for name, _data in events]
+    assert names[0] == "snapshot" and names[-1] == "done"
+    items = [data for name, data in events if name == "item"]
+    assert len(items) == 3
+    assert items[-1]["progress"]["done_files"] == 3 and items[-1]["progress"]["latency_ms"]["p50"] is not None
+    assert "queue" in items[0]["progress"]
+    assert events[-1][1]["status"] == "completed" and events[-1][1]["download_result_url"]
+    assert format_sse("done", {"a": "中文"}) == 'event: done\ndata: {"a": "中文"}\n\n'
+
+
+def test_jobs_api_over_http(isolated: Path) -> None:
+    from app.main import app
+
+    with run_simulator_in_thread(SimulatorConfig(latency="fixed", latency_ms=20)) as (api_url, _simulator):
+
+        async def scenario() -> tuple[httpx.Response, str, dict]:
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+                files = [("files", (upload.filename, upload.file.read(), "text/plain")) for upload in _uploads(2)]
+                form = {"api_url": api_url, "api_key": "k", "model_name": "sim", "template": "职业规划书", "skip_format_check": "true"}
+                submitted = await client.post("/api/jobs", data=form, files=files)
+                batch_id = submitted.json()["batch_id"]
+                stream = await client.get(f"/api/jobs/{batch_id}/events")
+                status = (await client.get(f"/api/jobs/{batch_id}")).json()
+                return submitted, stream.text, status
+
+        submitted, stream_text, status = asyncio.run(scenario())
+
+    assert submitted.status_code == 202
+    assert stream_text.startswith("event: snapshot") and stream_text.count("event: item") == 2
+    assert stream_text.rstrip().splitlines()[-2] == "event: done"
+    assert status["status"] == "completed" and status["counts"]["success"] == 2
@@ -0,0 +1,114 @@
+"""批次断点日志与中断批次恢复单元测试。"""
+from __future__ import annotations
+
+import asyncio
+import io
+import json
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi import UploadFile
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+from app.model.schemas import GradeConfig, GradeItem, ModelEndpoint
+from app.service.grading_service import GradingService
+from app.service.jobs import JobManager
+from app.service.journal import JOURNAL_FILE_NAME, BatchJournal
+from app.util.model_simulator import SimulatorConfig, run_simulator_in_thread
+
+ESSAY = "\n".join(f"第{p}段：我的职业目标是成为一名数据分析师，并为此制定了分阶段的学习与实践计划。" for p in range(1, 6))
+
+
+def _item(name: str, score: float | None) -> GradeItem:
+    return GradeItem(
+        file_name=name,
+        student_id=None,
+        student_name=None,
+        score=score,
+        score_rubric_max=None,
+        score_rubric=None,
+        detail_json=None,
+        comment=None,
+        status="成功" if score is not None else "失败",
+        error_message=None if score is not None else "模型调用失败",
+        raw_text_length=10,
+        grader_results=[{"model_index": 1, "status": "成功", "score": score}] if score is not None else None,
+    )
+
+
+def test_journal_round_trip_skips_torn_line_and_redacts_keys(tmp_path: Path) -> None:
+    config = GradeConfig(
+        api_url="http://a", api_key="secret-1", model_name="m", models=[ModelEndpoint(api_url="http://b", api_key="secret-2", model_name="n")]
+    )
+    journal = BatchJournal(tmp_path)
+    journal.start(["a.txt", "b.txt", "c.txt"], config)
+    journal.record(_item("a.txt", 50.0), None)
+    journal.record(_item("b.txt", None), {"file_name": "b.txt", "error_type": "模型调用失败", "error_message": "x"})
+    journal.record(_item("a.txt", 55.0), None)
+    # 模拟进程在写入过程中崩溃：末行只写了一半
+    with journal.path.open("a", encoding="utf-8") as fp:
+        fp.write('{"type": "file", "item": {"file_name": "c.t')
+
+    assert "secret" not in journal.path.read_text(encoding="utf-8")
+    state = journal.load()
+    assert state is not None
+    assert state.files == ["a.txt", "b.txt", "c.txt"]
+    assert state.results["a.txt"][0].score == 55.0
+    assert state.results["b.txt"][1]["error_type"] == "模型调用失败"
+    assert state.missing == ["c.txt"]
+    assert state.skipped_lines == 1 and not state.exported
+
+    # 重启后的进程续写：先补齐残缺末行，新记录不受影响
+    resumed = BatchJournal(tmp_path)
+    resumed.start(["a.txt", "b.txt", "c.txt"], config)
+    resumed.record(_item("c.txt", 40.0), None)
+    resumed.mark_exported()
+    state = resumed.load()
+    assert state.missing == [] and state.resumed == 1 and state.exported
+    assert BatchJournal(tmp_path / "missing").load() is None
+
+
+def test_resume_regrades_only_missing_files_and_rebuilds_export(isolated: Path) -> None:
+    uploads = [
+        UploadFile(file=io.BytesIO(f"学生{i:02d}\n{ESSAY}".encode("utf-8")), filename=f"25测试1班+学生{i:02d}+2025000000{i:02d}+职业规划书.txt")
+        for i in range(4)
+    ]
+    with run_simulator_in_thread(SimulatorConfig(latency="fixed", latency_ms=20)) as (api_url, simulator):
+        config = GradeConfig(api_url=api_url, api_key="k", model_name="sim", template="职业规划书", bypass_cache=True)
+        service = GradingService()
+        service.upload_root = isolated / "uploads"
+
+        first = asyncio.run(service.process(uploads, config))
+        batch_dir = isolated / "uploads" / first.batch_id
+        journal_path = batch_dir / JOURNAL_FILE_NAME
+        lines = journal_path.read_text(encoding="utf-8").splitlines()
+        assert [json.loads(line)["type"] for line in lines] == ["batch", "file", "file", "file", "file", "exported"]
+        # 模拟服务在前两个文件完成后重启：日志只剩表头与两条文件记录，Excel 尚未生成
+        journal_path.write_text("\n".join(lines[:3]) + "\n", encoding="utf-8")
+        (batch_dir / "grade_result.xlsx").unlink()
+        kept = {json.loads(line)["item"]["file_name"]: json.loads(line)["item"]["score"] for line in lines[1:3]}
+        simulator.reset()
+
+        async def scenario() -> dict:
+            manager = JobManager(service)
+            job = manager.resume(first.batch_id, config)
+            assert len(job.completed) == 2 and job.snapshot()["done_files"] == 2
+            while not job.finished:
+                await asyncio.sleep(0.02)
+            with pytest.raises(FileNotFoundError):
+                manager.resume("batch-does-not-exist", config)
+            return job.snapshot(include_items=True)
+
+        final = asyncio.run(scenario())
+        requests = simulator.snapshot()["counters"].get("requests", 0)
+
+    assert final["status"] == "completed" and final["success_count"] == 4
+    assert requests == 2
+    assert {item["file_name"]: item["score"] for item in final["items"] if item["file_name"] in kept} == kept
+    assert (batch_dir / "grade_result.xlsx").exists()
+    types = [json.loads(line)["type"] for line in journal_path.read_text(encoding="utf-8").splitlines()]
+    assert types == ["batch", "file", "file", "resumed", "file", "file", "exported"]
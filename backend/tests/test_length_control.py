@@ -0,0 +1,107 @@
+"""长文预检与超长作业截断/分段摘要单元测试。"""
+from __future__ import annotations
+
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+from app.model.schemas import ModelEndpoint
+from app.service import ai_client as ai_client_module
+from app.service.length_control import (
+    essay_token_budget,
+    fit_essay,
+    resolve_context_window,
+    split_chunks,
+    truncate_head_tail,
+)
+from app.service.rate_limit import estimate_tokens
+from app.service.retry_policy import RetryPolicy
+
+ENDPOINT = ModelEndpoint(api_url="http://long-essay-test/v1/chat/completions", api_key="k", model_name="m", context_window=8192)
+LONG_TEXT = "\n".join(f"第{i}段：" + "学生的职业规划内容" * 40 for i in range(1, 61))
+
+
+def _install_transport(monkeypatch: pytest.MonkeyPatch, handler) -> None:
+    async def fake_client(_api_url: str | None) -> httpx.AsyncClient:
+        return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    monkeypatch.setattr(ai_client_module, "get_http_client", fake_client)
+    monkeypatch.setattr(ai_client_module, "get_retry_policy", lambda kind: RetryPolicy(max_attempts=1, base_delay=0.0, max_delay=0.0))
+
+
+def _fit(strategy: str, *, mock: bool = False):
+    return asyncio.run(
+        fit_essay(LONG_TEXT, endpoints=[ENDPOINT], system_prompt="系统", user_prompt="规则 {{HOMEWORK_TEXT}}", strategy=strategy, mock=mock)
+    )
+
+
+def test_context_window_resolution() -> None:
+    assert resolve_context_window(ENDPOINT) == 8192
+    assert resolve_context_window(ModelEndpoint(api_url="x", model_name="deepseek-chat")) == 65536
+    assert resolve_context_window(ModelEndpoint(api_url="x", model_name="moonshot-v1-8k")) == 8192
+    budget, window = essay_token_budget(
+        [ENDPOINT, ModelEndpoint(api_url="x", model_name="qwen-plus")], "系统", "规则 {{HOMEWORK_TEXT}}"
+    )
+    assert window == 8192
+    assert 0 < budget < window
+
+
+def test_truncate_keeps_head_and_tail_within_budget() -> None:
+    fitted = truncate_head_tail(LONG_TEXT, 2000)
+    assert estimate_tokens(fitted) <= 2000
+    assert fitted.startswith("第1段")
+    assert fitted.endswith(LONG_TEXT.splitlines()[-1])
+    assert "已省略" in fitted
+
+
+def test_split_chunks_is_lossless() -> None:
+    chunks = split_chunks(LONG_TEXT, 1500)
+    assert len(chunks) > 1
+    assert "".join(chunks) == LONG_TEXT
+    assert all(estimate_tokens(chunk) <= 1500 for chunk in chunks)
+
+
+def test_short_essay_is_sent_in_full() -> None:
+    content, info, usage = asyncio.run(
+        fit_essay("短文", endpoints=[ENDPOINT], system_prompt="系统", user_prompt="{{HOMEWORK_TEXT}}", strategy="truncate", mock=True)
+    )
+    assert content == "短文" and info["strategy"] == "full" and usage is None
+
+
+def test_off_strategy_records_oversize() -> None:
+    content, info, _usage = _fit("off")
+    assert content == LONG_TEXT
+    assert info["strategy"] == "oversize"
+
+
+def test_summarize_map_reduce(monkeypatch: pytest.MonkeyPatch) -> None:
+    prompts: list[str] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        user = json.loads(request.content)["messages"][1]["content"]
+        prompts.append(user)
+        return httpx.Response(200, json={"choices": [{"message": {"content": json.dumps({"summary": f"摘要{len(prompts)}"})}}]})
+
+    _install_transport(monkeypatch, handler)
+    content, info, usage = _fit("summarize")
+    assert info["strategy"] == "summarized"
+    assert content.count("段摘要】") == len(prompts) > 1
+    assert usage is not None and usage["calls"] == len(prompts)
+
+
+def test_summarize_failure_falls_back_to_truncation(monkeypatch: pytest.MonkeyPatch) -> None:
+    _install_transport(monkeypatch, lambda request: httpx.Response(200, json={"choices": [{"message": {"content": "不是 JSON"}}]}))
+    content, info, usage = _fit("summarize")
+    assert info["strategy"] == "truncated"
+    assert "分段摘要失败" in info["note"]
+    assert "已省略" in content
+    assert usage is not None and usage["calls"] >= 1
+    assert _fit("summarize", mock=True)[1]["strategy"] == "truncated"
@@ -0,0 +1,82 @@
+"""离线模型模拟服务单元测试，以及基于模拟服务的 GradingService.process 端到端压测。"""
+from __future__ import annotations
+
+import asyncio
+import io
+import json
+import sys
+from pathlib import Path
+
+from fastapi import UploadFile
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+from app.model.schemas import GradeConfig
+from app.service.grading_service import GradingService
+from app.service.output_parser import compile_rubric_validator
+from app.service.prompt_builder import RubricExpected, RubricItem, RubricSection, build_repair_prompt
+from app.util.model_simulator import ModelSimulator, SimulatorConfig, run_simulator_in_thread
+
+EXPECTED = RubricExpected(
+    category_name="职业规划书",
+    rubric_max=10.0,
+    sections=[
+        RubricSection(name="维度A", max_score=6.0, items=[RubricItem(name="细则A1", max_score=4.0), RubricItem(name="细则A2", max_score=2.0)]),
+        RubricSection(name="维度B", max_score=4.0, items=[RubricItem(name="细则B", max_score=4.0)]),
+    ],
+)
+
+
+def _request(content: str, **extra: object) -> bytes:
+    return json.dumps({"model": "m", "messages": [{"role": "system", "content": "系统"}, {"role": "user", "content": content}], **extra}).encode()
+
+
+def _content(simulator: ModelSimulator, body: bytes) -> tuple[int, str]:
+    status, data, _headers = asyncio.run(simulator.handle(body))
+    return status, data["choices"][0]["message"]["content"] if status == 200 else ""
+
+
+def test_outputs_follow_schema_or_repair_structure() -> None:
+    simulator = ModelSimulator(SimulatorConfig(latency="fixed", latency_ms=0))
+    validator = compile_rubric_validator(EXPECTED)
+    schema_body = _request("评分", response_format={"type": "json_schema", "json_schema": {"schema": validator.json_schema}})
+    _status, text = _content(simulator, schema_body)
+    assert validator.normalize(json.loads(text), 100.0)["score"] > 0
+
+    broken = '{"schema_version": 2, "comment": "x", "sections": [{"name": "维度A", "items": []}]}'
+    _status, text = _content(simulator, _request(build_repair_prompt(EXPECTED, broken, "缺失评分维度：维度B")))
+    assert validator.normalize(json.loads(text), 100.0)["sections"][1]["name"] == "维度B"
+
+    _status, text = _content(simulator, _request("请压缩以下内容"))
+    assert set(json.loads(text)) == {"comment", "summary"}
+
+
+def test_fault_injection_is_deterministic() -> None:
+    config = SimulatorConfig(seed=7, latency="fixed", latency_ms=0, rate_limit_rate=0.3, error_rate=0.3, malformed_rate=0.3)
+
+    def outcomes() -> list[tuple[int, str]]:
+        simulator = ModelSimulator(config)
+        return [_content(simulator, _request(f"作业 {idx % 5}")) for idx in range(30)]
+
+    first = outcomes()
+    assert first == outcomes()
+    assert {status for status, _text in first} == {200, 429, 500}
+
+
+def test_grading_service_end_to_end(isolated: Path) -> None:
+    config = SimulatorConfig(seed=1, latency="uniform", latency_ms=20, error_rate=0.1, malformed_rate=0.1, mismatch_rate=0.2)
+    text = "\n".join(f"第{p}段：我的职业目标是成为一名软件工程师，并为此制定了分阶段的学习计划。" for p in range(1, 6))
+    uploads = [
+        UploadFile(file=io.BytesIO(f"{name}\n{text}".encode("utf-8")), filename=f"25测试1班+学生{name}+2025000000{idx:02d}+职业规划书.txt")
+        for idx, name in enumerate(["甲甲", "乙乙", "丙丙", "丁丁", "戊戊", "己己"], start=1)
+    ]
+    with run_simulator_in_thread(config) as (api_url, simulator):
+        grade_config = GradeConfig(api_url=api_url, api_key="k", model_name="sim", template="职业规划书", bypass_cache=True)
+        result = asyncio.run(GradingService().process(uploads, grade_config))
+        counters = simulator.snapshot()["counters"]
+    assert result.success_count == len(uploads), [item.error_message for item in result.items]
+    assert counters["requests"] >= len(uploads)
+    assert counters["ok"] == len(uploads)
+    assert all(item.usage and item.usage["calls"] >= 1 for item in result.items)
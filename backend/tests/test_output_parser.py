@@ -0,0 +1,127 @@
+"""模型输出 JSON 快速解析、有界修复与预编译校验器单元测试。"""
+from __future__ import annotations
+
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+from app.service import output_parser
+from app.service.ai_client import AIClient, ModelError
+from app.service.output_parser import compile_rubric_validator, extract_json_object, loads, repair_json
+from app.service.prompt_builder import RubricExpected, RubricItem, RubricSection
+
+EXPECTED = RubricExpected(
+    category_name="职业规划书",
+    rubric_max=20.0,
+    sections=[
+        RubricSection(name="维度A", max_score=10.0, items=[RubricItem(name="细则A", max_score=10.0)]),
+        RubricSection(name="维度B", max_score=10.0, items=[RubricItem(name="细则B1", max_score=5.0), RubricItem(name="细则B2", max_score=5.0)]),
+    ],
+)
+GOOD_OUTPUT = {
+    "schema_version": 2,
+    "comment": "总体较好",
+    "sections": [
+        {"name": "维度A", "comment": "较好", "items": [{"name": "细则A", "score": 8, "comment": "论证充分"}]},
+        {
+            "name": "维度B",
+            "comment": "",
+            "items": [{"name": "细则B1", "score": 6, "comment": "超出满分"}, {"name": "细则B2", "score": 2.5, "comment": ""}],
+        },
+    ],
+}
+GOOD_TEXT = json.dumps(GOOD_OUTPUT, ensure_ascii=False, indent=2)
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        GOOD_TEXT,
+        f"```json\n{GOOD_TEXT}\n```",
+        f"以下是评分结果：\n{GOOD_TEXT}\n以上。",
+        GOOD_TEXT.replace('"论证充分"', '"论证充分",').replace('"超出满分"', '"超出满分",'),
+    ],
+)
+def test_extract_variants(text: str) -> None:
+    assert extract_json_object(text)["sections"][0]["items"][0]["score"] == 8
+
+
+@pytest.mark.parametrize(
+    ("snippet", "expected"),
+    [
+        ('{"a": [1, 2,', {"a": [1, 2]}),
+        ('{"a": {"b": "未写完的字符串', {"a": {"b": "未写完的字符串"}}),
+        ('{"a": 1, "b', {"a": 1, "b": None}),
+        ('{"a": 1, "b":', {"a": 1, "b": None}),
+        ('{"a": tr', {"a": None}),
+        ('{"a": 8.', {"a": None}),
+        ('{"a": 15', {"a": None}),
+        ('{"a": 15\n', {"a": 15}),
+        ('{"a": [1, 2', {"a": [1]}),
+        ('{"a": "x\\', {"a": "x"}),
+        ('{"a": [1, 2,], "b": 3,}', {"a": [1, 2], "b": 3}),
+    ],
+)
+def test_bounded_repair(snippet: str, expected: dict) -> None:
+    assert repair_json(snippet) == expected
+
+
+def test_truncated_model_output_is_recovered() -> None:
+    truncated = GOOD_TEXT[: GOOD_TEXT.index('"细则B2"') + 30]
+    data = extract_json_object(truncated)
+    assert data["sections"][1]["items"][0]["name"] == "细则B1"
+
+
+def test_truncated_numeric_score_fails_validation() -> None:
+    # "score": 2.5 被截成 "score": 2，不能当作 2 分继续计分
+    truncated = GOOD_TEXT[: GOOD_TEXT.index('"score": 2.5') + len('"score": 2')]
+    data = extract_json_object(truncated)
+    assert data["sections"][1]["items"][1]["score"] is None
+    with pytest.raises(ValueError):
+        compile_rubric_validator(EXPECTED).normalize(data, 60.0)
+
+
+def test_repair_is_bounded(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(output_parser, "MODEL_JSON_REPAIR_MAX_CHARS", 10)
+    assert repair_json('{"a": [1, 2,') is None
+    assert repair_json("[" * 100) is None
+    with pytest.raises(ValueError):
+        extract_json_object("没有 JSON")
+
+
+def test_misplaced_model_field_is_moved_to_root() -> None:
+    snippet = '{\n  "sections": [\n    {"name": "维度A"},\n    "model": "m1"\n  ]\n}'
+    assert repair_json(snippet) == {"sections": [{"name": "维度A"}], "model": "m1"}
+
+
+def test_loads_falls_back_to_stdlib_for_nan() -> None:
+    assert loads('{"a": NaN}')["a"] != loads('{"a": NaN}')["a"]
+
+
+def test_validator_normalizes_and_is_compiled_once() -> None:
+    validator = compile_rubric_validator(EXPECTED)
+    # 每个文件都会重新构建 RubricExpected：内容相同即复用，内容不同才重新编译
+    rebuilt = RubricExpected(category_name=EXPECTED.category_name, rubric_max=EXPECTED.rubric_max, sections=list(EXPECTED.sections))
+    assert compile_rubric_validator(rebuilt) is validator
+    changed = RubricExpected(category_name=EXPECTED.category_name, rubric_max=30.0, sections=list(EXPECTED.sections))
+    assert compile_rubric_validator(changed) is not validator
+    normalized = AIClient._normalize_response(GOOD_OUTPUT, EXPECTED, 60.0)
+    assert normalized["score_rubric"] == 15.5
+    assert normalized["score"] == 46.5
+    assert normalized["sections"][1]["comment"] == "未提供维度总体评价。"
+    assert normalized["sections"][1]["items"][1]["comment"] == "未提供细则扣分原因。"
+
+
+def test_validator_rejects_mismatched_rubric() -> None:
+    broken = json.loads(GOOD_TEXT)
+    broken["sections"][1]["items"].pop()
+    with pytest.raises(ModelError):
+        AIClient._normalize_response(broken, EXPECTED, 60.0)
+    with pytest.raises(ValueError, match="细则数量"):
+        compile_rubric_validator(EXPECTED).normalize(broken, 60.0)
@@ -0,0 +1,146 @@
+"""多份作业合并批改单元测试。"""
+from __future__ import annotations
+
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+from app.service.ai_client import AIClient, ModelError
+from app.service.grading_service import GradingService
+from app.service.packing import PackCollector, PackError
+from app.service.prompt_builder import PACKED_GRADING_RULES, RubricExpected, RubricItem, RubricSection, build_packed_user_prompt
+
+EXPECTED = RubricExpected(
+    category_name="职业规划书",
+    rubric_max=10.0,
+    sections=[RubricSection(name="维度A", max_score=10.0, items=[RubricItem(name="细则A", max_score=10.0)])],
+)
+
+
+def test_packed_prompt_lists_every_essay() -> None:
+    prompt = build_packed_user_prompt("评分规则\n{{HOMEWORK_TEXT}}", [("E1", "甲的正文"), ("E2", "乙的正文")])
+    assert "【作业 E1 开始】\n甲的正文" in prompt
+    assert "【作业 E2 结束】" in prompt
+    assert '"results"' in prompt and "essay_id" in prompt
+    assert "{{HOMEWORK_TEXT}}" not in prompt
+
+
+def test_packed_prompt_keeps_static_prefix_before_essays() -> None:
+    template = "【评分配置】规则\n\n【学生作业正文】\n```\n{{HOMEWORK_TEXT}}\n```"
+    two = build_packed_user_prompt(template, [("E1", "甲的正文"), ("E2", "乙的正文")])
+    three = build_packed_user_prompt(template, [("E1", "丙"), ("E2", "丁"), ("E3", "戊")])
+    prefix = two[: two.index("【作业 E1 开始】")]
+    # 评分配置、合并规则依次在前，且与份数无关；正文位于代码块内、请求末尾
+    assert three.startswith(prefix)
+    assert prefix.index("【评分配置】") < prefix.index(PACKED_GRADING_RULES)
+    assert prefix.endswith("```\n") and two.endswith("【作业 E2 结束】\n```")
+
+
+def _grade_packed(collector: PackCollector, deadline: float | None):
+    return GradingService._grade_packed(
+        AIClient("http://pack-deadline-test/v1/chat/completions", "k", "m"),
+        collector,
+        content="正文",
+        system_prompt="系统",
+        user_prompt="规则 {{HOMEWORK_TEXT}}",
+        expected=EXPECTED,
+        score_target_max=100.0,
+        deadline=deadline,
+        retry_budget=None,
+        use_cache=False,
+    )
+
+
+def test_packed_call_honours_file_deadline(monkeypatch: pytest.MonkeyPatch) -> None:
+    seen: list[float | None] = []
+
+    async def fake_chat_json(self, **kwargs):
+        seen.append(kwargs.get("deadline"))
+        raise ModelError("模拟失败", kind="call")
+
+    monkeypatch.setattr(AIClient, "chat_json", fake_chat_json)
+    deadline = time.monotonic() + 60
+    # 合并请求失败、仍在时限内：交给调用方退回单篇调用，且合并请求使用了本文件的时限
+    assert asyncio.run(_grade_packed(PackCollector(2, flush_delay=0.0), deadline)) is None
+    assert seen == [deadline]
+
+    # 等待凑组时已到时限：不再退回单篇调用
+    started = time.monotonic()
+    with pytest.raises(ModelError, match="单文件时限"):
+        asyncio.run(_grade_packed(PackCollector(2, flush_delay=10.0), time.monotonic() + 0.05))
+    assert time.monotonic() - started < 5
+
+
+def test_full_group_is_sent_once_and_split_by_essay_id() -> None:
+    calls: list[list[tuple[str, str]]] = []
+
+    async def runner(essays: list[tuple[str, str]]) -> tuple[dict, dict]:
+        calls.append(essays)
+        # 故意倒序返回，验证按 essay_id 拆分
+        return {"results": [{"essay_id": eid, "comment": text} for eid, text in reversed(essays)]}, {"calls": 1, "prompt_tokens": 10}
+
+    async def scenario() -> list[str]:
+        collector = PackCollector(3, flush_delay=10.0)
+        outputs = await asyncio.gather(*(collector.submit("k", text, runner) for text in ["甲", "乙", "丙"]))
+        assert collector.snapshot()["saved_requests"] == 2
+        assert [share["prompt_tokens"] for _raw, share in outputs] == [4, 3, 3]
+        return [json.loads(raw)["comment"] for raw, _share in outputs]
+
+    assert asyncio.run(scenario()) == ["甲", "乙", "丙"]
+    assert len(calls) == 1
+    assert "essay_id" not in json.dumps(calls)
+
+
+def test_partial_group_flushes_after_delay_and_missing_entry_fails() -> None:
+    async def runner(essays: list[tuple[str, str]]) -> tuple[dict, None]:
+        return {"results": [{"essay_id": "E1", "comment": "只返回了第一份"}]}, None
+
+    async def scenario() -> None:
+        collector = PackCollector(4, flush_delay=0.01)
+        first, second = await asyncio.gather(
+            collector.submit("k", "甲", runner), collector.submit("k", "乙", runner), return_exceptions=True
+        )
+        assert json.loads(first[0])["comment"] == "只返回了第一份"
+        assert isinstance(second, PackError)
+
+    asyncio.run(scenario())
+
+
+def test_eligibility_by_length_and_size() -> None:
+    assert PackCollector(2, max_chars=10).eligible("短文")
+    assert not PackCollector(2, max_chars=1).eligible("短文")
+    assert not PackCollector(1).eligible("短文")
+
+
+def test_groups_are_isolated_by_key() -> None:
+    seen: list[int] = []
+
+    async def runner(essays: list[tuple[str, str]]) -> tuple[dict, None]:
+        seen.append(len(essays))
+        return {"results": [{"essay_id": eid} for eid, _text in essays]}, None
+
+    async def scenario() -> None:
+        collector = PackCollector(2, flush_delay=0.01)
+        await asyncio.gather(collector.submit("a", "1", runner), collector.submit("b", "2", runner))
+
+    asyncio.run(scenario())
+    assert sorted(seen) == [1, 1]
+
+
+def test_runner_failure_fails_every_entry() -> None:
+    async def runner(essays: list[tuple[str, str]]) -> tuple[dict, None]:
+        raise RuntimeError("网络错误")
+
+    async def scenario() -> list:
+        collector = PackCollector(2, flush_delay=0.01)
+        return await asyncio.gather(collector.submit("k", "1", runner), collector.submit("k", "2", runner), return_exceptions=True)
+
+    assert all(isinstance(r, PackError) for r in asyncio.run(scenario()))
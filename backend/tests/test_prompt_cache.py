@@ -0,0 +1,91 @@
+"""提示词前缀缓存：消息布局、服务商缓存提示与缓存 Token 统计单元测试。"""
+from __future__ import annotations
+
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+from app.service import ai_client as ai_client_module
+from app.service.ai_client import AIClient
+from app.service.prompt_builder import RubricExpected, RubricItem, RubricSection
+from app.service.provider_caps import extract_cached_tokens, prompt_cache_style
+
+EXPECTED = RubricExpected(
+    category_name="职业规划书",
+    rubric_max=10.0,
+    sections=[RubricSection(name="维度A", max_score=10.0, items=[RubricItem(name="细则A", max_score=10.0)])],
+)
+GOOD_OUTPUT = {
+    "schema_version": 2,
+    "comment": "总体较好",
+    "sections": [{"name": "维度A", "comment": "较好", "items": [{"name": "细则A", "score": 8, "comment": "扣分原因"}]}],
+}
+
+
+def test_prefix_is_identical_and_essay_last() -> None:
+    template = "【评分配置】规则\n\n【学生作业正文】\n```\n{{HOMEWORK_TEXT}}\n```"
+    prefix_a, tail_a = AIClient._split_user_content(template, "甲的正文")
+    prefix_b, tail_b = AIClient._split_user_content(template, "乙的正文")
+    assert prefix_a == prefix_b
+    assert tail_a == "甲的正文\n```"
+    assert AIClient._build_user_content(template, "甲的正文") == template.replace("{{HOMEWORK_TEXT}}", "甲的正文")
+
+
+def test_instructions_after_essay_move_into_prefix() -> None:
+    prefix, tail = AIClient._split_user_content("正文：{{HOMEWORK_TEXT}}\n请按骨架输出 JSON", "正文内容")
+    assert prefix.startswith("请按骨架输出 JSON")
+    assert tail == "正文内容"
+    prefix, tail = AIClient._split_user_content("只有规则", "正文内容")
+    assert prefix.startswith("只有规则") and tail == "正文内容"
+
+
+def test_cache_hint_styles() -> None:
+    assert prompt_cache_style("https://api.openai.com/v1/chat/completions", "gpt-4o") == "openai"
+    assert prompt_cache_style("https://openrouter.ai/api/v1/chat/completions", "anthropic/claude-3.5-sonnet") == "cache_control"
+    assert prompt_cache_style("https://api.deepseek.com/chat/completions", "deepseek-chat") == "none"
+
+    client = AIClient("https://openrouter.ai/api/v1/chat/completions", "k", "anthropic/claude-3.5-sonnet")
+    payload = client._build_grade_payload("系统", "规则\n{{HOMEWORK_TEXT}}", "正文")
+    parts = payload["messages"][1]["content"]
+    assert parts[0]["cache_control"] == {"type": "ephemeral"} and parts[1]["text"] == "正文"
+
+    openai_client = AIClient("https://api.openai.com/v1/chat/completions", "k", "gpt-4o")
+    key_a = openai_client._build_grade_payload("系统", "规则\n{{HOMEWORK_TEXT}}", "甲")["prompt_cache_key"]
+    key_b = openai_client._build_grade_payload("系统", "规则\n{{HOMEWORK_TEXT}}", "乙")["prompt_cache_key"]
+    assert key_a == key_b
+
+
+def test_extract_cached_tokens_variants() -> None:
+    assert extract_cached_tokens({"prompt_tokens_details": {"cached_tokens": 1024}}) == 1024
+    assert extract_cached_tokens({"prompt_cache_hit_tokens": 512}) == 512
+    assert extract_cached_tokens({"prompt_tokens": 10}) is None
+    assert extract_cached_tokens(None) is None
+
+
+def test_usage_cached_tokens_recorded(monkeypatch: pytest.MonkeyPatch) -> None:
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(
+            200,
+            json={
+                "choices": [{"message": {"content": json.dumps(GOOD_OUTPUT)}}],
+                "usage": {"prompt_tokens": 2000, "completion_tokens": 100, "total_tokens": 2100, "prompt_cache_hit_tokens": 1536},
+            },
+        )
+
+    async def fake_client(_api_url: str | None) -> httpx.AsyncClient:
+        return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    monkeypatch.setattr(ai_client_module, "get_http_client", fake_client)
+    monkeypatch.setattr(ai_client_module, "RESPONSE_CACHE_ENABLED", False)
+    client = AIClient("http://prompt-cache-test/v1/chat/completions", "k", "m")
+    asyncio.run(client.grade("正文", "系统", "规则 {{HOMEWORK_TEXT}}", EXPECTED, 60.0))
+    assert client.usage["prompt_tokens"] == 2000
+    assert client.usage["cached_tokens"] == 1536
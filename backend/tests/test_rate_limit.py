@@ -0,0 +1,82 @@
+"""模型端点限流（令牌桶）单元测试。"""
+from __future__ import annotations
+
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+from app.service.rate_limit import (
+    EndpointRateLimiter,
+    TokenBucket,
+    estimate_tokens,
+    parse_duration_seconds,
+    parse_retry_after,
+)
+
+
+def test_parse_duration_seconds_formats() -> None:
+    assert parse_duration_seconds("20") == 20.0
+    assert parse_duration_seconds("0.5") == 0.5
+    assert parse_duration_seconds("1m30s") == 90.0
+    assert abs(parse_duration_seconds("250ms") - 0.25) < 1e-9
+    assert parse_duration_seconds("") is None
+    assert parse_duration_seconds(None) is None
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+
+
+def test_estimate_tokens_counts_cjk_per_char() -> None:
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("你好世界") == 4
+    assert estimate_tokens("abcdefgh") == 2
+
+
+def test_token_bucket_wait_time() -> None:
+    bucket = TokenBucket(60)  # 1 个/秒
+    now = time.monotonic()
+    assert bucket.wait_time(1, now) == 0.0
+    bucket.consume(60)
+    assert abs(bucket.wait_time(1, now) - 1.0) < 0.05
+
+
+def test_retry_after_delays_next_acquire() -> None:
+    async def scenario() -> None:
+        limiter = EndpointRateLimiter("http://test")
+        limiter.update_from_headers({"retry-after": "0.2"}, 429)
+        assert limiter.throttled_count == 1
+        waited = await limiter.acquire(100)
+        assert waited >= 0.15
+
+    asyncio.run(scenario())
+
+
+def test_learns_bucket_from_headers_and_syncs_remaining() -> None:
+    limiter = EndpointRateLimiter("http://test")
+    assert limiter.requests is None
+    limiter.update_from_headers(
+        {
+            "x-ratelimit-limit-requests": "600",
+            "x-ratelimit-remaining-requests": "10",
+            "x-ratelimit-limit-tokens": "60000",
+            "x-ratelimit-remaining-tokens": "0",
+            "x-ratelimit-reset-tokens": "1s",
+        },
+        200,
+    )
+    assert limiter.requests is not None and limiter.requests.capacity == 600
+    assert limiter.requests.tokens <= 10.5
+    assert limiter.tokens is not None and limiter.tokens.capacity == 60000
+    assert limiter.blocked_until > time.monotonic()
+
+
+def test_settle_adjusts_token_bucket_by_actual_usage() -> None:
+    limiter = EndpointRateLimiter("http://test", tpm=6000)
+    asyncio.run(limiter.acquire(1000))
+    before = limiter.tokens.tokens
+    limiter.settle(1000, 400)
+    assert limiter.tokens.tokens > before
@@ -0,0 +1,105 @@
+"""批次内增量重评（只重新评分筛选出的文件）单元测试。"""
+from __future__ import annotations
+
+import asyncio
+import io
+import json
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi import UploadFile
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+from app.model.schemas import GradeConfig
+from app.service.grading_service import GradingService
+from app.service.jobs import JobManager
+from app.service.journal import JOURNAL_FILE_NAME
+from app.util.model_simulator import SimulatorConfig, run_simulator_in_thread
+
+ESSAY = "\n".join(f"第{p}段：我的职业目标是成为一名软件测试工程师，并为此制定了分阶段的学习与实践计划。" for p in range(1, 6))
+
+
+def _mark_failed(journal_path: Path, file_name: str) -> None:
+    """把日志中某个文件的结果改写为“所有模型评分失败”。"""
+    lines = []
+    for line in journal_path.read_text(encoding="utf-8").splitlines():
+        record = json.loads(line)
+        if record["type"] == "file" and record["item"]["file_name"] == file_name:
+            record["item"].update(score=None, score_rubric=None, status="失败", error_message="所有模型评分失败")
+            record["error_row"] = {"file_name": file_name, "error_type": "模型评分失败", "error_message": "所有模型评分失败"}
+        lines.append(json.dumps(record, ensure_ascii=False))
+    journal_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+def test_regrade_failed_only_merges_into_existing_batch(isolated: Path) -> None:
+    uploads = [
+        UploadFile(file=io.BytesIO(f"学生{i:02d}\n{ESSAY}".encode("utf-8")), filename=f"25测试2班+学生{i:02d}+2025000100{i:02d}+职业规划书.txt")
+        for i in range(3)
+    ]
+    with run_simulator_in_thread(SimulatorConfig(latency="fixed", latency_ms=20)) as (api_url, simulator):
+        config = GradeConfig(api_url=api_url, api_key="k", model_name="sim", template="职业规划书", bypass_cache=True)
+        service = GradingService()
+        service.upload_root = isolated / "uploads"
+        first = asyncio.run(service.process(uploads, config))
+        batch_dir = isolated / "uploads" / first.batch_id
+        failed_name = first.items[1].file_name
+        _mark_failed(batch_dir / JOURNAL_FILE_NAME, failed_name)
+        original = {item.file_name: item.score for item in first.items if item.file_name != failed_name}
+        simulator.reset()
+
+        async def scenario() -> tuple[dict, list[str]]:
+            manager = JobManager(service)
+            job = manager.regrade(first.batch_id, config, failed_only=True)
+            chosen = [name for name in job.file_states if name not in job.completed]
+            while not job.finished:
+                await asyncio.sleep(0.02)
+            return job.snapshot(include_items=True), chosen
+
+        final, chosen = asyncio.run(scenario())
+        requests = simulator.snapshot()["counters"].get("requests", 0)
+
+    assert chosen == [failed_name]
+    assert requests == 1
+    assert final["status"] == "completed" and final["success_count"] == 3 and final["error_count"] == 0
+    scores = {item["file_name"]: item["score"] for item in final["items"]}
+    assert scores[failed_name] is not None
+    assert {name: scores[name] for name in original} == original
+    assert (batch_dir / "grade_result.xlsx").exists()
+
+
+def test_regrade_filters_are_validated(isolated: Path) -> None:
+    uploads = [
+        UploadFile(file=io.BytesIO(f"学生{i:02d}\n{ESSAY}".encode("utf-8")), filename=f"25测试2班+学生{i:02d}+2025000100{i:02d}+职业规划书.txt")
+        for i in range(2)
+    ]
+    config = GradeConfig(mock=True, template="职业规划书")
+    service = GradingService()
+    service.upload_root = isolated / "uploads"
+    first = asyncio.run(service.process(uploads, config))
+    names = [item.file_name for item in first.items]
+
+    async def scenario() -> list[str]:
+        manager = JobManager(service)
+        with pytest.raises(ValueError, match="筛选条件"):
+            manager.regrade(first.batch_id, config)
+        with pytest.raises(ValueError, match="不存在"):
+            manager.regrade(first.batch_id, config, file_names=["nope.txt"])
+        with pytest.raises(ValueError, match="没有符合"):
+            manager.regrade(first.batch_id, config, failed_only=True)
+        with pytest.raises(ValueError, match="没有符合"):
+            manager.regrade(first.batch_id, config, categories=["专业分析报告"])
+        with pytest.raises(ValueError, match="未找到对应作业分类"):
+            manager.regrade(first.batch_id, config, categories=["不存在的分类"])
+        with pytest.raises(FileNotFoundError):
+            manager.regrade("batch-missing", config, failed_only=True)
+        job = manager.regrade(first.batch_id, config, file_names=[names[0]], categories=["职业规划书"])
+        chosen = [name for name in job.file_states if name not in job.completed]
+        while not job.finished:
+            await asyncio.sleep(0.02)
+        return chosen
+
+    assert asyncio.run(scenario()) == [names[0]]
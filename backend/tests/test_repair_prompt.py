@@ -0,0 +1,81 @@
+"""评分结果与评分规则不一致时的修复重提示单元测试。"""
+from __future__ import annotations
+
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+from app.service import ai_client as ai_client_module
+from app.service.ai_client import AIClient
+from app.service.prompt_builder import RubricExpected, RubricItem, RubricSection
+from app.service.retry_policy import RetryPolicy
+
+ESSAY = "这是一份需要评分的学生作业正文。"
+EXPECTED = RubricExpected(
+    category_name="职业规划书",
+    rubric_max=10.0,
+    sections=[RubricSection(name="维度A", max_score=10.0, items=[RubricItem(name="细则A", max_score=6.0), RubricItem(name="细则B", max_score=4.0)])],
+)
+GOOD = {
+    "schema_version": 2,
+    "comment": "总体较好",
+    "sections": [
+        {
+            "name": "维度A",
+            "comment": "较好",
+            "items": [{"name": "细则A", "score": 5, "comment": "扣分原因"}, {"name": "细则B", "score": 3, "comment": "扣分原因"}],
+        }
+    ],
+}
+MISSING_ITEM = {**GOOD, "sections": [{**GOOD["sections"][0], "items": GOOD["sections"][0]["items"][:1]}]}
+
+
+def _run(monkeypatch: pytest.MonkeyPatch, outputs: list[str]) -> tuple[AIClient, list[str], dict]:
+    prompts: list[str] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        prompts.append(json.loads(request.content)["messages"][1]["content"])
+        return httpx.Response(200, json={"choices": [{"message": {"content": outputs.pop(0)}}]})
+
+    async def fake_client(_api_url: str | None) -> httpx.AsyncClient:
+        return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    monkeypatch.setattr(ai_client_module, "get_http_client", fake_client)
+    monkeypatch.setattr(ai_client_module, "RESPONSE_CACHE_ENABLED", False)
+    monkeypatch.setattr(ai_client_module, "get_retry_policy", lambda kind: RetryPolicy(max_attempts=3, base_delay=0.0, max_delay=0.0))
+    client = AIClient("http://repair-test/v1/chat/completions", "k", "m")
+    _raw, _parsed, normalized = asyncio.run(client.grade(ESSAY, "系统", "规则 {{HOMEWORK_TEXT}}", EXPECTED, 100.0))
+    return client, prompts, normalized
+
+
+def test_mismatch_is_repaired_without_resending_essay(monkeypatch: pytest.MonkeyPatch) -> None:
+    client, prompts, normalized = _run(monkeypatch, [json.dumps(MISSING_ITEM), json.dumps(GOOD)])
+    assert normalized["score"] == 80.0
+    assert len(prompts) == 2
+    assert ESSAY in prompts[0] and ESSAY not in prompts[1]
+    assert "细则数量" in prompts[1] and "细则B（4.0分）" in prompts[1]
+    assert client.stats["repairs"] == {"attempts": 1, "succeeded": 1}
+    assert client.stats["attempts"] == 1 and client.stats["retries"]["parse"] == 0
+    assert client.usage["calls"] == 2
+
+
+def test_failed_repair_falls_back_to_full_regrade(monkeypatch: pytest.MonkeyPatch) -> None:
+    client, prompts, normalized = _run(monkeypatch, [json.dumps(MISSING_ITEM), json.dumps(MISSING_ITEM), json.dumps(GOOD)])
+    assert normalized["score"] == 80.0
+    assert ESSAY in prompts[2]
+    assert client.stats["repairs"] == {"attempts": 1, "succeeded": 0}
+    assert client.stats["retries"]["parse"] == 1
+
+
+def test_invalid_json_is_regraded_directly(monkeypatch: pytest.MonkeyPatch) -> None:
+    client, prompts, _normalized = _run(monkeypatch, ["不是 JSON", json.dumps(GOOD)])
+    assert all(ESSAY in prompt for prompt in prompts)
+    assert client.stats["repairs"]["attempts"] == 0
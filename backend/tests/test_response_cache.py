@@ -0,0 +1,91 @@
+"""模型响应缓存单元测试。"""
+from __future__ import annotations
+
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+from app.service import ai_client as ai_client_module
+from app.service.ai_client import AIClient
+from app.service.prompt_builder import RubricExpected, RubricItem, RubricSection
+from app.service.response_cache import ResponseCache
+
+EXPECTED = RubricExpected(
+    category_name="职业规划书",
+    rubric_max=10.0,
+    sections=[RubricSection(name="维度A", max_score=10.0, items=[RubricItem(name="细则A", max_score=10.0)])],
+)
+GOOD_OUTPUT = {
+    "schema_version": 2,
+    "comment": "总体较好",
+    "sections": [{"name": "维度A", "comment": "较好", "items": [{"name": "细则A", "score": 8, "comment": "扣分原因"}]}],
+}
+
+
+def test_key_changes_with_prompt_and_model() -> None:
+    base = dict(model_name="m", api_url="http://a", system_prompt="s", user_prompt="u", temperature=0.2)
+    key = ResponseCache.make_key(**base)
+    assert key == ResponseCache.make_key(**base)
+    assert key != ResponseCache.make_key(**{**base, "user_prompt": "u2"})
+    assert key != ResponseCache.make_key(**{**base, "model_name": "m2"})
+
+
+def test_get_put_counts_hits_and_misses(tmp_path: Path) -> None:
+    cache = ResponseCache(tmp_path / "c.sqlite3")
+    assert cache.get("k") is None
+    cache.put("k", "原始输出")
+    assert cache.get("k") == "原始输出"
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+    cache.clear()
+    assert cache.stats()["entries"] == 0
+
+
+def test_lru_eviction_by_entry_limit(tmp_path: Path) -> None:
+    cache = ResponseCache(tmp_path / "c.sqlite3", max_entries=2)
+    cache.put("a", "1")
+    cache.put("b", "2")
+    cache.get("a")  # a 变为最近访问
+    cache.put("c", "3")
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+    assert cache.evictions == 1
+
+
+def test_cached_response_skips_model_call(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    calls: list[int] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(1)
+        return httpx.Response(200, json={"choices": [{"message": {"content": json.dumps(GOOD_OUTPUT)}}]})
+
+    async def fake_client(_api_url: str | None) -> httpx.AsyncClient:
+        return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    cache = ResponseCache(tmp_path / "c.sqlite3")
+    monkeypatch.setattr(ai_client_module, "get_http_client", fake_client)
+    monkeypatch.setattr(ai_client_module, "get_response_cache", lambda: cache)
+
+    def grade(client: AIClient, score_target_max: float, **kwargs):
+        return asyncio.run(client.grade("正文", "系统提示词", "模板 {{HOMEWORK_TEXT}}", EXPECTED, score_target_max, **kwargs))
+
+    client = AIClient("http://test/v1/chat/completions", "k", "m")
+    assert grade(client, 60.0)[2]["score"] == 48.0
+    assert client.stats["cache_hit"] is False
+
+    # 命中缓存后仍按新的目标满分重新归一化
+    assert grade(client, 100.0)[2]["score"] == 80.0
+    assert client.stats["cache_hit"] is True
+    assert len(calls) == 1
+
+    grade(client, 60.0, use_cache=False)
+    assert client.stats["cache_hit"] is False
+    assert len(calls) == 2
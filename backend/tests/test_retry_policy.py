@@ -0,0 +1,101 @@
+"""模型调用重试策略与批次重试预算单元测试。"""
+from __future__ import annotations
+
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+from app.service import ai_client as ai_client_module
+from app.service.ai_client import AIClient, ModelError
+from app.service.prompt_builder import RubricExpected, RubricItem, RubricSection
+from app.service.retry_policy import RetryBudget, RetryPolicy, get_retry_policy
+
+EXPECTED = RubricExpected(
+    category_name="职业规划书",
+    rubric_max=10.0,
+    sections=[RubricSection(name="维度A", max_score=10.0, items=[RubricItem(name="细则A", max_score=10.0)])],
+)
+GOOD_OUTPUT = {
+    "schema_version": 2,
+    "comment": "总体较好",
+    "sections": [{"name": "维度A", "comment": "较好", "items": [{"name": "细则A", "score": 8, "comment": "扣分原因"}]}],
+}
+
+
+def _chat_response(content: str) -> httpx.Response:
+    return httpx.Response(200, json={"choices": [{"message": {"content": content}}]})
+
+
+def _install_transport(monkeypatch: pytest.MonkeyPatch, responses: list[httpx.Response]) -> list[int]:
+    calls: list[int] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(1)
+        return responses[min(len(calls), len(responses)) - 1]
+
+    async def fake_client(_api_url: str | None) -> httpx.AsyncClient:
+        return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    monkeypatch.setattr(ai_client_module, "get_http_client", fake_client)
+    monkeypatch.setattr(ai_client_module, "RESPONSE_CACHE_ENABLED", False)
+    monkeypatch.setattr(ai_client_module, "get_retry_policy", lambda kind: RetryPolicy(max_attempts=3, base_delay=0.0, max_delay=0.0))
+    return calls
+
+
+def _grade(client: AIClient, **kwargs):
+    return asyncio.run(client.grade("正文", "系统提示词", "模板 {{HOMEWORK_TEXT}}", EXPECTED, 60.0, **kwargs))
+
+
+def test_backoff_is_bounded_full_jitter() -> None:
+    policy = RetryPolicy(max_attempts=5, base_delay=1.0, max_delay=4.0)
+    for retry_index in range(6):
+        delay = policy.backoff(retry_index)
+        assert 0.0 <= delay <= min(4.0, 2**retry_index)
+    assert get_retry_policy("parse").max_attempts >= 1
+    assert get_retry_policy("unknown") == get_retry_policy("call")
+
+
+def test_retry_budget_caps_total_retries() -> None:
+    budget = RetryBudget(ratio=0.5, min_retries=1)
+    for _ in range(4):
+        budget.record_request()
+    assert budget.allowance == 3
+    assert [budget.try_spend() for _ in range(4)] == [True, True, True, False]
+    assert budget.snapshot()["denied"] == 1
+
+
+def test_parse_error_retried_and_recorded(monkeypatch: pytest.MonkeyPatch) -> None:
+    calls = _install_transport(monkeypatch, [_chat_response("不是 JSON"), _chat_response(json.dumps(GOOD_OUTPUT))])
+    client = AIClient("http://test/v1/chat/completions", "k", "m")
+    _raw, _parsed, normalized = _grade(client)
+    assert normalized["score"] == 48.0
+    assert len(calls) == 2
+    assert client.stats["attempts"] == 2
+    assert client.stats["retries"] == {"call": 0, "parse": 1}
+
+
+def test_auth_error_is_not_retried(monkeypatch: pytest.MonkeyPatch) -> None:
+    calls = _install_transport(monkeypatch, [httpx.Response(401)])
+    client = AIClient("http://test/v1/chat/completions", "k", "m")
+    with pytest.raises(ModelError) as exc_info:
+        _grade(client)
+    assert exc_info.value.kind == "call"
+    assert len(calls) == 1
+
+
+def test_batch_budget_stops_retries(monkeypatch: pytest.MonkeyPatch) -> None:
+    calls = _install_transport(monkeypatch, [httpx.Response(503)])
+    client = AIClient("http://test/v1/chat/completions", "k", "m")
+    with pytest.raises(ModelError) as exc_info:
+        _grade(client, retry_budget=RetryBudget(ratio=0.0, min_retries=0))
+    assert "预算" in str(exc_info.value)
+    assert client.stats["budget_exhausted"] is True
+    assert len(calls) == 1
@@ -0,0 +1,95 @@
+"""跨批次加权公平调度与调用优先级单元测试。"""
+from __future__ import annotations
+
+import asyncio
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+from app.service.concurrency import AdaptiveLimiter
+from app.service.scheduler import (
+    PRIORITY_OVERALL,
+    FairSemaphore,
+    batch_queue_snapshot,
+    batch_scope,
+    call_priority,
+)
+
+
+async def _queue_one(semaphore: FairSemaphore, order: list[str], label: str) -> None:
+    await semaphore.acquire()
+    order.append(label)
+
+
+def _spawn(semaphore: FairSemaphore, order: list[str], label: str, batch_id: str, *, priority: int | None = None) -> asyncio.Task:
+    # 任务创建时复制当前上下文，因此在 batch_scope / call_priority 内创建即归属该批次与优先级
+    with batch_scope(batch_id):
+        if priority is None:
+            return asyncio.create_task(_queue_one(semaphore, order, label))
+        with call_priority(priority):
+            return asyncio.create_task(_queue_one(semaphore, order, label))
+
+
+async def _drain(semaphore: FairSemaphore, tasks: list[asyncio.Task]) -> None:
+    for _ in tasks:
+        semaphore.release()
+        await asyncio.sleep(0)
+    await asyncio.gather(*tasks)
+
+
+def test_small_batch_is_not_starved_by_large_batch() -> None:
+    async def scenario() -> list[str]:
+        semaphore = FairSemaphore("file", 1)
+        order: list[str] = []
+        await semaphore.acquire()
+        tasks = [_spawn(semaphore, order, f"big{i}", "big") for i in range(10)]
+        await asyncio.sleep(0)
+        tasks += [_spawn(semaphore, order, f"small{i}", "small") for i in range(2)]
+        await asyncio.sleep(0)
+        assert semaphore.waiting == 12
+        assert batch_queue_snapshot("big")["file"]["waiting"] == 10
+        await _drain(semaphore, tasks)
+        return order
+
+    order = asyncio.run(scenario())
+    assert order[:4] == ["big0", "small0", "big1", "small1"]
+    stats = batch_queue_snapshot("small")["file"]
+    assert stats["waiting"] == 0 and stats["queued"] == stats["granted"] == 2
+
+
+def test_primary_calls_go_before_overall_comment() -> None:
+    async def scenario() -> list[str]:
+        semaphore = FairSemaphore("model", 1)
+        order: list[str] = []
+        await semaphore.acquire()
+        tasks = [_spawn(semaphore, order, f"overall{i}", "b1", priority=PRIORITY_OVERALL) for i in range(2)]
+        await asyncio.sleep(0)
+        tasks.append(_spawn(semaphore, order, "primary", "b2"))
+        await asyncio.sleep(0)
+        await _drain(semaphore, tasks)
+        return order
+
+    assert asyncio.run(scenario()) == ["primary", "overall0", "overall1"]
+
+
+def test_cancelled_waiter_is_skipped_by_limiter() -> None:
+    async def scenario() -> None:
+        limiter = AdaptiveLimiter("http://sched-test", initial=1, floor=1, ceiling=1)
+        await limiter.acquire()
+        with batch_scope("cancel-test"):
+            cancelled = asyncio.create_task(limiter.acquire())
+            waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        assert limiter.snapshot()["waiting"] == 2
+        cancelled.cancel()
+        await asyncio.sleep(0)
+        assert limiter.snapshot()["waiting"] == 1
+        limiter.release()
+        await asyncio.wait_for(waiter, timeout=1)
+        assert limiter.in_flight == 1
+        assert batch_queue_snapshot("cancel-test")["model"]["granted"] == 1
+
+    asyncio.run(scenario())
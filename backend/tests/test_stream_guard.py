@@ -0,0 +1,99 @@
+"""流式输出增量 JSON 校验与 SSE 调用单元测试。"""
+from __future__ import annotations
+
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+from app.service import ai_client as ai_client_module
+from app.service.ai_client import AIClient
+from app.service.prompt_builder import RubricExpected, RubricItem, RubricSection
+from app.service.retry_policy import RetryPolicy
+from app.service.stream_guard import StreamGuard, StreamGuardError
+
+EXPECTED = RubricExpected(
+    category_name="职业规划书",
+    rubric_max=10.0,
+    sections=[RubricSection(name="维度A", max_score=10.0, items=[RubricItem(name="细则A", max_score=10.0)])],
+)
+GOOD_OUTPUT = {
+    "schema_version": 2,
+    "comment": "总体较好",
+    "sections": [{"name": "维度A", "comment": "较好", "items": [{"name": "细则A", "score": 8, "comment": "扣分原因"}]}],
+}
+
+
+def _feed_in_chunks(guard: StreamGuard, text: str, size: int = 3) -> None:
+    for i in range(0, len(text), size):
+        guard.feed(text[i : i + size])
+
+
+def test_accepts_valid_output_and_code_fence() -> None:
+    text = json.dumps(GOOD_OUTPUT, ensure_ascii=False, indent=2)
+    guard = StreamGuard(EXPECTED)
+    _feed_in_chunks(guard, text)
+    assert guard.done
+    fenced = StreamGuard(EXPECTED)
+    _feed_in_chunks(fenced, "```json\n" + text + "\n```")
+    assert fenced.done
+
+
+def test_rejects_prose_before_json() -> None:
+    guard = StreamGuard(EXPECTED)
+    with pytest.raises(StreamGuardError):
+        _feed_in_chunks(guard, "好的，下面是评分结果：{")
+    assert guard.consumed <= 2
+
+
+def test_rejects_unknown_section_and_item_early() -> None:
+    with pytest.raises(StreamGuardError, match="维度"):
+        _feed_in_chunks(StreamGuard(EXPECTED), '{"schema_version": 2, "sections": [{"name": "维度X", "items": [')
+    with pytest.raises(StreamGuardError, match="细则"):
+        _feed_in_chunks(StreamGuard(EXPECTED), '{"sections": [{"name": "维度A", "items": [{"name": "细则Z"')
+
+
+def test_rejects_syntax_error() -> None:
+    with pytest.raises(StreamGuardError):
+        _feed_in_chunks(StreamGuard(), '{"comment" "缺少冒号"}')
+    with pytest.raises(StreamGuardError):
+        _feed_in_chunks(StreamGuard(), '{"score": 8x}')
+
+
+def _sse_body(text: str) -> bytes:
+    lines = []
+    for i in range(0, len(text), 5):
+        chunk = {"choices": [{"delta": {"content": text[i : i + 5]}}]}
+        lines.append("data: " + json.dumps(chunk, ensure_ascii=False))
+    lines.append("data: [DONE]")
+    return ("\n\n".join(lines) + "\n\n").encode("utf-8")
+
+
+def test_stream_aborts_off_schema_and_retries(monkeypatch: pytest.MonkeyPatch) -> None:
+    bodies = [_sse_body("抱歉，我无法评分。" * 50), _sse_body(json.dumps(GOOD_OUTPUT, ensure_ascii=False))]
+    requests: list[dict] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(json.loads(request.content))
+        return httpx.Response(200, content=bodies[len(requests) - 1], headers={"content-type": "text/event-stream"})
+
+    async def fake_client(_api_url: str | None) -> httpx.AsyncClient:
+        return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    monkeypatch.setattr(ai_client_module, "get_http_client", fake_client)
+    monkeypatch.setattr(ai_client_module, "RESPONSE_CACHE_ENABLED", False)
+    monkeypatch.setattr(ai_client_module, "get_retry_policy", lambda kind: RetryPolicy(max_attempts=3, base_delay=0.0, max_delay=0.0))
+
+    client = AIClient("http://test/v1/chat/completions", "k", "m", stream=True)
+    raw, _parsed, normalized = asyncio.run(client.grade("正文", "系统提示词", "模板 {{HOMEWORK_TEXT}}", EXPECTED, 60.0))
+    assert normalized["score"] == 48.0
+    assert json.loads(raw) == GOOD_OUTPUT
+    assert all(req["stream"] is True for req in requests)
+    assert client.stats["retries"]["parse"] == 1
@@ -0,0 +1,157 @@
+"""结构化输出：由评分规则生成 JSON Schema、按端点协商下发方式与降级单元测试。"""
+from __future__ import annotations
+
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+from app.service import ai_client as ai_client_module
+from app.service import provider_caps
+from app.service.ai_client import AIClient, ModelError
+from app.service.prompt_builder import RubricExpected, RubricItem, RubricSection, build_rubric_json_schema
+from app.service.provider_caps import apply_structured_output, structured_output_style
+
+EXPECTED = RubricExpected(
+    category_name="职业规划书",
+    rubric_max=10.0,
+    sections=[
+        RubricSection(name="维度A", max_score=6.0, items=[RubricItem(name="细则A1", max_score=4.0), RubricItem(name="细则A2", max_score=2.0)]),
+        RubricSection(name="维度B", max_score=4.0, items=[RubricItem(name="细则B", max_score=4.0)]),
+    ],
+)
+GOOD_OUTPUT = {
+    "schema_version": 2,
+    "category_name": "职业规划书",
+    "comment": "总体较好",
+    "sections": [
+        {
+            "name": "维度A",
+            "comment": "较好",
+            "items": [{"name": "细则A1", "score": 3, "comment": "扣分原因"}, {"name": "细则A2", "score": 2, "comment": ""}],
+        },
+        {"name": "维度B", "comment": "一般", "items": [{"name": "细则B", "score": 2, "comment": "扣分原因"}]},
+    ],
+}
+
+
+@pytest.fixture(autouse=True)
+def _reset_negotiation(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(provider_caps, "_NEGOTIATED_STRUCTURED", {})
+
+
+def _walk_strict_objects(node: object) -> list[dict]:
+    found: list[dict] = []
+    if isinstance(node, dict):
+        if node.get("type") == "object":
+            found.append(node)
+        for value in node.values():
+            found.extend(_walk_strict_objects(value))
+    elif isinstance(node, list):
+        for value in node:
+            found.extend(_walk_strict_objects(value))
+    return found
+
+
+def test_schema_enumerates_rubric_and_bounds_scores() -> None:
+    schema = build_rubric_json_schema(EXPECTED)
+    sections = schema["properties"]["sections"]
+    assert sections["minItems"] == sections["maxItems"] == 2
+    section_a, section_b = sections["items"]["anyOf"]
+    assert section_a["properties"]["name"]["enum"] == ["维度A"]
+    item_a1, item_a2 = section_a["properties"]["items"]["items"]["anyOf"]
+    assert item_a1["properties"]["score"] == {"type": "number", "minimum": 0, "maximum": 4.0}
+    assert item_a2["properties"]["name"]["enum"] == ["细则A2"]
+    assert section_b["properties"]["items"]["items"]["properties"]["name"]["enum"] == ["细则B"]
+    for obj in _walk_strict_objects(schema):
+        assert obj["additionalProperties"] is False
+        assert set(obj["required"]) == set(obj["properties"])
+
+
+def test_style_inference_and_payload() -> None:
+    assert structured_output_style("https://api.openai.com/v1/chat/completions", "gpt-4o") == "json_schema"
+    assert structured_output_style("http://127.0.0.1:8000/v1/chat/completions", "qwen2.5-7b") == "json_schema"
+    assert structured_output_style("https://api.deepseek.com/chat/completions", "deepseek-chat") == "json_object"
+    assert structured_output_style(None, "m") == "none"
+
+    payload = {"model": "m", "messages": []}
+    schema = build_rubric_json_schema(EXPECTED)
+    assert apply_structured_output(payload, schema, "json_schema")["response_format"]["json_schema"]["schema"] is schema
+    assert apply_structured_output(payload, schema, "guided_json")["guided_json"] is schema
+    assert apply_structured_output(payload, schema, "json_object")["response_format"] == {"type": "json_object"}
+    assert apply_structured_output(payload, schema, "none") is payload
+    assert "response_format" not in payload
+
+
+def test_rejected_schema_is_downgraded_and_remembered(monkeypatch: pytest.MonkeyPatch) -> None:
+    formats: list[object] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        response_format = json.loads(request.content).get("response_format")
+        formats.append(response_format)
+        if response_format and response_format["type"] == "json_schema":
+            return httpx.Response(400, json={"error": {"message": "response_format json_schema is not supported"}})
+        return httpx.Response(200, json={"choices": [{"message": {"content": json.dumps(GOOD_OUTPUT)}}]})
+
+    async def fake_client(_api_url: str | None) -> httpx.AsyncClient:
+        return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    monkeypatch.setattr(ai_client_module, "get_http_client", fake_client)
+    monkeypatch.setattr(ai_client_module, "RESPONSE_CACHE_ENABLED", False)
+    url = "http://structured-test:8000/v1/chat/completions"
+    for _ in range(2):
+        client = AIClient(url, "k", "local-model")
+        _raw, _parsed, normalized = asyncio.run(client.grade("正文", "系统 JSON", "规则 {{HOMEWORK_TEXT}}", EXPECTED, 100.0))
+        assert normalized["score"] == 70.0
+        assert client.stats["attempts"] == 1
+    assert [f and f["type"] for f in formats] == ["json_schema", "json_object", "json_object"]
+    assert structured_output_style(url, "local-model") == "json_object"
+    assert provider_caps.negotiated_structured_outputs() == {"local-model@http://structured-test:8000": "json_object"}
+
+
+@pytest.mark.parametrize(
+    "message",
+    [
+        "This model's maximum context length is 8192 tokens",
+        "Request does not match schema: messages[1].content must be a string",
+    ],
+)
+def test_unrelated_client_error_does_not_downgrade(monkeypatch: pytest.MonkeyPatch, message: str) -> None:
+    formats: list[object] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        formats.append(json.loads(request.content).get("response_format"))
+        return httpx.Response(400, json={"error": {"message": message}})
+
+    async def fake_client(_api_url: str | None) -> httpx.AsyncClient:
+        return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    monkeypatch.setattr(ai_client_module, "get_http_client", fake_client)
+    monkeypatch.setattr(ai_client_module, "RESPONSE_CACHE_ENABLED", False)
+    url = "http://structured-unrelated:8000/v1/chat/completions"
+    client = AIClient(url, "k", "local-model")
+    with pytest.raises(ModelError) as exc_info:
+        asyncio.run(client.grade("正文", "系统 JSON", "规则 {{HOMEWORK_TEXT}}", EXPECTED, 100.0))
+    assert exc_info.value.status_code == 400
+    assert [f and f["type"] for f in formats] == ["json_schema"]
+    assert structured_output_style(url, "local-model") == "json_schema"
+    assert provider_caps.negotiated_structured_outputs() == {}
+
+
+def test_negotiated_downgrade_expires(monkeypatch: pytest.MonkeyPatch) -> None:
+    url = "http://structured-ttl:8000/v1/chat/completions"
+    assert provider_caps.downgrade_structured_output(url, "m", "json_schema") == "json_object"
+    assert structured_output_style(url, "m") == "json_object"
+
+    monkeypatch.setattr(provider_caps, "MODEL_STRUCTURED_DOWNGRADE_TTL_SECONDS", 0.0)
+    provider_caps.downgrade_structured_output(url, "m", "json_schema")
+    # 到期后重新按原方式试探，快照中也不再显示
+    assert structured_output_style(url, "m") == "json_schema"
+    assert provider_caps.negotiated_structured_outputs() == {}
@@ -0,0 +1,124 @@
+"""Token 用量与成本统计单元测试。"""
+from __future__ import annotations
+
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+from app.service import ai_client as ai_client_module
+from app.service import token_usage
+from app.service.ai_client import AIClient
+from app.service.prompt_builder import RubricExpected, RubricItem, RubricSection
+from app.service.token_usage import PriceTable, UsageLedger, split_usage, usage_from_response
+
+EXPECTED = RubricExpected(
+    category_name="职业规划书",
+    rubric_max=10.0,
+    sections=[RubricSection(name="维度A", max_score=10.0, items=[RubricItem(name="细则A", max_score=10.0)])],
+)
+GOOD_OUTPUT = {
+    "schema_version": 2,
+    "comment": "总体较好",
+    "sections": [{"name": "维度A", "comment": "较好", "items": [{"name": "细则A", "score": 8, "comment": "扣分原因"}]}],
+}
+
+
+@pytest.fixture()
+def price_table(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> PriceTable:
+    path = tmp_path / "prices.json"
+    path.write_text(
+        json.dumps(
+            {
+                "currency": "CNY",
+                "models": {
+                    "deepseek": {"input": 1.0, "output": 2.0},
+                    "deepseek-chat": {"input": 2.0, "cached_input": 0.5, "output": 8.0},
+                },
+            }
+        ),
+        encoding="utf-8",
+    )
+    table = PriceTable(path)
+    monkeypatch.setattr(token_usage, "_PRICE_TABLE", table)
+    return table
+
+
+def test_price_lookup_exact_then_longest_prefix(price_table: PriceTable) -> None:
+    assert price_table.lookup("DeepSeek-Chat")["input"] == 2.0
+    assert price_table.lookup("deepseek-chat-0324")["cached_input"] == 0.5
+    assert price_table.lookup("deepseek-r1")["input"] == 1.0
+    assert price_table.lookup("gpt-4o") is None
+
+
+def test_cost_bills_cached_tokens_at_cached_price(price_table: PriceTable) -> None:
+    # (1_000_000 - 400_000) × 2 + 400_000 × 0.5 + 100_000 × 8，单位：每百万 Token
+    assert price_table.cost("deepseek-chat", 1_000_000, 400_000, 100_000) == pytest.approx(2.2)
+
+
+def test_missing_usage_falls_back_to_local_estimate(price_table: PriceTable) -> None:
+    record = usage_from_response(None, model_name="unknown-model", prompt_estimate=120, completion_text="四个汉字")
+    assert record["prompt_tokens"] == 120
+    assert record["completion_tokens"] == 4
+    assert record["estimated_calls"] == 1
+    assert record["unpriced_calls"] == 1 and record["cost"] == 0.0
+
+    reported = usage_from_response(
+        {"prompt_tokens": 1000, "completion_tokens": 50, "prompt_cache_hit_tokens": 600},
+        model_name="deepseek-chat",
+        prompt_estimate=1,
+        completion_text="",
+    )
+    assert reported["estimated_calls"] == 0
+    assert reported["cached_tokens"] == 600
+    assert reported["total_tokens"] == 1050
+
+
+def test_split_and_ledger_totals() -> None:
+    shares = split_usage({"calls": 1, "prompt_tokens": 10, "cost": 0.3}, 3)
+    assert [s["prompt_tokens"] for s in shares] == [4, 3, 3]
+    assert sum(s["cost"] for s in shares) == pytest.approx(0.3)
+
+    ledger = UsageLedger()
+    ledger.add("https://api.example.com/v1/chat/completions", "m", {"calls": 1, "prompt_tokens": 5, "cost": 0.1})
+    ledger.add("https://api.example.com/v2/chat/completions", "m", {"calls": 2, "prompt_tokens": 7, "cost": 0.2})
+    ledger.add("https://other.example.com/v1/chat/completions", "m", {"calls": 0})
+    snapshot = ledger.snapshot()
+    assert snapshot["total"]["calls"] == 3
+    assert snapshot["total"]["cost"] == pytest.approx(0.3)
+    assert [e["endpoint"] for e in snapshot["endpoints"]] == ["https://api.example.com"]
+
+
+def test_client_accumulates_usage_across_retries(monkeypatch: pytest.MonkeyPatch, price_table: PriceTable) -> None:
+    responses = [
+        httpx.Response(200, json={"choices": [{"message": {"content": "不是 JSON"}}]}),
+        httpx.Response(
+            200,
+            json={
+                "choices": [{"message": {"content": json.dumps(GOOD_OUTPUT)}}],
+                "usage": {"prompt_tokens": 300, "completion_tokens": 40, "total_tokens": 340},
+            },
+        ),
+    ]
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return responses.pop(0)
+
+    async def fake_client(_api_url: str | None) -> httpx.AsyncClient:
+        return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    monkeypatch.setattr(ai_client_module, "get_http_client", fake_client)
+    monkeypatch.setattr(ai_client_module, "RESPONSE_CACHE_ENABLED", False)
+    client = AIClient("http://usage-test/v1/chat/completions", "k", "deepseek-chat")
+    asyncio.run(client.grade("正文", "系统", "规则 {{HOMEWORK_TEXT}}", EXPECTED, 60.0))
+    assert client.usage["calls"] == 2
+    assert client.usage["estimated_calls"] == 1
+    assert client.usage["prompt_tokens"] > 300
+    assert client.usage["cost"] > 0
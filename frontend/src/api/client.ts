@@ -1,4 +1,14 @@
-import type { GradeConfigPayload, GradeResponse, PromptConfig } from "./types";
+import type {
+  GradeConfigPayload,
+  GradeItem,
+  GradeResponse,
+  JobEventHandlers,
+  JobProgress,
+  JobSnapshot,
+  JobSubmitResponse,
+  JobSummary,
+  PromptConfig,
+} from "./types";
 
 const API_PREFIX = "/api";
 
@@ -10,7 +20,7 @@ async function parseJsonSafe(resp: Response): Promise<any> {
   }
 }
 
-export async function gradeHomework(files: File[], config: GradeConfigPayload): Promise<GradeResponse> {
+function buildGradeForm(files: File[], config: GradeConfigPayload): FormData {
   const formData = new FormData();
   files.forEach((file) => formData.append("files", file));
   formData.append("api_url", config.apiUrl);
@@ -30,10 +40,13 @@ export async function gradeHomework(files: File[], config: GradeConfigPayload):
   formData.append("mock", String(config.mock));
   formData.append("skip_format_check", String(config.skipFormatCheck));
   formData.append("score_target_max", String(config.scoreTargetMax));
+  return formData;
+}
 
+export async function gradeHomework(files: File[], config: GradeConfigPayload): Promise<GradeResponse> {
   const resp = await fetch(`${API_PREFIX}/grade`, {
     method: "POST",
-    body: formData,
+    body: buildGradeForm(files, config),
   });
 
   if (!resp.ok) {
@@ -45,6 +58,96 @@ export async function gradeHomework(files: File[], config: GradeConfigPayload):
   return resp.json();
 }
 
+export async function submitGradeJob(files: File[], config: GradeConfigPayload): Promise<JobSubmitResponse> {
+  const resp = await fetch(`${API_PREFIX}/jobs`, {
+    method: "POST",
+    body: buildGradeForm(files, config),
+  });
+
+  if (!resp.ok) {
+    const payload = await parseJsonSafe(resp);
+    const message = payload?.detail || "批改任务提交失败，请稍后重试。";
+    throw new Error(message);
+  }
+
+  return resp.json();
+}
+
+// 服务重启后按批次断点日志恢复：只重新评分缺失的文件（日志不保存密钥，需重新提交配置）
+export async function resumeGradeJob(batchId: string, config: GradeConfigPayload): Promise<JobSubmitResponse> {
+  const resp = await fetch(`${API_PREFIX}/jobs/${encodeURIComponent(batchId)}/resume`, {
+    method: "POST",
+    body: buildGradeForm([], config),
+  });
+
+  if (!resp.ok) {
+    const payload = await parseJsonSafe(resp);
+    throw new Error(payload?.detail || "恢复批改任务失败");
+  }
+
+  return resp.json();
+}
+
+// 在已有批次内只重新评分筛选出的文件（条件之间为“且”），完成后合并结果并重新导出 Excel
+export async function regradeBatch(
+  batchId: string,
+  config: GradeConfigPayload,
+  filter: { failedOnly?: boolean; fileNames?: string[]; categories?: string[] },
+): Promise<JobSubmitResponse> {
+  const formData = buildGradeForm([], config);
+  formData.append("failed_only", String(Boolean(filter.failedOnly)));
+  if (filter.fileNames?.length) formData.append("file_names", JSON.stringify(filter.fileNames));
+  if (filter.categories?.length) formData.append("categories", JSON.stringify(filter.categories));
+  const resp = await fetch(`${API_PREFIX}/batches/${encodeURIComponent(batchId)}/regrade`, {
+    method: "POST",
+    body: formData,
+  });
+
+  if (!resp.ok) {
+    const payload = await parseJsonSafe(resp);
+    throw new Error(payload?.detail || "重新评分失败，请稍后重试。");
+  }
+
+  return resp.json();
+}
+
+export async function cancelGradeJob(batchId: string): Promise<void> {
+  const resp = await fetch(`${API_PREFIX}/jobs/${encodeURIComponent(batchId)}/cancel`, { method: "POST" });
+  if (!resp.ok) {
+    const payload = await parseJsonSafe(resp);
+    throw new Error(payload?.detail || "取消批改任务失败");
+  }
+}
+
+/**
+ * 订阅后台任务的进度事件流（SSE）。断线时浏览器会自动重连，服务端重连后先补发 snapshot，
+ * 调用方按文件名合并结果即可。返回关闭函数。
+ */
+export function subscribeJobEvents(batchId: string, handlers: JobEventHandlers): () => void {
+  const source = new EventSource(`${API_PREFIX}/jobs/${encodeURIComponent(batchId)}/events`);
+  const parse = (event: MessageEvent) => JSON.parse(event.data);
+
+  source.addEventListener("snapshot", (event) => handlers.onSnapshot(parse(event as MessageEvent) as JobSnapshot));
+  source.addEventListener("item", (event) => {
+    const data = parse(event as MessageEvent);
+    handlers.onItem(data.item as GradeItem, data.progress as JobProgress);
+  });
+  for (const name of ["file", "status"]) {
+    source.addEventListener(name, (event) => handlers.onProgress(parse(event as MessageEvent).progress as JobProgress));
+  }
+  source.addEventListener("progress", (event) => handlers.onProgress(parse(event as MessageEvent) as JobProgress));
+  source.addEventListener("done", (event) => {
+    source.close();
+    handlers.onDone(parse(event as MessageEvent) as JobSummary);
+  });
+  source.onerror = () => {
+    if (source.readyState === EventSource.CLOSED) {
+      handlers.onError(new Error("进度连接已断开，请稍后刷新查看结果。"));
+    }
+  };
+  return () => source.close();
+}
+
 export async function fetchPromptConfig(): Promise<PromptConfig | null> {
   const resp = await fetch(`${API_PREFIX}/prompt-config`);
   if (!resp.ok) {
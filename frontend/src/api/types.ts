@@ -44,6 +44,71 @@ export interface GradeResponse {
   items: GradeItem[];
 }
 
+export type JobStatus = "queued" | "running" | "exporting" | "completed" | "failed" | "cancelled";
+
+export interface JobSubmitResponse {
+  batch_id: string;
+  status: JobStatus;
+  status_url: string;
+  // 仅断点恢复/增量重评时返回：沿用原结果的文件数、待重新评分的文件数与文件名
+  resumed_files?: number;
+  pending_files?: number;
+  regrade_files?: string[];
+}
+
+export interface JobCounts {
+  pending: number;
+  running: number;
+  success: number;
+  failed: number;
+  cancelled: number;
+}
+
+export interface JobQueueStats {
+  waiting: number;
+  granted: number;
+  queued: number;
+  wait_ms_avg: number;
+  wait_ms_max: number;
+}
+
+export interface JobProgress {
+  status: JobStatus;
+  total_files: number;
+  done_files: number;
+  counts: JobCounts;
+  eta_seconds: number | null;
+  latency_ms: { p50: number | null; p95: number | null };
+  queue: Record<string, JobQueueStats>;
+}
+
+export interface JobSummary {
+  batch_id: string;
+  status: JobStatus;
+  error: string | null;
+  total_files: number;
+  done_files: number;
+  counts: JobCounts;
+  eta_seconds: number | null;
+  download_result_url: string | null;
+  download_error_url: string | null;
+  success_count?: number;
+  error_count?: number;
+  average_score?: number | null;
+}
+
+export interface JobSnapshot extends JobSummary {
+  items: GradeItem[];
+}
+
+export interface JobEventHandlers {
+  onSnapshot: (snapshot: JobSnapshot) => void;
+  onItem: (item: GradeItem, progress: JobProgress) => void;
+  onProgress: (progress: JobProgress) => void;
+  onDone: (summary: JobSummary) => void;
+  onError: (error: Error) => void;
+}
+
 export interface PromptItem {
   key: string;
   max_score: number;
@@ -1,6 +1,23 @@
 import { onBeforeUnmount, onMounted, reactive, ref, watch } from "vue";
-import { fetchPromptConfig, gradeHomework, savePromptConfig } from "@/api/client";
-import type { GradeConfigPayload, GradeResponse, PromptConfig, PromptSettings, TemplateOption } from "@/api/types";
+import {
+  cancelGradeJob,
+  fetchPromptConfig,
+  regradeBatch,
+  resumeGradeJob,
+  savePromptConfig,
+  submitGradeJob,
+  subscribeJobEvents,
+} from "@/api/client";
+import type {
+  GradeConfigPayload,
+  GradeItem,
+  GradeResponse,
+  JobProgress,
+  JobSummary,
+  PromptConfig,
+  PromptSettings,
+  TemplateOption,
+} from "@/api/types";
 import { useUI } from "@/shared/composables/useUI";
 
 type TabKey = "workspace" | "rules" | "templates" | "settings";
@@ -16,6 +33,8 @@ type WorkspaceCachePayload = {
   inProgress: boolean;
   statusText: string;
   result: GradeResponse | null;
+  // 后台任务 ID：页面刷新后据此重新订阅进度
+  jobId?: string | null;
 };
 
 export function useAppController() {
@@ -41,6 +60,9 @@ export function useAppController() {
   const configPersistTimer = ref<number | null>(null);
 
   const result = ref<GradeResponse | null>(null);
+  const jobProgress = ref<JobProgress | null>(null);
+  const activeJobId = ref<string | null>(null);
+  let stopJobStream: (() => void) | null = null;
   const promptConfig = ref<PromptConfig | null>(null);
   const promptLoading = ref(false);
   const promptSaving = ref(false);
@@ -102,6 +124,7 @@ export function useAppController() {
       inProgress,
       statusText: statusText.value,
       result: result.value ? sanitizeResultForCache(result.value) : null,
+      jobId: inProgress ? activeJobId.value : null,
     };
     try {
       localStorage.setItem(WORKSPACE_STATE_KEY, JSON.stringify(payload));
@@ -126,7 +149,9 @@ export function useAppController() {
       if (typeof parsed.statusText === "string" && parsed.statusText.trim()) {
         statusText.value = parsed.statusText;
       }
-      if (parsed.inProgress) {
+      if (parsed.inProgress && parsed.jobId) {
+        void resumeJob(parsed.jobId);
+      } else if (parsed.inProgress) {
         statusText.value = "上次批改在页面刷新时被中断，请重新点击开始批改。";
         showToast(statusText.value, "warning");
         persistWorkspaceState(false);
@@ -263,21 +288,128 @@ export function useAppController() {
     }
   }
 
+  function emptyJobResult(batchId: string, totalFiles: number): GradeResponse {
+    return {
+      batch_id: batchId,
+      total_files: totalFiles,
+      success_count: 0,
+      error_count: 0,
+      average_score: null,
+      download_result_url: "",
+      download_error_url: "",
+      items: [],
+    };
+  }
+
+  // 按文件名合并增量结果（重连后服务端会补发已完成的结果）
+  function mergeJobItems(items: GradeItem[]) {
+    if (!result.value || !items.length) return;
+    const byName = new Map(result.value.items.map((item) => [item.file_name, item]));
+    items.forEach((item) => byName.set(item.file_name, item));
+    const merged = Array.from(byName.values());
+    const scores = merged.map((item) => item.score).filter((score): score is number => typeof score === "number");
+    result.value = {
+      ...result.value,
+      items: merged,
+      success_count: scores.length,
+      error_count: merged.length - scores.length,
+      average_score: scores.length ? scores.reduce((sum, score) => sum + score, 0) / scores.length : null,
+    };
+  }
+
+  function formatEta(seconds: number | null): string {
+    if (seconds === null) return "";
+    if (seconds < 60) return `，预计剩余 ${Math.ceil(seconds)} 秒`;
+    return `，预计剩余 ${Math.ceil(seconds / 60)} 分钟`;
+  }
+
+  function applyProgress(progress: JobProgress) {
+    jobProgress.value = progress;
+    const phase = progress.status === "exporting" ? "导出中" : progress.status === "queued" ? "排队中" : "处理中";
+    statusText.value = `${phase} ${progress.done_files}/${progress.total_files}${formatEta(progress.eta_seconds)}`;
+  }
+
+  function followJob(batchId: string, session: number): Promise<JobSummary> {
+    return new Promise((resolve, reject) => {
+      stopJobStream = subscribeJobEvents(batchId, {
+        onSnapshot: (snapshot) => {
+          if (session !== gradeSessionId.value) return;
+          if (!result.value || result.value.batch_id !== batchId) {
+            result.value = emptyJobResult(batchId, snapshot.total_files);
+          }
+          mergeJobItems(snapshot.items);
+          statusText.value = `处理中 ${snapshot.done_files}/${snapshot.total_files}${formatEta(snapshot.eta_seconds)}`;
+        },
+        onItem: (item, progress) => {
+          if (session !== gradeSessionId.value) return;
+          mergeJobItems([item]);
+          applyProgress(progress);
+        },
+        onProgress: (progress) => {
+          if (session !== gradeSessionId.value) return;
+          applyProgress(progress);
+        },
+        onDone: (summary) => {
+          stopJobStream = null;
+          resolve(summary);
+        },
+        onError: (err) => {
+          stopJobStream = null;
+          reject(err);
+        },
+      });
+    });
+  }
+
+  function finishJob(summary: JobSummary) {
+    activeJobId.value = null;
+    jobProgress.value = null;
+    if (result.value) {
+      result.value = {
+        ...result.value,
+        success_count: summary.success_count ?? result.value.success_count,
+        error_count: summary.error_count ?? result.value.error_count,
+        average_score: summary.average_score ?? result.value.average_score,
+        download_result_url: summary.download_result_url || "",
+        download_error_url: summary.download_error_url || "",
+      };
+    }
+    if (summary.status === "completed") {
+      statusText.value = "已完成";
+      showToast(`批改完成！成功处理 ${summary.success_count ?? 0} 个文件`, "success");
+    } else if (summary.status === "cancelled") {
+      statusText.value = "已取消";
+      showToast(`批改已取消，已完成的 ${summary.done_files} 个文件结果已保留`, "warning");
+    } else {
+      statusText.value = "异常";
+      showToast(summary.error || "批改任务失败", "error");
+    }
+    persistWorkspaceState(false);
+  }
+
+  async function runJob(batchId: string, session: number) {
+    activeJobId.value = batchId;
+    persistWorkspaceState(true);
+    const summary = await followJob(batchId, session);
+    if (session !== gradeSessionId.value) return;
+    finishJob(summary);
+  }
+
   async function handleGrade(files: File[]) {
     if (loading.value) return;
     const currentSession = bumpGradeSession();
     loading.value = true;
     statusText.value = "处理中";
+    jobProgress.value = null;
     persistWorkspaceState(true);
     try {
-      const resp = await gradeHomework(files, config);
+      const job = await submitGradeJob(files, config);
       if (currentSession !== gradeSessionId.value) return;
-      result.value = resp;
-      statusText.value = "已完成";
-      persistWorkspaceState(false);
-      showToast(`批改完成！成功处理 ${resp.success_count} 个文件`, "success");
+      result.value = emptyJobResult(job.batch_id, files.length);
+      await runJob(job.batch_id, currentSession);
     } catch (err) {
       if (currentSession !== gradeSessionId.value) return;
+      activeJobId.value = null;
       statusText.value = "异常";
       persistWorkspaceState(false);
       showToast((err as Error).message, "error");
@@ -287,6 +419,66 @@ export function useAppController() {
     }
   }
 
+  async function resumeJob(batchId: string) {
+    const currentSession = bumpGradeSession();
+    loading.value = true;
+    statusText.value = "正在恢复上次批改进度";
+    try {
+      try {
+        await runJob(batchId, currentSession);
+      } catch {
+        // 服务已重启、任务不在内存中：按批次断点日志恢复，只重新评分缺失的文件
+        if (currentSession !== gradeSessionId.value) return;
+        const resumed = await resumeGradeJob(batchId, config);
+        if (currentSession !== gradeSessionId.value) return;
+        showToast(`已从断点恢复批改：沿用 ${resumed.resumed_files ?? 0} 个文件的结果`, "success");
+        await runJob(batchId, currentSession);
+      }
+    } catch {
+      if (currentSession !== gradeSessionId.value) return;
+      activeJobId.value = null;
+      statusText.value = "上次批改的进度已无法恢复，请重新点击开始批改。";
+      showToast(statusText.value, "warning");
+      persistWorkspaceState(false);
+    } finally {
+      if (currentSession === gradeSessionId.value) loading.value = false;
+    }
+  }
+
+  async function regradeFailed() {
+    const batchId = result.value?.batch_id;
+    if (loading.value || !batchId) return;
+    const currentSession = bumpGradeSession();
+    loading.value = true;
+    statusText.value = "重新评分失败文件";
+    jobProgress.value = null;
+    try {
+      const job = await regradeBatch(batchId, config, { failedOnly: true });
+      if (currentSession !== gradeSessionId.value) return;
+      showToast(`正在重新评分 ${job.pending_files ?? 0} 个失败文件，其余结果保留`, "info");
+      await runJob(batchId, currentSession);
+    } catch (err) {
+      if (currentSession !== gradeSessionId.value) return;
+      activeJobId.value = null;
+      statusText.value = "异常";
+      persistWorkspaceState(false);
+      showToast((err as Error).message, "error");
+    } finally {
+      if (currentSession === gradeSessionId.value) loading.value = false;
+    }
+  }
+
+  async function cancelGrade() {
+    const batchId = activeJobId.value;
+    if (!batchId) return;
+    try {
+      await cancelGradeJob(batchId);
+      statusText.value = "正在取消";
+    } catch (err) {
+      showToast((err as Error).message, "error");
+    }
+  }
+
   async function handleSavePrompt(payload: PromptConfig) {
     promptSaving.value = true;
     try {
@@ -302,6 +494,10 @@ export function useAppController() {
   }
 
   function bumpGradeSession(): number {
+    if (stopJobStream) {
+      stopJobStream();
+      stopJobStream = null;
+    }
     gradeSessionId.value += 1;
     return gradeSessionId.value;
   }
@@ -342,6 +538,8 @@ export function useAppController() {
     loading.value = false;
     statusText.value = "就绪";
     result.value = null;
+    jobProgress.value = null;
+    activeJobId.value = null;
 
     try {
       localStorage.removeItem(WORKSPACE_STATE_KEY);
@@ -365,6 +563,7 @@ export function useAppController() {
     statusText,
     loading,
     result,
+    jobProgress,
     promptConfig,
     promptLoading,
     promptSaving,
@@ -375,6 +574,8 @@ export function useAppController() {
     updateConfig,
     updatePromptSettings,
     handleGrade,
+    cancelGrade,
+    regradeFailed,
     clearWorkspaceState,
     clearAllLocalCache,
     loadPromptConfig,